@@ -0,0 +1,109 @@
+#!/usr/bin/python3
+
+import time
+import multiprocessing as mp
+import numpy as np
+from argparse import ArgumentParser
+
+from skaimsginterface.skaimessages import *
+from skaimsginterface.framing import FrameChecksum
+from skaimsginterface.tcp import TcpSenderMP, MultiportTcpListener
+
+
+def create_feetpos_msg(seq, num_people):
+    # camera id is the sequence number, timestamp the monotonic send time (same clock in every process)
+    msg = FeetPosMsg.new_msg()
+    camframe = msg.camera_frames.add()
+    camframe.camera_id = seq
+    camframe.timestamp = time.monotonic_ns()
+    for person_idx in range(num_people):
+        person = camframe.people_in_frame.add()
+        person.id = person_idx
+        FeetPosMsg.set_feet_pos(person, [1.0, 2.0, 0.0])
+    return FeetPosMsg.pack(msg)
+
+
+def run_listener(port, num_msgs, result_q):
+    latency_us = np.zeros(num_msgs)
+    seqs = []
+
+    def callback(msg_bytes, server_address):
+        msg_type, msg = SkaiMsg.unpack(bytes(msg_bytes))
+        camframe = msg.camera_frames[0]
+        latency_us[len(seqs)] = (time.monotonic_ns() - camframe.timestamp) / 1000
+        seqs.append(camframe.camera_id)
+        if len(seqs) == num_msgs:
+            result_q.put((time.monotonic(), latency_us, seqs))
+
+    MultiportTcpListener([port], callback)
+    while True:
+        time.sleep(1)
+
+
+def run_case(name, args, port, rate, batch_max_msgs):
+    num_msgs = args.msgs if rate is None else int(rate * args.seconds)
+    result_q = mp.Queue()
+    listener = mp.Process(target=run_listener, args=(port, num_msgs, result_q), daemon=True)
+    listener.start()
+    time.sleep(0.5)
+    sender = TcpSenderMP('127.0.0.1', port, checksum_type=FrameChecksum.Type.CRC32C, batch_max_msgs=batch_max_msgs,
+                         batch_max_delay_s=args.delay_ms / 1000)
+
+    start = time.monotonic()
+    for seq in range(num_msgs):
+        if rate is not None:
+            # paced: wait for this msg's slot
+            delay = start + seq / rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        sender.send(create_feetpos_msg(seq, args.people))
+    end, latency_us, seqs = result_q.get(timeout=60)
+    sender.stop()
+    listener.terminate()
+
+    # every msg arrives once and in order, batched or not
+    assert seqs == list(range(num_msgs))
+    print(f'{name:>12} {"max" if rate is None else f"{rate:.0f}":>8} {num_msgs / (end - start):>10.0f}'
+          f' {np.percentile(latency_us, 50):>10.0f} {np.percentile(latency_us, 99):>10.0f}')
+
+
+def check_send_then_stop(args, port, batch_max_msgs):
+    # a batch that never fills up within its delay, stop() right after send() still has to deliver it
+    num_msgs = 2 * batch_max_msgs + batch_max_msgs // 2
+    result_q = mp.Queue()
+    listener = mp.Process(target=run_listener, args=(port, num_msgs, result_q), daemon=True)
+    listener.start()
+    time.sleep(0.5)
+    sender = TcpSenderMP('127.0.0.1', port, checksum_type=FrameChecksum.Type.CRC32C, batch_max_msgs=batch_max_msgs,
+                         batch_max_delay_s=60)
+    for seq in range(num_msgs):
+        sender.send(create_feetpos_msg(seq, args.people))
+    sender.stop()
+    end, latency_us, seqs = result_q.get(timeout=10)
+    listener.terminate()
+    assert seqs == list(range(num_msgs))
+    print(f'{batch_max_msgs:>9} msgs: {num_msgs} msgs sent then stopped, all delivered')
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--port', help='first port, each case uses a fresh one', type=int, default=FeetPosMsg.ports[97])
+    parser.add_argument('--msgs', help='msgs of the unpaced cases', type=int, default=50000)
+    parser.add_argument('--rate', help='msgs/s of the paced cases', type=float, default=2000)
+    parser.add_argument('--seconds', help='length of the paced cases', type=float, default=3)
+    parser.add_argument('--people', help='people per msg', type=int, default=2)
+    parser.add_argument('--delay_ms', help='batch_max_delay_s of the batched cases, in ms', type=float, default=2)
+    parser.add_argument('--batch', help='batch_max_msgs of the batched cases', type=int, nargs='+', default=[8, 32, 128])
+    args = parser.parse_args()
+
+    print(f'FeetPosMsg ({args.people} people) TcpSenderMP -> MultiportTcpListener, latency is send() to callback')
+    print(f'{"batch":>12} {"rate":>8} {"msgs/s":>10} {"p50 us":>10} {"p99 us":>10}')
+    port = args.port
+    for rate in (None, args.rate):
+        for batch_max_msgs in [None] + args.batch:
+            name = 'off' if batch_max_msgs is None else f'{batch_max_msgs} msgs'
+            run_case(name, args, port, rate, batch_max_msgs)
+            port += 1
+    for batch_max_msgs in args.batch:
+        check_send_then_stop(args, port, batch_max_msgs)
+        port += 1
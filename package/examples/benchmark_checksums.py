@@ -0,0 +1,68 @@
+#!/usr/bin/python3
+
+import os
+import time
+from argparse import ArgumentParser
+
+from skaimsginterface.framing import FrameChecksum, SkaiFrame
+
+
+def run_checksum(checksum_type, payload, min_sec):
+    # repeat until min_sec has passed so small payloads get a stable number
+    view = memoryview(payload)
+    iterations = 0
+    start = time.perf_counter()
+    elapsed = 0
+    while elapsed < min_sec:
+        for i in range(16):
+            FrameChecksum.compute(checksum_type, view)
+        iterations += 16
+        elapsed = time.perf_counter() - start
+    return iterations * len(payload) / elapsed / 1e6
+
+
+def run_frame_roundtrip(checksum_type, payload, min_sec):
+    # what a sender + listener pair pays per msg: pack, join, verify and trim
+    iterations = 0
+    start = time.perf_counter()
+    elapsed = 0
+    while elapsed < min_sec:
+        for i in range(16):
+            body = bytearray().join(SkaiFrame.pack(payload, checksum_type))
+            SkaiFrame.unpack_inplace(body)
+        iterations += 16
+        elapsed = time.perf_counter() - start
+    return iterations * len(payload) / elapsed / 1e6
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--sizes', help='payload sizes in bytes', nargs='+', type=int,
+                        default=[1024, 16 * 1024, 256 * 1024, 1024 * 1024, 16 * 1024 * 1024])
+    parser.add_argument('--seconds', help='minimum seconds per measurement', type=float, default=0.5)
+    parser.add_argument('--roundtrip', help='also time SkaiFrame pack + unpack_inplace per checksum', nargs='?', type=bool, const=True, default=False)
+    args = parser.parse_args()
+
+    checksum_types = [t for t in FrameChecksum.available() if t != FrameChecksum.Type.NONE]
+    missing = [t.name for t in FrameChecksum.Type if t not in FrameChecksum.available()]
+    print(f'best available checksum: {FrameChecksum.best_available().name}')
+    if missing:
+        print(f'not installed: {", ".join(missing)}')
+
+    print(f'\nchecksum throughput (MB/s)')
+    print(f'{"size":>10} ' + ' '.join(f'{t.name:>10}' for t in checksum_types))
+    for size in args.sizes:
+        payload = os.urandom(size)
+        results = [run_checksum(t, payload, args.seconds) for t in checksum_types]
+        print(f'{size:>10} ' + ' '.join(f'{r:>10.0f}' for r in results))
+
+    if args.roundtrip:
+        # legacy frames (None) vs versioned frames with each checksum
+        frame_types = [None] + checksum_types
+        names = ['legacy'] + [t.name for t in checksum_types]
+        print(f'\nframe pack + verify throughput (MB/s)')
+        print(f'{"size":>10} ' + ' '.join(f'{n:>10}' for n in names))
+        for size in args.sizes:
+            payload = os.urandom(size)
+            results = [run_frame_roundtrip(t, payload, args.seconds) for t in frame_types]
+            print(f'{size:>10} ' + ' '.join(f'{r:>10.0f}' for r in results))
@@ -0,0 +1,155 @@
+#!/usr/bin/python3
+
+import os
+import time
+import numpy as np
+from argparse import ArgumentParser
+
+from skaimsginterface.skaimessages import *
+from skaimsginterface.framing import SkaiFrame, FrameChecksum, FrameCompression
+from skaimsginterface.replay import FileRecorder
+
+
+# recorded traffic of a camera group: per frame a LocalTrackMsg per camera (face and bbox
+# embeddings, pose, feet position) and a small FeetPosMsg, every --global_every frames a
+# GlobalTrackMsg per track (top embeddings plus the whole location history so far).
+# bbox embeddings are post relu features (non negative, about half zeros), face embeddings
+# dense and l2 normalized, both drift a little per frame. pass --file for a real recording
+
+def embeddings(rng, base, relu):
+    vals = base + 0.05 * rng.standard_normal(base.shape).astype(np.float32)
+    if relu:
+        return np.maximum(vals, 0)
+    return vals / np.linalg.norm(vals, axis=-1, keepdims=True)
+
+
+def create_localtrack_msg(rng, timestamp, camera_id, face_bases, bbox_bases):
+    msg = LocalTrackMsg.new_msg()
+    msg.timestamp = timestamp
+    camframe = msg.camera_frames.add()
+    camframe.camera_id = camera_id
+    people = [camframe.people_in_frame.add() for _ in range(len(face_bases))]
+    for track_idx, person in enumerate(people):
+        person.skaimot_id = track_idx
+        person.classification = SkaiMsg.CLASSIFICATION.CUSTOMER
+        SkaimotMsg.set_bbox(person, rng.random(4).tolist())
+        person.feet_position.x, person.feet_position.y = rng.random(2) * 20
+        person.feet_position_confidence = 0.9
+        for field in person.pose_keypoints.DESCRIPTOR.fields:
+            if field.message_type is not None:
+                PoseMsg.set_xy(getattr(person.pose_keypoints, field.name), rng.random(2))
+    SkaiMsg.set_embeddings([p.face_embed for p in people], embeddings(rng, face_bases, relu=False), timestamp)
+    SkaiMsg.set_embeddings([p.bbox_embed for p in people], embeddings(rng, bbox_bases, relu=True), timestamp)
+    return msg
+
+
+def create_globaltrack_msg(rng, track_idx, history, face_base, bbox_base, top_k):
+    msg = GlobalTrackMsg.new_msg()
+    msg.global_track_id = 1000 + track_idx
+    msg.meta_people.greeted = True
+    faces = [msg.top_faces.add() for _ in range(top_k)]
+    bboxes = [msg.top_bboxes.add() for _ in range(top_k)]
+    SkaiMsg.set_embeddings(faces, embeddings(rng, np.tile(face_base, (top_k, 1)), relu=False))
+    SkaiMsg.set_embeddings(bboxes, embeddings(rng, np.tile(bbox_base, (top_k, 1)), relu=True))
+    for timestamp, camera_id, tag, xy in history:
+        location = msg.history.locations.add()
+        location.timestamp = timestamp
+        location.camera_ids.append(camera_id)
+        location.location_tags.append(tag)
+        location.x, location.y = xy
+    return msg
+
+
+def record_traffic(filepath, args):
+    rng = np.random.default_rng(0)
+    recorder = FileRecorder(filepath)
+    recorder.open()
+    face_bases = rng.standard_normal((args.people, 512)).astype(np.float32)
+    bbox_bases = rng.standard_normal((args.people, 2048)).astype(np.float32)
+    camera_ids = [SkaiMsg.convert_mac_addr_to_camera_identifier_number(f'00:10:FA:66:42:{i:02X}') for i in range(args.cams)]
+    tags = ['showroom', 'service desk', 'lot north', 'lot south']
+    histories = [[] for _ in range(args.people)]
+    start_ns = time.time_ns()
+    for frame_idx in range(args.frames):
+        timestamp = start_ns + frame_idx * 100_000_000
+        for cam_idx, camera_id in enumerate(camera_ids):
+            msg = create_localtrack_msg(rng, timestamp, camera_id, face_bases, bbox_bases)
+            recorder.record(LocalTrackMsg.pack(msg), timestamp / 1e9, LocalTrackMsg.ports[0])
+        feetpos = FeetPosMsg.new_msg()
+        for track_idx in range(args.people):
+            person = feetpos.camera_frames.add().people_in_frame.add()
+            person.id = track_idx
+            FeetPosMsg.set_feet_pos(person, [*(rng.random(2) * 20), 0.0])
+            histories[track_idx].append((timestamp, camera_ids[track_idx % args.cams], tags[track_idx % len(tags)],
+                                         rng.random(2) * 20))
+        recorder.record(FeetPosMsg.pack(feetpos), timestamp / 1e9, FeetPosMsg.ports[0])
+        if frame_idx % args.global_every == args.global_every - 1:
+            for track_idx in range(args.people):
+                msg = create_globaltrack_msg(rng, track_idx, histories[track_idx], face_bases[track_idx],
+                                             bbox_bases[track_idx], args.top_k)
+                recorder.record(GlobalTrackMsg.pack(msg), timestamp / 1e9, GlobalTrackMsg.ports[0])
+    recorder.close()
+
+
+def run_codec(compression, msgs, args):
+    checksum_type = FrameChecksum.Type.CRC32C
+    # cpu of framing (checksum + compression) on the sender, of checksum + decompression on the listener
+    start = time.process_time()
+    frames = [SkaiFrame.pack_bytes(msg_bytes, checksum_type, seq, compression=compression,
+                                   compress_min_bytes=args.min_bytes) for seq, msg_bytes in enumerate(msgs)]
+    pack_s = time.process_time() - start
+    start = time.process_time()
+    unpacked = [SkaiFrame.split_msgs(SkaiFrame.strip_checksum(frame)[0])[0] for frame in frames]
+    unpack_s = time.process_time() - start
+    # every msg comes back as sent
+    assert all(len(msg_list) == 1 and msg_list[0] == msg_bytes for msg_list, msg_bytes in zip(unpacked, msgs))
+    compressed = sum(1 for frame in frames if SkaiFrame.unpack(frame)[1].flags & SkaiFrame.COMPRESSION)
+    return sum(len(frame) for frame in frames), pack_s, unpack_s, compressed
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--file', help='recorded .skaibin to measure, default records synthetic traffic first', type=str, default=None)
+    parser.add_argument('--out', help='where to record the synthetic traffic', type=str, default='/tmp/benchmark_compression.skaibin')
+    parser.add_argument('--frames', help='frames of synthetic traffic (10 per second)', type=int, default=300)
+    parser.add_argument('--cams', help='cameras', type=int, default=4)
+    parser.add_argument('--people', help='tracks in view', type=int, default=6)
+    parser.add_argument('--global_every', help='frames between GlobalTrackMsgs', type=int, default=10)
+    parser.add_argument('--top_k', help='top embeddings per GlobalTrackMsg', type=int, default=5)
+    parser.add_argument('--min_bytes', help='compress_min_bytes', type=int, default=1024)
+    args = parser.parse_args()
+
+    filepath = args.file
+    if filepath is None:
+        filepath = args.out
+        record_traffic(filepath, args)
+    msgs_by_type = {}
+    for timestamp, port, header, msg_bytes in FileRecorder.parseRecordedFileWithHeaders(filepath):
+        msgs_by_type.setdefault(SkaiMsg.getMessageTypeName(msg_bytes), []).append(msg_bytes)
+    total_bytes = sum(len(m) for msgs in msgs_by_type.values() for m in msgs)
+    print(f'{filepath}: {sum(len(msgs) for msgs in msgs_by_type.values())} msgs, {total_bytes / 1e6:.1f} MB,'
+          f' CRC32C frames, compress_min_bytes {args.min_bytes}')
+    print('cpu is ms per MB of msgs, break even is the link speed below which the bytes saved'
+          ' outweigh the extra cpu of both ends')
+    print(f'{"codec":>6} {"msg type":>16} {"msgs":>6} {"compressed":>10} {"MB":>7} {"MB sent":>8} {"saved":>6}'
+          f' {"pack ms":>8} {"unpack ms":>9} {"break even Mbit/s":>18}')
+
+    baseline = {}
+    for compression in FrameCompression.available():
+        rows = []
+        for type_name, msgs in msgs_by_type.items():
+            rows.append((type_name, msgs) + run_codec(compression, msgs, args))
+        all_msgs = [m for msgs in msgs_by_type.values() for m in msgs]
+        rows.append(('all', all_msgs) + tuple(np.sum([row[2:] for row in rows], axis=0)))
+        for type_name, msgs, sent_bytes, pack_s, unpack_s, compressed in rows:
+            msg_mb = sum(len(m) for m in msgs) / 1e6
+            if compression == FrameCompression.Type.NONE:
+                baseline[type_name] = (sent_bytes, pack_s + unpack_s)
+            saved_bytes = baseline[type_name][0] - sent_bytes
+            extra_cpu_s = pack_s + unpack_s - baseline[type_name][1]
+            break_even = f'{saved_bytes * 8 / extra_cpu_s / 1e6:.0f}' if saved_bytes > 0 and extra_cpu_s > 0 else '-'
+            print(f'{compression.name:>6} {type_name:>16} {len(msgs):>6} {int(compressed):>10} {msg_mb:>7.2f}'
+                  f' {sent_bytes / 1e6:>8.2f} {saved_bytes / baseline[type_name][0]:>6.1%}'
+                  f' {pack_s * 1e3 / msg_mb:>8.2f} {unpack_s * 1e3 / msg_mb:>9.2f} {break_even:>18}')
+    if args.file is None:
+        os.remove(filepath)
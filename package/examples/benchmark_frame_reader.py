@@ -0,0 +1,85 @@
+#!/usr/bin/python3
+
+import math
+import time
+import socket
+import struct
+import threading
+from argparse import ArgumentParser
+
+from skaimsginterface.tcp import FrameReader
+
+
+def legacy_read_frame(sock):
+    # the old listener loop: ceil(length/4096) recv calls concatenated together
+    bytes_in = sock.recv(4)
+    if not bytes_in:
+        return None
+    length = struct.unpack('!I', bytes_in)[0]
+    chunksize = 4096
+    data = bytes()
+    for chunk in range(math.ceil(length / chunksize)):
+        data += sock.recv(chunksize)
+    return data
+
+
+def frame_reader_read_frame(reader):
+    frame = reader.read_frame()
+    if frame is None:
+        return None
+    return frame[0]
+
+
+def send_frames(sock, frame_size, num_frames):
+    frame = struct.pack('!I', frame_size) + bytes(frame_size)
+    try:
+        for i in range(num_frames):
+            sock.sendall(frame)
+        sock.shutdown(socket.SHUT_WR)
+    except OSError:
+        # receiver gave up after losing framing
+        pass
+
+
+def run(frame_size, num_frames, use_frame_reader):
+    rx, tx = socket.socketpair()
+    sender = threading.Thread(target=send_frames, args=(tx, frame_size, num_frames))
+    sender.daemon = True
+
+    reader = FrameReader(rx)
+    frames = 0
+    truncated = 0
+    start = time.perf_counter()
+    sender.start()
+    while frames < num_frames:
+        if use_frame_reader:
+            data = frame_reader_read_frame(reader)
+        else:
+            data = legacy_read_frame(rx)
+        if data is None:
+            break
+        frames += 1
+        if len(data) != frame_size:
+            truncated += 1
+            # legacy reader has lost framing at this point, stop counting
+            break
+    elapsed = time.perf_counter() - start
+    sender.join(timeout=1)
+    rx.close()
+    tx.close()
+    return frames, truncated, elapsed
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--numbytes', help='total bytes to transfer per frame size (default 256 MB)', type=int, default=256 * 1024 * 1024)
+    args = parser.parse_args()
+
+    frame_sizes = [1024, 16 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024]
+    print(f'{"frame size":>12} {"reader":>12} {"frames":>8} {"truncated":>10} {"MB/s":>10} {"frames/s":>10}')
+    for frame_size in frame_sizes:
+        num_frames = max(10, args.numbytes // frame_size)
+        for name, use_frame_reader in (('legacy', False), ('FrameReader', True)):
+            frames, truncated, elapsed = run(frame_size, num_frames, use_frame_reader)
+            mbps = frames * frame_size / elapsed / 1e6
+            print(f'{frame_size:>12} {name:>12} {frames:>8} {truncated:>10} {mbps:>10.1f} {frames / elapsed:>10.0f}')
@@ -0,0 +1,105 @@
+#!/usr/bin/python3
+
+import time
+import numpy as np
+from argparse import ArgumentParser
+from google.protobuf.internal import api_implementation
+
+from skaimsginterface.skaimessages import *
+
+
+def create_skaimotmsg(num_cams, num_people):
+    # full size embeddings, the part a router never needs
+    msg = SkaimotMsg.new_msg()
+    timestamp = time.time_ns()
+    for cam_idx in range(num_cams):
+        camframe = msg.camera_frames.add()
+        camframe.camera_id = 0x0010FA664211 + cam_idx
+        camframe.timestamp = timestamp
+        for person_idx in range(num_people):
+            person = camframe.people_in_frame.add()
+            person.id = person_idx
+            person.classification = SkaiMsg.CLASSIFICATION.CUSTOMER
+            SkaimotMsg.set_bbox(person, [0.2, 0.21, 0.4, 0.42])
+            SkaimotMsg.set_face_embed(person, np.random.rand(512).tolist())
+            SkaimotMsg.set_bbox_embed(person, np.random.rand(2048).tolist())
+    return msg
+
+
+def create_localtrackmsg(num_cams, num_people):
+    msg = LocalTrackMsg.new_msg()
+    msg.timestamp = time.time_ns()
+    for cam_idx in range(num_cams):
+        frame = msg.camera_frames.add()
+        frame.camera_id = 0x0010FA664211 + cam_idx
+        for person_idx in range(num_people):
+            person = frame.people_in_frame.add()
+            person.skaimot_id = person_idx
+            person.face_embed.vals.extend(np.random.rand(512).tolist())
+            person.bbox_embed.vals.extend(np.random.rand(2048).tolist())
+            # every keypoint is its own submessage
+            for kp_field in person.pose_keypoints.DESCRIPTOR.fields:
+                if kp_field.message_type is not None:
+                    kp = getattr(person.pose_keypoints, kp_field.name)
+                    kp.x, kp.y = np.random.rand(2).tolist()
+    return msg
+
+
+def full_decode(msg_bytes, paths):
+    # what a router does today
+    msg_type, msg = SkaiMsg.unpack(msg_bytes)
+    if msg_type == SkaiMsg.MsgType.SKAIMOT:
+        return [frame.camera_id for frame in msg.camera_frames], [frame.timestamp for frame in msg.camera_frames]
+    return [frame.camera_id for frame in msg.camera_frames], msg.timestamp
+
+
+def lazy_view(msg_bytes, paths):
+    # default: wire scan on the pure python protobuf backend, cached full decode otherwise
+    view = SkaiMsgView(msg_bytes)
+    return tuple(view.get(path) for path in paths)
+
+
+def wire_scan_view(msg_bytes, paths):
+    view = SkaiMsgView(msg_bytes, wire_scan=True)
+    return tuple(view.get(path) for path in paths)
+
+
+def time_per_call(func, msg_bytes, paths, min_sec):
+    iterations = 0
+    start = time.perf_counter()
+    elapsed = 0
+    while elapsed < min_sec:
+        func(msg_bytes, paths)
+        iterations += 1
+        elapsed = time.perf_counter() - start
+    return elapsed / iterations * 1e6
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--cams', help='camera frames per msg', nargs='+', type=int, default=[1, 5, 20])
+    parser.add_argument('--people', help='people per camera frame', type=int, default=4)
+    parser.add_argument('--seconds', help='minimum seconds per measurement', type=float, default=0.5)
+    args = parser.parse_args()
+
+    cases = [
+        ('SkaimotMsg', SkaimotMsg, create_skaimotmsg, ['camera_frames.camera_id', 'camera_frames.timestamp']),
+        ('LocalTrackMsg', LocalTrackMsg, create_localtrackmsg, ['camera_frames.camera_id', 'timestamp']),
+    ]
+
+    print(f'protobuf backend: {api_implementation.Type()}')
+    print(f'reading camera ids + timestamps, {args.people} people per camera frame (us per msg)')
+    print(f'{"msg":>14} {"cams":>5} {"bytes":>9} {"full":>9} {"view":>9} {"wire scan":>10}')
+    for name, msg_class, create, paths in cases:
+        for num_cams in args.cams:
+            msg_bytes = msg_class.pack(create(num_cams, args.people))
+
+            # every path has to agree before timing them
+            expected = full_decode(msg_bytes, paths)
+            assert lazy_view(msg_bytes, paths) == expected
+            assert wire_scan_view(msg_bytes, paths) == expected
+
+            full_us = time_per_call(full_decode, msg_bytes, paths, args.seconds)
+            view_us = time_per_call(lazy_view, msg_bytes, paths, args.seconds)
+            scan_us = time_per_call(wire_scan_view, msg_bytes, paths, args.seconds)
+            print(f'{name:>14} {num_cams:>5} {len(msg_bytes):>9} {full_us:>9.1f} {view_us:>9.1f} {scan_us:>10.1f}')
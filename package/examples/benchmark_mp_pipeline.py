@@ -0,0 +1,78 @@
+#!/usr/bin/python3
+
+import os
+import time
+import multiprocessing as mp
+from argparse import ArgumentParser
+
+from skaimsginterface.skaimessages import *
+from skaimsginterface.tcp import TcpSenderMP, MultiportTcpListenerMP
+from examples.test_feetpos import create_example_feetposmsg
+
+received = mp.Value('L', 0)
+
+
+def counting_callback(msg_bytes, server_address):
+    with received.get_lock():
+        received.value += 1
+
+
+def cpu_seconds(pids):
+    # user + system time of each pid from /proc (linux only)
+    ticks = os.sysconf('SC_CLK_TCK')
+    total = 0.0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            total += (int(fields[11]) + int(fields[12])) / ticks
+        except FileNotFoundError:
+            pass
+    return total
+
+
+def child_pids():
+    return [p.pid for p in mp.active_children()]
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--port', help='port to send / listen on (default 6299)', type=int, default=FeetPosMsg.ports[99])
+    parser.add_argument('--nummsgs', help='messages to push through (default 20000)', type=int, default=20000)
+    parser.add_argument('--idlesec', help='seconds to measure idle cpu over (default 3)', type=float, default=3.0)
+    parser.add_argument('--recordfile', help='also record to this skaibin file', type=str, default=None)
+    args = parser.parse_args()
+
+    listener = MultiportTcpListenerMP([args.port], counting_callback, recordfile=args.recordfile)
+    time.sleep(0.5)
+    sender = TcpSenderMP(TcpSenderMP.ipv4_localhost, args.port)
+    time.sleep(0.5)
+
+    # idle cpu: nothing is being sent, all processes should be sleeping
+    pids = child_pids()
+    cpu0 = cpu_seconds(pids)
+    time.sleep(args.idlesec)
+    idle_cpu = (cpu_seconds(pids) - cpu0) / args.idlesec
+
+    # throughput: push small messages and wait until the callback saw them all
+    msg_bytes = FeetPosMsg.pack(create_example_feetposmsg(num_people=2, num_cams=1))
+    cpu0 = cpu_seconds(pids)
+    start = time.perf_counter()
+    for i in range(args.nummsgs):
+        sender.send(msg_bytes)
+    while received.value < args.nummsgs and time.perf_counter() - start < 120:
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    busy_cpu = (cpu_seconds(pids) - cpu0) / elapsed
+
+    print(f'message size        {len(msg_bytes)} bytes')
+    print(f'child processes     {len(pids)}')
+    print(f'idle cpu            {idle_cpu * 100:.1f} % of a core (all children)')
+    print(f'delivered           {received.value} / {args.nummsgs} in {elapsed:.2f} s')
+    print(f'throughput          {received.value / elapsed:.0f} msg/s')
+    print(f'cpu under load      {busy_cpu * 100:.1f} % of a core (all children)')
+
+    sender.stop()
+    listener.stop()
+    # give the recorder a moment to flush before the daemon processes exit
+    time.sleep(0.5)
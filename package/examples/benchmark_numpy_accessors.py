@@ -0,0 +1,112 @@
+#!/usr/bin/python3
+
+import time
+import numpy as np
+from argparse import ArgumentParser
+
+from skaimsginterface.skaimessages import *
+
+
+def new_people(msg_class, num_people):
+    camframe = msg_class.new_msg().camera_frames.add()
+    for person_idx in range(num_people):
+        camframe.people_in_frame.add().id = person_idx
+    return camframe.people_in_frame
+
+
+""" per field code, what callers do today """
+
+def set_face_embeds_per_field(people, embeds):
+    for person, embed in zip(people, embeds):
+        del person.face_embedding.vals[:]
+        SkaimotMsg.set_face_embed(person, embed.tolist())
+
+def face_embeds_per_field(people):
+    return np.array([list(person.face_embedding.vals) for person in people], dtype=np.float32)
+
+def set_bboxes_per_field(people, tlbr):
+    for person, box in zip(people, tlbr):
+        SkaimotMsg.set_bbox(person, box.tolist())
+
+def bboxes_per_field(people):
+    return np.array([[p.box.top, p.box.left, p.box.bottom, p.box.right] for p in people], dtype=np.float32)
+
+def set_keypoints_per_field(people, keypoints):
+    for person, person_keypoints in zip(people, keypoints):
+        PoseMsg.set_keypoints(person, person_keypoints.tolist(), None)
+
+def keypoints_per_field(people):
+    return np.array([[(getattr(p.keypoints, name).x, getattr(p.keypoints, name).y) for name in PoseMsg.keypoint_names]
+                     for p in people], dtype=np.float32)
+
+def set_feet_pos_per_field(people, xyz):
+    for person, person_xyz in zip(people, xyz):
+        FeetPosMsg.set_feet_pos(person, person_xyz.tolist())
+
+def feet_pos_per_field(people):
+    return np.array([[p.feet_position.x, p.feet_position.y, p.feet_position.z] for p in people], dtype=np.float32)
+
+
+def time_per_call(func, args, min_sec):
+    iterations = 0
+    start = time.perf_counter()
+    elapsed = 0
+    while elapsed < min_sec:
+        func(*args)
+        iterations += 1
+        elapsed = time.perf_counter() - start
+    return elapsed / iterations * 1e6
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--people', help='people per camera frame', nargs='+', type=int, default=[1, 10, 50])
+    parser.add_argument('--seconds', help='minimum seconds per measurement', type=float, default=0.3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print('us per camera frame, per field loop vs numpy helpers')
+    print(f'{"field":>12} {"people":>7} {"set loop":>9} {"set numpy":>10} {"get loop":>9} {"get numpy":>10}')
+    for num_people in args.people:
+        embeds = rng.random((num_people, 512), dtype=np.float32)
+        tlbr = rng.random((num_people, 4), dtype=np.float32)
+        keypoints = rng.random((num_people, 33, 2), dtype=np.float32)
+        # zeros are left off the wire by protobuf, they have to round trip too
+        keypoints[:, 0] = 0
+        xyz = rng.random((num_people, 3), dtype=np.float32)
+
+        skaimot_people = new_people(SkaimotMsg, num_people)
+        pose_people = new_people(PoseMsg, num_people)
+        feet_people = new_people(FeetPosMsg, num_people)
+        pose_keypoints = lambda people: [person.keypoints for person in people]
+
+        cases = [
+            ('face embed', skaimot_people, embeds,
+             set_face_embeds_per_field, lambda people, a: SkaimotMsg.set_face_embeds(people, a),
+             face_embeds_per_field, SkaimotMsg.face_embeds_to_numpy),
+            ('bbox', skaimot_people, tlbr,
+             set_bboxes_per_field, SkaimotMsg.set_bboxes,
+             bboxes_per_field, SkaimotMsg.bboxes_to_numpy),
+            ('keypoints', pose_people, keypoints,
+             set_keypoints_per_field, lambda people, a: PoseMsg.set_keypoints_from_numpy(pose_keypoints(people), a),
+             keypoints_per_field, lambda people: PoseMsg.keypoints_to_numpy(pose_keypoints(people))),
+            ('feet pos', feet_people, xyz,
+             set_feet_pos_per_field, lambda people, a: FeetPosMsg.set_feet_pos_from_numpy(people, a),
+             feet_pos_per_field, FeetPosMsg.feet_pos_to_numpy),
+        ]
+        for name, people, array, set_loop, set_numpy, get_loop, get_numpy in cases:
+            # round trips: numpy set -> both getters, per field set -> both getters, same wire bytes
+            set_numpy(people, array)
+            numpy_bytes = [person.SerializeToString() for person in people]
+            assert np.array_equal(get_numpy(people), array) and np.array_equal(get_loop(people), array)
+            set_loop(people, array)
+            assert [person.SerializeToString() for person in people] == numpy_bytes
+            assert np.array_equal(get_numpy(people), array)
+
+            results = [
+                time_per_call(set_loop, (people, array), args.seconds),
+                time_per_call(set_numpy, (people, array), args.seconds),
+                time_per_call(get_loop, (people,), args.seconds),
+                time_per_call(get_numpy, (people,), args.seconds),
+            ]
+            print(f'{name:>12} {num_people:>7} ' + ' '.join(f'{r:>{w}.1f}' for r, w in zip(results, [9, 10, 9, 10])))
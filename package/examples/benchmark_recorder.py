@@ -0,0 +1,173 @@
+#!/usr/bin/python3
+
+import os
+import sys
+import time
+import struct
+import threading
+import multiprocessing as mp
+import numpy as np
+from queue import Queue, Empty
+from argparse import ArgumentParser
+
+from skaimsginterface.skaimessages import *
+from skaimsginterface.framing import SkaiFrame, FrameChecksum
+from skaimsginterface.replay import FileRecorder, SkaibinReader
+from examples.test_feetpos import create_example_feetposmsg
+
+
+class OldSafeWriter:
+    # the SafeWriter FileRecorder used before: an unbounded queue and one write call per record
+    def __init__(self, *args):
+        self.filewriter = open(*args)
+        self.queue = Queue()
+        self.finished = False
+        threading.Thread(name='SafeWriter', target=self.internal_writer).start()
+
+    def write(self, data):
+        self.queue.put(data)
+
+    def internal_writer(self):
+        while not self.finished:
+            try:
+                data = self.queue.get(True, 1)
+            except Empty:
+                continue
+            self.filewriter.write(data)
+            self.queue.task_done()
+
+    def close(self):
+        self.queue.join()
+        self.finished = True
+        self.filewriter.close()
+
+
+class OldFileRecorder:
+    def __init__(self, filepath):
+        self.fd = OldSafeWriter(filepath, 'wb')
+
+    def record(self, msg_bytes, epoch_timestamp, port):
+        record = struct.pack('!dHI', epoch_timestamp, port, len(msg_bytes)) + msg_bytes
+        print('writing to file...')
+        self.fd.write(record)
+        return True
+
+    def stats(self):
+        return {'buffered_bytes': None, 'max_lag_sec': None, 'dropped': 0}
+
+    def close(self):
+        self.fd.close()
+
+
+def create_frame_msgs(num_people):
+    # per camera frame one embedding heavy SkaimotMsg (legacy record) and 10 small FeetPosMsgs (versioned records)
+    skaimot = SkaimotMsg.new_msg()
+    camframe = skaimot.camera_frames.add()
+    for person_idx in range(num_people):
+        person = camframe.people_in_frame.add()
+        person.id = person_idx
+        SkaimotMsg.set_face_embed(person, np.random.rand(512).astype(np.float32))
+        SkaimotMsg.set_bbox_embed(person, np.random.rand(2048).astype(np.float32))
+    feetpos_record = b''.join(SkaiFrame.pack(FeetPosMsg.pack(create_example_feetposmsg(num_people=4)),
+                                             FrameChecksum.Type.CRC32C)[:-1])
+    return [(SkaimotMsg.pack(skaimot), SkaimotMsg.ports[0])] + [(feetpos_record, FeetPosMsg.ports[0])] * 10
+
+
+def status_mb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def produce(recorder, frame_msgs, rate, duration_s, thread_idx, num_threads, latencies, results):
+    # a listener thread: its share of rate msgs/s, paced in 1 ms steps, timing each record() call
+    interval = num_threads / rate if rate else 0.0
+    start = time.perf_counter()
+    count = dropped = 0
+    while True:
+        now = time.perf_counter()
+        if now - start >= duration_s:
+            break
+        due = int((now - start) / interval) + 1 if interval else count + 64
+        while count < due:
+            msg_bytes, port = frame_msgs[(count + thread_idx) % len(frame_msgs)]
+            call_start = time.perf_counter()
+            if not recorder.record(msg_bytes, float(count * num_threads + thread_idx), port):
+                dropped += 1
+            latencies.append(time.perf_counter() - call_start)
+            count += 1
+        if interval:
+            time.sleep(0.001)
+    results[thread_idx] = (count, dropped)
+
+
+def run_case(case, filepath, frame_msgs, rate, args, result_q):
+    # peak rss growth of this process only, resetting the high water mark to the current rss
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+    # the old recorder prints a line per msg
+    sys.stdout = open(os.devnull, 'w')
+    if case == 'old':
+        recorder = OldFileRecorder(filepath)
+    else:
+        recorder = FileRecorder(filepath, capacity_bytes=args.capacity_mb * 1024 * 1024, overflow_policy=case)
+        recorder.open()
+    rss_start = status_mb('VmRSS:')
+    latencies = [[] for _ in range(args.threads)]
+    results = [None] * args.threads
+    threads = [threading.Thread(target=produce, args=(recorder, frame_msgs, rate, args.seconds, idx, args.threads,
+                                                      latencies[idx], results)) for idx in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    produced_s = time.perf_counter() - start
+    stats = recorder.stats()
+    recorder.close()
+    # backlog still to write once the listeners stop
+    drain_s = time.perf_counter() - start - produced_s
+    latencies = np.concatenate([np.array(l) for l in latencies]) * 1e6
+    count = sum(c for c, d in results)
+    dropped = sum(d for c, d in results)
+    result_q.put((count, dropped, produced_s, drain_s, np.percentile(latencies, 50), np.percentile(latencies, 99),
+                  stats['max_lag_sec'], status_mb('VmHWM:') - rss_start))
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--file', help='recording to write', type=str, default='/tmp/benchmark_recorder.skaibin')
+    parser.add_argument('--rates', help='msgs per second, 0 is flat out', type=int, nargs='+', default=[500, 2000, 5000, 0])
+    parser.add_argument('--seconds', help='seconds of recording per case', type=float, default=5)
+    parser.add_argument('--threads', help='listener threads recording concurrently', type=int, default=4)
+    parser.add_argument('--people', help='people (embeddings) per SkaimotMsg', type=int, default=10)
+    parser.add_argument('--capacity_mb', help='FileRecorder capacity_bytes in MB', type=int, default=64)
+    args = parser.parse_args()
+
+    frame_msgs = create_frame_msgs(args.people)
+    mb_per_msg = sum(len(msg_bytes) for msg_bytes, port in frame_msgs) / len(frame_msgs) / 1e6
+    print(f'{args.threads} threads recording 1 SkaimotMsg ({len(frame_msgs[0][0]) / 1e3:.0f} KB) per 10 FeetPosMsgs,'
+          f' {args.seconds:g} s per case. old is the queue per record SafeWriter and per msg print (to /dev/null)')
+    print(f'{"rate":>6} {"case":>12} {"msgs/s":>8} {"MB/s":>6} {"dropped":>8} {"drain s":>7} {"p50 us":>7}'
+          f' {"p99 us":>8} {"max lag s":>9} {"peak MB":>8}')
+    for rate in args.rates:
+        for case in ['old', 'block', 'drop_newest']:
+            result_q = mp.Queue()
+            proc = mp.Process(target=run_case, args=(case, args.file, frame_msgs, rate, args, result_q))
+            proc.start()
+            count, dropped, produced_s, drain_s, p50, p99, max_lag, peak_mb = result_q.get()
+            proc.join()
+            recorded = count - dropped
+            # every record that was not dropped made it to the file, whole
+            with SkaibinReader(args.file) as reader:
+                assert sum(1 for _ in reader.records()) == recorded and reader.truncated_bytes == 0
+            msgs_per_s = recorded / (produced_s + drain_s)
+            max_lag = '-' if max_lag is None else f'{max_lag:.3f}'
+            print(f'{rate or "max":>6} {case:>12} {msgs_per_s:>8.0f} {msgs_per_s * mb_per_msg:>6.0f} {dropped:>8}'
+                  f' {drain_s:>7.2f} {p50:>7.1f} {p99:>8.1f} {max_lag:>9} {peak_mb:>8.1f}')
+    os.remove(args.file)
@@ -0,0 +1,148 @@
+#!/usr/bin/python3
+
+import time
+import socket
+import struct
+import threading
+import multiprocessing as mp
+import numpy as np
+from argparse import ArgumentParser
+
+from skaimsginterface.skaimessages import *
+from skaimsginterface.framing import SkaiFrame, FrameChecksum
+from skaimsginterface.tcp import TcpSender
+
+length_struct = struct.Struct('!I')
+
+
+def create_msg(num_people, embed_dim):
+    msg = SkaimotMsg.new_msg()
+    camframe = msg.camera_frames.add()
+    for person_idx in range(num_people):
+        person = camframe.people_in_frame.add()
+        person.id = person_idx
+        SkaimotMsg.set_bbox_embed(person, np.random.rand(embed_dim).astype(np.float32))
+    return msg
+
+
+# every way serialized msg -> bytes on the socket, all produce the same frame. serializing
+# costs the same for all of them (SkaiMsg.pack / pack_parts call SerializeToString), so it
+# is done once up front and timed on its own
+
+def send_concat(sock, payload, checksum_type, sequence, timestamp_ns, buffer):
+    # msg id + payload, header + msg + checksum, length + body: three full copies
+    msg_bytes = SkaimotMsg.msg_id_bytes + payload
+    body = (SkaiFrame.pack_header(msg_bytes, checksum_type, sequence, timestamp_ns) + msg_bytes
+            + FrameChecksum.compute(checksum_type, msg_bytes))
+    sock.sendall(length_struct.pack(len(body)) + body)
+
+
+def send_join(sock, payload, checksum_type, sequence, timestamp_ns, buffer):
+    # SkaiMsg.pack copy, then one join of the frame buffers
+    frame_body = SkaiFrame.pack(SkaimotMsg.msg_id_bytes + payload, checksum_type, sequence, timestamp_ns)
+    frame_len = sum(len(b) for b in frame_body)
+    sock.sendall(b''.join([length_struct.pack(frame_len)] + frame_body))
+
+
+def send_sendmsg(sock, payload, checksum_type, sequence, timestamp_ns, buffer):
+    # SkaiMsg.pack_parts, gathered by sendmsg, the serialized msg is never copied
+    frame_body = SkaiFrame.pack([SkaimotMsg.msg_id_bytes, payload], checksum_type, sequence, timestamp_ns)
+    frame_len = sum(len(b) for b in frame_body)
+    TcpSender.sendmsg_all(sock, [length_struct.pack(frame_len)] + frame_body)
+
+
+def send_pack_into(sock, payload, checksum_type, sequence, timestamp_ns, buffer):
+    # SkaiMsg.pack_parts, one copy into a buffer reused for every msg
+    parts = [SkaimotMsg.msg_id_bytes, payload]
+    frame_len = SkaiFrame.frame_size(SkaiFrame.msg_len(parts), checksum_type)
+    if len(buffer) < length_struct.size + frame_len:
+        buffer.extend(bytes(length_struct.size + frame_len - len(buffer)))
+    length_struct.pack_into(buffer, 0, frame_len)
+    end = SkaiFrame.pack_into(buffer, length_struct.size, parts, checksum_type, sequence, timestamp_ns)
+    with memoryview(buffer) as view:
+        sock.sendall(view[:end])
+
+
+methods = {
+    'concat': send_concat,
+    'join': send_join,
+    'sendmsg': send_sendmsg,
+    'pack_into': send_pack_into,
+}
+
+
+def drain(sock, nbytes, received):
+    # read and throw away in another process, like a listener that keeps up
+    buf = bytearray(4 * 1024 * 1024)
+    with memoryview(buf) as view:
+        while received.value < nbytes:
+            n = sock.recv_into(view)
+            if not n:
+                break
+            received.value += n
+
+
+def read_frame(sock):
+    length = length_struct.unpack(sock.recv(4, socket.MSG_WAITALL))[0]
+    return sock.recv(length, socket.MSG_WAITALL)
+
+
+def run_case(num_people, args):
+    msg = create_msg(num_people, args.dim)
+    checksum_type = FrameChecksum.Type.CRC32C
+    serialize_us = []
+    for _ in range(5):
+        serialize_start = time.perf_counter()
+        payload = msg.SerializeToString()
+        serialize_us.append((time.perf_counter() - serialize_start) * 1e6)
+    assert SkaimotMsg.pack(msg) == b''.join(SkaimotMsg.pack_parts(msg)) == SkaimotMsg.msg_id_bytes + payload
+    msg_len = len(SkaimotMsg.msg_id_bytes) + len(payload)
+    num_msgs = max(10, min(args.msgs, int(args.mb * 1e6 / msg_len)))
+
+    # same frame bytes from every method
+    reader, writer = socket.socketpair()
+    frames = []
+    for send in methods.values():
+        threading.Thread(target=lambda: frames.append(read_frame(reader)), daemon=True).start()
+        send(writer, payload, checksum_type, 7, 1234, bytearray())
+        while len(frames) < len(methods) and len(frames) < list(methods.values()).index(send) + 1:
+            time.sleep(0.001)
+    assert all(frame == frames[0] for frame in frames)
+    assert SkaiFrame.unpack(frames[0])[1].sequence == 7
+    reader.close()
+    writer.close()
+    print(f'{msg_len:>10} {"serialize":>10} {np.median(serialize_us):>10.1f}')
+
+    for name, send in methods.items():
+        reader, writer = socket.socketpair()
+        frame_size = length_struct.size + SkaiFrame.frame_size(msg_len, checksum_type)
+        received = mp.Value('q', 0, lock=False)
+        reader_proc = mp.Process(target=drain, args=(reader, frame_size * num_msgs, received), daemon=True)
+        reader_proc.start()
+        buffer = bytearray()
+        send_us = []
+        start = time.perf_counter()
+        for seq in range(num_msgs):
+            t = time.perf_counter()
+            send(writer, payload, checksum_type, seq, None, buffer)
+            send_us.append((time.perf_counter() - t) * 1e6)
+        reader_proc.join()
+        elapsed = time.perf_counter() - start
+        assert received.value == frame_size * num_msgs
+        print(f'{msg_len:>10} {name:>10} {np.percentile(send_us, 50):>10.1f} {received.value / elapsed / 1e6:>8.0f}')
+        reader.close()
+        writer.close()
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--people', help='people per msg, one size per value', type=int, nargs='+', default=[1, 16, 512])
+    parser.add_argument('--dim', help='bbox embedding floats per person', type=int, default=2048)
+    parser.add_argument('--msgs', help='max msgs per case', type=int, default=5000)
+    parser.add_argument('--mb', help='MB sent per case', type=float, default=400)
+    args = parser.parse_args()
+
+    print('serialized SkaimotMsg -> frame (CRC32C) -> socketpair, a reader process drains it')
+    print(f'{"msg bytes":>10} {"method":>10} {"p50 us":>10} {"MB/s":>8}')
+    for num_people in args.people:
+        run_case(num_people, args)
@@ -0,0 +1,99 @@
+#!/usr/bin/python3
+
+import time
+import threading
+import numpy as np
+from argparse import ArgumentParser
+
+from skaimsginterface.skaimessages import *
+from skaimsginterface.framing import FrameChecksum
+from skaimsginterface.tcp import TcpSenderMP, MultiportTcpListener
+
+
+def create_tracks_msg(tick, key, num_people):
+    # timestamp is the send tick, the first person's id says which stream (conflate_key) it belongs to
+    msg = TracksInDealershipMsg.new_msg()
+    msg.timestamp = tick
+    for person_idx in range(num_people):
+        person = msg.people.add()
+        person.id = key if person_idx == 0 else person_idx
+        person.feet_position.x = 1.0
+        person.feet_position.y = 2.0
+    return TracksInDealershipMsg.pack(msg)
+
+
+def run_case(name, args, port, conflate):
+    received = []   # (receive time, key, tick)
+    lock = threading.Lock()
+    listener_up = []
+    listeners = []
+
+    def callback(msg_bytes, server_address):
+        msg_type, msg = SkaiMsg.unpack(bytes(msg_bytes))
+        with lock:
+            received.append((time.perf_counter(), msg.people[0].id, msg.timestamp))
+
+    def start_listener():
+        listener_up.append(time.perf_counter())
+        listeners.append(MultiportTcpListener([port], callback))
+
+    # listener is down for --downsec, like a gui restarting
+    listener_timer = threading.Timer(args.downsec, start_listener)
+    listener_timer.daemon = True
+    listener_timer.start()
+    sender = TcpSenderMP('127.0.0.1', port, retryTimeoutSec=0.1, block_during_first_connection=False,
+                         checksum_type=FrameChecksum.Type.CRC32C, conflate=conflate)
+
+    # every stream sends its state at --rate hz until --upsec after the listener is up
+    tick_sent = []
+    start = time.perf_counter()
+    while time.perf_counter() - start < args.downsec + args.upsec:
+        tick_sent.append(time.perf_counter())
+        for key in range(args.streams):
+            sender.send(create_tracks_msg(len(tick_sent) - 1, key, args.people), conflate_key=key)
+        time.sleep(1 / args.rate)
+    end = time.perf_counter()
+    time.sleep(0.5)
+    stats = sender.queue_stats()
+    # per connection, so read before the sender closes it
+    stream_stats = list(listeners[0].stream_stats.values())
+    sender.stop()
+    sender.sender_proc.join(1.0)
+    sender.sock.close()
+
+    # stale: sent before the listener came up. catch up: until every stream has delivered
+    # a msg sent after the listener came up
+    up = listener_up[0]
+    stale = sum(1 for _, _, tick in received if tick_sent[tick] < up)
+    catch_up_ms = []
+    for key in range(args.streams):
+        first_current = min(t for t, k, tick in received if k == key and tick_sent[tick] >= up)
+        catch_up_ms.append((first_current - up) * 1000)
+    # delivered while the listener was up, a conflating sender should keep up with the send rate
+    up_rate = sum(1 for t, _, _ in received if up + max(catch_up_ms) / 1000 <= t <= end) / (end - up - max(catch_up_ms) / 1000)
+    print(f'{name:>10} {len(tick_sent) * args.streams:>6} {len(received):>9} {stale:>6} {stats["coalesced"]:>9}'
+          f' {np.median(catch_up_ms):>10.1f} {max(catch_up_ms):>10.1f} {up_rate:>9.0f}')
+
+    # the latest state of every stream arrives, and in send order within the stream
+    for key in range(args.streams):
+        ticks = [tick for _, k, tick in received if k == key]
+        assert ticks == sorted(ticks) and ticks[-1] == len(tick_sent) - 1
+    assert len(received) + stats['coalesced'] == len(tick_sent) * args.streams
+    # replaced msgs show up as gaps, never as reordering
+    assert len(stream_stats) == 1 and stream_stats[0].reordered == 0, stream_stats
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--port', help='first port, each case uses a fresh one', type=int, default=TracksInDealershipMsg.ports[5])
+    parser.add_argument('--streams', help='conflate keys, e.g. one per dealership zone', type=int, default=4)
+    parser.add_argument('--rate', help='msgs per second per stream', type=float, default=200)
+    parser.add_argument('--people', help='people per msg', type=int, default=20)
+    parser.add_argument('--downsec', help='seconds before the listener comes up', type=float, default=5.0)
+    parser.add_argument('--upsec', help='seconds the streams keep sending after that', type=float, default=1.0)
+    args = parser.parse_args()
+
+    print(f'{args.streams} TracksInDealershipMsg streams at {args.rate:.0f} hz, listener down for the first {args.downsec}s')
+    print(f'{"sender":>10} {"sent":>6} {"delivered":>9} {"stale":>6} {"coalesced":>9} {"catch up":>10} {"max ms":>10} {"up msg/s":>9}')
+    for case_idx, (name, conflate) in enumerate([('queue', False), ('conflate', True)]):
+        run_case(name, args, args.port + case_idx, conflate)
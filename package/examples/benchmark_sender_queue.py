@@ -0,0 +1,135 @@
+#!/usr/bin/python3
+
+import time
+import threading
+import numpy as np
+from argparse import ArgumentParser
+
+from skaimsginterface.skaimessages import *
+from skaimsginterface.framing import FrameChecksum
+from skaimsginterface.tcp import TcpSenderMP, MultiportTcpListener
+from examples.test_feetpos import create_example_feetposmsg
+from examples.test_pose import create_example_posemsg
+
+
+def rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def run_case(name, args, port, **queue_kwargs):
+    # two msg types, alternating, like a camera group sending feetpos and pose
+    msgs = [FeetPosMsg.pack(create_example_feetposmsg(num_people=args.people)),
+            PoseMsg.pack(create_example_posemsg(num_people=args.people))]
+    received = {}
+    lock = threading.Lock()
+
+    def callback(msg_bytes, server_address):
+        msg_type = SkaiMsg.getMessageTypeName(bytes(msg_bytes))
+        with lock:
+            received[msg_type] = received.get(msg_type, 0) + 1
+
+    listeners = []
+
+    def start_listener():
+        listeners.append(MultiportTcpListener([port], callback))
+
+    # listener is down while the msgs are sent, it comes up after --downsec
+    listener_timer = threading.Timer(args.downsec, start_listener)
+    listener_timer.daemon = True
+    listener_timer.start()
+    rss_start = rss_mb()
+    sender = TcpSenderMP('127.0.0.1', port, retryTimeoutSec=0.1, block_during_first_connection=False,
+                         checksum_type=FrameChecksum.Type.CRC32C, **queue_kwargs)
+
+    send_us = []
+    max_depth = (0, 0)
+    start = time.perf_counter()
+    for i in range(args.msgs):
+        t = time.perf_counter()
+        sender.send(msgs[i % 2])
+        send_us.append((time.perf_counter() - t) * 1e6)
+        if i % 100 == 0:
+            max_depth = max(max_depth, sender.queue_depth())
+    send_sec = time.perf_counter() - start
+    rss_peak = rss_mb() - rss_start
+
+    # wait for the listener to come up and the queue to drain
+    deadline = time.perf_counter() + args.downsec + 30
+    while sender.queue_depth()[0] and time.perf_counter() < deadline:
+        time.sleep(0.05)
+    time.sleep(0.5)
+    stats = sender.queue_stats()
+    # per connection, so read before the sender closes it
+    stream_stats = list(listeners[0].stream_stats.values())
+    sender.stop()
+    # the sender process has its own copy of the socket, close both so the listener sees the connection end
+    sender.sender_proc.join(1.0)
+    sender.sock.close()
+
+    send_us = np.array(send_us)
+    delivered = sum(received.values())
+    print(f'{name:>16} {send_sec:>7.2f} {np.percentile(send_us, 50):>7.1f} {send_us.max() / 1000:>8.1f}'
+          f' {max_depth[0]:>7} {max_depth[1] / 1e6:>7.1f} {rss_peak:>7.1f} {delivered:>9}'
+          f' {stats["dropped_oldest"]:>7} {stats["dropped_newest"]:>7} {stats["coalesced"]:>9} {stats["blocked_sec"]:>7.2f}')
+    # every msg is either delivered or counted by exactly one policy counter
+    assert delivered + stats['dropped_oldest'] + stats['dropped_newest'] + stats['coalesced'] == args.msgs
+    # dropped and replaced msgs show up as gaps, never as reordering
+    assert len(stream_stats) == 1 and stream_stats[0].reordered == 0, stream_stats
+    return received
+
+
+def check_coalesce_order(args, port):
+    # behind a full in flight window: feetpos, pose, then a feetpos that replaces the first in its place,
+    # ahead of the pose. it has to go out numbered before the pose, not counted as reordered
+    feetpos, pose = FeetPosMsg.pack(create_example_feetposmsg(num_people=args.people)), \
+        PoseMsg.pack(create_example_posemsg(num_people=args.people))
+    received = []
+    listeners = []
+
+    def start_listener():
+        listeners.append(MultiportTcpListener([port], lambda msg_bytes, server_address:
+                                              received.append(SkaiMsg.getMessageTypeName(bytes(msg_bytes)))))
+
+    sender = TcpSenderMP('127.0.0.1', port, retryTimeoutSec=0.1, block_during_first_connection=False,
+                         checksum_type=FrameChecksum.Type.CRC32C, max_queue_msgs=args.capacity,
+                         queue_policy='coalesce')
+    for i in range(sender.in_flight_msgs_limit):
+        sender.send(pose)
+    for msg_bytes in (feetpos, pose, feetpos):
+        sender.send(msg_bytes)
+    start_listener()
+    deadline = time.perf_counter() + 30
+    while len(received) < sender.in_flight_msgs_limit + 2 and time.perf_counter() < deadline:
+        time.sleep(0.05)
+    stream_stats = list(listeners[0].stream_stats.values())
+    sender.stop()
+    sender.sender_proc.join(1.0)
+    sender.sock.close()
+    assert received[-2:] == ['FeetPosMsg', 'PoseMsg'], received[-2:]
+    assert len(stream_stats) == 1 and stream_stats[0].reordered == 0 and stream_stats[0].dropped == 1, stream_stats
+    print(f'{"":>18}coalesce order {received[-2:]}, {stream_stats[0]}')
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--port', help='first port, each case uses a fresh one', type=int, default=7400)
+    parser.add_argument('--msgs', help='msgs sent while the listener is down', type=int, default=20000)
+    parser.add_argument('--people', help='people per msg', type=int, default=10)
+    parser.add_argument('--downsec', help='seconds before the listener comes up', type=float, default=2.0)
+    parser.add_argument('--capacity', help='max_queue_msgs of the bounded cases', type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f'{args.msgs} msgs sent to a listener that comes up after {args.downsec}s, capacity {args.capacity} msgs')
+    print(f'{"queue":>16} {"send s":>7} {"p50 us":>7} {"max ms":>8} {"depth":>7} {"MB":>7} {"rss MB":>7} {"delivered":>9}'
+          f' {"oldest":>7} {"newest":>7} {"coalesced":>9} {"block s":>7}')
+    cases = [('unbounded', {})] + [(policy, dict(max_queue_msgs=args.capacity, queue_policy=policy))
+                                   for policy in TcpSenderMP.queue_policies]
+    for case_idx, (name, queue_kwargs) in enumerate(cases):
+        received = run_case(name, args, args.port + case_idx, **queue_kwargs)
+        if name == 'coalesce':
+            print(f'{"":>18}coalesce delivered {received}')
+    check_coalesce_order(args, args.port + len(cases))
@@ -0,0 +1,80 @@
+#!/usr/bin/python3
+
+import time
+import queue
+import multiprocessing as mp
+from argparse import ArgumentParser
+
+from skaimsginterface.ipc import ShmRingBuffer
+
+
+def queue_producer(msg_q, msg_size, num_msgs):
+    # same tuple the tcp port processes put on the queue
+    data = bytearray(msg_size)
+    server_address = ('0.0.0.0', 6000)
+    for i in range(num_msgs):
+        msg_q.put_nowait( (data, time.time(), server_address) )
+
+
+def ring_producer(ring, data_event, msg_size, num_msgs):
+    data = bytearray(msg_size)
+    for i in range(num_msgs):
+        ring.write(data, time.time())
+        data_event.set()
+
+
+def run_queue(msg_size, num_msgs):
+    msg_q = mp.Queue()
+    proc = mp.Process(target=queue_producer, args=(msg_q, msg_size, num_msgs))
+    start = time.perf_counter()
+    proc.start()
+    received = 0
+    while received < num_msgs:
+        msg_bytes, timestamp, server_address = msg_q.get()
+        # touch the payload like a callback would
+        received += len(msg_bytes) == msg_size
+    elapsed = time.perf_counter() - start
+    proc.join()
+    return elapsed
+
+
+def run_ring(msg_size, num_msgs, ring_size):
+    ring = ShmRingBuffer(create=True, size=ring_size)
+    data_event = mp.Event()
+    proc = mp.Process(target=ring_producer, args=(ring, data_event, msg_size, num_msgs))
+    start = time.perf_counter()
+    proc.start()
+    received = 0
+    while received < num_msgs:
+        data_event.wait(0.1)
+        data_event.clear()
+        record = ring.read()
+        while record is not None:
+            view, timestamp = record
+            received += len(view) == msg_size
+            view.release()
+            ring.release()
+            record = ring.read()
+    elapsed = time.perf_counter() - start
+    proc.join()
+    ring.close()
+    ring.unlink()
+    return elapsed
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--numbytes', help='total bytes to transfer per msg size (default 512 MB)', type=int, default=512 * 1024 * 1024)
+    parser.add_argument('--ringsize', help='shared memory ring size in bytes (default 16 MB)', type=int, default=16 * 1024 * 1024)
+    args = parser.parse_args()
+
+    msg_sizes = [1024, 64 * 1024, 1024 * 1024, 4 * 1024 * 1024]
+    print(f'{"msg size":>10} {"transport":>10} {"msgs":>8} {"msg/s":>10} {"MB/s":>10}')
+    for msg_size in msg_sizes:
+        num_msgs = max(20, min(100000, args.numbytes // msg_size))
+        for name in ('mp.Queue', 'shm ring'):
+            if name == 'mp.Queue':
+                elapsed = run_queue(msg_size, num_msgs)
+            else:
+                elapsed = run_ring(msg_size, num_msgs, args.ringsize)
+            print(f'{msg_size:>10} {name:>10} {num_msgs:>8} {num_msgs / elapsed:>10.0f} {num_msgs * msg_size / elapsed / 1e6:>10.1f}')
@@ -0,0 +1,222 @@
+#!/usr/bin/python3
+
+import os
+import time
+import shutil
+import multiprocessing as mp
+import numpy as np
+from pathlib import Path
+from argparse import ArgumentParser
+
+from skaimsginterface.skaimessages import *
+from skaimsginterface.replay import FileRecorder, SkaibinReader, SkaibinArchive
+from skaimsginterface.replay.SkaibinArchive import _pa
+
+
+def create_frame_msgs(rng, frame_idx, num_people, num_cams):
+    # a SkaimotMsg (boxes, face and bbox embeddings), a FeetPosMsg and a PoseMsg of num_people, new values every frame
+    cam_idx = frame_idx % num_cams
+    skaimot, feetpos, pose = SkaimotMsg.new_msg(), FeetPosMsg.new_msg(), PoseMsg.new_msg()
+    skaimot_frame, feetpos_frame, pose_frame = (msg.camera_frames.add() for msg in (skaimot, feetpos, pose))
+    for camframe in (skaimot_frame, feetpos_frame, pose_frame):
+        camframe.camera_id = 1000 + cam_idx
+        camframe.timestamp = frame_idx
+    people = [skaimot_frame.people_in_frame.add() for _ in range(num_people)]
+    for person_idx, person in enumerate(people):
+        person.id = person_idx
+    SkaimotMsg.set_bboxes(people, rng.random((num_people, 4)))
+    SkaimotMsg.set_face_embeds(people, rng.standard_normal((num_people, 512)))
+    SkaimotMsg.set_bbox_embeds(people, rng.standard_normal((num_people, 2048)))
+    people = [feetpos_frame.people_in_frame.add() for _ in range(num_people)]
+    FeetPosMsg.set_feet_pos_from_numpy(people, rng.random((num_people, 3)) * 20)
+    people = [pose_frame.people_in_frame.add() for _ in range(num_people)]
+    PoseMsg.set_keypoints_from_numpy([person.keypoints for person in people], rng.random((num_people, 33, 2)))
+    return [(SkaimotMsg.pack(skaimot), SkaimotMsg.ports[cam_idx]), (FeetPosMsg.pack(feetpos), FeetPosMsg.ports[cam_idx]),
+            (PoseMsg.pack(pose), PoseMsg.ports[cam_idx])]
+
+
+def write_recording(filepath, mb, num_people, num_cams):
+    rng = np.random.default_rng(0)
+    recorder = FileRecorder(filepath)
+    recorder.open()
+    written = frame_idx = 0
+    while written < mb * 1e6:
+        for msg_bytes, port in create_frame_msgs(rng, frame_idx, num_people, num_cams):
+            recorder.record(msg_bytes, 1.7e9 + frame_idx * 0.01, port)
+            written += len(msg_bytes)
+        frame_idx += 1
+    recorder.close()
+
+
+def drop_page_cache(path):
+    # clean pages of the files leave the page cache, the next read comes off the disk
+    paths = [f for f in Path(path).rglob('*') if f.is_file()] if os.path.isdir(path) else [path]
+    for filepath in paths:
+        fd = os.open(filepath, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def status_mb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def export(filepath, dirpath, format, compress, chunk_mb, result_q):
+    # peak rss growth of this process only, resetting the high water mark to the current rss
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+    rss_start = status_mb('VmRSS:')
+    start = time.perf_counter()
+    SkaibinArchive.export(filepath, dirpath, format=format, compress=compress, chunk_bytes=int(chunk_mb * 1e6))
+    result_q.put((time.perf_counter() - start, status_mb('VmHWM:') - rss_start))
+
+
+def reparse_feet_pos(filepath):
+    # what analysts did before: unpack every msg of the type and pull the arrays out of the protobufs
+    feet_pos = []
+    with SkaibinReader(filepath, msg_types=[FeetPosMsg]) as reader:
+        for timestamp, port, header, msg_bytes in reader:
+            msg_type, msg = SkaiMsg.unpack(msg_bytes)
+            for camframe in msg.camera_frames:
+                feet_pos.append(FeetPosMsg.feet_pos_to_numpy(camframe.people_in_frame))
+    return {'feet_pos': np.concatenate(feet_pos)}
+
+
+def reparse_skaimot(filepath, column):
+    to_numpy = SkaimotMsg.face_embeds_to_numpy if column == 'face_embedding' else SkaimotMsg.bboxes_to_numpy
+    arrays = []
+    with SkaibinReader(filepath, msg_types=[SkaimotMsg]) as reader:
+        for timestamp, port, header, msg_bytes in reader:
+            msg_type, msg = SkaiMsg.unpack(msg_bytes)
+            for camframe in msg.camera_frames:
+                arrays.append(to_numpy(camframe.people_in_frame))
+    return {column: np.concatenate(arrays)}
+
+
+def create_track_msgs(rng, num_people):
+    # a LocalTrackMsg of num_people people and a vehicle, a GlobalTrackMsg with their top face and bbox embeddings
+    localtrack, globaltrack = LocalTrackMsg.new_msg(), GlobalTrackMsg.new_msg()
+    localtrack.timestamp = 7
+    camframe = localtrack.camera_frames.add()
+    camframe.camera_id = 1000
+    people = [camframe.people_in_frame.add() for _ in range(num_people)]
+    for person_idx, person in enumerate(people):
+        person.skaimot_id = 100 + person_idx
+    SkaimotMsg.set_bboxes(people, rng.random((num_people, 4)))
+    SkaiMsg.set_embeddings([person.face_embed for person in people], rng.standard_normal((num_people, 512)))
+    SkaiMsg.set_embeddings([person.bbox_embed for person in people], rng.standard_normal((num_people, 2048)))
+    FeetPosMsg.set_feet_pos_from_numpy(people, rng.random((num_people, 3)) * 20)
+    vehicle = camframe.vehicles_in_frame.add()
+    vehicle.skaimot_id = 200
+    vehicle.license_plate = 'SKAI 123'
+    globaltrack.global_track_id = 9
+    SkaiMsg.set_embeddings([globaltrack.top_faces.add() for _ in range(num_people)],
+                           rng.standard_normal((num_people, 512)))
+    SkaiMsg.set_embeddings([globaltrack.top_bboxes.add() for _ in range(num_people)],
+                           rng.standard_normal((num_people, 2048)))
+    return localtrack, globaltrack
+
+
+def check_track_tables(filepath, dirpath, num_people):
+    # the LocalTrackMsg and GlobalTrackMsg tables hold what unpacking the msgs gives, and a msg with an
+    # embedding of another dim than earlier ones is counted as undecodable instead of aborting the export
+    rng = np.random.default_rng(0)
+    localtrack, globaltrack = create_track_msgs(rng, num_people)
+    short = LocalTrackMsg.new_msg()
+    short.CopyFrom(localtrack)
+    SkaiMsg.set_embeddings([short.camera_frames[0].people_in_frame[0].face_embed], rng.standard_normal((1, 128)))
+    recorder = FileRecorder(filepath)
+    recorder.open()
+    msgs = [(LocalTrackMsg, localtrack), (GlobalTrackMsg, globaltrack), (LocalTrackMsg, short), (LocalTrackMsg, localtrack)]
+    for idx, (msg_class, msg) in enumerate(msgs):
+        recorder.record(msg_class.pack(msg), 1.7e9 + idx, msg_class.ports[0])
+    recorder.close()
+    SkaibinArchive.export(filepath, dirpath)
+    manifest = SkaibinArchive.read_manifest(dirpath)
+    assert manifest['msgs'] == 4 and manifest['undecodable'] == 1, manifest
+    people = localtrack.camera_frames[0].people_in_frame
+    arrays = SkaibinArchive.load(dirpath, 'localtrack_people')
+    assert np.array_equal(arrays['id'], [person.skaimot_id for person in people] * 2)
+    assert np.array_equal(arrays['frame_timestamp'], [7] * 2 * num_people)
+    assert np.array_equal(arrays['face_embedding'],
+                          np.tile(SkaiMsg.embeddings_to_numpy([person.face_embed for person in people]), (2, 1)))
+    assert np.array_equal(arrays['feet_pos'], np.tile(FeetPosMsg.feet_pos_to_numpy(people), (2, 1)))
+    arrays = SkaibinArchive.load(dirpath, 'localtrack_vehicles')
+    assert list(arrays['license_plate']) == ['SKAI 123'] * 2 and list(arrays['id']) == [200] * 2
+    arrays = SkaibinArchive.load(dirpath, 'globaltrack_bboxes')
+    assert np.array_equal(arrays['id'], [9] * num_people) and np.array_equal(arrays['rank'], range(num_people))
+    assert np.array_equal(arrays['bbox_embedding'], SkaiMsg.embeddings_to_numpy(globaltrack.top_bboxes))
+    shutil.rmtree(dirpath)
+    os.remove(filepath)
+    print('local and global track tables match the msgs, a msg with a mismatched embedding dim is undecodable')
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--file', help='recording to write and convert', type=str, default='/tmp/benchmark_skaibin_archive.skaibin')
+    parser.add_argument('--archive', help='archive directory', type=str, default='/tmp/benchmark_skaibin_archive')
+    parser.add_argument('--mb', help='recording size', type=float, default=500)
+    parser.add_argument('--people', help='people per camera frame', type=int, default=10)
+    parser.add_argument('--cams', help='cameras', type=int, default=4)
+    parser.add_argument('--chunk_mb', help='SkaibinArchive chunk_bytes in MB', type=float, default=32)
+    parser.add_argument('--warm', help="keep the files in the page cache between cases", action='store_true')
+    args = parser.parse_args()
+
+    def timed(func, *func_args):
+        # best of 2, the first parquet read also pays for setting up pyarrow
+        best_s = None
+        for _ in range(2):
+            if not args.warm:
+                drop_page_cache(func_args[0])
+            start = time.perf_counter()
+            result = func(*func_args)
+            elapsed = time.perf_counter() - start
+            best_s = elapsed if best_s is None else min(best_s, elapsed)
+        return result, best_s
+
+    write_recording(args.file, args.mb, args.people, args.cams)
+    file_mb = Path(args.file).stat().st_size / 1e6
+    queries = [
+        ('feetpos_people', 'feet_pos', reparse_feet_pos, ()),
+        ('skaimot_people', 'face_embedding', reparse_skaimot, ('face_embedding',)),
+        ('skaimot_people', 'box', reparse_skaimot, ('box',)),
+    ]
+    reparsed = [timed(reparse, args.file, *reparse_args) for table, column, reparse, reparse_args in queries]
+    print(f'{args.file}: {file_mb:.0f} MB, {len(reparsed[1][0]["face_embedding"])} people with 512 + 2048 float'
+          f' embeddings, {"warm" if args.warm else "cold"} page cache')
+    print(f'{"case":>20} {"export s":>8} {"export MB/s":>11} {"peak MB":>8} {"archive MB":>10}'
+          + ''.join(f' {column + " s":>16}' for table, column, reparse, reparse_args in queries))
+    print(f'{"unpack msgs":>20} {"":>8} {"":>11} {"":>8} {"":>10}'
+          + ''.join(f' {query_s:>16.3f}' for result, query_s in reparsed))
+
+    cases = [('npz', False), ('npz', True)]
+    if _pa is not None:
+        cases += [('parquet', False), ('parquet', True)]
+    for format, compress in cases:
+        result_q = mp.Queue()
+        proc = mp.Process(target=export, args=(args.file, args.archive, format, compress, args.chunk_mb, result_q))
+        proc.start()
+        export_s, peak_mb = result_q.get()
+        proc.join()
+        archive_mb = sum(f.stat().st_size for f in Path(args.archive).rglob('*') if f.is_file()) / 1e6
+        loaded = []
+        for (table, column, reparse, reparse_args), (expected, reparse_s) in zip(queries, reparsed):
+            arrays, load_s = timed(SkaibinArchive.load, args.archive, table, [column])
+            # the archive holds exactly what unpacking the msgs gives
+            assert np.array_equal(arrays[column], expected[column])
+            loaded.append(f'{load_s:.3f} ({reparse_s / load_s:.0f}x)')
+        name = f'{format}{", compressed" if compress else ""}'
+        print(f'{name:>20} {export_s:>8.2f} {file_mb / export_s:>11.0f} {peak_mb:>8.0f} {archive_mb:>10.0f}'
+              + ''.join(f' {result:>16}' for result in loaded))
+    shutil.rmtree(args.archive)
+    os.remove(args.file)
+    check_track_tables(args.file, args.archive, args.people)
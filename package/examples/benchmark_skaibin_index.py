@@ -0,0 +1,132 @@
+#!/usr/bin/python3
+
+import os
+import time
+import numpy as np
+from pathlib import Path
+from argparse import ArgumentParser
+
+from skaimsginterface.skaimessages import *
+from skaimsginterface.framing import SkaiFrame, FrameChecksum
+from skaimsginterface.replay import FileRecorder, SkaibinReader, SkaibinIndex
+from examples.test_feetpos import create_example_feetposmsg
+
+
+def write_recording(filepath, mb, hours, num_people):
+    # per frame one embedding heavy SkaimotMsg (legacy record) and 10 small FeetPosMsgs (versioned
+    # records), frames spread evenly over hours. the recorder threads of a listener stamp arrival
+    # times, so each record gets up to 50 ms of jitter and the file is only roughly in time order
+    rng = np.random.default_rng(0)
+    skaimot = SkaimotMsg.new_msg()
+    camframe = skaimot.camera_frames.add()
+    for person_idx in range(num_people):
+        person = camframe.people_in_frame.add()
+        person.id = person_idx
+        SkaimotMsg.set_face_embed(person, rng.random(512).astype(np.float32))
+        SkaimotMsg.set_bbox_embed(person, rng.random(2048).astype(np.float32))
+    skaimot_bytes = SkaimotMsg.pack(skaimot)
+    feetpos_record = b''.join(SkaiFrame.pack(FeetPosMsg.pack(create_example_feetposmsg(num_people=4)),
+                                             FrameChecksum.Type.CRC32C)[:-1])
+    num_frames = int(mb * 1e6 / (len(skaimot_bytes) + 10 * len(feetpos_record) + 11 * 14))
+    start_time = 1.7e9
+    frame_times = start_time + np.arange(num_frames) * (hours * 3600 / num_frames)
+    jitter = rng.random((num_frames, 11)) * 0.05
+    recorder = FileRecorder(filepath, index=True)
+    recorder.open()
+    for frame_idx, frame_time in enumerate(frame_times):
+        recorder.record(skaimot_bytes, frame_time + jitter[frame_idx, 0], SkaimotMsg.ports[0])
+        for record_idx in range(1, 11):
+            recorder.record(feetpos_record, frame_time + jitter[frame_idx, record_idx], FeetPosMsg.ports[0])
+    recorder.close()
+    return start_time
+
+
+def drop_page_cache(filepath):
+    # clean pages of the file leave the page cache, the next read comes off the disk
+    if os.path.exists(filepath) and hasattr(os, 'posix_fadvise'):
+        fd = os.open(filepath, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def scan_window(filepath, start_time, end_time):
+    # what finding a window took without an index: every record of the file
+    with SkaibinReader(filepath) as reader:
+        return [(t, p, bytes(m)) for t, p, h, m in reader if start_time <= t <= end_time]
+
+
+def seek_window(filepath, start_time, end_time):
+    with SkaibinReader(filepath, start_time=start_time, end_time=end_time) as reader:
+        return [(t, p, bytes(m)) for t, p, h, m in reader]
+
+
+def scan_port_counts(filepath):
+    with SkaibinReader(filepath) as reader:
+        port_counts = {}
+        for timestamp, port, record in reader.records():
+            port_counts[port] = port_counts.get(port, 0) + 1
+        return port_counts
+
+
+def index_port_counts(filepath):
+    return SkaibinIndex.load(filepath).port_counts()
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--file', help='recording to write and read', type=str, default='/tmp/benchmark_skaibin_index.skaibin')
+    parser.add_argument('--mb', help='recording size', type=float, default=1000)
+    parser.add_argument('--hours', help='hours the recording spans', type=float, default=8)
+    parser.add_argument('--window_min', help='minutes of the window extracted', type=float, default=10)
+    parser.add_argument('--people', help='people (embeddings) per SkaimotMsg', type=int, default=10)
+    parser.add_argument('--warm', help="keep the recording in the page cache between cases", action='store_true')
+    args = parser.parse_args()
+
+    start_time = write_recording(args.file, args.mb, args.hours, args.people)
+    index_path = SkaibinIndex.index_path(args.file)
+    recorded_index = Path(index_path).read_bytes()
+    window_start = start_time + args.hours * 3600 / 2
+    window_end = window_start + args.window_min * 60
+
+    def timed(func, *func_args):
+        if not args.warm:
+            drop_page_cache(args.file)
+            drop_page_cache(index_path)
+        start = time.perf_counter()
+        result = func(*func_args)
+        return result, time.perf_counter() - start
+
+    # rebuilding the index of a legacy recording, from the record prefixes and frame headers only
+    os.remove(index_path)
+    index, build_s = timed(SkaibinIndex.load, args.file)
+    # the recorder's index and the rebuilt one are the same bytes
+    assert Path(index_path).read_bytes() == recorded_index
+    index, load_s = timed(SkaibinIndex.load, args.file)
+    scanned, scan_s = timed(scan_window, args.file, window_start, window_end)
+    seeked, seek_s = timed(seek_window, args.file, window_start, window_end)
+    scanned_counts, scan_counts_s = timed(scan_port_counts, args.file)
+    index_counts, index_counts_s = timed(index_port_counts, args.file)
+    # the index finds exactly what a full scan finds
+    assert seeked == scanned and len(seeked) > 0
+    assert index_counts == scanned_counts and sum(index_counts.values()) == len(index)
+
+    file_mb = Path(args.file).stat().st_size / 1e6
+    window_mb = sum(len(m) for t, p, m in seeked) / 1e6
+    print(f'{args.file}: {file_mb:.0f} MB, {len(index)} records over {args.hours:g} h,'
+          f' index {Path(index_path).stat().st_size / 1e6:.1f} MB, {"warm" if args.warm else "cold"} page cache')
+    print(f'{"case":>28} {"sec":>8}')
+    print(f'{"build index (legacy file)":>28} {build_s:>8.3f}')
+    print(f'{"load index":>28} {load_s:>8.3f}')
+    print(f'{f"{args.window_min:g} min window, full scan":>28} {scan_s:>8.3f}')
+    print(f'{f"{args.window_min:g} min window, index seek":>28} {seek_s:>8.3f}   {len(seeked)} msgs, {window_mb:.1f} MB')
+    print(f'{"port counts, full scan":>28} {scan_counts_s:>8.3f}')
+    print(f'{"port counts, index":>28} {index_counts_s:>8.3f}   {index_counts}')
+
+    # readers build a missing index in memory only, the sidecar may belong to a live recorder
+    os.remove(index_path)
+    assert seek_window(args.file, window_start, window_end) == seeked and not os.path.exists(index_path)
+    # a corrupt record (too short for its frame header) is indexed as msg type 0 instead of failing the index
+    assert SkaibinIndex.record_msg_type(b'SK\x02') == 0
+    Path(args.file).unlink()
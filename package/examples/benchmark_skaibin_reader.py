@@ -0,0 +1,167 @@
+#!/usr/bin/python3
+
+import time
+import struct
+import multiprocessing as mp
+import numpy as np
+from pathlib import Path
+from argparse import ArgumentParser
+
+from skaimsginterface.skaimessages import *
+from skaimsginterface.framing import SkaiFrame, FrameChecksum
+from skaimsginterface.replay import FileRecorder, SkaibinReader
+from examples.test_feetpos import create_example_feetposmsg
+
+record_struct = struct.Struct('!dHI')
+
+
+def write_recording(filepath, mb, num_people):
+    # per frame one embedding heavy SkaimotMsg (legacy record) and 10 small FeetPosMsgs
+    # (versioned records), written the way FileRecorder writes them
+    skaimot = SkaimotMsg.new_msg()
+    camframe = skaimot.camera_frames.add()
+    for person_idx in range(num_people):
+        person = camframe.people_in_frame.add()
+        person.id = person_idx
+        SkaimotMsg.set_face_embed(person, np.random.rand(512).astype(np.float32))
+        SkaimotMsg.set_bbox_embed(person, np.random.rand(2048).astype(np.float32))
+    skaimot_bytes = SkaimotMsg.pack(skaimot)
+    feetpos_record = b''.join(SkaiFrame.pack(FeetPosMsg.pack(create_example_feetposmsg(num_people=4)),
+                                             FrameChecksum.Type.CRC32C)[:-1])
+    frame = [record_struct.pack(0.0, SkaimotMsg.ports[0], len(skaimot_bytes)) + skaimot_bytes]
+    frame += [record_struct.pack(0.0, FeetPosMsg.ports[0], len(feetpos_record)) + feetpos_record] * 10
+    frame = b''.join(frame)
+    num_frames = int(mb * 1e6 / len(frame))
+    with open(filepath, 'wb') as f:
+        for _ in range(num_frames):
+            f.write(frame)
+    return num_frames
+
+
+def old_parse(filepath):
+    # what parseRecordedFileForReplay did: the whole file in memory, plus a copy of every msg
+    msgbytes = Path(filepath).read_bytes()
+    retlist = []
+    idx = 0
+    while idx < len(msgbytes):
+        timestamp, port, length = record_struct.unpack(msgbytes[idx:idx + record_struct.size])
+        idx += record_struct.size
+        header_len, header = SkaiFrame.parse_header(msgbytes[idx:idx + min(length, SkaiFrame.header_struct.size)])
+        retlist.append((timestamp, port, msgbytes[idx + header_len:idx + length]))
+        idx += length
+    return retlist
+
+
+def case_old_parse(filepath):
+    msgs = old_parse(filepath)
+    return len(msgs), sum(len(m) for t, p, m in msgs)
+
+
+def case_parse_list(filepath):
+    msgs = FileRecorder.parseRecordedFileForReplay(filepath)
+    return len(msgs), sum(len(m) for t, p, m in msgs)
+
+
+def case_reader(filepath):
+    with SkaibinReader(filepath) as reader:
+        count = nbytes = 0
+        for timestamp, port, header, msg_bytes in reader:
+            count += 1
+            nbytes += len(msg_bytes)
+    return count, nbytes
+
+
+def case_reader_port(filepath):
+    with SkaibinReader(filepath, ports=[FeetPosMsg.ports[0]]) as reader:
+        return sum(1 for _ in reader), None
+
+
+def case_reader_type(filepath):
+    with SkaibinReader(filepath, msg_types=[SkaimotMsg]) as reader:
+        return sum(1 for _ in reader), None
+
+
+def case_reader_lazy(filepath):
+    # routing on one field of each SkaimotMsg, without keeping any decoded msg around
+    with SkaibinReader(filepath, msg_types=[SkaimotMsg]) as reader:
+        return sum(len(view.get('camera_frames.people_in_frame.id')) for t, p, h, view in reader.messages()), None
+
+
+cases = {
+    'read_bytes': case_old_parse,
+    'parse list': case_parse_list,
+    'reader': case_reader,
+    'reader port': case_reader_port,
+    'reader type': case_reader_type,
+    'lazy get': case_reader_lazy,
+}
+
+
+def status_mb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def run_case(case, filepath, result_q):
+    # peak rss growth of this process only, resetting the high water mark to the current rss
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+    rss_start = status_mb('VmRSS:')
+    start = time.perf_counter()
+    count, nbytes = cases[case](filepath)
+    elapsed = time.perf_counter() - start
+    result_q.put((count, nbytes, elapsed, status_mb('VmHWM:') - rss_start))
+
+
+def check_int_msg_type_filter(filepath):
+    # a msg type registered with a plain int id (not in SkaiMsg.MsgType) filters like the built in ones
+    @register_msg
+    class ExampleIntIdMsg(SkaiMsg):
+        msg_type = 200
+        proto_msg_class = FeetPosMsg.proto_msg_class
+
+    feetpos = FeetPosMsg.pack(create_example_feetposmsg(num_people=1))
+    example = ExampleIntIdMsg.pack(create_example_feetposmsg(num_people=1))
+    with open(filepath, 'wb') as f:
+        for msg_bytes in (feetpos, example, feetpos, example):
+            f.write(record_struct.pack(0.0, FeetPosMsg.ports[0], len(msg_bytes)) + msg_bytes)
+    for msg_types in ([ExampleIntIdMsg], [200]):
+        with SkaibinReader(filepath, msg_types=msg_types) as reader:
+            assert [bytes(msg_bytes) for timestamp, port, header, msg_bytes in reader] == [example, example]
+    Path(filepath).unlink()
+    print('msg type registered with an int id: filtered by class and by id')
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--file', help='recording to write and read', type=str, default='/tmp/benchmark_skaibin_reader.skaibin')
+    parser.add_argument('--mb', help='recording sizes, one run per value', type=float, nargs='+', default=[250, 1000])
+    parser.add_argument('--people', help='people (embeddings) per SkaimotMsg', type=int, default=10)
+    args = parser.parse_args()
+
+    print('every case runs in its own process, peak MB is its rss growth while reading')
+    print(f'{"file MB":>8} {"case":>12} {"msgs":>8} {"sec":>7} {"MB/s":>7} {"peak MB":>8}')
+    for mb in args.mb:
+        num_frames = write_recording(args.file, mb, args.people)
+        file_mb = Path(args.file).stat().st_size / 1e6
+        results = {}
+        for case in cases:
+            result_q = mp.Queue()
+            proc = mp.Process(target=run_case, args=(case, args.file, result_q))
+            proc.start()
+            count, nbytes, elapsed, peak_mb = result_q.get()
+            proc.join()
+            results[case] = (count, nbytes)
+            print(f'{file_mb:>8.0f} {case:>12} {count:>8} {elapsed:>7.2f} {file_mb / elapsed:>7.0f} {peak_mb:>8.1f}')
+        # every path finds the same msgs, the filters exactly the selected ones
+        assert results['read_bytes'] == results['parse list'] == results['reader'] and results['reader'][0] == 11 * num_frames
+        assert results['reader port'][0] == 10 * num_frames and results['reader type'][0] == num_frames
+        assert results['lazy get'][0] == args.people * num_frames
+        Path(args.file).unlink()
+    check_int_msg_type_filter(args.file)
@@ -0,0 +1,128 @@
+#!/usr/bin/python3
+
+import os
+import time
+import shutil
+import signal
+import multiprocessing as mp
+import numpy as np
+from pathlib import Path
+from argparse import ArgumentParser
+
+from skaimsginterface.skaimessages import *
+from skaimsginterface.framing import SkaiFrame, FrameChecksum
+from skaimsginterface.replay import FileRecorder, SkaibinReader, SkaibinSegments
+from examples.test_feetpos import create_example_feetposmsg
+
+
+def create_frame_msgs(num_people):
+    # per frame one embedding heavy SkaimotMsg (legacy record) and 10 small FeetPosMsgs (versioned records)
+    skaimot = SkaimotMsg.new_msg()
+    camframe = skaimot.camera_frames.add()
+    for person_idx in range(num_people):
+        person = camframe.people_in_frame.add()
+        person.id = person_idx
+        SkaimotMsg.set_face_embed(person, np.random.rand(512).astype(np.float32))
+        SkaimotMsg.set_bbox_embed(person, np.random.rand(2048).astype(np.float32))
+    feetpos_record = b''.join(SkaiFrame.pack(FeetPosMsg.pack(create_example_feetposmsg(num_people=4)),
+                                             FrameChecksum.Type.CRC32C)[:-1])
+    return [(SkaimotMsg.pack(skaimot), SkaimotMsg.ports[0])] + [(feetpos_record, FeetPosMsg.ports[0])] * 10
+
+
+def remove_recording(filepath):
+    if os.path.isdir(filepath):
+        shutil.rmtree(filepath)
+    elif os.path.exists(filepath):
+        os.remove(filepath)
+
+
+def record(filepath, frame_msgs, num_frames, recorder_kwargs):
+    remove_recording(filepath)
+    recorder = FileRecorder(filepath, **recorder_kwargs)
+    start = time.perf_counter()
+    recorder.open()
+    for frame_idx in range(num_frames):
+        for msg_bytes, port in frame_msgs:
+            recorder.record(msg_bytes, float(frame_idx), port)
+    # close waits until everything is written
+    recorder.close()
+    return time.perf_counter() - start
+
+
+def read(filepath):
+    start = time.perf_counter()
+    with SkaibinReader(filepath) as reader:
+        count = sum(1 for _ in reader)
+        truncated_bytes = reader.truncated_bytes
+    return count, truncated_bytes, time.perf_counter() - start
+
+
+def record_until_killed(filepath, frame_msgs, recorder_kwargs, started):
+    # records numbered frames flat out until killed, every record's timestamp is its frame number
+    recorder = FileRecorder(filepath, **recorder_kwargs)
+    recorder.open()
+    started.set()
+    frame_idx = 0
+    while True:
+        for msg_bytes, port in frame_msgs:
+            recorder.record(msg_bytes, float(frame_idx), port)
+        frame_idx += 1
+
+
+def crash(filepath, frame_msgs, recorder_kwargs, run_s):
+    # SIGKILL a recording process mid stream, then read back what made it to the file
+    remove_recording(filepath)
+    started = mp.Event()
+    proc = mp.Process(target=record_until_killed, args=(filepath, frame_msgs, recorder_kwargs, started))
+    proc.start()
+    started.wait()
+    time.sleep(run_s)
+    os.kill(proc.pid, signal.SIGKILL)
+    proc.join()
+    with SkaibinReader(filepath) as reader:
+        timestamps = [timestamp for timestamp, port, header, msg_bytes in reader]
+        truncated_bytes = reader.truncated_bytes
+    # whatever is read back is a whole prefix of what was recorded, in order
+    expected = [float(frame_idx) for frame_idx in range(len(timestamps) // len(frame_msgs) + 1) for _ in frame_msgs]
+    assert timestamps == expected[:len(timestamps)]
+    return len(timestamps), truncated_bytes
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--file', help='recording to write and read', type=str, default='/tmp/benchmark_skaibin_segments.skaibin')
+    parser.add_argument('--mb', help='recording size', type=float, default=500)
+    parser.add_argument('--segment_mb', help='segment size', type=float, default=64)
+    parser.add_argument('--people', help='people (embeddings) per SkaimotMsg', type=int, default=10)
+    parser.add_argument('--crash_s', help='seconds of recording before the kill', type=float, default=3)
+    args = parser.parse_args()
+
+    frame_msgs = create_frame_msgs(args.people)
+    num_frames = int(args.mb * 1e6 / sum(len(msg_bytes) for msg_bytes, port in frame_msgs))
+    segment_bytes = int(args.segment_mb * 1e6)
+    cases = {
+        'one file': {},
+        'segments, no fsync': {'max_segment_bytes': segment_bytes, 'fsync_interval_s': None},
+        'segments, fsync 1 s': {'max_segment_bytes': segment_bytes, 'fsync_interval_s': 1.0},
+        'segments, fsync 0.1 s': {'max_segment_bytes': segment_bytes, 'fsync_interval_s': 0.1},
+        'segments, fsync 0.01 s': {'max_segment_bytes': segment_bytes, 'fsync_interval_s': 0.01},
+    }
+
+    print(f'{num_frames * len(frame_msgs)} msgs, {args.mb:.0f} MB, {args.segment_mb:g} MB segments')
+    print(f'{"case":>24} {"write s":>8} {"write MB/s":>10} {"read s":>7} {"read MB/s":>9} {"files":>6}')
+    for case, recorder_kwargs in cases.items():
+        write_s = record(args.file, frame_msgs, num_frames, recorder_kwargs)
+        count, truncated_bytes, read_s = read(args.file)
+        # every msg is read back, segments only rotate between records
+        assert count == num_frames * len(frame_msgs) and truncated_bytes == 0
+        files = len(SkaibinSegments.read_manifest(args.file)['segments']) if os.path.isdir(args.file) else 1
+        mb = sum(f.stat().st_size for f in Path(args.file).glob('*.skaibin')) / 1e6 if os.path.isdir(args.file) \
+            else Path(args.file).stat().st_size / 1e6
+        print(f'{case:>24} {write_s:>8.2f} {mb / write_s:>10.0f} {read_s:>7.2f} {mb / read_s:>9.0f} {files:>6}')
+
+    print(f'killed after {args.crash_s:g} s of recording')
+    print(f'{"case":>24} {"msgs read back":>14} {"skipped bytes":>13}')
+    for case in ['one file', 'segments, fsync 0.1 s']:
+        count, truncated_bytes = crash(args.file, frame_msgs, cases[case], args.crash_s)
+        print(f'{case:>24} {count:>14} {truncated_bytes:>13}')
+    remove_recording(args.file)
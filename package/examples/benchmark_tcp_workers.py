@@ -0,0 +1,106 @@
+#!/usr/bin/python3
+
+import os
+import time
+import socket
+import struct
+import multiprocessing as mp
+from argparse import ArgumentParser
+
+from skaimsginterface.skaimessages import *
+from skaimsginterface.framing import SkaiFrame, FrameChecksum
+from skaimsginterface.tcp import MultiportTcpListenerMP
+
+
+def run_sender(port, sender_idx, num_msgs, num_people, start_event, big_every=0):
+    # camera id says which connection a msg came from, timestamp is its place in that connection.
+    # every big_every-th msg has 2000 people, more than half of a 64 KB shared memory ring
+    frames = []
+    for seq in range(num_msgs):
+        msg = FeetPosMsg.new_msg()
+        camframe = msg.camera_frames.add()
+        camframe.camera_id = sender_idx
+        camframe.timestamp = seq
+        msg_people = 2000 if big_every and seq % big_every == 0 else num_people
+        for person_idx in range(msg_people):
+            person = camframe.people_in_frame.add()
+            person.id = person_idx
+            FeetPosMsg.set_feet_pos(person, [1.0, 2.0, 0.0])
+        frame_body = SkaiFrame.pack_bytes(FeetPosMsg.pack(msg), FrameChecksum.Type.CRC32C, seq)
+        frames.append(struct.pack('!I', len(frame_body)) + frame_body)
+    # frames straight onto the socket, TcpSender paces itself with a sleep per msg
+    sock = socket.create_connection(('127.0.0.1', port))
+    start_event.wait()
+    for i in range(0, num_msgs, 64):
+        sock.sendall(b''.join(frames[i:i + 64]))
+    time.sleep(1.0)
+    sock.close()
+
+
+def run_case(name, args, port, workers, ordered, shm_ring_size=16 * 1024 * 1024, big_every=0):
+    # shared between the callback process (ordered) or the worker processes (unordered)
+    delivered = mp.Value('l', 0)
+    out_of_order = mp.Value('l', 0)
+    last_seq = mp.Array('l', [-1] * args.senders)
+
+    def callback(msg_bytes, server_address):
+        msg_type, msg = SkaiMsg.unpack(bytes(msg_bytes))
+        camframe = msg.camera_frames[0]
+        with delivered.get_lock():
+            delivered.value += 1
+            if camframe.timestamp != last_seq[camframe.camera_id] + 1:
+                out_of_order.value += 1
+            last_seq[camframe.camera_id] = camframe.timestamp
+
+    listener = MultiportTcpListenerMP([port], callback, use_shared_memory=True, shm_ring_size=shm_ring_size,
+                                      workers_per_port=workers, ordered=ordered)
+    time.sleep(0.5)
+
+    start_event = mp.Event()
+    senders = [mp.Process(target=run_sender, args=(port, i, args.msgs, args.people, start_event, big_every))
+               for i in range(args.senders)]
+    for sender in senders:
+        sender.start()
+    time.sleep(1.0)
+
+    start = time.perf_counter()
+    start_event.set()
+    expected = args.senders * args.msgs
+    while delivered.value < expected and time.perf_counter() - start < 60:
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+
+    print(f'{name:>22} {delivered.value / elapsed:>8.0f} {delivered.value:>6}/{expected} {out_of_order.value:>12}')
+    for (worker_port, worker_idx), stats in listener.worker_stats().items():
+        print(f'{"":>24}worker {worker_idx}: {stats["connections"]} connections {stats["msgs"]} msgs {stats["bytes"]} bytes')
+    for sender in senders:
+        sender.join()
+    ring_names = [ring.name for ring in listener.rings.values()]
+    listener.stop()
+    assert delivered.value == expected and out_of_order.value == 0
+    # stop() removes the shared memory rings, nothing left behind in /dev/shm
+    assert not [name for name in ring_names if os.path.exists(f'/dev/shm/{name}')], ring_names
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--port', help='first port, each case uses a fresh one', type=int, default=FeetPosMsg.ports[98])
+    parser.add_argument('--senders', help='connections to the hot port', type=int, default=8)
+    parser.add_argument('--msgs', help='msgs per connection', type=int, default=5000)
+    parser.add_argument('--people', help='people per msg', type=int, default=2)
+    parser.add_argument('--workers', help='workers per port for the sharded cases', type=int, default=4)
+    args = parser.parse_args()
+
+    print(f'{args.senders} connections x {args.msgs} feetpos msgs into one port')
+    print(f'{"listener":>22} {"msgs/s":>8} {"delivered":>12} {"out of order":>12}')
+    cases = [
+        ('1 worker', 1, True, {}),
+        (f'{args.workers} workers, ordered', args.workers, True, {}),
+        (f'{args.workers} workers, unordered', args.workers, False, {}),
+        # msgs too big for the ring go through the queue and still arrive in their place
+        ('64 KB rings, big msgs', args.workers, True, {'shm_ring_size': 64 * 1024, 'big_every': 10}),
+    ]
+    for case_idx, (name, workers, ordered, case_kwargs) in enumerate(cases):
+        run_case(name, args, args.port + case_idx, workers, ordered, **case_kwargs)
+        # let the daemon processes of the last case exit
+        time.sleep(0.5)
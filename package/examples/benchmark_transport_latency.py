@@ -0,0 +1,61 @@
+#!/usr/bin/python3
+
+import time
+import struct
+import threading
+import numpy as np
+from argparse import ArgumentParser
+
+from skaimsginterface.framing import FrameChecksum
+from skaimsginterface.tcp import TcpSender, MultiportTcpListener
+from skaimsginterface.transport import TransportOptions
+
+# msg bytes: 2 byte msg type, 8 byte sequence number, padding
+seq_struct = struct.Struct('!HQ')
+
+
+def run_case(profile, msg_size, num_msgs, port):
+    options = TransportOptions.profile(profile)
+    received = {}
+    done = threading.Event()
+
+    def callback(msg_bytes, server_address):
+        received[seq_struct.unpack_from(msg_bytes)[1]] = time.perf_counter()
+        if len(received) == num_msgs:
+            done.set()
+
+    MultiportTcpListener([port], callback, transport_options=options)
+    time.sleep(0.2)
+    sender = TcpSender('127.0.0.1', port, checksum_type=FrameChecksum.Type.CRC32C, transport_options=options)
+
+    padding = bytes(msg_size - seq_struct.size)
+    msgs = [seq_struct.pack(0, seq) + padding for seq in range(num_msgs)]
+    sent = {}
+    for seq, msg_bytes in enumerate(msgs):
+        sent[seq] = time.perf_counter()
+        # TcpSender sleeps 5 ms after each msg, a steady trickle like status / heartbeat msgs
+        sender.send(msg_bytes)
+    done.wait(30)
+    sender.sock.close()
+
+    latency_ms = np.array([(received[seq] - sent[seq]) * 1000 for seq in received])
+    assert len(latency_ms) == num_msgs, f'{num_msgs - len(latency_ms)} msgs missing'
+    print(f'{profile:>12} {msg_size:>9} {np.percentile(latency_ms, 50):>8.3f} {np.percentile(latency_ms, 99):>8.3f}'
+          f' {latency_ms.max():>8.3f}')
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--port', help='first port, each case uses a fresh one', type=int, default=7300)
+    parser.add_argument('--small', help='msgs per small case', type=int, default=400)
+    parser.add_argument('--large', help='msgs per large case', type=int, default=40)
+    args = parser.parse_args()
+
+    print('send to callback latency over loopback, ms, sender and listener use the same profile')
+    print(f'{"profile":>12} {"msg bytes":>9} {"p50":>8} {"p99":>8} {"max":>8}')
+    cases = [(100, args.small), (2 * 1024 * 1024, args.large)]
+    port = args.port
+    for msg_size, num_msgs in cases:
+        for profile in TransportOptions.profiles:
+            run_case(profile, msg_size, num_msgs, port)
+            port += 1
@@ -0,0 +1,124 @@
+#!/usr/bin/python3
+
+import os
+import time
+import socket
+import threading
+import multiprocessing as mp
+from argparse import ArgumentParser
+
+from skaimsginterface.skaimessages import *
+from skaimsginterface.framing import SkaiFrame
+from skaimsginterface.udp import UdpSender, MultiportUdpListener, UdpBatchSocket, UdpChunk
+from skaimsginterface.udp.UdpSender import create_example_skaimotmsg
+
+
+def syscall_benchmark(num_datagrams, datagram_size, rounds):
+    # one process, send a burst to our own socket then drain it, timing both halves
+    rx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    rx.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 16 * 1024 * 1024)
+    rx.bind(('127.0.0.1', 0))
+    tx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    address = rx.getsockname()
+    datagrams = [os.urandom(datagram_size) for i in range(num_datagrams)]
+
+    print(f'{num_datagrams} x {datagram_size} byte datagrams over localhost, us per datagram')
+    print(f'{"path":>22} {"send":>8} {"recv":>8}')
+    paths = [
+        ('sendto / recvfrom_into', False, False),
+        ('sendmmsg / recvmmsg', True, False),
+        ('gso / recvmmsg', True, True),
+    ]
+    for name, use_mmsg, use_gso in paths:
+        if (use_mmsg and not UdpBatchSocket.available) or (use_gso and not UdpBatchSocket.gso_available):
+            print(f'{name:>22} not available')
+            continue
+        tx_batch = UdpBatchSocket(tx, batch_size=64, use_mmsg=use_mmsg, use_gso=use_gso)
+        rx_batch = UdpBatchSocket(rx, batch_size=64, max_datagram_size=8192, use_mmsg=use_mmsg)
+        send_s = recv_s = 0
+        for r in range(rounds):
+            start = time.perf_counter()
+            tx_batch.sendto_many(datagrams, address)
+            send_s += time.perf_counter() - start
+            start = time.perf_counter()
+            received = 0
+            while received < num_datagrams:
+                batch = rx_batch.recv_many(timeout=1.0)
+                if not batch:
+                    break
+                received += len(batch)
+            recv_s += time.perf_counter() - start
+            assert received == num_datagrams, f'lost {num_datagrams - received} datagrams'
+        # every path has to deliver the same datagrams
+        tx_batch.sendto_many(datagrams[:64], address)
+        assert [bytes(d) for d, a in rx_batch.recv_many(timeout=1.0)] == datagrams[:64]
+        per = rounds * num_datagrams
+        print(f'{name:>22} {send_s / per * 1e6:>8.2f} {recv_s / per * 1e6:>8.2f}')
+
+
+def run_senders(ports, msg_bytes, fps, seconds, start_event):
+    senders = [UdpSender('127.0.0.1', port, chunked=True) for port in ports]
+    start_event.wait()
+    interval = 1 / fps
+    next_tick = time.perf_counter()
+    for tick in range(int(fps * seconds)):
+        for sender in senders:
+            sender.send(msg_bytes)
+        next_tick += interval
+        delay = next_tick - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def listener_benchmark(args, batch_size, first_port):
+    ports = list(range(first_port, first_port + args.groups))
+    counts = {port: 0 for port in ports}
+    lock = threading.Lock()
+
+    def callback(data, server_address):
+        with lock:
+            counts[server_address[1]] += 1
+
+    listener = MultiportUdpListener(ports, callback, batch_size=batch_size)
+    time.sleep(0.5)
+
+    msg_bytes = SkaimotMsg.pack(create_example_skaimotmsg(args.people, args.cams))
+    start_event = mp.Event()
+    sender = mp.Process(target=run_senders, args=(ports, msg_bytes, args.fps, args.seconds, start_event))
+    sender.start()
+    time.sleep(0.5)
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    start_event.set()
+    sender.join()
+    time.sleep(0.5)
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+
+    expected = args.groups * int(args.fps * args.seconds)
+    delivered = sum(counts.values())
+    chunks = len(UdpChunk.split(SkaiFrame.pack_bytes(msg_bytes), 0, 0))
+    name = f'batch {batch_size}' if batch_size else 'per datagram'
+    print(f'{name:>14} {len(msg_bytes):>9} {expected / wall:>8.0f} {expected * chunks / wall:>10.0f}'
+          f' {delivered / expected:>9.1%} {cpu / wall:>9.1%}')
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--datagrams', help='datagrams per burst in the syscall benchmark', type=int, default=512)
+    parser.add_argument('--rounds', help='bursts in the syscall benchmark', type=int, default=50)
+    parser.add_argument('--groups', help='camera groups, one listener port each', type=int, default=20)
+    parser.add_argument('--cams', help='cameras per group msg', type=int, default=5)
+    parser.add_argument('--people', help='people per camera frame', type=int, default=2)
+    parser.add_argument('--fps', help='msgs per second per group', type=float, default=15)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--port', help='first listener port, each run uses --groups fresh ports', type=int, default=6900)
+    args = parser.parse_args()
+
+    syscall_benchmark(args.datagrams, 4096 + UdpChunk.header_struct.size, args.rounds)
+
+    print(f'\n{args.groups} camera groups x {args.fps} skaimot msgs/s over chunked udp, listener in this process')
+    print(f'{"listener":>14} {"msg bytes":>9} {"msgs/s":>8} {"chunks/s":>10} {"delivered":>9} {"cpu":>9}')
+    for run_idx, batch_size in enumerate([None, 32]):
+        listener_benchmark(args, batch_size, args.port + run_idx * args.groups)
@@ -0,0 +1,107 @@
+#!/usr/bin/python3
+
+import time
+import resource
+import multiprocessing as mp
+from argparse import ArgumentParser
+
+from skaimsginterface.skaimessages import *
+from skaimsginterface.udp import UdpSender, MultiportUdpListener, MultiportUdpListenerMP
+from skaimsginterface.udp.UdpSender import create_example_skaimotmsg
+
+
+def create_msgs(ports, num_people, num_cams):
+    # a different msg per port so the callback can check it got the right bytes
+    msgs = {}
+    for port in ports:
+        msg = create_example_skaimotmsg(num_people, num_cams)
+        msg.camera_frames[0].camera_id = port
+        msgs[port] = SkaimotMsg.pack(msg)
+    return msgs
+
+
+def run_senders(msgs, fps, seconds, start_event):
+    senders = [(UdpSender('127.0.0.1', port, chunked=True), msg_bytes) for port, msg_bytes in msgs.items()]
+    start_event.wait()
+    interval = 1 / fps
+    next_tick = time.perf_counter()
+    for tick in range(int(fps * seconds)):
+        for sender, msg_bytes in senders:
+            sender.send(msg_bytes)
+        next_tick += interval
+        delay = next_tick - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_case(name, args, first_port, mp_listener, use_shared_memory=True):
+    ports = list(range(first_port, first_port + args.groups))
+    msgs = create_msgs(ports, args.people, args.cams)
+    # counters live in shared memory, the mp callback runs in another process
+    delivered = mp.Value('l', 0)
+    corrupt = mp.Value('l', 0)
+
+    def callback(data, server_address):
+        # compare as bytes, memoryview == bytes goes item by item
+        ok = bytes(data) == msgs[server_address[1]]
+        with delivered.get_lock():
+            delivered.value += 1
+            if not ok:
+                corrupt.value += 1
+
+    if mp_listener:
+        listener = MultiportUdpListenerMP(ports, callback, use_shared_memory=use_shared_memory)
+    else:
+        listener = MultiportUdpListener(ports, callback, batch_size=32)
+    time.sleep(1.0)
+
+    start_event = mp.Event()
+    sender = mp.Process(target=run_senders, args=(msgs, args.fps, args.seconds, start_event))
+    sender.start()
+    time.sleep(0.5)
+
+    cpu_start = time.process_time()
+    children_start = children_cpu()
+    wall_start = time.perf_counter()
+    start_event.set()
+    sender.join()
+    time.sleep(0.5)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    sender_cpu = children_cpu() - children_start
+    listener_cpu = cpu
+    if mp_listener:
+        # joined listener processes show up in the children usage
+        listener.stop()
+        listener_cpu = children_cpu() - children_start - sender_cpu
+
+    expected = args.groups * int(args.fps * args.seconds)
+    print(f'{name:>20} {expected / wall:>8.0f} {delivered.value / expected:>9.1%} {corrupt.value:>7}'
+          f' {cpu / wall:>9.1%} {listener_cpu / wall:>9.1%}')
+    assert corrupt.value == 0
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--groups', help='camera groups, one listener port each', type=int, default=20)
+    parser.add_argument('--cams', help='cameras per group msg', type=int, default=5)
+    parser.add_argument('--people', help='people per camera frame', type=int, default=2)
+    parser.add_argument('--fps', help='msgs per second per group', type=float, default=15)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--port', help='first listener port, each case uses --groups fresh ports', type=int, default=7100)
+    args = parser.parse_args()
+
+    print(f'{args.groups} camera groups x {args.fps} chunked udp skaimot msgs/s')
+    print(f'{"listener":>20} {"msgs/s":>8} {"delivered":>9} {"corrupt":>7} {"main cpu":>9} {"rx cpu":>9}')
+    cases = [
+        ('threaded', False, False),
+        ('mp, queue', True, False),
+        ('mp, shared memory', True, True),
+    ]
+    for case_idx, (name, mp_listener, use_shared_memory) in enumerate(cases):
+        run_case(name, args, args.port + case_idx * args.groups, mp_listener, use_shared_memory)
@@ -0,0 +1,139 @@
+#!/usr/bin/python3
+
+import time
+import threading
+import numpy as np
+from argparse import ArgumentParser
+
+from skaimsginterface.skaimessages import *
+from skaimsginterface.udp import UdpSender, MultiportUdpListener, UdpLossInjector, UdpChunk, UdpReassembler
+
+
+def create_msgs(sender_idx, num_msgs, num_people):
+    # unique msgs so every delivery can be matched to what was sent
+    msgs = []
+    for msg_idx in range(num_msgs):
+        msg = SkaimotMsg.new_msg()
+        camframe = msg.camera_frames.add()
+        camframe.camera_id = sender_idx
+        camframe.timestamp = msg_idx
+        for person_idx in range(num_people):
+            person = camframe.people_in_frame.add()
+            person.id = person_idx
+            SkaimotMsg.set_face_embed(person, np.random.rand(512).tolist())
+            SkaimotMsg.set_bbox_embed(person, np.random.rand(2048).tolist())
+        msgs.append(SkaimotMsg.pack(msg))
+    return msgs
+
+
+def run_sender(sender, msgs, msg_interval_s, nack_linger_s):
+    for msg_bytes in msgs:
+        sender.send(msg_bytes)
+        time.sleep(msg_interval_s)
+    # keep answering NACKs for the last msgs
+    sender.handle_nacks(nack_linger_s)
+
+
+def check_msg_id_wrap():
+    # msg ids 0xfffffffd .. 2 with 0xffffffff lost and the last chunk of 0xfffffffe swapped with the first of 1:
+    # everything else completes across the wrap, one msg lost, nothing taken for a duplicate
+    reassembler = UdpReassembler()
+    datagrams = []
+    for msg_id in (0xfffffffd, 0xfffffffe, 0, 1, 2):
+        datagrams += UdpChunk.split(bytes(100), 7, msg_id, payload_size=40)
+    datagrams[5], datagrams[9] = datagrams[9], datagrams[5]
+    completed = [done for datagram in datagrams for done in reassembler.add(datagram, ('127.0.0.1', 1), now=0.0)]
+    source = reassembler.sources[(('127.0.0.1', 1), 7)]
+    reassembler.service(now=10.0)
+    assert len(completed) == 5 and all(frame == bytes(100) for frame, ts, _ in completed), len(completed)
+    assert source.msgs_lost == 1 and source.chunks_duplicate == 0 and source.msgs_reordered == 1, source
+    print(f'msg ids wrapping at 2^32: {source}')
+
+
+def check_source_expiry():
+    # a sender restarting gets a new source id, the old source goes once idle for source_idle_timeouts timeouts
+    reassembler = UdpReassembler(timeout_s=1.0)
+    address = ('127.0.0.1', 1)
+    for datagram in UdpChunk.split(bytes(100), 7, 0, payload_size=40):
+        reassembler.add(datagram, address, now=0.0)
+    reassembler.add(UdpChunk.split(bytes(100), 8, 0, payload_size=40)[0], address, now=5.0)
+    reassembler.service(now=9.5)
+    assert list(reassembler.sources) == [(address, 7), (address, 8)], list(reassembler.sources)
+    reassembler.service(now=10.5)
+    assert list(reassembler.sources) == [(address, 8)], list(reassembler.sources)
+    reassembler.service(now=15.5)
+    assert not reassembler.sources, list(reassembler.sources)
+    print(f'udp sources dropped after {reassembler.source_idle_timeouts} reassembly timeouts idle')
+
+
+def run_case(name, listen_port, proxy_port, args, chunked, nack, first_msg_id=0):
+    delivered = []
+    lock = threading.Lock()
+
+    def callback(data, server_address):
+        with lock:
+            delivered.append(bytes(data))
+
+    listener = MultiportUdpListener([listen_port], callback, nack=nack)
+    injector = UdpLossInjector(proxy_port, ('127.0.0.1', listen_port), drop=args.drop, duplicate=args.duplicate,
+                               reorder=args.reorder, seed=args.seed)
+    injector.start()
+    time.sleep(0.2)
+
+    sent = {}
+    threads = []
+    for sender_idx in range(args.senders):
+        msgs = create_msgs(sender_idx, args.msgs, args.people)
+        sent.update({msg_bytes: sender_idx for msg_bytes in msgs})
+        sender = UdpSender('127.0.0.1', proxy_port, chunked=chunked, retransmit_msgs=64 if nack else 0)
+        sender.msg_id = first_msg_id
+        threads.append(threading.Thread(target=run_sender, args=(sender, msgs, args.interval, 1.0 if nack else 0)))
+    start = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    time.sleep(1.5)     # reassembly timeout
+    injector.stop()
+    elapsed = time.time() - start
+
+    # everything delivered must be a msg that was sent, exactly once
+    with lock:
+        corrupt = [d for d in delivered if d not in sent]
+        duplicates = len(delivered) - len(set(delivered)) - len(corrupt)
+    total = args.senders * args.msgs
+    print(f'{name:>18}: delivered {len(delivered) - len(corrupt)}/{total} intact, {len(corrupt)} corrupt,'
+          f' {duplicates} duplicate in {elapsed:.1f}s | proxy {injector}')
+    if chunked:
+        for (address, source_id), source in listener.reassemblers[listen_port].sources.items():
+            print(f'{"":>20}source {source_id:08x}: {source}')
+        assert not corrupt and not duplicates
+    return len(delivered) - len(corrupt)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--port', help='first listener port, each case uses 2 fresh ports', type=int, default=6800)
+    parser.add_argument('--senders', help='senders sharing the listener port', type=int, default=2)
+    parser.add_argument('--msgs', help='msgs per sender', type=int, default=100)
+    parser.add_argument('--people', help='people per msg, each ~10KB', type=int, default=2)
+    parser.add_argument('--interval', help='seconds between msgs per sender', type=float, default=0.005)
+    parser.add_argument('--drop', help='datagram drop probability', type=float, default=0.02)
+    parser.add_argument('--duplicate', help='datagram duplicate probability', type=float, default=0.01)
+    parser.add_argument('--reorder', help='datagram reorder probability', type=float, default=0.02)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f'{args.senders} senders x {args.msgs} msgs through a proxy dropping {args.drop:.0%},'
+          f' duplicating {args.duplicate:.0%}, reordering {args.reorder:.0%} of datagrams')
+    check_msg_id_wrap()
+    check_source_expiry()
+    cases = [
+        ('legacy', False, False, 0),
+        ('chunked', True, False, 0),
+        ('chunked + nack', True, True, 0),
+        # msg ids wrap halfway through
+        ('nack, id wrap', True, True, 0x100000000 - args.msgs // 2),
+    ]
+    for case_idx, (name, chunked, nack, first_msg_id) in enumerate(cases):
+        run_case(name, args.port + 2 * case_idx, args.port + 2 * case_idx + 1, args, chunked, nack, first_msg_id)
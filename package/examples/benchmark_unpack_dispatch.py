@@ -0,0 +1,115 @@
+#!/usr/bin/python3
+
+import struct
+import time
+from argparse import ArgumentParser
+
+from skaimsginterface.skaimessages import *
+from skaimsginterface.skaimessages.SkaiMsgView import SkaiMsgView
+from skaimsginterface.framing import SkaiFrame, FrameChecksum
+
+
+def legacy_get_class_from_id(id):
+    # the if/elif ladder SkaiMsg.MsgType.get_class_from_id used to be
+    MsgType = SkaiMsg.MsgType
+    if id == MsgType.SKAIMOT.value:
+        return SkaimotMsg
+    elif id == MsgType.POSE.value:
+        return PoseMsg
+    elif id == MsgType.FEETPOS.value:
+        return FeetPosMsg
+    elif id == MsgType.LOCALTRACK.value:
+        return LocalTrackMsg
+    elif id == MsgType.GLOBALTRACK.value:
+        return GlobalTrackMsg
+    elif id == MsgType.ACTION.value:
+        return ActionMsg
+    elif id == MsgType.SKAIBOX_DEALERSHIP.value:
+        return SkaiboxDealershipMsg
+    elif id == MsgType.SKAIBOX_CAMERACALIBRATION.value:
+        return SkaiboxCameraCalibrationMsg
+    elif id == MsgType.SKAIBOX_CAMERAGROUP.value:
+        return SkaiboxCameraGroupMsg
+    elif id == MsgType.SKAIBOX_DATABASECLOUD.value:
+        return SkaiboxDatabaseCloudMsg
+    elif id == MsgType.TRACKS_IN_DEALERSHIP.value:
+        return TracksInDealershipMsg
+    elif id == MsgType.INTERACTION_IN_DEALERSHIP.value:
+        return InteractionInDealershipMsg
+    elif id == MsgType.VEHICLE.value:
+        return VehicleMsg
+    elif id == MsgType.VEHICLE_SPOT_MONITOR.value:
+        return VehicleSpotMonitorMsg
+    elif id == MsgType.SKAI_EVENT.value:
+        return SkaiEventMsg
+    elif id == MsgType.SKAI_GOOEY.value:
+        return SkaiGooeyMsg
+    elif id == MsgType.MODULE_STATUS.value:
+        return ModuleStatusMsg
+    elif id == MsgType.ADAT_STATUS.value:
+        return AdatStatusMsg
+    else:
+        return None
+
+
+def legacy_unpack(msg_bytes):
+    # the old SkaiMsg.unpack body: ladder dispatch and a sliced copy of the protobuf bytes
+    msg_type_id = struct.unpack('! H', msg_bytes[:2])[0]
+    classRef = legacy_get_class_from_id(msg_type_id)
+    msg = classRef.proto_msg_class()
+    msg.ParseFromString(msg_bytes[2:])
+    return classRef.msg_type, msg
+
+
+def time_per_call(func, arg, iterations):
+    start = time.perf_counter()
+    for i in range(iterations):
+        func(arg)
+    return (time.perf_counter() - start) / iterations * 1e9
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--iterations', help='calls timed per msg type', type=int, default=200000)
+    args = parser.parse_args()
+
+    print(f'{len(SkaiMsg.registry)} registered msg types, ns per call (empty msgs, so dispatch dominates unpack)')
+    print(f'{"msg type":>28} {"ladder":>8} {"table":>8} {"old unpack":>11} {"unpack":>8} {"try_unpack":>11}')
+    totals = [0] * 5
+    for msg_id, msg_class in sorted(SkaiMsg.registry.items()):
+        msg_bytes = msg_class.pack(msg_class.new_msg())
+        results = [
+            time_per_call(legacy_get_class_from_id, msg_id, args.iterations),
+            time_per_call(SkaiMsg.MsgType.get_class_from_id, msg_id, args.iterations),
+            time_per_call(legacy_unpack, msg_bytes, args.iterations),
+            time_per_call(SkaiMsg.unpack, msg_bytes, args.iterations),
+            time_per_call(SkaiMsg.try_unpack, msg_bytes, args.iterations),
+        ]
+        totals = [t + r for t, r in zip(totals, results)]
+        print(f'{msg_class.__name__:>28} ' + ' '.join(f'{r:>{w}.0f}' for r, w in zip(results, [8, 8, 11, 8, 11])))
+
+    mean = [t / len(SkaiMsg.registry) for t in totals]
+    print(f'{"mean":>28} ' + ' '.join(f'{r:>{w}.0f}' for r, w in zip(mean, [8, 8, 11, 8, 11])))
+
+    # failures keep the old contract, unpack prints and returns (None, None) whatever went wrong,
+    # try_unpack returns the UnpackError
+    bad_inputs = [b'', b'\x00', b'\xff\xff', b'\x00\x03\xff\xff', b'SK\x02 truncated', None, 'not bytes', 12]
+    for bad in bad_inputs:
+        assert SkaiMsg.unpack(bad) == (None, None), bad
+        assert isinstance(SkaiMsg.try_unpack(bad).error, UnpackError), bad
+    print(f'{len(bad_inputs)} malformed inputs: unpack returns (None, None), try_unpack an UnpackError')
+
+    # a recorded batch record: the msg type comes from its header, unpack and SkaiMsgView point to split_msgs()
+    feetpos = FeetPosMsg.pack(FeetPosMsg.new_msg())
+    batch_record = b''.join(SkaiFrame.pack_batch([feetpos, feetpos], FrameChecksum.Type.CRC32))[:-4]
+    assert SkaiMsg.getMessageTypeName(batch_record) == 'FeetPosMsg'
+    error = SkaiMsg.try_unpack(batch_record).error
+    assert isinstance(error, MsgDecodeError) and 'split_msgs' in str(error), error
+    try:
+        SkaiMsgView(batch_record)
+        raise AssertionError('SkaiMsgView took a batch record')
+    except MsgDecodeError:
+        pass
+    msgs, header = SkaiFrame.split_msgs(batch_record)
+    assert [SkaiMsg.unpack(msg_bytes)[0] for msg_bytes in msgs] == [FeetPosMsg.msg_type] * 2
+    print(f'batch record: {error}')
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+import asyncio
+from argparse import ArgumentParser
+
+from skaimsginterface.skaimessages import *
+from skaimsginterface.tcp import AsyncMultiportTcpListener
+
+def example_multiport_callback_func(data, server_address):
+    # store it, unpack, etc do as you wish
+    msg_type, msg = SkaiMsg.unpack(data)
+    print(f'got some data length {len(data)} from {server_address} msg type {msg_type}\n')
+
+async def example_async_multiport_callback_func(data, server_address):
+    # coroutine callbacks are awaited, so you can hand off to other async code here
+    msg_type, msg = SkaiMsg.unpack(data)
+    await asyncio.sleep(0)
+    print(f'got some data length {len(data)} from {server_address} msg type {msg_type} (async callback)\n')
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--camgroups', help='camera group numbers to listen on (default 0)', nargs='+', type=int, default=[0])
+    parser.add_argument('--recordfile', help='skaibin file to record to', nargs='?', type=str, default=None)
+    parser.add_argument('--ipv6', help='use ipv6 instead of ipv4 default', nargs='?', type=bool, const=True, default=False)
+    parser.add_argument('--asynccallback', help='use the coroutine example callback', nargs='?', type=bool, const=True, default=False)
+    parser.add_argument('--nouvloop', help='use the default asyncio event loop even if uvloop is installed', nargs='?', type=bool, const=True, default=False)
+    args = parser.parse_args()
+
+    # every msg type port of every requested camera group, all served from one event loop
+    ports = []
+    for camgroup_idx in args.camgroups:
+        ports += [
+            SkaimotMsg.ports[camgroup_idx],
+            PoseMsg.ports[camgroup_idx],
+            FeetPosMsg.ports[camgroup_idx],
+            LocalTrackMsg.ports[camgroup_idx],
+            GlobalTrackMsg.ports[camgroup_idx],
+            ActionMsg.ports[camgroup_idx],
+            VehicleMsg.ports[camgroup_idx],
+            VehicleSpotMonitorMsg.ports[camgroup_idx],
+            SkaiEventMsg.ports[camgroup_idx],
+        ]
+
+    if args.asynccallback:
+        callback = example_async_multiport_callback_func
+    else:
+        callback = example_multiport_callback_func
+
+    listener = AsyncMultiportTcpListener(
+        portlist=ports,
+        multiport_callback_func=callback,
+        recordfile=args.recordfile,
+        ipv6=args.ipv6,
+        verbose=True)
+
+    # stay active until ctrl+c input
+    try:
+        listener.run(use_uvloop=not args.nouvloop)
+    except KeyboardInterrupt:
+        print('exiting now...')
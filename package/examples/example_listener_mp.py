@@ -4,7 +4,7 @@ from argparse import ArgumentParser
 
 from skaimsginterface.skaimessages import *
 from skaimsginterface.tcp import MultiportTcpListenerMP
-# from skaimsginterface.udp import MultiportUdpListenerMP TODO implement this later
+from skaimsginterface.udp import MultiportUdpListenerMP
 
 def example_multiport_callback_func(data, server_address):
     # store it, unpack, etc do as you wish
@@ -67,12 +67,13 @@ if __name__ == '__main__':
 
     # listen
     if args.udp_or_tcp == 'udp':
-        print('multiprocessing udp support not implemented yet')
-        # listener = MultiportUdpListener(
-        #     portlist=ports,
-        #     multiport_callback_func=example_multiport_callback_func,
-        #     recordfile=args.recordfile,
-        #     verbose=True)
+        listener = MultiportUdpListenerMP(
+            portlist=ports,
+            multiport_callback_func=example_multiport_callback_func,
+            print_q=print_q,
+            recordfile=args.recordfile,
+            ipv6=args.ipv6,
+            verbose=True)
     else:
         listener = MultiportTcpListenerMP(
             portlist=ports,
@@ -7,6 +7,7 @@ from argparse import ArgumentParser
 from skaimsginterface.skaimessages import *
 from skaimsginterface.tcp import TcpSender, TcpSenderMP
 from skaimsginterface.udp import UdpSender
+from skaimsginterface.framing import FrameChecksum
 
 import multiprocessing as mp
 
@@ -57,6 +58,7 @@ if __name__=='__main__':
     parser.add_argument('--exampleout', help='dump an example message text file under a folder example_msg_prints', nargs='?', type=bool, const=True, default=False)
     parser.add_argument('--camgroup', help='camera group number (default 0)', nargs='?', type=int, default=0)
     parser.add_argument('--ipv6', help='use ipv6 instead of ipv4 default', nargs='?', type=bool, const=True, default=False)
+    parser.add_argument('--checksum', help='checksum type of versioned frames (default legacy md5 frames)', type=str, choices=[t.name for t in FrameChecksum.Type], default=None)
     args = parser.parse_args()
 
     msg = create_example_skaimotmsg()
@@ -77,10 +79,11 @@ if __name__=='__main__':
         destination_ip = '::1' # TcpSender.ipv6_localhost
     else:
         destination_ip = TcpSender.ipv4_localhost
+    checksum_type = None if args.checksum is None else FrameChecksum.Type[args.checksum]
     if args.udp_or_tcp == 'udp':
-        sender = UdpSender(destination_ip, SkaimotMsg.ports[cam_group_idx], verbose=True)
+        sender = UdpSender(destination_ip, SkaimotMsg.ports[cam_group_idx], checksum_type=checksum_type, verbose=True)
     else:    
-        sender = TcpSenderMP(destination_ip, SkaimotMsg.ports[cam_group_idx], print_q=print_q, verbose=True)
+        sender = TcpSenderMP(destination_ip, SkaimotMsg.ports[cam_group_idx], print_q=print_q, checksum_type=checksum_type, verbose=True)
     
     # send with fake checksum and real altnerating
     for i in range(10):
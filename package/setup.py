@@ -4,6 +4,10 @@ setup(
   description='skai message definitions, tcp, protobuf, and database interface classes',
   version='1.0',
   # packages=['skaimsginterface', 'skaimsginterface.protobuf']
-  packages=find_packages()
+  packages=find_packages(),
+  # optional FrameCompression codecs, ZLIB needs neither: pip3 install .[compression]
+  extras_require={
+    'compression': ['lz4', 'zstandard'],
+  }
 
 )
\ No newline at end of file
@@ -0,0 +1,136 @@
+#!/usr/bin/python3
+
+import hashlib
+import struct
+import zlib
+from enum import IntEnum
+
+# optional faster checksum libraries
+try:
+    import crc32c as _crc32c
+    _crc32c_func = _crc32c.crc32c
+    _crc32c_extend = lambda crc, data: _crc32c.crc32c(data, crc)
+except ImportError:
+    try:
+        import google_crc32c as _crc32c
+        _crc32c_func = _crc32c.value
+        _crc32c_extend = _crc32c.extend
+    except ImportError:
+        _crc32c_func = None
+        _crc32c_extend = None
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+
+class FrameChecksum:
+    """integrity checks that can trail a frame's msg bytes
+
+    MD5 is what every legacy frame carries. the others are much cheaper per
+    byte, CRC32C and XXHASH64 need the crc32c (or google-crc32c) and xxhash
+    packages, CRC32 only needs zlib.
+    """
+
+    class Type(IntEnum):
+        NONE = 0
+        MD5 = 1
+        CRC32 = 2
+        CRC32C = 3
+        XXHASH64 = 4
+
+    sizes = {
+        Type.NONE: 0,
+        Type.MD5: 16,
+        Type.CRC32: 4,
+        Type.CRC32C: 4,
+        Type.XXHASH64: 8,
+    }
+
+    # fastest first, used to pick a default (CRC32C uses the sse4.2 crc instruction where available)
+    preference = [Type.CRC32C, Type.XXHASH64, Type.CRC32, Type.MD5]
+
+    crc_struct = struct.Struct('!I')
+
+    @classmethod
+    def is_available(cls, checksum_type):
+        checksum_type = cls.Type(checksum_type)
+        if checksum_type == cls.Type.CRC32C:
+            return _crc32c_func is not None
+        if checksum_type == cls.Type.XXHASH64:
+            return xxhash is not None
+        return True
+
+    @classmethod
+    def available(cls):
+        return [t for t in cls.Type if cls.is_available(t)]
+
+    @classmethod
+    def best_available(cls):
+        for t in cls.preference:
+            if cls.is_available(t):
+                return t
+
+    @classmethod
+    def compute(cls, checksum_type, data):
+        """returns the checksum bytes of data (any bytes-like object, no copy is made)
+
+        data can also be a list / tuple of bytes-like parts, e.g. SkaiMsg.pack_parts()
+        output, which is checksummed as if the parts were concatenated
+        """
+        if isinstance(data, (list, tuple)):
+            return cls.compute_parts(checksum_type, data)
+        if checksum_type == cls.Type.MD5:
+            return hashlib.md5(data).digest()
+        elif checksum_type == cls.Type.CRC32:
+            return cls.crc_struct.pack(zlib.crc32(data))
+        elif checksum_type == cls.Type.CRC32C:
+            if _crc32c_func is None:
+                raise ValueError('CRC32C checksum needs the crc32c or google-crc32c package')
+            return cls.crc_struct.pack(_crc32c_func(data))
+        elif checksum_type == cls.Type.XXHASH64:
+            if xxhash is None:
+                raise ValueError('XXHASH64 checksum needs the xxhash package')
+            return xxhash.xxh64_digest(data)
+        elif checksum_type == cls.Type.NONE:
+            return b''
+        raise ValueError(f'unknown checksum type {checksum_type}')
+
+    @classmethod
+    def compute_parts(cls, checksum_type, parts):
+        """returns the checksum bytes of the concatenation of parts, without concatenating them"""
+        if len(parts) == 1:
+            return cls.compute(checksum_type, parts[0])
+        if checksum_type == cls.Type.MD5:
+            md5 = hashlib.md5()
+            for part in parts:
+                md5.update(part)
+            return md5.digest()
+        elif checksum_type == cls.Type.CRC32:
+            crc = 0
+            for part in parts:
+                crc = zlib.crc32(part, crc)
+            return cls.crc_struct.pack(crc)
+        elif checksum_type == cls.Type.CRC32C:
+            if _crc32c_extend is None:
+                raise ValueError('CRC32C checksum needs the crc32c or google-crc32c package')
+            crc = 0
+            for part in parts:
+                crc = _crc32c_extend(crc, part)
+            return cls.crc_struct.pack(crc)
+        elif checksum_type == cls.Type.XXHASH64:
+            if xxhash is None:
+                raise ValueError('XXHASH64 checksum needs the xxhash package')
+            xxh = xxhash.xxh64()
+            for part in parts:
+                xxh.update(part)
+            return xxh.digest()
+        elif checksum_type == cls.Type.NONE:
+            return b''
+        raise ValueError(f'unknown checksum type {checksum_type}')
+
+    @staticmethod
+    def corrupt(checksum):
+        """returns checksum with 1 added to each byte, for sending intentionally failed checksums"""
+        return bytes([ (b + 1) % 256 for b in checksum ])
@@ -0,0 +1,113 @@
+#!/usr/bin/python3
+
+import zlib
+from enum import IntEnum
+
+# optional faster compression libraries
+try:
+    import lz4.frame as _lz4
+except ImportError:
+    _lz4 = None
+
+try:
+    import zstandard as _zstd
+except ImportError:
+    _zstd = None
+
+
+class FrameCompression:
+    """codecs that can compress a versioned frame's msg bytes
+
+    ZLIB only needs zlib, so every install can read it. LZ4 and ZSTD need the
+    lz4 and zstandard packages (optional, the compression extra of setup.py
+    installs both) on both ends: a frame names its codec in the header flags
+    (see SkaiFrame), a listener without the package drops the frame with a
+    FrameError, so only pick them for streams whose listeners have them.
+    """
+
+    class Type(IntEnum):
+        NONE = 0
+        ZLIB = 1
+        LZ4 = 2
+        ZSTD = 3
+
+    # fast levels, embedding floats barely compress better at higher ones
+    levels = {
+        Type.ZLIB: 1,
+        Type.LZ4: 0,
+        Type.ZSTD: 1,
+    }
+
+    # fastest first, used to pick a default
+    preference = [Type.LZ4, Type.ZSTD, Type.ZLIB]
+
+    @classmethod
+    def is_available(cls, compression):
+        compression = cls.Type(compression)
+        if compression == cls.Type.LZ4:
+            return _lz4 is not None
+        if compression == cls.Type.ZSTD:
+            return _zstd is not None
+        return True
+
+    @classmethod
+    def available(cls):
+        return [t for t in cls.Type if cls.is_available(t)]
+
+    @classmethod
+    def best_available(cls):
+        for t in cls.preference:
+            if cls.is_available(t):
+                return t
+
+    @classmethod
+    def compress(cls, compression, data, level=None):
+        """returns data compressed with compression
+
+        Args:
+            compression (FrameCompression.Type): codec
+            data (bytes-like or list): bytes or a list of parts compressed as if concatenated
+            level (int, optional): codec level, None uses levels[compression]. Defaults to None.
+        """
+        compression = cls.Type(compression)
+        if level is None:
+            level = cls.levels.get(compression)
+        if compression == cls.Type.ZLIB:
+            if not isinstance(data, (list, tuple)):
+                return zlib.compress(data, level)
+            # parts stream through one compressor without being joined
+            compressor = zlib.compressobj(level)
+            chunks = [compressor.compress(part) for part in data]
+            chunks.append(compressor.flush())
+            return b''.join(chunks)
+        if isinstance(data, (list, tuple)):
+            data = b''.join(data)
+        if compression == cls.Type.LZ4:
+            if _lz4 is None:
+                raise ValueError('LZ4 compression needs the lz4 package')
+            return _lz4.compress(data, compression_level=level, store_size=True)
+        elif compression == cls.Type.ZSTD:
+            if _zstd is None:
+                raise ValueError('ZSTD compression needs the zstandard package')
+            return _zstd.ZstdCompressor(level=level).compress(data)
+        elif compression == cls.Type.NONE:
+            return bytes(data)
+        raise ValueError(f'unknown compression type {compression}')
+
+    @classmethod
+    def decompress(cls, compression, data):
+        """returns the bytes data was compressed from"""
+        compression = cls.Type(compression)
+        if compression == cls.Type.ZLIB:
+            return zlib.decompress(data)
+        elif compression == cls.Type.LZ4:
+            if _lz4 is None:
+                raise ValueError('LZ4 compression needs the lz4 package')
+            return _lz4.decompress(data)
+        elif compression == cls.Type.ZSTD:
+            if _zstd is None:
+                raise ValueError('ZSTD compression needs the zstandard package')
+            return _zstd.ZstdDecompressor().decompress(data)
+        elif compression == cls.Type.NONE:
+            return bytes(data)
+        raise ValueError(f'unknown compression type {compression}')
@@ -0,0 +1,419 @@
+#!/usr/bin/python3
+
+import struct
+import time
+from collections import namedtuple
+
+from skaimsginterface.framing.FrameChecksum import FrameChecksum
+from skaimsginterface.framing.FrameCompression import FrameCompression
+
+
+class FrameError(ValueError):
+    """frame could not be parsed"""
+
+
+class ChecksumError(FrameError):
+    """frame checksum did not match its msg bytes"""
+
+
+# parsed frame header. legacy frames report version 1 with an MD5 checksum and
+# None for the fields only versioned frames carry
+FrameHeader = namedtuple('FrameHeader', ['version', 'flags', 'checksum_type', 'msg_type', 'sequence', 'send_timestamp_ns'])
+
+
+class SkaiFrame:
+    """frame body layout shared by every sender and listener
+
+    the body is what follows the tcp length prefix (or what a udp message
+    reassembles to). two layouts are understood:
+
+    version 1 (legacy, no header):
+        [msg bytes][16 byte md5 of msg bytes]
+
+    version 2:
+        [2s magic 'SK'][u8 version][u8 header length][u8 flags][u8 checksum type]
+        [u16 msg type][u64 sequence][u64 send timestamp ns]
+        [msg bytes][checksum of msg bytes, length set by checksum type]
+
+    msg bytes always start with the 2 byte SkaiMsg type id, whose first byte
+    is 0x00 for every defined type, so the 'SK' magic can't be mistaken for a
+    legacy frame. readers skip header length bytes, so later versions can
+    append header fields without breaking version 2 readers.
+
+    listeners strip the checksum and keep the rest as a "record": the plain msg
+    bytes for legacy frames, header + msg bytes for versioned frames. records
+    are what gets recorded to skaibin files, split() separates them again.
+
+    the pack functions take msg bytes as one bytes-like object or as a list of
+    parts (SkaiMsg.pack_parts() output) that are framed as if concatenated.
+
+    version 2 frames with the BATCH flag carry several msgs (see pack_batch()),
+    one header and checksum for all of them:
+        [header][u32 msg length][msg bytes][u32 msg length][msg bytes]...[checksum]
+    the header's msg type is that of the msgs if they all share one, else 0.
+    listeners hand each msg to the callback on its own, split_msgs() does that.
+
+    version 2 frames can carry their msg bytes (a batch's whole length prefixed
+    body for batch frames) compressed, flag bits 1-3 hold the FrameCompression.Type,
+    0 for uncompressed. the checksum covers the compressed bytes as sent, the
+    header's msg type is still that of the uncompressed msgs. records keep the
+    compressed bytes (so do skaibin files), split() decompresses them.
+    """
+
+    magic = b'SK'
+    version = 2
+    header_struct = struct.Struct('!2sBBBBHQQ')
+    msg_type_struct = struct.Struct('!H')
+    batch_len_struct = struct.Struct('!I')
+    # the header fields before the sequence, set_sequence() rewrites it in place
+    sequence_offset = struct.calcsize('!2sBBBBH')
+    sequence_struct = struct.Struct('!Q')
+
+    # flag bits
+    BATCH = 0x01
+    COMPRESSION = 0x0e  # FrameCompression.Type << compression_shift
+    compression_shift = 1
+    legacy_header = FrameHeader(1, 0, FrameChecksum.Type.MD5, None, None, None)
+
+    @classmethod
+    def pack_header(cls, msg_bytes, checksum_type, sequence=0, send_timestamp_ns=None, flags=0):
+        """returns the version 2 header bytes for msg_bytes
+
+        Args:
+            msg_bytes (bytes-like): SkaiMsg.pack() output, its type id is copied into the header
+            checksum_type (FrameChecksum.Type): checksum trailing the msg bytes
+            sequence (int, optional): per stream sequence number. Defaults to 0.
+            send_timestamp_ns (int, optional): epoch ns, None stamps time.time_ns(). Defaults to None.
+            flags (int, optional): header flag bits. Defaults to 0.
+        """
+        if send_timestamp_ns is None:
+            send_timestamp_ns = time.time_ns()
+        return cls.header_struct.pack(cls.magic, cls.version, cls.header_struct.size, flags,
+                                      checksum_type, cls.msg_type_of(msg_bytes), sequence, send_timestamp_ns)
+
+    @classmethod
+    def set_sequence(cls, buffer, sequence, offset=0):
+        """rewrites the sequence number of the version 2 frame body at offset of a writable buffer,
+        the checksum only covers the msg bytes so it stays valid"""
+        cls.sequence_struct.pack_into(buffer, offset + cls.sequence_offset, sequence)
+
+    @classmethod
+    def msg_type_of(cls, msg_bytes):
+        """returns the SkaiMsg type id msg bytes (or msg parts) start with, 0 if too short"""
+        if isinstance(msg_bytes, (list, tuple)):
+            if not msg_bytes or len(msg_bytes[0]) < 2:
+                msg_bytes = b''.join(bytes(memoryview(part)[:2]) for part in msg_bytes)
+            else:
+                msg_bytes = msg_bytes[0]
+        return cls.msg_type_struct.unpack_from(msg_bytes)[0] if len(msg_bytes) >= 2 else 0
+
+    @staticmethod
+    def msg_len(msg_bytes):
+        """returns the length of msg bytes or msg parts"""
+        if isinstance(msg_bytes, (list, tuple)):
+            return sum(len(part) for part in msg_bytes)
+        return len(msg_bytes)
+
+    @classmethod
+    def frame_size(cls, msg_len, checksum_type=None):
+        """returns the bytes of a frame body around msg_len msg bytes, see pack()"""
+        if checksum_type is None:
+            return msg_len + FrameChecksum.sizes[FrameChecksum.Type.MD5]
+        return cls.header_struct.size + msg_len + FrameChecksum.sizes[FrameChecksum.Type(checksum_type)]
+
+    @classmethod
+    def compression_of(cls, header):
+        """returns the FrameCompression.Type a FrameHeader's flags name"""
+        return FrameCompression.Type((header.flags & cls.COMPRESSION) >> cls.compression_shift)
+
+    @classmethod
+    def check_compression(cls, compression, checksum_type):
+        """raises ValueError if frames of checksum_type can't be sent with compression, see pack()"""
+        if not compression:
+            return
+        if checksum_type is None:
+            raise ValueError('compression needs a checksum_type, legacy frames have no flags')
+        if not FrameCompression.is_available(compression):
+            raise ValueError(f'{FrameCompression.Type(compression).name} compression library not installed')
+
+    @classmethod
+    def compress_parts(cls, parts, compression, compress_min_bytes=0):
+        """returns (parts, flags) of msg parts compressed for a version 2 frame
+
+        parts shorter than compress_min_bytes, or that don't get smaller, are returned
+        as they are with flags 0, so the frame goes out uncompressed
+        """
+        if compression is None or compression == FrameCompression.Type.NONE:
+            return parts, 0
+        if cls.msg_len(parts) < compress_min_bytes:
+            return parts, 0
+        compressed = FrameCompression.compress(compression, parts)
+        if len(compressed) >= cls.msg_len(parts):
+            return parts, 0
+        return [compressed], FrameCompression.Type(compression) << cls.compression_shift
+
+    @classmethod
+    def pack(cls, msg_bytes, checksum_type=None, sequence=0, send_timestamp_ns=None, corrupt_checksum=False,
+             compression=None, compress_min_bytes=0):
+        """frames msg_bytes without copying them
+
+        Args:
+            msg_bytes (bytes-like or list): SkaiMsg.pack() or SkaiMsg.pack_parts() output
+            checksum_type (FrameChecksum.Type, optional): None sends a legacy md5 frame that every
+                listener understands, anything else sends a version 2 frame. Defaults to None.
+            sequence (int, optional): per stream sequence number, version 2 only. Defaults to 0.
+            send_timestamp_ns (int, optional): epoch ns, None stamps time.time_ns(). version 2 only. Defaults to None.
+            corrupt_checksum (bool, optional): send an intentionally wrong checksum. Defaults to False.
+            compression (FrameCompression.Type, optional): compress the msg bytes, version 2 only. Defaults to None.
+            compress_min_bytes (int, optional): smaller msgs go out uncompressed. Defaults to 0.
+
+        Returns:
+            list of buffers whose concatenation is the frame body
+        """
+        parts = list(msg_bytes) if isinstance(msg_bytes, (list, tuple)) else [msg_bytes]
+        if checksum_type is None:
+            cls.check_compression(compression, checksum_type)
+            checksum = FrameChecksum.compute(FrameChecksum.Type.MD5, parts)
+            if corrupt_checksum:
+                checksum = FrameChecksum.corrupt(checksum)
+            return parts + [checksum]
+
+        checksum_type = FrameChecksum.Type(checksum_type)
+        compressed, flags = cls.compress_parts(parts, compression, compress_min_bytes)
+        # msg type from the uncompressed msg
+        header = cls.pack_header(parts, checksum_type, sequence, send_timestamp_ns, flags)
+        parts = compressed
+        checksum = FrameChecksum.compute(checksum_type, parts)
+        if corrupt_checksum:
+            checksum = FrameChecksum.corrupt(checksum)
+        return [header] + parts + [checksum]
+
+    @classmethod
+    def pack_bytes(cls, msg_bytes, checksum_type=None, sequence=0, send_timestamp_ns=None, corrupt_checksum=False,
+                   compression=None, compress_min_bytes=0):
+        """same as pack() but joined into a single bytes object"""
+        return b''.join(cls.pack(msg_bytes, checksum_type, sequence, send_timestamp_ns, corrupt_checksum,
+                                 compression, compress_min_bytes))
+
+    @classmethod
+    def pack_batch(cls, msgs, checksum_type, sequence=0, send_timestamp_ns=None, corrupt_checksum=False,
+                   compression=None, compress_min_bytes=0):
+        """frames several msgs as one batch frame, see the class docstring
+
+        the msgs are small by nature (big ones gain nothing from sharing a header), so they
+        are joined into one buffer, which checksums faster than many small parts
+
+        Args:
+            msgs (list): msg bytes or msg parts of every msg, in order
+            checksum_type (FrameChecksum.Type): batches are version 2 frames only, so not None
+            compression (FrameCompression.Type, optional): compress the whole batch, see pack(). Defaults to None.
+            compress_min_bytes (int, optional): smaller batches go out uncompressed. Defaults to 0.
+
+        Returns:
+            list of buffers whose concatenation is the frame body
+        """
+        if checksum_type is None:
+            raise ValueError('batch frames need a checksum_type, legacy frames have no flags')
+        checksum_type = FrameChecksum.Type(checksum_type)
+        items = []
+        msg_types = set()
+        for msg_bytes in msgs:
+            parts = list(msg_bytes) if isinstance(msg_bytes, (list, tuple)) else [msg_bytes]
+            items.append(cls.batch_len_struct.pack(cls.msg_len(parts)))
+            items.extend(parts)
+            msg_types.add(cls.msg_type_of(parts))
+        body = b''.join(items)
+        [body], flags = cls.compress_parts([body], compression, compress_min_bytes)
+        checksum = FrameChecksum.compute(checksum_type, body)
+        if corrupt_checksum:
+            checksum = FrameChecksum.corrupt(checksum)
+        if send_timestamp_ns is None:
+            send_timestamp_ns = time.time_ns()
+        msg_type = msg_types.pop() if len(msg_types) == 1 else 0
+        header = cls.header_struct.pack(cls.magic, cls.version, cls.header_struct.size, cls.BATCH | flags,
+                                        checksum_type, msg_type, sequence, send_timestamp_ns)
+        return [header, body, checksum]
+
+    @classmethod
+    def unbatch(cls, batch):
+        """returns the memoryviews of the msgs in the msg bytes of a batch frame
+
+        Raises:
+            FrameError: an msg length runs past the end of the batch
+        """
+        view = memoryview(batch)
+        msgs = []
+        pos = 0
+        len_size = cls.batch_len_struct.size
+        while pos < len(view):
+            if pos + len_size > len(view):
+                raise FrameError(f'batch truncated at byte {pos} of {len(view)}')
+            msg_len = cls.batch_len_struct.unpack_from(view, pos)[0]
+            pos += len_size
+            if pos + msg_len > len(view):
+                raise FrameError(f'batch msg of {msg_len} bytes runs past the end of the batch')
+            msgs.append(view[pos:pos + msg_len])
+            pos += msg_len
+        return msgs
+
+    @classmethod
+    def pack_into(cls, buffer, offset, msg_bytes, checksum_type=None, sequence=0, send_timestamp_ns=None,
+                  corrupt_checksum=False):
+        """writes the frame body of msg_bytes into a writable buffer at offset, like struct.pack_into
+
+        lets a sender reuse one buffer (e.g. a bytearray, mmap or shared memory) for every
+        frame instead of allocating and joining new bytes per msg. the msg bytes are copied
+        once, checksum and header are written in place. see pack() for the other args.
+        the frame is never compressed, so its size is known before writing it.
+
+        Raises:
+            ValueError: the frame does not fit into buffer past offset
+
+        Returns:
+            int: offset just past the frame body, its size is frame_size(msg_len(msg_bytes), checksum_type)
+        """
+        parts = list(msg_bytes) if isinstance(msg_bytes, (list, tuple)) else [msg_bytes]
+        msg_len = cls.msg_len(parts)
+        end = offset + cls.frame_size(msg_len, checksum_type)
+        if end > len(buffer):
+            raise ValueError(f'{end - offset} byte frame does not fit into {len(buffer) - offset} bytes of buffer')
+
+        view = memoryview(buffer)
+        if checksum_type is None:
+            checksum_type = FrameChecksum.Type.MD5
+            pos = offset
+        else:
+            checksum_type = FrameChecksum.Type(checksum_type)
+            if send_timestamp_ns is None:
+                send_timestamp_ns = time.time_ns()
+            cls.header_struct.pack_into(view, offset, cls.magic, cls.version, cls.header_struct.size, 0,
+                                        checksum_type, cls.msg_type_of(parts), sequence, send_timestamp_ns)
+            pos = offset + cls.header_struct.size
+        for part in parts:
+            view[pos:pos + len(part)] = part
+            pos += len(part)
+        # checksum the msg bytes where they now sit, one contiguous buffer instead of the parts
+        checksum = FrameChecksum.compute(checksum_type, view[pos - msg_len:pos])
+        if corrupt_checksum:
+            checksum = FrameChecksum.corrupt(checksum)
+        view[pos:end] = checksum
+        view.release()
+        return end
+
+    @classmethod
+    def is_legacy(cls, body):
+        return len(body) < 2 or body[:2] != cls.magic
+
+    @classmethod
+    def parse_header(cls, body):
+        """returns (header length, FrameHeader) of a frame body or record, header length is 0 for legacy ones
+
+        Raises:
+            FrameError: malformed header or unknown checksum type
+        """
+        if cls.is_legacy(body):
+            return 0, cls.legacy_header
+        if len(body) < cls.header_struct.size:
+            raise FrameError(f'frame of {len(body)} bytes too short for its header')
+        _, version, header_len, flags, checksum_type, msg_type, sequence, send_timestamp_ns = cls.header_struct.unpack_from(body)
+        if version < 2 or header_len < cls.header_struct.size:
+            raise FrameError(f'bad frame header version {version} length {header_len}')
+        try:
+            checksum_type = FrameChecksum.Type(checksum_type)
+        except ValueError:
+            raise FrameError(f'unknown checksum type {checksum_type}')
+        return header_len, FrameHeader(version, flags, checksum_type, msg_type, sequence, send_timestamp_ns)
+
+    @classmethod
+    def parse(cls, body, verify=True):
+        """locates the msg bytes inside a frame body and verifies the checksum
+
+        Args:
+            body (bytes-like): frame body
+            verify (bool, optional): check the checksum. Defaults to True.
+
+        Raises:
+            FrameError: body is malformed or uses a checksum this install can't compute
+            ChecksumError: checksum mismatch
+
+        Returns:
+            (int, int, FrameHeader): msg bytes are body[start:end]
+        """
+        start, header = cls.parse_header(body)
+
+        checksum_len = FrameChecksum.sizes[header.checksum_type]
+        end = len(body) - checksum_len
+        if end < start:
+            raise FrameError(f'frame of {len(body)} bytes too short')
+
+        if verify and checksum_len:
+            if not FrameChecksum.is_available(header.checksum_type):
+                raise FrameError(f'{header.checksum_type.name} checksum library not installed')
+            view = memoryview(body)
+            ok = view[end:] == FrameChecksum.compute(header.checksum_type, view[start:end])
+            view.release()
+            if not ok:
+                raise ChecksumError('checksum failed')
+
+        return start, end, header
+
+    @classmethod
+    def unpack(cls, body, verify=True):
+        """returns (memoryview of the msg bytes, FrameHeader), see parse()"""
+        start, end, header = cls.parse(body, verify)
+        return memoryview(body)[start:end], header
+
+    @classmethod
+    def unpack_inplace(cls, body, verify=True):
+        """trims a bytearray body down to its msg bytes in place and returns the FrameHeader, see parse()"""
+        start, end, header = cls.parse(body, verify)
+        del body[end:]
+        del body[:start]
+        return header
+
+    @classmethod
+    def strip_checksum(cls, body, verify=True):
+        """returns (memoryview of the record, FrameHeader), see parse() and split()"""
+        start, end, header = cls.parse(body, verify)
+        return memoryview(body)[:end], header
+
+    @classmethod
+    def strip_checksum_inplace(cls, body, verify=True):
+        """trims the checksum off a bytearray body in place, leaving the record. returns the FrameHeader"""
+        start, end, header = cls.parse(body, verify)
+        del body[end:]
+        return header
+
+    @classmethod
+    def split(cls, record):
+        """returns (msg bytes, FrameHeader) of a record
+
+        legacy records are returned as is, versioned ones as a memoryview past the header,
+        compressed ones as the decompressed bytes
+
+        Raises:
+            FrameError: unknown or not installed codec, or the msg bytes don't decompress
+        """
+        header_len, header = cls.parse_header(record)
+        if not header_len:
+            return record, header
+        msg_bytes = memoryview(record)[header_len:]
+        if header.flags & cls.COMPRESSION:
+            try:
+                msg_bytes = FrameCompression.decompress(cls.compression_of(header), msg_bytes)
+            except Exception as e:
+                raise FrameError(f'could not decompress frame: {e}')
+        return msg_bytes, header
+
+    @classmethod
+    def split_msgs(cls, record):
+        """returns (list of msg bytes, FrameHeader) of a record, a batch record's msgs unbatched,
+        any other record's msg bytes as the only item, see split()
+
+        Raises:
+            FrameError: malformed batch
+        """
+        msg_bytes, header = cls.split(record)
+        if header.flags & cls.BATCH:
+            return cls.unbatch(msg_bytes), header
+        return [msg_bytes], header
@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+
+
+class StreamStats:
+    """drop, reorder and one-way latency bookkeeping for one sender stream
+
+    fed the FrameHeader of every frame received on a connection. legacy
+    frames carry no sequence or send timestamp, they are only counted.
+
+    latency is receive time minus the sender's send timestamp, so across
+    hosts it is only as good as their clock sync (ntp / ptp).
+    """
+
+    def __init__(self):
+        self.received = 0
+        self.dropped = 0        # sequence numbers skipped over
+        self.reordered = 0      # frames arriving below the expected sequence (late or resent)
+        self.next_sequence = None
+
+        self.latency_count = 0
+        self.latency_sum_ns = 0
+        self.latency_min_ns = None
+        self.latency_max_ns = None
+        self.last_latency_ns = None
+
+    def update(self, header, recv_timestamp):
+        """
+        Args:
+            header (FrameHeader): header of the received frame
+            recv_timestamp (float): epoch seconds the frame started arriving
+
+        Returns:
+            int: number of frames skipped right before this one (0 if in order)
+        """
+        self.received += 1
+        gap = 0
+        sequence = header.sequence
+        if sequence is not None:
+            if self.next_sequence is None or sequence == self.next_sequence:
+                self.next_sequence = sequence + 1
+            elif sequence > self.next_sequence:
+                gap = sequence - self.next_sequence
+                self.dropped += gap
+                self.next_sequence = sequence + 1
+            else:
+                self.reordered += 1
+
+        if header.send_timestamp_ns is not None:
+            latency_ns = int(recv_timestamp * 1e9) - header.send_timestamp_ns
+            self.last_latency_ns = latency_ns
+            self.latency_count += 1
+            self.latency_sum_ns += latency_ns
+            if self.latency_min_ns is None or latency_ns < self.latency_min_ns:
+                self.latency_min_ns = latency_ns
+            if self.latency_max_ns is None or latency_ns > self.latency_max_ns:
+                self.latency_max_ns = latency_ns
+        return gap
+
+    @property
+    def mean_latency_ns(self):
+        if not self.latency_count:
+            return None
+        return self.latency_sum_ns / self.latency_count
+
+    def __str__(self):
+        summary = f'received {self.received} dropped {self.dropped} reordered {self.reordered}'
+        if self.latency_count:
+            summary += (f' latency ms mean {self.mean_latency_ns / 1e6:.3f}'
+                        f' min {self.latency_min_ns / 1e6:.3f} max {self.latency_max_ns / 1e6:.3f}')
+        return summary
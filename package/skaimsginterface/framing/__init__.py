@@ -0,0 +1,4 @@
+from .FrameChecksum import FrameChecksum
+from .FrameCompression import FrameCompression
+from .SkaiFrame import SkaiFrame, FrameHeader, FrameError, ChecksumError
+from .StreamStats import StreamStats
@@ -0,0 +1,184 @@
+#!/usr/bin/python3
+
+import time
+import struct
+from multiprocessing import shared_memory
+
+
+class ShmRingBuffer:
+    """single producer / single consumer byte ring on multiprocessing.shared_memory
+
+    carries variable length records between two processes without pickling.
+    the producer copies a payload into the ring once, the consumer gets a
+    memoryview straight into shared memory (no copy) that stays valid until
+    release() is called.
+
+    layout:
+        [0:8]     head (total bytes ever written, only the producer stores it)
+        [8:16]    capacity of the data region
+        [64:72]   tail (total bytes ever consumed, only the consumer stores it)
+        [128:]    data region, records are 8 byte aligned and never split:
+                  [u32 length][4 pad][f64 timestamp][payload][pad to 8]
+                  a length of 0xFFFFFFFF marks the unused space at the end of
+                  the data region when the next record did not fit there
+
+    head and tail are each written by a single side, so no locks are needed.
+    several threads of the producer process must share a threading.Lock
+    around write(); several producer processes should each get their own ring.
+
+    example:
+        ring = ShmRingBuffer(create=True, size=16 * 1024 * 1024)
+        # producer process
+        ring.write(msg_bytes, time.time())
+        # consumer process
+        record = ring.read()
+        if record is not None:
+            view, timestamp = record
+            ... # use view
+            view.release()
+            ring.release()
+    """
+
+    index_struct = struct.Struct('<Q')
+    record_struct = struct.Struct('<I4xd')
+    marker_struct = struct.Struct('<I')
+    head_offset = 0
+    capacity_offset = 8
+    tail_offset = 64
+    data_offset = 128
+    wrap_marker = 0xFFFFFFFF
+
+    def __init__(self, name=None, create=False, size=16 * 1024 * 1024):
+        """
+        Args:
+            name (str, optional): shared memory block name to attach to (or create with). Defaults to a random name.
+            create (bool, optional): create a new block instead of attaching to an existing one. Defaults to False.
+            size (int, optional): size of the data region in bytes when creating. Defaults to 16 MB.
+        """
+        if create:
+            # round data region down to 8 byte alignment
+            size -= size % 8
+            if size < 64:
+                raise ValueError('ShmRingBuffer size must be at least 64 bytes')
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=self.data_offset + size)
+            self.buf = self.shm.buf
+            self.index_struct.pack_into(self.buf, self.head_offset, 0)
+            self.index_struct.pack_into(self.buf, self.capacity_offset, size)
+            self.index_struct.pack_into(self.buf, self.tail_offset, 0)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.buf = self.shm.buf
+
+        # shm.size may be rounded up to a page, capacity is what the creator asked for
+        self.capacity = self.index_struct.unpack_from(self.buf, self.capacity_offset)[0]
+
+        # each side caches its own index, reads the other side's from shared memory
+        self.head = self.index_struct.unpack_from(self.buf, self.head_offset)[0]
+        self.tail = self.index_struct.unpack_from(self.buf, self.tail_offset)[0]
+        self.pending = 0
+
+    def __reduce__(self):
+        # attach by name when handed to another process
+        return (self.__class__, (self.shm.name, False))
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def max_payload_size(self):
+        # anything bigger than half the ring could wait forever for contiguous space
+        return self.capacity // 2 - self.record_struct.size - 8
+
+    def used_bytes(self):
+        head = self.index_struct.unpack_from(self.buf, self.head_offset)[0]
+        tail = self.index_struct.unpack_from(self.buf, self.tail_offset)[0]
+        return head - tail
+
+    """ producer side """
+
+    def try_write(self, payload, timestamp):
+        """copies payload into the ring if there is room
+
+        Returns:
+            bool: whether the record was written
+        """
+        length = len(payload)
+        if length > self.max_payload_size:
+            raise ValueError(f'payload of {length} bytes exceeds max_payload_size {self.max_payload_size} of the ring')
+        reclen = (self.record_struct.size + length + 7) & ~7
+
+        pos = self.head % self.capacity
+        waste = self.capacity - pos if pos + reclen > self.capacity else 0
+        tail = self.index_struct.unpack_from(self.buf, self.tail_offset)[0]
+        if self.capacity - (self.head - tail) < waste + reclen:
+            return False
+
+        if waste:
+            # record would straddle the end, mark the rest unused and start over at 0
+            self.marker_struct.pack_into(self.buf, self.data_offset + pos, self.wrap_marker)
+            pos = 0
+
+        start = self.data_offset + pos
+        self.record_struct.pack_into(self.buf, start, length, timestamp)
+        start += self.record_struct.size
+        self.buf[start:start + length] = payload
+
+        # publish only after the record is fully written
+        self.head += waste + reclen
+        self.index_struct.pack_into(self.buf, self.head_offset, self.head)
+        return True
+
+    def write(self, payload, timestamp, stop_event=None, poll_sec=0.0005):
+        """copies payload into the ring, waiting for the consumer to free up room if needed
+
+        Returns:
+            bool: whether the record was written (False only if stop_event got set while waiting)
+        """
+        while not self.try_write(payload, timestamp):
+            if stop_event is not None and stop_event.is_set():
+                return False
+            time.sleep(poll_sec)
+        return True
+
+    """ consumer side """
+
+    def read(self):
+        """returns the oldest unread record without copying it
+
+        Returns:
+            (memoryview, float) tuple of (payload, timestamp), or None if the ring is empty.
+            call release() once done with the payload to free its space
+        """
+        if self.pending:
+            raise RuntimeError('release() the previous record before reading the next one')
+
+        while True:
+            head = self.index_struct.unpack_from(self.buf, self.head_offset)[0]
+            if self.tail == head:
+                return None
+            pos = self.tail % self.capacity
+            if self.marker_struct.unpack_from(self.buf, self.data_offset + pos)[0] == self.wrap_marker:
+                # skip unused space at the end of the data region
+                self.tail += self.capacity - pos
+                self.index_struct.pack_into(self.buf, self.tail_offset, self.tail)
+                continue
+            length, timestamp = self.record_struct.unpack_from(self.buf, self.data_offset + pos)
+            start = self.data_offset + pos + self.record_struct.size
+            self.pending = (self.record_struct.size + length + 7) & ~7
+            return self.buf[start:start + length], timestamp
+
+    def release(self):
+        """frees the space of the record returned by the last read()"""
+        self.tail += self.pending
+        self.pending = 0
+        self.index_struct.pack_into(self.buf, self.tail_offset, self.tail)
+
+    """ lifetime """
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
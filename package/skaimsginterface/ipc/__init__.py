@@ -0,0 +1 @@
+from .ShmRingBuffer import ShmRingBuffer
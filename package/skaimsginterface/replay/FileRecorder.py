@@ -3,14 +3,43 @@
 # if it breaks contact: Philip Wolfe <pwolfe854@gmail.com>
 
 from skaimsginterface.skaimessages import *
+from skaimsginterface.framing import SkaiFrame
+from skaimsginterface.replay.SkaibinReader import SkaibinReader
+from skaimsginterface.replay.SkaibinIndex import SkaibinIndex
+from skaimsginterface.replay.SkaibinSegments import SkaibinSegments
+from skaimsginterface.replay.SafeWriter import SafeWriter
 import struct
 from pathlib import Path
-from queue import Queue, Empty
-from threading import Thread
+from queue import Empty
+from threading import Thread, Lock, Event
 import multiprocessing as mp
 
 class FileRecorder:
-    def __init__(self, filepath, append=False) -> None:       
+
+    # mp_record_process tuning
+    queue_timeout_sec = 0.1     # max blocking wait on the record queue before rechecking the stop event
+    max_batch = 256             # max queued records joined into one write
+
+    # index sidecar SafeWriter buffers, entries are 20 bytes per record
+    index_capacity_bytes = 4 * 1024 * 1024
+
+    def __init__(self, filepath, append=False, index=False, max_segment_bytes=None, max_segment_sec=None,
+                 fsync_interval_s=1.0, capacity_bytes=64 * 1024 * 1024, overflow_policy='block') -> None:
+        """
+        Args:
+            filepath (str): .skaibin file, or directory of segments when segmenting
+            append (bool, optional): add to an existing recording instead of replacing it. Defaults to False.
+            index (bool, optional): write a SkaibinIndex along with the recording. Defaults to False.
+            max_segment_bytes (int, optional): record into a SkaibinSegments directory, rotating segments
+                at this size. Defaults to None.
+            max_segment_sec (float, optional): record into a SkaibinSegments directory, rotating segments
+                after this many seconds of records. Defaults to None.
+            fsync_interval_s (float, optional): how often segments are flushed and fsynced, see
+                SkaibinSegments. Defaults to 1.0.
+            capacity_bytes (int, optional): bytes of records buffered at most, see SafeWriter. Defaults to 64 MB.
+            overflow_policy (str, optional): what record() does when the buffer is full, 'block' waits for the
+                disk and 'drop_newest' drops the record and returns False. Defaults to 'block'.
+        """
         # check filepath ends in skaibin
         if not isinstance(filepath, str):
             raise TypeError('FileRecorder file must by type str')
@@ -20,17 +49,54 @@ class FileRecorder:
         self.filepath = filepath
         self.modifier = 'ab' if append else 'wb'
         self.fd = None
+        # sidecar index (see SkaibinIndex) and the offset of the next record in the file
+        self.index = index
+        self.index_fd = None
+        self.offset = 0
+        self.write_lock = Lock()    # listener threads record concurrently, offsets must match the write order
+        # checksummed, rotating segments instead of one file (see SkaibinSegments)
+        self.segmented = max_segment_bytes is not None or max_segment_sec is not None
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_sec = max_segment_sec
+        self.fsync_interval_s = fsync_interval_s
+        self.capacity_bytes = capacity_bytes
+        self.overflow_policy = overflow_policy
+        self.segments = None
+        self.sync_stop = Event()
 
     def open(self):
         # create directory if needed
         self.create_directory_if_needed(self.filepath)
         # open with either append or write binary
         print(f'opening file {self.filepath} in mode {self.modifier}')
-        self.fd = SafeWriter(self.filepath, self.modifier)
-        # self.fd = open(self.filepath, self.modifier)
+        if self.segmented:
+            self.segments = SkaibinSegments(self.filepath, self.max_segment_bytes, self.max_segment_sec,
+                                            self.fsync_interval_s, append=self.modifier == 'ab', index=self.index,
+                                            capacity_bytes=self.capacity_bytes, overflow_policy=self.overflow_policy)
+            self.segments.open()
+            # keeps the manifest current even while no msgs come in, the SafeWriters fsync on their own
+            self.sync_stop.clear()
+            if self.fsync_interval_s is not None:
+                Thread(name='SegmentSync', target=self.sync_segments, daemon=True).start()
+            return
+        if self.index:
+            self.offset = SkaibinIndex.prepare(self.filepath, append=self.modifier == 'ab')
+            self.index_fd = SafeWriter(SkaibinIndex.index_path(self.filepath), 'ab',
+                                       capacity_bytes=self.index_capacity_bytes)
+        self.fd = SafeWriter(self.filepath, self.modifier, capacity_bytes=self.capacity_bytes,
+                             overflow_policy=self.overflow_policy)
+
+    def sync_segments(self):
+        while not self.sync_stop.wait(self.fsync_interval_s):
+            with self.write_lock:
+                if self.segments is not None:
+                    self.segments.sync()
 
     @staticmethod
-    def mp_record_process(stop_event, print_q, msg_in_q, filepath, append=False, verbose=False):
+    def mp_record_process(stop_event, print_q, msg_in_q, filepath, append=False, verbose=False, index=False,
+                          max_segment_bytes=None, max_segment_sec=None, fsync_interval_s=1.0):
+        """records what listeners put on msg_in_q, (msg bytes, epoch timestamp, port) tuples, None stops it.
+        takes FileRecorder's options, see __init__"""
 
         # check filepath is str and ends in skaibin
         if not isinstance(filepath, str):
@@ -42,31 +108,86 @@ class FileRecorder:
         FileRecorder.create_directory_if_needed(filepath)
         modifier = 'ab' if append else 'wb'
 
+        f = None
+        index_f = None
+        segments = None
         try:
-            # open file
-            print_q.put(f'recording to file {filepath}, append={append}')
-            f = open(filepath, modifier)
+            # open file, and its sidecar index if wanted, or the segments directory
+            if print_q is not None:
+                print_q.put(f'recording to file {filepath}, append={append}, index={index}')
+            if max_segment_bytes is not None or max_segment_sec is not None:
+                segments = SkaibinSegments(filepath, max_segment_bytes, max_segment_sec, fsync_interval_s,
+                                           append=append, index=index).open()
+            else:
+                if index:
+                    offset = SkaibinIndex.prepare(filepath, append)
+                    index_f = open(SkaibinIndex.index_path(filepath), 'ab')
+                f = open(filepath, modifier)
             
-            # query queue and write to file when not empty
-            while not stop_event.is_set():
-                if not msg_in_q.empty():
+            # block until something to record, then drain everything else already queued
+            # and write the whole batch with a single write call. after the stop event
+            # keep going until the queue is empty so queued records are not lost
+            stopping = False
+            while not stopping:
+                try:
+                    item = msg_in_q.get(timeout=FileRecorder.queue_timeout_sec)
+                except Empty:
+                    if segments is not None:
+                        segments.sync()
+                    if stop_event.is_set():
+                        break
+                    continue
+                records = []
+                entries = []
+                num_records = 0
+                while item is not None:
                     # get info from queue
-                    msg_bytes, epoch_timestamp, port = msg_in_q.get()
-                            
-                    # pack msg type + protobuf serialized according to SkaiMsg type
-                    # append timestamp (double) port(uint16) & length (integer)
-                    msg_bytes = struct.pack('!dHI', epoch_timestamp, port, len(msg_bytes)) + msg_bytes
-                    if verbose:
-                        print_q.put(f'writing to file...')
+                    msg_bytes, epoch_timestamp, port = item
+                    num_records += 1
+
+                    if segments is not None:
+                        # buffered by the segment file, see SkaibinSegments
+                        segments.write(msg_bytes, epoch_timestamp, port)
+                    else:
+                        # pack msg type + protobuf serialized according to SkaiMsg type
+                        # append timestamp (double) port(uint16) & length (integer)
+                        records.append(struct.pack('!dHI', epoch_timestamp, port, len(msg_bytes)))
+                        records.append(msg_bytes)
+                    if index_f is not None:
+                        entries.append(SkaibinIndex.pack_entry(epoch_timestamp, port, msg_bytes, offset))
+                        offset += SkaibinIndex.record_struct.size + len(msg_bytes)
+                    if num_records >= FileRecorder.max_batch:
+                        break
+                    try:
+                        item = msg_in_q.get_nowait()
+                    except Empty:
+                        break
+                # None is the stop sentinel
+                stopping = item is None
 
-                    # write to file
-                    f.write(msg_bytes)
+                if num_records and verbose and print_q is not None:
+                    print_q.put(f'writing {num_records} records to file...')
+                if segments is not None:
+                    segments.sync()
+                if records:
+                    # write to file, then index what was written
+                    f.write(b''.join(records))
+                    if index_f is not None:
+                        f.flush()
+                        index_f.write(b''.join(entries))
 
         except Exception as e:
-            print_q.put(f'mp_record_process got exception {e}')
+            if print_q is not None:
+                print_q.put(f'mp_record_process got exception {e}')
         finally:
-            print_q.put(f'mp_record_process closing file {filepath}')
-            f.close()
+            if print_q is not None:
+                print_q.put(f'mp_record_process closing file {filepath}')
+            if f is not None:
+                f.close()
+            if index_f is not None:
+                index_f.close()
+            if segments is not None:
+                segments.close()
             
 
 
@@ -76,36 +197,60 @@ class FileRecorder:
         p.parent.mkdir(exist_ok=True, parents=True)
 
     def close(self):
-        if self.fd is not None:
+        if self.segments is not None:
+            self.sync_stop.set()
+            with self.write_lock:
+                self.segments.close()
+                self.segments = None
+        elif self.fd is not None:
             self.fd.close()
             self.fd = None
+            if self.index_fd is not None:
+                self.index_fd.close()
+                self.index_fd = None
         else:
             print('Cannot close file if never opened')
 
     def record(self, msg_bytes, epoch_timestamp, port):
         """ 
             params:
-                msgbytes: bytes result of msgtype.pack(protobuf)
+                msgbytes: bytes result of msgtype.pack(protobuf), or a listener record
+                    (frame header + msg bytes, see SkaiFrame.split)
                 epoch_timestamp (double): epoch time
                 port (uint16): the port received on
 
             ret:
-                success (bool): whether recording was successful or not
+                success (bool): whether recording was successful or not, False when not open
+                    or dropped by overflow_policy
         """
-        if self.fd is None:
+        if self.fd is None and self.segments is None:
             print('cannot write if recorder is not opened yet. call the open() function first')
             # return success = False
             return False
 
+        if self.segments is not None:
+            with self.write_lock:
+                return self.segments.write(msg_bytes, epoch_timestamp, port)
+
         # pack msg type + protobuf serialized according to SkaiMsg type
         # append timestamp (double) port(uint16) & length (integer)
-        msg_bytes = struct.pack('!dHI', epoch_timestamp, port, len(msg_bytes)) + msg_bytes
-        # write to file
-        print('writing to file...')
-        self.fd.write(msg_bytes)
-
-        # return success = True
+        prefix = struct.pack('!dHI', epoch_timestamp, port, len(msg_bytes))
+        # copied into the write buffer, see SafeWriter
+        if self.index_fd is None:
+            return self.fd.write(prefix, msg_bytes)
+        with self.write_lock:
+            if not self.fd.write(prefix, msg_bytes):
+                return False
+            self.index_fd.write(SkaibinIndex.pack_entry(epoch_timestamp, port, msg_bytes, self.offset))
+            self.offset += len(prefix) + len(msg_bytes)
         return True
+
+    def stats(self):
+        """returns the recording's write stats (throughput, lag, drops, blocking), see SafeWriter.stats()"""
+        if self.segments is not None:
+            with self.write_lock:
+                return self.segments.stats()
+        return self.fd.stats() if self.fd is not None else {}
         
 
     @classmethod 
@@ -122,54 +267,32 @@ class FileRecorder:
         return retlist
 
     @classmethod
-    def parseRecordedFileForReplay(cls, filepath):
+    def parseRecordedFileForReplay(cls, filepath, start_time=None, end_time=None):
         """
+            start_time / end_time (epoch, optional): only the msgs received in between, see parseRecordedFileWithHeaders
+
             returns:
                 list of tuples of form (timestamp, port, bytes2replay)
         """
-        msgbytes = cls._readRecordedBytes(filepath)
-        retlist = []
-        idx = 0
-        while idx < len(msgbytes):
-            # unpack timestamp & length
-            headerlen = 8+2+4
-            timestamp, port, length = struct.unpack('!dHI', msgbytes[idx:idx+headerlen])
-            # increment to start of SkaiMsg
-            idx += headerlen
-            # unapck message type and message
-            bytes2replay = msgbytes[idx:idx+length]
-            retlist.append( (timestamp, port, bytes2replay) )
-            idx += length
+        return [ (timestamp, port, bytes2replay) for timestamp, port, header, bytes2replay
+                 in cls.parseRecordedFileWithHeaders(filepath, start_time, end_time) ]
 
-        return retlist
+    @classmethod
+    def parseRecordedFileWithHeaders(cls, filepath, start_time=None, end_time=None):
+        """
+            records of versioned frames keep the sender's frame header (msg type,
+            sequence, send timestamp), legacy ones get SkaiFrame.legacy_header.
+            a recorded batch frame turns into one tuple per msg, all with the batch's header,
+            compressed frames are decompressed. every msg is copied into the list, iterate
+            a SkaibinReader instead for recordings that don't fit in memory.
+            start_time / end_time (epoch, optional) seek to the msgs received in between
+            with the recording's SkaibinIndex instead of reading the whole file
 
-    @staticmethod
-    def _readRecordedBytes(filepath):
-        return Path(filepath).read_bytes()
-
-class SafeWriter:
-    def __init__(self, *args):
-        self.filewriter = open(*args)
-        self.queue = Queue()
-        self.finished = False
-        Thread(name = "SafeWriter", target=self.internal_writer).start()  
-    
-    def write(self, data):
-        self.queue.put(data)
-    
-    def internal_writer(self):
-        while not self.finished:
-            try:
-                data = self.queue.get(True, 1)
-            except Empty:
-                continue    
-            self.filewriter.write(data)
-            self.queue.task_done()
-    
-    def close(self):
-        self.queue.join()
-        self.finished = True
-        self.filewriter.close()
+            returns:
+                list of tuples of form (timestamp, port, FrameHeader, bytes2replay)
+        """
+        with SkaibinReader(filepath, start_time=start_time, end_time=end_time) as reader:
+            return [ (timestamp, port, header, bytes(msg_bytes)) for timestamp, port, header, msg_bytes in reader ]
 
 if __name__=='__main__':
     from examples.test_skaimot import create_example_skaimotmsg
@@ -10,11 +10,12 @@ from skaimsginterface.tcp import TcpSender
 from skaimsginterface.udp import UdpSender
 
 class ReplayModule:
-    def __init__(self, filepath, udp_or_tcp, analyze_only=False, camgroupchange=None) -> None:
+    def __init__(self, filepath, udp_or_tcp, analyze_only=False, camgroupchange=None, start_time=None, end_time=None) -> None:
         self.analyze_only = analyze_only
 
         # parses file to get list of tuples: (timestamp, port, bytes2replay)
-        retlist = FileRecorder.parseRecordedFileForReplay(filepath)
+        # start_time / end_time (epoch) replay just that window, seeking with the recording's SkaibinIndex
+        retlist = FileRecorder.parseRecordedFileForReplay(filepath, start_time, end_time)
 
         print(f'ReplayModule parsed {filepath} for total of {len(retlist)} messages')
 
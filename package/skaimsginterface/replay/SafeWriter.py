@@ -0,0 +1,194 @@
+#!/usr/bin/python3
+
+import os
+import time
+from threading import Thread, Condition
+
+
+class SafeWriter:
+    """writes to a file from a background thread, so recording never waits on the disk
+
+    write() copies the data into a preallocated buffer and returns. the writer
+    thread swaps that buffer for a second one and writes all of it with one write
+    call, so however fast records come in there is one syscall per batch of them
+    (whatever accumulated during the previous write) and no allocation per record.
+    capacity_bytes bounds the memory: when the buffer being filled is full,
+    overflow_policy decides what write() does:
+        block        wait for the writer thread to catch up
+        drop_newest  drop the data and return False
+    data bigger than a buffer is written by the calling thread itself once the
+    buffered data is out, whatever the policy.
+
+    with fsync_interval_s the writer thread fsyncs what it wrote at most that
+    often, and on close(). stats() reports throughput, lag, drops and blocking.
+    """
+
+    overflow_policies = ('block', 'drop_newest')
+
+    # counters summed by merge_stats(), the other stats() fields are current values or maxima
+    counter_fields = ('records', 'bytes', 'writes', 'write_sec', 'fsyncs', 'dropped', 'dropped_bytes', 'blocked',
+                      'blocked_sec')
+
+    def __init__(self, *args, capacity_bytes=64 * 1024 * 1024, overflow_policy='block', fsync_interval_s=None):
+        """
+        Args:
+            args: open() args, file path and mode
+            capacity_bytes (int, optional): bytes buffered at most, in two buffers of half of it. Defaults to 64 MB.
+            overflow_policy (str, optional): one of overflow_policies. Defaults to 'block'.
+            fsync_interval_s (float, optional): fsync written data at most this often, None never. Defaults to None.
+        """
+        if overflow_policy not in self.overflow_policies:
+            raise ValueError(f'unknown overflow_policy {overflow_policy}, expected one of {self.overflow_policies}')
+        self.filewriter = open(*args)
+        self.overflow_policy = overflow_policy
+        self.fsync_interval_s = fsync_interval_s
+        # the buffer write() fills and the spare one, None while the writer thread writes it out
+        self.buffer = bytearray(capacity_bytes // 2)
+        self.spare = bytearray(capacity_bytes // 2)
+        self.fill = 0
+        self.oldest = None          # monotonic time of the first data in buffer
+        self.writing_oldest = None  # and of the buffer being written
+        self.writing_fill = 0
+        self.cond = Condition()
+        self.finished = False
+        self.dirty = False          # written but not fsynced
+        self.last_fsync = time.monotonic()
+        self.opened = time.monotonic()
+        self.counters = dict.fromkeys(self.counter_fields, 0)
+        self.max_lag_sec = 0.0
+        self.thread = Thread(name='SafeWriter', target=self.internal_writer)
+        self.thread.start()
+
+    def write(self, *parts):
+        """queues the concatenation of parts (bytes-like) for writing
+
+        Returns:
+            bool: False if overflow_policy dropped it
+        """
+        size = sum(len(part) for part in parts)
+        with self.cond:
+            if self.fill + size > len(self.buffer):
+                if size > len(self.buffer):
+                    self.write_through(parts, size)
+                    return True
+                if self.overflow_policy == 'drop_newest':
+                    self.counters['dropped'] += 1
+                    self.counters['dropped_bytes'] += size
+                    return False
+                self.counters['blocked'] += 1
+                start = time.perf_counter()
+                while self.fill + size > len(self.buffer):
+                    self.cond.wait()
+                self.counters['blocked_sec'] += time.perf_counter() - start
+            if not self.fill:
+                self.oldest = time.monotonic()
+                # the writer thread only waits while there is nothing to write
+                self.cond.notify_all()
+            buffer, fill = self.buffer, self.fill
+            for part in parts:
+                buffer[fill:fill + len(part)] = part
+                fill += len(part)
+            self.fill = fill
+            self.counters['records'] += 1
+            self.counters['bytes'] += size
+        return True
+
+    def write_through(self, parts, size):
+        # called holding cond: waits until everything buffered is written, writes parts itself
+        start = time.perf_counter()
+        while self.fill or self.spare is None:
+            self.cond.wait()
+        for part in parts:
+            self.filewriter.write(part)
+        self.dirty = True
+        self.counters['records'] += 1
+        self.counters['bytes'] += size
+        self.counters['writes'] += len(parts)
+        self.counters['write_sec'] += time.perf_counter() - start
+        # the writer thread schedules the fsync
+        self.cond.notify_all()
+
+    def fsync_due(self):
+        return self.fsync_interval_s is not None and self.dirty and \
+            time.monotonic() - self.last_fsync >= self.fsync_interval_s
+
+    def fsync_wait(self):
+        """seconds until written data is due an fsync, None if there is none"""
+        if self.fsync_interval_s is None or not self.dirty:
+            return None
+        return max(0.0, self.last_fsync + self.fsync_interval_s - time.monotonic())
+
+    def internal_writer(self):
+        while True:
+            with self.cond:
+                while not self.fill and not self.finished and not self.fsync_due():
+                    self.cond.wait(self.fsync_wait())
+                if not self.fill and self.finished:
+                    break
+                # swap buffers, write() goes on filling the spare one meanwhile
+                buffer, fill, self.writing_oldest, self.writing_fill = self.buffer, self.fill, self.oldest, self.fill
+                self.buffer, self.spare, self.fill, self.oldest = self.spare, None, 0, None
+                self.cond.notify_all()
+            if fill:
+                start = time.perf_counter()
+                self.filewriter.write(memoryview(buffer)[:fill])
+                write_sec = time.perf_counter() - start
+                self.dirty = True
+            if self.fsync_due():
+                self.fsync()
+            with self.cond:
+                if fill:
+                    self.counters['writes'] += 1
+                    self.counters['write_sec'] += write_sec
+                    self.max_lag_sec = max(self.max_lag_sec, time.monotonic() - self.writing_oldest)
+                self.spare, self.writing_oldest, self.writing_fill = buffer, None, 0
+                self.cond.notify_all()
+
+    def fsync(self):
+        self.filewriter.flush()
+        os.fsync(self.filewriter.fileno())
+        self.dirty = False
+        self.last_fsync = time.monotonic()
+        self.counters['fsyncs'] += 1
+
+    def flush(self):
+        """waits until everything written so far is in the file"""
+        with self.cond:
+            while self.fill or self.spare is None:
+                self.cond.wait()
+        self.filewriter.flush()
+
+    def stats(self):
+        """returns a dict of the counters, plus
+            buffered_bytes  written and not yet in the file
+            lag_sec         age of the oldest of those, 0 when there are none
+            max_lag_sec     the most any data waited to be written
+            mb_per_sec      bytes written per second since open
+        """
+        with self.cond:
+            stats = dict(self.counters)
+            now = time.monotonic()
+            oldest = [t for t in (self.writing_oldest, self.oldest) if t is not None]
+            stats['buffered_bytes'] = self.fill + self.writing_fill
+            stats['lag_sec'] = now - min(oldest) if oldest else 0.0
+            stats['max_lag_sec'] = self.max_lag_sec
+            stats['mb_per_sec'] = (stats['bytes'] - stats['buffered_bytes']) / 1e6 / max(now - self.opened, 1e-9)
+        return stats
+
+    @classmethod
+    def merge_stats(cls, stats, other):
+        """returns stats of two writers, e.g. a recording's closed and open segments"""
+        merged = dict(other)
+        for field in cls.counter_fields:
+            merged[field] = stats.get(field, 0) + other.get(field, 0)
+        merged['max_lag_sec'] = max(stats.get('max_lag_sec', 0.0), other.get('max_lag_sec', 0.0))
+        return merged
+
+    def close(self):
+        with self.cond:
+            self.finished = True
+            self.cond.notify_all()
+        self.thread.join()
+        if self.fsync_interval_s is not None:
+            self.fsync()
+        self.filewriter.close()
@@ -0,0 +1,508 @@
+#!/usr/bin/python3
+
+import os
+import json
+import zipfile
+import numpy as np
+from pathlib import Path
+
+from skaimsginterface.skaimessages import *
+from skaimsginterface.framing import SkaiFrame
+from skaimsginterface.replay.SkaibinReader import SkaibinReader
+
+try:
+    import pyarrow as _pa
+    import pyarrow.parquet as _pq
+except ImportError:
+    _pa = None
+    _pq = None
+
+
+class SkaibinArchive:
+    """columnar export of a .skaibin recording for offline analytics
+
+        recording.archive/
+            archive.json
+            skaimot_people/000000.npz
+            skaimot_people/000001.npz
+            feetpos_people/000000.npz
+            ...
+
+    every table holds one row per person (or vehicle) of every camera frame of
+    one msg type, with the record's arrival timestamp and port, the frame's
+    camera_id and timestamp, the track id and that type's numeric fields as
+    numpy arrays (boxes, embeddings, feet positions, keypoints), see table_columns.
+    GlobalTrackMsgs have no camera frames, their tables hold one row per top
+    face / bbox embedding with the global track id and class instead.
+    rows are written in chunks of about chunk_bytes, as .npz files (one zip
+    member per column) or as Parquet files when pyarrow is installed, so a
+    recording of any size converts in about chunk_bytes per table of memory and
+    load() reads just the columns and chunks asked for, no protobuf parsing.
+
+    archive.json lists every table's columns (dtype and per row shape) and its
+    chunks in order with their row count and time span. it is rewritten after
+    every chunk, so an export that was interrupted still loads up to its last
+    chunk. embeddings missing from a msg are nan rows, a chunk written before any
+    embedding of a column was seen leaves the column out and load() fills it in.
+    """
+
+    manifest_name = 'archive.json'
+    manifest_version = 1
+    formats = ('npz', 'parquet')
+
+    # table: (msg class, repeated field of a camera frame with the table's rows, of the msg for GlobalTrackMsg)
+    tables = {
+        'skaimot_people': (SkaimotMsg, 'people_in_frame'),
+        'skaimot_vehicles': (SkaimotMsg, 'vehicles_in_frame'),
+        'feetpos_people': (FeetPosMsg, 'people_in_frame'),
+        'pose_people': (PoseMsg, 'people_in_frame'),
+        'localtrack_people': (LocalTrackMsg, 'people_in_frame'),
+        'localtrack_vehicles': (LocalTrackMsg, 'vehicles_in_frame'),
+        'globaltrack_faces': (GlobalTrackMsg, 'top_faces'),
+        'globaltrack_bboxes': (GlobalTrackMsg, 'top_bboxes'),
+    }
+    # track id field of a table's rows, GlobalTrackMsg rows share the msg's global_track_id
+    id_fields = {'skaimot_people': 'id', 'skaimot_vehicles': 'id', 'feetpos_people': 'id', 'pose_people': 'id',
+                 'localtrack_people': 'skaimot_id', 'localtrack_vehicles': 'skaimot_id'}
+    # columns of a camera frame (or global track) that every one of its rows repeats
+    group_column_dtypes = {'camera_id': np.uint64, 'frame_timestamp': np.uint64, 'id': np.uint64,
+                           'classification': np.int32}
+
+    embedding_columns = ('face_embedding', 'bbox_embedding')
+    orientation_fields = ['x', 'y', 'z']
+
+    # fast levels, embedding floats barely compress better at higher ones
+    npz_level = 1
+    zstd_level = 1
+
+    def __init__(self, dirpath, format=None, compress=None, chunk_bytes=32 * 1024 * 1024, tables=None) -> None:
+        """
+        Args:
+            dirpath (str): archive directory, created if needed
+            format (str, optional): one of formats, None is parquet if pyarrow is installed else npz. Defaults to None.
+            compress (bool, optional): zstd compressed parquet / deflated npz, None compresses parquet only,
+                deflate costs far more time than it saves space on embedding floats. Defaults to None.
+            chunk_bytes (int, optional): uncompressed bytes of a table buffered before they are written
+                as a chunk. Defaults to 32 MB.
+            tables (list, optional): names of the tables to write, None all of them. Defaults to None.
+        """
+        if format is None:
+            format = self.best_format()
+        if format not in self.formats:
+            raise ValueError(f'unknown format {format}, expected one of {self.formats}')
+        if format == 'parquet' and _pa is None:
+            raise ValueError('parquet format needs pyarrow')
+        self.dirpath = dirpath
+        self.format = format
+        self.compress = format == 'parquet' if compress is None else compress
+        self.chunk_bytes = chunk_bytes
+        self.table_names = list(self.tables) if tables is None else list(tables)
+        for table in self.table_names:
+            if table not in self.tables:
+                raise ValueError(f'unknown table {table}, expected one of {list(self.tables)}')
+        self.msg_ids = {self.tables[table][0].msg_id: [] for table in self.table_names}
+        for table in self.table_names:
+            self.msg_ids[self.tables[table][0].msg_id].append(table)
+        self.manifest = None
+        self.buffers = {}       # table: {column: [per frame arrays]}
+        self.buffered_bytes = {}
+        self.buffered_rows = {}
+        self.dims = {table: {} for table in self.table_names}  # embedding dims seen so far
+
+    @staticmethod
+    def best_format():
+        return 'npz' if _pa is None else 'parquet'
+
+    @classmethod
+    def manifest_path(cls, dirpath):
+        return os.path.join(dirpath, cls.manifest_name)
+
+    @classmethod
+    def read_manifest(cls, dirpath):
+        """returns the manifest dict of an archive directory
+
+        Raises:
+            ValueError: manifest of an unknown version
+        """
+        with open(cls.manifest_path(dirpath)) as f:
+            manifest = json.load(f)
+        if manifest.get('version') != cls.manifest_version:
+            raise ValueError(f'{cls.manifest_path(dirpath)} is not a version {cls.manifest_version} manifest')
+        return manifest
+
+    @classmethod
+    def export(cls, filepath, dirpath, start_time=None, end_time=None, **kwargs):
+        """converts a recording (.skaibin file or SkaibinSegments directory) into an archive,
+        streaming it with a SkaibinReader
+
+        Args:
+            filepath (str): the recording
+            dirpath (str): archive directory, an archive already there is replaced
+            start_time (float, optional): only export records received at or after this epoch time. Defaults to None.
+            end_time (float, optional): only export records received at or before this epoch time. Defaults to None.
+            kwargs: SkaibinArchive args
+
+        Returns:
+            dict: the archive's manifest
+        """
+        archive = cls(dirpath, **kwargs).open()
+        msg_types = [cls.tables[table][0] for table in archive.table_names]
+        try:
+            with SkaibinReader(filepath, msg_types=msg_types, start_time=start_time, end_time=end_time) as reader:
+                for timestamp, port, header, msg_bytes in reader:
+                    archive.write(msg_bytes, timestamp, port)
+        finally:
+            archive.close()
+        return archive.manifest
+
+    def open(self):
+        Path(self.dirpath).mkdir(exist_ok=True, parents=True)
+        if os.path.exists(self.manifest_path(self.dirpath)):
+            # replace the old archive's chunks
+            for table, table_manifest in self.read_manifest(self.dirpath)['tables'].items():
+                for chunk in table_manifest['chunks']:
+                    path = os.path.join(self.dirpath, table, chunk['file'])
+                    if os.path.exists(path):
+                        os.remove(path)
+        self.manifest = {'version': self.manifest_version, 'format': self.format, 'msgs': 0, 'undecodable': 0,
+                         'tables': {}}
+        for table in self.table_names:
+            Path(self.dirpath, table).mkdir(exist_ok=True)
+            self.manifest['tables'][table] = {'rows': 0, 'columns': {}, 'chunks': []}
+            self.reset_buffer(table)
+        self.write_manifest()
+        return self
+
+    def reset_buffer(self, table):
+        self.buffers[table] = {}
+        self.buffered_bytes[table] = 0
+        self.buffered_rows[table] = 0
+
+    def write(self, msg_bytes, epoch_timestamp, port):
+        """adds the rows of one msg, msgs of other types are ignored
+
+        Returns:
+            bool: False if the msg does not unpack or has an embedding of another length than its column's
+        """
+        tables = self.msg_ids.get(SkaiFrame.msg_type_of(msg_bytes))
+        if tables is None:
+            return True
+        self.manifest['msgs'] += 1
+        # all rows of the msg first, so a msg that fails adds none of them
+        dims = {table: dict(self.dims[table]) for table in tables}
+        try:
+            msg_type, msg = SkaiMsg.unpack_strict(msg_bytes)
+            rows = [(table, self.row_columns(table, group_columns, objs, epoch_timestamp, port, dims[table]))
+                    for table in tables for group_columns, objs in self.row_groups(table, msg)]
+        except (UnpackError, ValueError):
+            self.manifest['undecodable'] += 1
+            return False
+        self.dims.update(dims)
+        for table, columns in rows:
+            self.add_rows(table, columns)
+        return True
+
+    @classmethod
+    def row_groups(cls, table, msg):
+        """yields ({column: value} every row repeats, rows) per camera frame of msg with rows for the table,
+        once for a GlobalTrackMsg"""
+        msg_class, field = cls.tables[table]
+        if msg_class is GlobalTrackMsg:
+            objs = getattr(msg, field)
+            if objs:
+                yield {'id': msg.global_track_id, 'classification': getattr(msg, 'class')}, objs
+            return
+        for camframe in msg.camera_frames:
+            objs = getattr(camframe, field)
+            if objs:
+                # LocalTrackMsg camera frames have no timestamp of their own, the msg's stands in
+                frame_timestamp = camframe.timestamp if msg_class is not LocalTrackMsg else msg.timestamp
+                yield {'camera_id': camframe.camera_id, 'frame_timestamp': frame_timestamp}, objs
+
+    @classmethod
+    def row_columns(cls, table, group_columns, objs, epoch_timestamp, port, dims):
+        n = len(objs)
+        columns = {
+            'timestamp': np.full(n, epoch_timestamp, dtype=np.float64),
+            'port': np.full(n, port, dtype=np.uint16),
+        }
+        for name, value in group_columns.items():
+            columns[name] = np.full(n, value, dtype=cls.group_column_dtypes[name])
+        id_field = cls.id_fields.get(table)
+        if id_field:
+            columns['id'] = np.array([getattr(obj, id_field) for obj in objs], dtype=np.uint64)
+        columns.update(cls.table_columns(table, objs, dims))
+        return columns
+
+    def add_rows(self, table, columns):
+        buffer = self.buffers[table]
+        for name, array in columns.items():
+            buffer.setdefault(name, []).append(array)
+            self.buffered_bytes[table] += array.nbytes
+        self.buffered_rows[table] += len(columns['timestamp'])
+        if self.buffered_bytes[table] >= self.chunk_bytes:
+            self.write_chunk(table)
+
+    @classmethod
+    def table_columns(cls, table, objs, dims):
+        """returns {column: array} of a table's own columns for the rows of one camera frame
+
+            skaimot_people       classification (int32), box (4) tlbr, face_embedding (dim), bbox_embedding (dim)
+            skaimot_vehicles     box (4) tlbr, bbox_embedding (dim), license_plate (str)
+            feetpos_people       feet_pos (3) xyz, confidence
+            pose_people          keypoints (33, 2) xy in PoseMsg.keypoint_names order, orientation (3) xyz
+            localtrack_people    classification (int32), box (4) tlbr, face_embedding (dim),
+                                 bbox_embedding (dim), feet_pos (3) xyz, confidence
+            localtrack_vehicles  box (4) tlbr, bbox_embedding (dim), license_plate (str), feet_pos (3) xyz,
+                                 confidence
+            globaltrack_faces    rank (position in top_faces), skaimot_id, embedding_timestamp, face_embedding (dim)
+            globaltrack_bboxes   rank (position in top_bboxes), skaimot_id, embedding_timestamp, bbox_embedding (dim)
+
+        Args:
+            dims (dict): the table's embedding dims seen so far, updated
+
+        Raises:
+            ValueError: an embedding is not as long as earlier ones of its column
+        """
+        if table == 'skaimot_people':
+            return {
+                'classification': np.array([obj.classification for obj in objs], dtype=np.int32),
+                'box': SkaimotMsg.bboxes_to_numpy(objs),
+                'face_embedding': cls.embedding_column(dims, 'face_embedding',
+                                                       [obj.face_embedding for obj in objs]),
+                'bbox_embedding': cls.embedding_column(dims, 'bbox_embedding',
+                                                       [obj.bbox_embedding for obj in objs]),
+            }
+        if table == 'skaimot_vehicles':
+            return {
+                'box': SkaimotMsg.bboxes_to_numpy(objs),
+                'bbox_embedding': cls.embedding_column(dims, 'bbox_embedding',
+                                                       [obj.bbox_embedding for obj in objs]),
+                'license_plate': np.array([obj.license_plate for obj in objs], dtype=str),
+            }
+        if table == 'feetpos_people':
+            return {
+                'feet_pos': FeetPosMsg.feet_pos_to_numpy(objs),
+                'confidence': np.array([obj.confidence for obj in objs], dtype=np.float32),
+            }
+        if table == 'pose_people':
+            return {
+                'keypoints': PoseMsg.keypoints_to_numpy([obj.keypoints for obj in objs]),
+                'orientation': SkaiMsg.float_fields_to_numpy([obj.orientation for obj in objs],
+                                                             cls.orientation_fields),
+            }
+        if table == 'localtrack_people':
+            return {
+                'classification': np.array([obj.classification for obj in objs], dtype=np.int32),
+                'box': SkaimotMsg.bboxes_to_numpy(objs),
+                'face_embedding': cls.embedding_column(dims, 'face_embedding',
+                                                       [obj.face_embed for obj in objs]),
+                'bbox_embedding': cls.embedding_column(dims, 'bbox_embedding',
+                                                       [obj.bbox_embed for obj in objs]),
+                'feet_pos': FeetPosMsg.feet_pos_to_numpy(objs),
+                'confidence': np.array([obj.feet_position_confidence for obj in objs], dtype=np.float32),
+            }
+        if table == 'localtrack_vehicles':
+            return {
+                'box': SkaimotMsg.bboxes_to_numpy(objs),
+                'bbox_embedding': cls.embedding_column(dims, 'bbox_embedding',
+                                                       [obj.bbox_embedding for obj in objs]),
+                'license_plate': np.array([obj.license_plate for obj in objs], dtype=str),
+                'feet_pos': FeetPosMsg.feet_pos_to_numpy(objs),
+                'confidence': np.array([obj.feet_position_confidence for obj in objs], dtype=np.float32),
+            }
+        if table in ('globaltrack_faces', 'globaltrack_bboxes'):
+            name = 'face_embedding' if table == 'globaltrack_faces' else 'bbox_embedding'
+            return {
+                'rank': np.arange(len(objs), dtype=np.uint16),
+                'skaimot_id': np.array([obj.skaimot_id for obj in objs], dtype=np.uint64),
+                'embedding_timestamp': np.array([obj.timestamp for obj in objs], dtype=np.uint64),
+                name: cls.embedding_column(dims, name, list(objs)),
+            }
+        raise ValueError(f'unknown table {table}')
+
+    @staticmethod
+    def embedding_column(dims, name, embeddings):
+        # (N, dim), (N, 0) while no embedding of the column has been seen yet
+        array = SkaiMsg.embeddings_to_numpy(embeddings, dims.get(name))
+        if array.shape[1]:
+            dims[name] = array.shape[1]
+        return array
+
+    def write_chunk(self, table):
+        rows = self.buffered_rows[table]
+        if not rows:
+            return
+        table_manifest = self.manifest['tables'][table]
+        columns = {}
+        for name, parts in self.buffers[table].items():
+            width = max(part.shape[1:] for part in parts) if name in self.embedding_columns else None
+            if width is not None and width != (0,):
+                # rows from before the dim was known
+                parts = [part if part.shape[1:] == width else np.full((len(part),) + width, np.nan, dtype=np.float32)
+                         for part in parts]
+            array = np.concatenate(parts)
+            if name in self.embedding_columns and array.shape[1] == 0:
+                # no embeddings yet, load() fills the column in
+                continue
+            columns[name] = array
+            known = table_manifest['columns'].get(name)
+            if known is None or (name in self.embedding_columns and not known['shape'][0]):
+                table_manifest['columns'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape[1:])}
+        for name in self.embedding_columns:
+            if name in self.buffers[table] and name not in table_manifest['columns']:
+                table_manifest['columns'][name] = {'dtype': np.dtype(np.float32).str, 'shape': [0]}
+        self.reset_buffer(table)
+
+        file = f'{len(table_manifest["chunks"]):06d}.{self.format}'
+        path = os.path.join(self.dirpath, table, file)
+        if self.format == 'npz':
+            self.write_npz(path, columns, self.compress)
+        else:
+            self.write_parquet(path, columns, self.compress)
+        timestamps = columns['timestamp']
+        table_manifest['chunks'].append({'file': file, 'rows': rows, 'start_time': float(timestamps.min()),
+                                         'end_time': float(timestamps.max())})
+        table_manifest['rows'] += rows
+        self.write_manifest()
+
+    @classmethod
+    def write_npz(cls, path, columns, compress):
+        # what np.savez_compressed writes, but at a fast deflate level
+        compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        with zipfile.ZipFile(path, 'w', compression, compresslevel=cls.npz_level if compress else None) as zf:
+            for name, array in columns.items():
+                with zf.open(name + '.npy', 'w', force_zip64=True) as f:
+                    np.lib.format.write_array(f, array, allow_pickle=False)
+
+    @classmethod
+    def write_parquet(cls, path, columns, compress):
+        # dictionaries only pay off for ids, floats go byte stream split so zstd finds their repeating exponent bytes
+        float_columns = [name for name, array in columns.items() if array.dtype.kind == 'f']
+        _pq.write_table(cls.arrow_table(columns), path, compression='zstd' if compress else 'none',
+                        compression_level=cls.zstd_level if compress else None,
+                        use_dictionary=[name for name, array in columns.items()
+                                        if array.ndim == 1 and array.dtype.kind in 'iuU'],
+                        use_byte_stream_split=float_columns if compress else False)
+
+    @staticmethod
+    def arrow_table(columns):
+        # multi dimensional columns become fixed size lists of their flattened rows
+        arrays = {}
+        for name, array in columns.items():
+            if array.ndim == 1:
+                arrays[name] = _pa.array(array)
+            else:
+                flat = array.reshape(len(array), -1)
+                arrays[name] = _pa.FixedSizeListArray.from_arrays(_pa.array(flat.reshape(-1)), flat.shape[1])
+        return _pa.table(arrays)
+
+    def write_manifest(self):
+        path = self.manifest_path(self.dirpath)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(path + '.tmp', path)
+
+    def close(self):
+        if self.manifest is None:
+            return
+        for table in self.table_names:
+            self.write_chunk(table)
+        self.write_manifest()
+
+    @classmethod
+    def chunks(cls, dirpath, table, columns=None, start_time=None, end_time=None):
+        """yields {column: array} per chunk of a table, reading only the columns asked for
+        and only chunks with rows between start_time and end_time (arrival times)
+
+        Args:
+            dirpath (str): archive directory
+            table (str): table name, see tables
+            columns (list, optional): column names, None all of them. Defaults to None.
+            start_time (float, optional): only rows received at or after this epoch time. Defaults to None.
+            end_time (float, optional): only rows received at or before this epoch time. Defaults to None.
+        """
+        manifest = cls.read_manifest(dirpath)
+        table_manifest = manifest['tables'][table]
+        known_columns = table_manifest['columns']
+        if columns is None:
+            columns = list(known_columns)
+        for name in columns:
+            if name not in known_columns:
+                raise ValueError(f'{table} has no column {name}, it has {list(known_columns)}')
+        time_filter = start_time is not None or end_time is not None
+        read_columns = list(columns) + (['timestamp'] if time_filter and 'timestamp' not in columns else [])
+        for chunk in table_manifest['chunks']:
+            if start_time is not None and chunk['end_time'] < start_time:
+                continue
+            if end_time is not None and chunk['start_time'] > end_time:
+                continue
+            path = os.path.join(dirpath, table, chunk['file'])
+            arrays = cls.read_chunk(path, manifest['format'], read_columns, known_columns, chunk['rows'])
+            if time_filter:
+                timestamps = arrays['timestamp']
+                keep = np.ones(len(timestamps), dtype=bool)
+                if start_time is not None:
+                    keep &= timestamps >= start_time
+                if end_time is not None:
+                    keep &= timestamps <= end_time
+                arrays = {name: arrays[name][keep] for name in columns}
+            yield arrays
+
+    @classmethod
+    def read_chunk(cls, path, format, columns, known_columns, rows):
+        arrays = {}
+        if format == 'npz':
+            with np.load(path) as npz:
+                present = set(npz.files)
+                for name in columns:
+                    if name in present:
+                        arrays[name] = npz[name]
+        else:
+            if _pq is None:
+                raise ValueError(f'{path} is parquet, reading it needs pyarrow')
+            present = set(_pq.read_schema(path).names)
+            arrow_table = _pq.read_table(path, columns=[name for name in columns if name in present])
+            for name in arrow_table.column_names:
+                column = arrow_table.column(name).combine_chunks()
+                shape = tuple(known_columns[name]['shape'])
+                if _pa.types.is_string(column.type):
+                    arrays[name] = np.array(column.to_pylist(), dtype=str)
+                elif shape:
+                    arrays[name] = column.flatten().to_numpy(zero_copy_only=False).reshape((rows,) + shape)
+                else:
+                    arrays[name] = column.to_numpy(zero_copy_only=False)
+        for name in columns:
+            if name not in arrays:
+                # an embedding column the chunk left out, no embeddings seen yet when it was written
+                known = known_columns[name]
+                arrays[name] = np.full((rows,) + tuple(known['shape']), np.nan, dtype=known['dtype'])
+        return arrays
+
+    @classmethod
+    def load(cls, dirpath, table, columns=None, start_time=None, end_time=None):
+        """returns {column: array} of all rows of a table, see chunks() for the args"""
+        parts = {}
+        for arrays in cls.chunks(dirpath, table, columns, start_time, end_time):
+            for name, array in arrays.items():
+                parts.setdefault(name, []).append(array)
+        if not parts:
+            known_columns = cls.read_manifest(dirpath)['tables'][table]['columns']
+            return {name: np.empty((0,) + tuple(known_columns[name]['shape']), dtype=known_columns[name]['dtype'])
+                    for name in (known_columns if columns is None else columns)}
+        return {name: np.concatenate(arrays) for name, arrays in parts.items()}
+
+
+if __name__=='__main__':
+    import sys
+    import time
+
+    # converts a recording and prints the archive's tables
+    start = time.perf_counter()
+    manifest = SkaibinArchive.export(sys.argv[1], sys.argv[2])
+    print(f'{manifest["msgs"]} msgs ({manifest["undecodable"]} undecodable) in {time.perf_counter() - start:.1f} s,'
+          f' {manifest["format"]}')
+    for table, table_manifest in manifest['tables'].items():
+        columns = ', '.join(f'{name}{tuple(column["shape"]) if column["shape"] else ""}'
+                            for name, column in table_manifest['columns'].items())
+        print(f'{table:>19} {table_manifest["rows"]:>10} rows {len(table_manifest["chunks"]):>5} chunks  {columns}')
@@ -0,0 +1,214 @@
+#!/usr/bin/python3
+
+import os
+import mmap
+import struct
+import numpy as np
+
+from skaimsginterface.framing import SkaiFrame, FrameError
+from skaimsginterface.replay.SkaibinRecord import SkaibinRecord
+
+
+class SkaibinIndex:
+    """sidecar index of a .skaibin recording, one entry per record
+
+    recording.skaibin.idx holds a 5 byte file header ('SKIX', u8 version) then
+        [f64 timestamp][u16 port][u16 msg type][u64 record offset]
+    per record, in file order. msg type is the frame header's (0 for a batch of
+    mixed types) or the legacy msg's id, offset points at the record's
+    [timestamp][port][length] prefix. FileRecorder(index=True) writes it along with
+    the recording, load() reads it and indexes whatever records it is missing (an
+    unindexed legacy recording, or a recorder killed before its index caught up)
+    by reading just the record prefixes and frame headers, never the payloads.
+    each segment of a SkaibinSegments recording has its own index, offsets
+    within the segment.
+
+    timestamps are arrival times in file order, which the recorder threads can
+    leave a little out of order, so seeks bisect the running max timestamp: every
+    record before the seek offset is older than the seek time.
+    """
+
+    magic = b'SKIX'
+    version = 1
+    file_header_struct = struct.Struct('!4sB')
+    entry_struct = struct.Struct('!dHHQ')
+    entry_dtype = np.dtype([('timestamp', '>f8'), ('port', '>u2'), ('msg_type', '>u2'), ('offset', '>u8')])
+    record_struct = struct.Struct('!dHI')   # recording's record prefix, see FileRecorder
+
+    def __init__(self, filepath, entries, data_size) -> None:
+        """
+        Args:
+            filepath (str): the .skaibin recording
+            entries (np.ndarray): entry_dtype array, one per record
+            data_size (int): recording bytes the entries cover
+        """
+        self.filepath = filepath
+        self.entries = entries
+        self.data_size = data_size
+        self.max_timestamps = np.maximum.accumulate(entries['timestamp']) if len(entries) else entries['timestamp']
+
+    @staticmethod
+    def index_path(filepath):
+        return filepath + '.idx'
+
+    @classmethod
+    def file_header(cls):
+        return cls.file_header_struct.pack(cls.magic, cls.version)
+
+    @classmethod
+    def record_msg_type(cls, record):
+        """msg type of a record from its first bytes, SkaiFrame.header_struct.size of them are enough.
+        0 for a record whose frame header does not parse, readers skip or report it"""
+        try:
+            header_len, header = SkaiFrame.parse_header(record)
+        except FrameError:
+            return 0
+        if header_len:
+            return header.msg_type
+        return SkaiFrame.msg_type_of(record)
+
+    @classmethod
+    def pack_entry(cls, timestamp, port, record, offset):
+        """returns the index entry bytes of record written at offset, for recorders"""
+        return cls.entry_struct.pack(timestamp, port, cls.record_msg_type(record), offset)
+
+    @classmethod
+    def prepare(cls, filepath, append=False):
+        """readies the sidecar of a recording a recorder is about to open, completing it when
+        appending and starting a fresh one otherwise. the recorder appends entries to it from then on
+
+        Returns:
+            int: offset of the next record in the recording
+        """
+        if append and os.path.exists(filepath):
+            cls.load(filepath)
+            return os.path.getsize(filepath)
+        with open(cls.index_path(filepath), 'wb') as f:
+            f.write(cls.file_header())
+        return 0
+
+    @classmethod
+    def load(cls, filepath, write=True):
+        """returns the index of a recording, indexing the records its sidecar is missing (all
+        of them if there is none)
+
+        Args:
+            filepath (str): .skaibin recording
+            write (bool, optional): save the completed index to the sidecar. Defaults to True.
+        """
+        entries = cls.read_sidecar(filepath)
+        sidecar_entries = len(entries)
+        data_size = os.path.getsize(filepath)
+        data_end = 0
+        # drop entries of records that didn't make it into the recording, then index the rest
+        if len(entries):
+            entries = entries[entries['offset'] < data_size]
+        new_entries = []
+        with open(filepath, 'rb') as f:
+            if data_size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    # records of a SkaibinSegments segment start after its file header
+                    start, record_struct, checksum_type = SkaibinRecord.layout(mm)
+                    if len(entries):
+                        # the last indexed record may be partial, rescan from it
+                        start = int(entries['offset'][-1])
+                        entries = entries[:-1]
+                    new_entries, data_end = cls.scan(mm, start, data_size, record_struct)
+        if new_entries:
+            entries = np.concatenate([entries, np.array(new_entries, dtype=cls.entry_dtype)])
+        index = cls(filepath, entries, data_end)
+        if write and (len(entries) != sidecar_entries or not os.path.exists(cls.index_path(filepath))):
+            index.write()
+        return index
+
+    @classmethod
+    def read_sidecar(cls, filepath):
+        index_path = cls.index_path(filepath)
+        if not os.path.exists(index_path):
+            return np.zeros(0, dtype=cls.entry_dtype)
+        with open(index_path, 'rb') as f:
+            file_header = f.read(cls.file_header_struct.size)
+            if file_header != cls.file_header():
+                print(f'{index_path} is not a version {cls.version} skaibin index, rebuilding it')
+                return np.zeros(0, dtype=cls.entry_dtype)
+            data = f.read()
+        # a partially written last entry is dropped
+        return np.frombuffer(data[:len(data) - len(data) % cls.entry_struct.size], dtype=cls.entry_dtype).copy()
+
+    @classmethod
+    def scan(cls, mm, pos, size, record_struct=None):
+        """returns (entries as tuples, end of the last complete record) of the records in mm[pos:size],
+        record_struct is the record prefix, see SkaibinRecord.layout()"""
+        entries = []
+        record_struct = record_struct or cls.record_struct
+        prefix_size = record_struct.size
+        peek = SkaiFrame.header_struct.size
+        while pos + prefix_size <= size:
+            timestamp, port, length = record_struct.unpack_from(mm, pos)[:3]
+            start = pos + prefix_size
+            if start + length > size:
+                break
+            entries.append((timestamp, port, cls.record_msg_type(mm[start:start + min(length, peek)]), pos))
+            pos = start + length
+        return entries, pos
+
+    def write(self):
+        with open(self.index_path(self.filepath), 'wb') as f:
+            f.write(self.file_header())
+            # numpy ops like concatenate return native byte order, the file is big endian
+            f.write(self.entries.astype(self.entry_dtype).tobytes())
+
+    def __len__(self):
+        return len(self.entries)
+
+    def seek(self, timestamp):
+        """returns the offset of the first record at or after timestamp, data_size if there is none"""
+        idx = np.searchsorted(self.max_timestamps, timestamp, side='left')
+        return int(self.entries['offset'][idx]) if idx < len(self.entries) else self.data_size
+
+    def time_range(self, start_timestamp=None, end_timestamp=None):
+        """returns (start offset, end offset) of the records from start_timestamp up to end_timestamp,
+        None leaves that side open. records in between can still be out of range by a little, see above"""
+        start = 0 if start_timestamp is None else self.seek(start_timestamp)
+        if end_timestamp is None:
+            return start, self.data_size
+        idx = np.searchsorted(self.max_timestamps, end_timestamp, side='right')
+        end = int(self.entries['offset'][idx]) if idx < len(self.entries) else self.data_size
+        return start, max(start, end)
+
+    def counts(self, start_timestamp=None, end_timestamp=None):
+        """returns {(port, msg type): records} of the whole recording or a time range, from the index alone"""
+        entries = self.entries
+        if start_timestamp is not None:
+            entries = entries[entries['timestamp'] >= start_timestamp]
+        if end_timestamp is not None:
+            entries = entries[entries['timestamp'] <= end_timestamp]
+        keys, counts = np.unique(entries['port'].astype(np.uint32) << 16 | entries['msg_type'], return_counts=True)
+        return {(int(key >> 16), int(key & 0xffff)): int(count) for key, count in zip(keys, counts)}
+
+    def port_counts(self, start_timestamp=None, end_timestamp=None):
+        """returns {port: records} from the index alone, see counts()"""
+        port_counts = {}
+        for (port, msg_type), count in self.counts(start_timestamp, end_timestamp).items():
+            port_counts[port] = port_counts.get(port, 0) + count
+        return port_counts
+
+    @property
+    def start_time(self):
+        return float(self.entries['timestamp'].min()) if len(self.entries) else None
+
+    @property
+    def end_time(self):
+        return float(self.max_timestamps[-1]) if len(self.entries) else None
+
+
+if __name__=='__main__':
+    import sys
+    from skaimsginterface.skaimessages import SkaiMsg
+
+    # builds (or completes) the index of a recording and prints what it holds
+    index = SkaibinIndex.load(sys.argv[1])
+    print(f'{len(index)} records from {index.start_time} to {index.end_time}')
+    for (port, msg_type), count in sorted(index.counts().items()):
+        msg_class = SkaiMsg.registry.get(msg_type)
+        print(f'{port:>6} {msg_class.__name__ if msg_class else msg_type:>24} {count:>8}')
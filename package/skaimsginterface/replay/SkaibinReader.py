@@ -0,0 +1,216 @@
+#!/usr/bin/python3
+
+import os
+import mmap
+
+from skaimsginterface.skaimessages import *
+from skaimsginterface.framing import SkaiFrame
+from skaimsginterface.replay.SkaibinIndex import SkaibinIndex
+from skaimsginterface.replay.SkaibinRecord import SkaibinRecord
+from skaimsginterface.replay.SkaibinSegments import SkaibinSegments
+
+
+class SkaibinReader:
+    """streams a .skaibin recording off an mmap instead of reading it into memory
+
+    every record in the file is [f64 timestamp][u16 port][u32 length][record bytes],
+    see FileRecorder and SkaibinRecord. iterating yields (timestamp, port, FrameHeader, msg bytes)
+    like FileRecorder.parseRecordedFileWithHeaders, but one at a time and with the
+    msg bytes a memoryview into the mapped file (decompressed bytes for compressed
+    frames), so memory use does not grow with the file. batch frames yield each
+    msg on its own. messages() yields lazy SkaiMsgViews instead of msg bytes.
+
+        with SkaibinReader('dealership.skaibin', ports=[6000], msg_types=[SkaimotMsg]) as reader:
+            for timestamp, port, header, msg_bytes in reader:
+                ...
+
+    start_time / end_time read just the records received in between. they seek
+    with the recording's SkaibinIndex, its sidecar completed in memory (reading
+    only the record prefixes) if it is missing records. the reader never writes
+    the sidecar, a live recorder may still be appending to it.
+
+    filepath can also be a SkaibinSegments recording directory, whose segments
+    are read in order as one stream. their records carry checksums, a record that
+    fails its checksum ends the segment like a cut short one.
+
+    yielded memoryviews stay valid until close(), keep bytes(msg_bytes) past that.
+    records are read in file order, which is arrival order per recorder. a record
+    cut short at the end of the file (recorder killed mid write) ends the iteration,
+    truncated_bytes says how much was left over (summed over the segments).
+    """
+
+    release_bytes = 64 * 1024 * 1024        # mapped pages already read are dropped every this many bytes
+
+    def __init__(self, filepath, ports=None, msg_types=None, start_time=None, end_time=None) -> None:
+        """
+        Args:
+            filepath (str): .skaibin file or SkaibinSegments directory
+            ports (list, optional): only yield records received on these ports. Defaults to None.
+            msg_types (list, optional): only yield msgs of these SkaiMsg classes, SkaiMsg.MsgTypes or
+                registered int msg ids. Defaults to None.
+            start_time (float, optional): only yield records received at or after this epoch time. Defaults to None.
+            end_time (float, optional): only yield records received at or before this epoch time. Defaults to None.
+        """
+        self.filepath = filepath
+        self.ports = None if ports is None else set(ports)
+        self.msg_ids = None if msg_types is None else {self.msg_id_of(t) for t in msg_types}
+        self.start_time = start_time
+        self.end_time = end_time
+        self.paths = None
+        self.index = None
+        self.file = None
+        self.mm = None
+        self.size = 0
+        self.truncated_bytes = 0
+        self.open_maps = []     # mappings of read segments with msg bytes still referenced
+
+    @staticmethod
+    def msg_id_of(msg_type):
+        # the id @register_msg gave a class, so types registered with a plain int id filter too
+        if isinstance(msg_type, type) and issubclass(msg_type, SkaiMsg):
+            return msg_type.msg_id
+        msg_id = msg_type.value if isinstance(msg_type, SkaiMsg.MsgType) else msg_type
+        if msg_id not in SkaiMsg.registry:
+            raise ValueError(f'msg type {msg_type} is not registered')
+        return msg_id
+
+    def open(self):
+        if os.path.isdir(self.filepath):
+            self.paths = SkaibinSegments.segment_paths(self.filepath, self.start_time, self.end_time)
+        else:
+            self.paths = [self.filepath]
+        return self
+
+    def open_segment(self, path):
+        self.file = open(path, 'rb')
+        self.size = os.fstat(self.file.fileno()).st_size
+        # an empty file can't be mapped, and has no records anyway
+        if self.size:
+            self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                self.mm.madvise(mmap.MADV_SEQUENTIAL)
+        if self.start_time is not None or self.end_time is not None:
+            self.index = SkaibinIndex.load(path, write=False)
+
+    def close_segment(self):
+        if self.mm is not None:
+            try:
+                self.mm.close()
+            except BufferError:
+                # msg bytes still referenced, the mapping goes away with the last of them
+                self.open_maps.append(self.mm)
+            self.mm = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.index = None
+
+    def close(self):
+        self.close_segment()
+        for mm in self.open_maps:
+            try:
+                mm.close()
+            except BufferError:
+                pass
+        self.open_maps = []
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        return self.msgs()
+
+    def records(self):
+        """yields (timestamp, port, record) of every record of the selected ports, record is a memoryview
+        of the bytes as recorded (frame header + msg bytes, still batched / compressed, see SkaiFrame.split)"""
+        if self.paths is None:
+            self.open()
+        self.truncated_bytes = 0
+        for path in self.paths:
+            self.open_segment(path)
+            try:
+                yield from self.segment_records(path)
+            finally:
+                self.close_segment()
+
+    def segment_records(self, path):
+        if self.mm is None:
+            return
+        mm = self.mm
+        view = memoryview(mm)
+        data_start, record_struct, checksum_type = SkaibinRecord.layout(mm)
+        release = hasattr(mmap, 'MADV_DONTNEED')
+        pos, end = data_start, self.size
+        if self.index is not None:
+            pos, end = self.index.time_range(self.start_time, self.end_time)
+            pos = max(pos, data_start)
+            if end >= self.index.data_size:
+                end = self.size
+        released = pos - pos % mmap.PAGESIZE
+        start_time = float('-inf') if self.start_time is None else self.start_time
+        end_time = float('inf') if self.end_time is None else self.end_time
+        try:
+            while pos < end:
+                if pos + record_struct.size > self.size:
+                    break
+                timestamp, port, length = record_struct.unpack_from(mm, pos)[:3]
+                start = pos + record_struct.size
+                if start + length > self.size:
+                    break
+                if checksum_type is not None and not SkaibinRecord.verify(checksum_type, view, pos, start + length):
+                    break
+                pos = start + length
+                if (self.ports is None or port in self.ports) and start_time <= timestamp <= end_time:
+                    yield timestamp, port, view[start:pos]
+                # pages read so far refault from the file if still referenced, so
+                # dropping them keeps rss flat without invalidating yielded views
+                if release and pos - released >= self.release_bytes:
+                    drop_end = pos - pos % mmap.PAGESIZE
+                    mm.madvise(mmap.MADV_DONTNEED, released, drop_end - released)
+                    released = drop_end
+            truncated_bytes = self.size - pos if end == self.size else 0
+            if truncated_bytes:
+                print(f'{path} ends in {truncated_bytes} bytes of partial or corrupt records')
+            self.truncated_bytes += truncated_bytes
+        finally:
+            view.release()
+
+    def msgs(self):
+        """yields (timestamp, port, FrameHeader, msg bytes) of every selected msg
+
+        Raises:
+            FrameError: a record's frame header, batch or compression is malformed
+        """
+        msg_ids = self.msg_ids
+        for timestamp, port, record in self.records():
+            header_len, header = SkaiFrame.parse_header(record)
+            # versioned headers name the msg type, skip other types before unbatching or decompressing
+            if msg_ids is not None and header.msg_type and header.msg_type not in msg_ids:
+                continue
+            msgs, header = SkaiFrame.split_msgs(record)
+            for msg_bytes in msgs:
+                if msg_ids is None or SkaiFrame.msg_type_of(msg_bytes) in msg_ids:
+                    yield timestamp, port, header, msg_bytes
+
+    def messages(self, wire_scan=None):
+        """yields (timestamp, port, FrameHeader, SkaiMsgView) of every selected msg, protobuf
+        decoding happens on view.get() / view.decode() only, see SkaiMsgView"""
+        for timestamp, port, header, msg_bytes in self.msgs():
+            yield timestamp, port, header, SkaiMsgView(msg_bytes, wire_scan)
+
+
+if __name__=='__main__':
+    import sys
+
+    # summary of a recording: msgs and bytes per port and msg type
+    counts = {}
+    with SkaibinReader(sys.argv[1]) as reader:
+        for timestamp, port, header, msg_bytes in reader:
+            key = (port, SkaiMsg.getMessageTypeName(msg_bytes))
+            msgs, nbytes = counts.get(key, (0, 0))
+            counts[key] = (msgs + 1, nbytes + len(msg_bytes))
+    for (port, type_name), (msgs, nbytes) in sorted(counts.items()):
+        print(f'{port:>6} {type_name:>24} {msgs:>8} msgs {nbytes / 1e6:>10.1f} MB')
@@ -0,0 +1,68 @@
+#!/usr/bin/python3
+
+import struct
+
+from skaimsginterface.framing import FrameChecksum
+
+
+class SkaibinRecord:
+    """the two record layouts a .skaibin file can hold
+
+    a plain recording (FileRecorder without segments) is just records
+        [f64 timestamp][u16 port][u32 length][record bytes]
+    a segment of a SkaibinSegments recording starts with a 6 byte file header
+    ('SKSG', u8 version, u8 FrameChecksum.Type) and its records carry a checksum
+        [f64 timestamp][u16 port][u32 length][u32 crc][record bytes]
+    over the first 14 prefix bytes and the record bytes, so a reader can tell a
+    torn or garbage tail (recorder killed mid write, unsynced pages after a power
+    loss) from whole records. a plain recording starts with a timestamp whose
+    first bytes can never read 'SKSG' (that would be a ~1e93 epoch time), so
+    layout() tells them apart from the first bytes alone.
+    """
+
+    legacy_struct = struct.Struct('!dHI')       # timestamp, port, length
+    checked_struct = struct.Struct('!dHII')     # timestamp, port, length, crc
+    segment_magic = b'SKSG'
+    segment_version = 1
+    segment_header_struct = struct.Struct('!4sBB')
+
+    # 4 byte checksums only, the crc field is a u32
+    checksum_preference = [FrameChecksum.Type.CRC32C, FrameChecksum.Type.CRC32]
+
+    @classmethod
+    def best_checksum(cls):
+        for checksum_type in cls.checksum_preference:
+            if FrameChecksum.is_available(checksum_type):
+                return checksum_type
+
+    @classmethod
+    def segment_header(cls, checksum_type):
+        return cls.segment_header_struct.pack(cls.segment_magic, cls.segment_version, checksum_type)
+
+    @classmethod
+    def layout(cls, buf):
+        """returns (offset of the first record, record prefix struct, FrameChecksum.Type or None)
+        of a recording from its first bytes
+
+        Raises:
+            ValueError: a segment of an unknown version or checksum
+        """
+        if len(buf) < cls.segment_header_struct.size or bytes(buf[:4]) != cls.segment_magic:
+            return 0, cls.legacy_struct, None
+        magic, version, checksum_type = cls.segment_header_struct.unpack_from(buf)
+        if version != cls.segment_version or checksum_type not in cls.checksum_preference:
+            raise ValueError(f'unsupported skaibin segment version {version} checksum {checksum_type}')
+        return cls.segment_header_struct.size, cls.checked_struct, FrameChecksum.Type(checksum_type)
+
+    @classmethod
+    def pack_checked(cls, epoch_timestamp, port, msg_bytes, checksum_type):
+        """returns the checksummed record prefix of msg_bytes"""
+        prefix = cls.legacy_struct.pack(epoch_timestamp, port, len(msg_bytes))
+        return prefix + FrameChecksum.compute_parts(checksum_type, [prefix, msg_bytes])
+
+    @classmethod
+    def verify(cls, checksum_type, buf, pos, end):
+        """whether the checksummed record at buf[pos:end] (prefix included) is intact"""
+        legacy_end = pos + cls.legacy_struct.size
+        crc = FrameChecksum.compute_parts(checksum_type, [buf[pos:legacy_end], buf[legacy_end + 4:end]])
+        return crc == buf[legacy_end:legacy_end + 4]
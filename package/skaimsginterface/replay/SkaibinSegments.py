@@ -0,0 +1,221 @@
+#!/usr/bin/python3
+
+import os
+import json
+import time
+from pathlib import Path
+
+from skaimsginterface.replay.SkaibinRecord import SkaibinRecord
+from skaimsginterface.replay.SkaibinIndex import SkaibinIndex
+from skaimsginterface.replay.SafeWriter import SafeWriter
+
+
+class SkaibinSegments:
+    """writes a recording as numbered segment files in a directory, rotating by size or time
+
+        recording.skaibin/
+            manifest.json
+            000000.skaibin
+            000001.skaibin
+            ...
+
+    segments hold checksummed records (see SkaibinRecord) and are written by a
+    SafeWriter that fsyncs every fsync_interval_s, so a crash loses at most that
+    much plus what was still buffered, and leaves at worst a torn tail that readers
+    skip. the manifest lists the segments in order with their time span, record
+    count and size. it is rewritten atomically (write, fsync, rename) whenever a
+    segment is added and on every sync(), and a segment is listed before its file
+    is created. a segment that is not closed in the manifest was still being
+    written, its stats are as of the last sync. SkaibinReader(recording.skaibin) reads the whole directory as one
+    stream and skips closed segments outside its start_time / end_time.
+
+    not thread safe, FileRecorder serializes its listener threads around it.
+    """
+
+    manifest_name = 'manifest.json'
+    manifest_version = 1
+    index_capacity_bytes = 4 * 1024 * 1024      # index SafeWriter buffers, entries are 20 bytes per record
+
+    def __init__(self, dirpath, max_segment_bytes=None, max_segment_sec=None, fsync_interval_s=1.0, append=False,
+                 index=False, capacity_bytes=64 * 1024 * 1024, overflow_policy='block') -> None:
+        """
+        Args:
+            dirpath (str): recording directory, created if needed
+            max_segment_bytes (int, optional): start a new segment before one would grow past this. Defaults to None.
+            max_segment_sec (float, optional): start a new segment once a record arrives this long after the
+                segment's first one. Defaults to None.
+            fsync_interval_s (float, optional): fsync the open segment and update the manifest at most this
+                often, see sync(). None leaves it to the OS. Defaults to 1.0.
+            append (bool, optional): keep the segments already in dirpath and add new ones after them, otherwise
+                they are deleted. Defaults to False.
+            index (bool, optional): write a SkaibinIndex next to every segment. Defaults to False.
+            capacity_bytes (int, optional): SafeWriter capacity. Defaults to 64 MB.
+            overflow_policy (str, optional): SafeWriter overflow_policy, write() returns False for dropped
+                records. Defaults to 'block'.
+        """
+        self.dirpath = dirpath
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_sec = max_segment_sec
+        self.fsync_interval_s = fsync_interval_s
+        self.append = append
+        self.index = index
+        self.capacity_bytes = capacity_bytes
+        self.overflow_policy = overflow_policy
+        self.checksum_type = SkaibinRecord.best_checksum()
+        self.manifest = None
+        self.segment = None     # manifest entry of the open segment
+        self.f = None
+        self.index_f = None
+        self.closed_stats = {}  # SafeWriter stats of the closed segments
+        self.last_sync = time.monotonic()
+
+    @classmethod
+    def manifest_path(cls, dirpath):
+        return os.path.join(dirpath, cls.manifest_name)
+
+    @staticmethod
+    def segment_name(number):
+        return f'{number:06d}.skaibin'
+
+    @classmethod
+    def read_manifest(cls, dirpath):
+        """returns the manifest dict of a recording directory
+
+        Raises:
+            ValueError: manifest of an unknown version
+        """
+        with open(cls.manifest_path(dirpath)) as f:
+            manifest = json.load(f)
+        if manifest.get('version') != cls.manifest_version:
+            raise ValueError(f'{cls.manifest_path(dirpath)} is not a version {cls.manifest_version} manifest')
+        return manifest
+
+    @classmethod
+    def segment_paths(cls, dirpath, start_time=None, end_time=None):
+        """returns the paths of the segments in stream order, leaving out closed segments
+        with no records between start_time and end_time"""
+        paths = []
+        for segment in cls.read_manifest(dirpath)['segments']:
+            if segment['closed'] and segment['records']:
+                if start_time is not None and segment['end_time'] < start_time:
+                    continue
+                if end_time is not None and segment['start_time'] > end_time:
+                    continue
+            paths.append(os.path.join(dirpath, segment['file']))
+        return paths
+
+    def open(self):
+        Path(self.dirpath).mkdir(exist_ok=True, parents=True)
+        self.manifest = {'version': self.manifest_version, 'checksum': self.checksum_type.name, 'segments': []}
+        if os.path.exists(self.manifest_path(self.dirpath)):
+            old_manifest = self.read_manifest(self.dirpath)
+            if self.append:
+                self.manifest['segments'] = old_manifest['segments']
+            else:
+                for segment in old_manifest['segments']:
+                    for path in (os.path.join(self.dirpath, segment['file']),
+                                 SkaibinIndex.index_path(os.path.join(self.dirpath, segment['file']))):
+                        if os.path.exists(path):
+                            os.remove(path)
+        self.open_segment()
+        return self
+
+    def open_segment(self):
+        self.segment = {'file': self.segment_name(len(self.manifest['segments'])), 'start_time': None,
+                        'end_time': None, 'records': 0, 'bytes': SkaibinRecord.segment_header_struct.size,
+                        'closed': False}
+        self.manifest['segments'].append(self.segment)
+        self.write_manifest()
+        path = os.path.join(self.dirpath, self.segment['file'])
+        self.f = SafeWriter(path, 'wb', capacity_bytes=self.capacity_bytes, overflow_policy=self.overflow_policy,
+                            fsync_interval_s=self.fsync_interval_s)
+        self.f.write(SkaibinRecord.segment_header(self.checksum_type))
+        if self.index:
+            SkaibinIndex.prepare(path)
+            self.index_f = SafeWriter(SkaibinIndex.index_path(path), 'ab', capacity_bytes=self.index_capacity_bytes)
+
+    def close_segment(self):
+        self.f.close()
+        self.closed_stats = SafeWriter.merge_stats(self.closed_stats, self.f.stats())
+        self.f = None
+        if self.index_f is not None:
+            self.index_f.close()
+            self.index_f = None
+        self.segment['closed'] = True
+
+    def rotate(self):
+        self.close_segment()
+        self.open_segment()
+        self.last_sync = time.monotonic()
+
+    def rotation_due(self, epoch_timestamp, record_bytes):
+        segment = self.segment
+        if not segment['records']:
+            return False
+        if self.max_segment_bytes is not None and segment['bytes'] + record_bytes > self.max_segment_bytes:
+            return True
+        return self.max_segment_sec is not None and epoch_timestamp - segment['start_time'] >= self.max_segment_sec
+
+    def write(self, msg_bytes, epoch_timestamp, port):
+        """appends one record to the open segment, rotating first if it is full
+
+        Returns:
+            bool: False if overflow_policy dropped it
+        """
+        prefix = SkaibinRecord.pack_checked(epoch_timestamp, port, msg_bytes, self.checksum_type)
+        record_bytes = len(prefix) + len(msg_bytes)
+        if self.rotation_due(epoch_timestamp, record_bytes):
+            self.rotate()
+        segment = self.segment
+        if not self.f.write(prefix, msg_bytes):
+            return False
+        if self.index_f is not None:
+            self.index_f.write(SkaibinIndex.pack_entry(epoch_timestamp, port, msg_bytes, segment['bytes']))
+        if not segment['records']:
+            segment['start_time'] = segment['end_time'] = epoch_timestamp
+        else:
+            segment['start_time'] = min(segment['start_time'], epoch_timestamp)
+            segment['end_time'] = max(segment['end_time'], epoch_timestamp)
+        segment['records'] += 1
+        segment['bytes'] += record_bytes
+        return True
+
+    def sync(self, force=False):
+        """updates the manifest if fsync_interval_s has passed since the last sync, or right away if
+        force. the SafeWriters fsync the segment on their own, the index is never fsynced,
+        SkaibinIndex.load() completes it from the segment after a crash"""
+        if self.f is None or (not force and (self.fsync_interval_s is None
+                                             or time.monotonic() - self.last_sync < self.fsync_interval_s)):
+            return
+        self.write_manifest()
+        self.last_sync = time.monotonic()
+
+    def stats(self):
+        """returns the SafeWriter stats of the whole recording, see SafeWriter.stats()"""
+        if self.f is None:
+            return dict(self.closed_stats)
+        return SafeWriter.merge_stats(self.closed_stats, self.f.stats())
+
+    def write_manifest(self):
+        path = self.manifest_path(self.dirpath)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.manifest, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+
+    def close(self):
+        if self.f is None:
+            return
+        self.close_segment()
+        self.write_manifest()
+
+
+if __name__=='__main__':
+    import sys
+
+    # prints the segments of a recording directory
+    manifest = SkaibinSegments.read_manifest(sys.argv[1])
+    for segment in manifest['segments']:
+        print(f'{segment["file"]} {segment["records"]:>8} records {segment["bytes"] / 1e6:>8.1f} MB'
+              f' {segment["start_time"]} - {segment["end_time"]}{"" if segment["closed"] else " (open)"}')
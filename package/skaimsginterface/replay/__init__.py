@@ -1,2 +1,8 @@
 from .FileRecorder import FileRecorder
-from .ReplayModule import ReplayModule
\ No newline at end of file
+from .ReplayModule import ReplayModule
+from .SkaibinReader import SkaibinReader
+from .SkaibinIndex import SkaibinIndex
+from .SkaibinRecord import SkaibinRecord
+from .SkaibinSegments import SkaibinSegments
+from .SafeWriter import SafeWriter
+from .SkaibinArchive import SkaibinArchive
\ No newline at end of file
@@ -1,10 +1,12 @@
 #!/usr/bin/python3
 
+import operator
 import struct
 import time
 from datetime import datetime
 import numpy as np
 from enum import Enum
+from collections import namedtuple
 from abc import ABC, abstractmethod
 
 from skaiproto.ActionProtoMsg_pb2 import ActionProtoMsg
@@ -20,6 +22,7 @@ from skaiproto.VehicleProtoMsg_pb2 import VehicleProtoMsg, VehicleSpotMonitorPro
 from skaiproto.SkaiGooeyProtoMsg_pb2 import SkaiGooeyProtoMsg
 from skaiproto.StatusProtoMsg_pb2 import ModuleStatusProtoMsg, AdatStatusProtoMsg
 from skaiproto import *
+from skaimsginterface.framing import SkaiFrame, FrameError
 
 class SkaiMsg(ABC):
     """Skai Abstract Base Class for standard messages"""
@@ -78,85 +81,118 @@ class SkaiMsg(ABC):
 
         @classmethod
         def get_class_from_id(cls, id):
-            if id == cls.SKAIMOT.value:
-                return SkaimotMsg
-            elif id == cls.POSE.value:
-                return PoseMsg
-            elif id == cls.FEETPOS.value:
-                return FeetPosMsg
-            elif id == cls.LOCALTRACK.value:
-                return LocalTrackMsg
-            elif id == cls.GLOBALTRACK.value:
-                return GlobalTrackMsg
-            elif id == cls.ACTION.value:
-                return ActionMsg
-            elif id == cls.SKAIBOX_DEALERSHIP.value:
-                return SkaiboxDealershipMsg
-            elif id == cls.SKAIBOX_CAMERACALIBRATION.value:
-                return SkaiboxCameraCalibrationMsg
-            elif id == cls.SKAIBOX_CAMERAGROUP.value:
-                return SkaiboxCameraGroupMsg
-            elif id == cls.SKAIBOX_DATABASECLOUD.value:
-                return SkaiboxDatabaseCloudMsg
-            elif id == cls.TRACKS_IN_DEALERSHIP.value:
-                return TracksInDealershipMsg
-            elif id == cls.INTERACTION_IN_DEALERSHIP.value:
-                return InteractionInDealershipMsg
-            elif id == cls.VEHICLE.value:
-                return VehicleMsg
-            elif id == cls.VEHICLE_SPOT_MONITOR.value:
-                return VehicleSpotMonitorMsg
-            elif id == cls.SKAI_EVENT.value:
-                return SkaiEventMsg
-            elif id == cls.SKAI_GOOEY.value:
-                return SkaiGooeyMsg
-            elif id == cls.MODULE_STATUS.value:
-                return ModuleStatusMsg
-            elif id == cls.ADAT_STATUS.value:
-                return AdatStatusMsg
-            else:
-                return None
+            # table lookup, filled in by @register_msg at import
+            return SkaiMsg.registry.get(id)
+
+    # msg id: SkaiMsg subclass, see register_msg
+    registry = {}
 
     @classmethod
     def pack(cls, protobuf_msg, verbose=False):
         if verbose:
             print(f'packing {cls.__name__} protobuf message')
-        msg_bytes = struct.pack('! H', cls.msg_type.value)
-        msg_bytes += protobuf_msg.SerializeToString() 
+        msg_bytes = cls.msg_id_bytes + protobuf_msg.SerializeToString()
         return msg_bytes
 
+    @classmethod
+    def pack_parts(cls, protobuf_msg):
+        """same as pack() but returns [msg id bytes, serialized msg] instead of copying them into one
+        buffer. senders and SkaiFrame take the list as is, for multi MB msgs it saves a full copy"""
+        return [cls.msg_id_bytes, protobuf_msg.SerializeToString()]
+
     @classmethod
     def unpack(cls, msg_bytes, verbose=False):
         """unpacks message after decoding message id and forwarding to appropriate function
 
+        prints and returns (None, None) on failure, see try_unpack() / unpack_strict()
+        for the reason instead
+
         Args:
-            msg_bytes (bytes): bytes from message payload
+            msg_bytes (bytes): bytes from message payload, or a record starting with a versioned frame header
 
         Returns:
             SkaiMsg.MsgType enum
             ProtobufMsg
         """
         try:
-            msg_type_id = cls.unpack_msgid(msg_bytes)
-            classRef = cls.MsgType.get_class_from_id(msg_type_id)
-            if classRef is not None:
-                if verbose:
-                    print(f'unpacking {classRef.__name__}')
-                msg = classRef.proto_msg_class()
-                msg.ParseFromString(msg_bytes[2:]) # unpack after the 2 msg type bytes
-                return classRef.msg_type, msg
-            else:
-                print('msg id not found')
-                return None, None
-        except Warning:
-            print(f'warning during SkaiMsg unpack!!')
+            return cls.unpack_strict(msg_bytes, verbose)
+        except UnknownMsgTypeError:
+            print('msg id not found')
         except Exception as e:
+            # UnpackError, or anything unpack_strict() did not expect
             print(f'[SkaiMsg.unpack Exception]: {e}')
-            return None, None
+        return None, None
+
+    @classmethod
+    def unpack_strict(cls, msg_bytes, verbose=False):
+        """same as unpack() but raises instead of printing
+
+        Raises:
+            UnknownMsgTypeError: msg id is not registered
+            MsgDecodeError: msg bytes are truncated, not bytes at all or the protobuf does not parse,
+                or a batch record (unpack each of SkaiFrame.split_msgs() instead)
+
+        Returns:
+            SkaiMsg.MsgType enum
+            ProtobufMsg
+        """
+        try:
+            if len(msg_bytes) < 2:
+                raise MsgDecodeError(f'{len(msg_bytes)} bytes is too short for a msg id')
+            if msg_bytes[0] == cls.frame_magic_byte:
+                # skip the frame header of versioned records
+                header_len, header = SkaiFrame.parse_header(msg_bytes)
+                if header.flags & SkaiFrame.BATCH:
+                    raise MsgDecodeError(f'batch record of msg type {header.msg_type}, unpack each msg of '
+                                         f'SkaiFrame.split_msgs() instead', header.msg_type)
+                msg_bytes, header = SkaiFrame.split(msg_bytes)
+                if len(msg_bytes) < 2:
+                    raise MsgDecodeError(f'{len(msg_bytes)} bytes is too short for a msg id')
+            msg_type_id = cls.msg_id_struct.unpack_from(msg_bytes)[0]
+        except UnpackError:
+            raise
+        except Exception as e:
+            # FrameError, or a TypeError / struct.error for something that is not a bytes-like object
+            raise MsgDecodeError(str(e)) from e
+
+        classRef = cls.registry.get(msg_type_id)
+        if classRef is None:
+            raise UnknownMsgTypeError(f'msg id {msg_type_id} not found', msg_type_id)
+        if verbose:
+            print(f'unpacking {classRef.__name__}')
+
+        msg = classRef.proto_msg_class()
+        try:
+            # unpack after the 2 msg type bytes, without copying them
+            msg.ParseFromString(memoryview(msg_bytes)[2:])
+        except Exception as e:
+            raise MsgDecodeError(f'{classRef.__name__} did not parse: {e}', msg_type_id) from e
+        return classRef.msg_type, msg
+
+    @classmethod
+    def try_unpack(cls, msg_bytes, verbose=False):
+        """same as unpack() but never prints or raises
+
+        Returns:
+            UnpackResult: (msg_type, msg, error), error is None on success
+                and an UnpackError otherwise (msg_type and msg are then None)
+        """
+        try:
+            msg_type, msg = cls.unpack_strict(msg_bytes, verbose)
+        except UnpackError as e:
+            return UnpackResult(None, None, e)
+        return UnpackResult(msg_type, msg, None)
 
     @staticmethod
     def unpack_msgid(msg_bytes):
+        if isinstance(msg_bytes, (list, tuple)):
+            # pack_parts() output
+            return SkaiFrame.msg_type_of(msg_bytes)
         try:
+            # versioned records (batches and compressed ones too) carry it in the header
+            header_len, header = SkaiFrame.parse_header(msg_bytes)
+            if header_len:
+                return header.msg_type
             return struct.unpack('! H', msg_bytes[:2])[0]
         except:
             print(f'could not unpack msg id!')
@@ -199,6 +235,148 @@ class SkaiMsg(ABC):
         else:
             print(f'unsupported type for conversion: {type(int_or_list)}')
 
+    """ numpy bulk conversion helpers
+
+    the getters read lists of submessages (embeddings, boxes, ...) into one
+    float32 array. the setters build the protobuf wire bytes of every
+    submessage with numpy and merge them in with one MergeFromString call
+    each, instead of one python attribute set per float.
+    """
+
+    # packed repeated float field 1, the vals of every embedding message
+    embedding_vals_key = (1 << 3) | 2
+
+    @staticmethod
+    def encode_varint(value):
+        encoded = bytearray()
+        while value >= 0x80:
+            encoded.append((value & 0x7f) | 0x80)
+            value >>= 7
+        encoded.append(value)
+        return bytes(encoded)
+
+    @staticmethod
+    def float_fields_wire(values, field_numbers):
+        """protobuf wire bytes setting float fields, one row per message
+
+        Args:
+            values (array-like): (N, K) values of K float fields
+            field_numbers (list): protobuf field number of each of the K fields, below 16
+
+        Returns:
+            np.ndarray: (N, 5 * K) uint8, row i is MergeFromString input for message i
+        """
+        values = np.ascontiguousarray(values, dtype='<f4')
+        n, k = values.shape
+        wire = np.empty((n, k, 5), dtype=np.uint8)
+        wire[:, :, 0] = [(number << 3) | 5 for number in field_numbers]
+        wire[:, :, 1:] = values.view(np.uint8).reshape(n, k, 4)
+        return wire.reshape(n, 5 * k)
+
+    @staticmethod
+    def float_fields_to_numpy(msgs, field_names):
+        """returns (N, K) float32 of the named float fields of N messages"""
+        getter = operator.attrgetter(*field_names)
+        return np.array([getter(msg) for msg in msgs], dtype=np.float32).reshape(len(msgs), len(field_names))
+
+    @classmethod
+    def set_float_fields(cls, msgs, field_names, values):
+        """sets the named float fields of N messages from (N, K) values"""
+        values = np.asarray(values)
+        if values.shape != (len(msgs), len(field_names)):
+            raise ValueError(f'expected shape {(len(msgs), len(field_names))} for {len(msgs)} msgs, got {values.shape}')
+        if not len(msgs):
+            return
+        descriptor = msgs[0].DESCRIPTOR
+        wire = cls.float_fields_wire(values, [descriptor.fields_by_name[name].number for name in field_names])
+        for msg, msg_wire in zip(msgs, wire):
+            msg.MergeFromString(msg_wire.tobytes())
+
+    @classmethod
+    def embeddings_to_numpy(cls, embeddings, dim=None):
+        """returns the vals of N embedding messages as an (N, dim) float32 array
+
+        rows of embeddings without vals are nan
+
+        Args:
+            embeddings (list): FaceEmbedding / BBoxEmbedding messages
+            dim (int, optional): embedding length, None takes it from the first non empty one. Defaults to None.
+
+        Raises:
+            ValueError: an embedding is not dim long
+
+        Returns:
+            np.ndarray: (N, dim) float32
+        """
+        # the serialized vals are the packed little endian floats, so every
+        # embedding is one serialize and a bytes slice instead of dim python floats
+        key = cls.embedding_vals_key
+        rows = []
+        for embedding in embeddings:
+            data = embedding.SerializeToString()
+            if not data or data[0] != key:
+                rows.append(None)
+                continue
+            length = 0
+            shift = 0
+            pos = 1
+            while True:
+                b = data[pos]
+                pos += 1
+                length |= (b & 0x7f) << shift
+                if b < 0x80:
+                    break
+                shift += 7
+            if dim is None:
+                dim = length // 4
+            if length != dim * 4:
+                raise ValueError(f'embedding {len(rows)} has {length // 4} vals, expected {dim}')
+            rows.append(data[pos:pos + length])
+
+        if dim is None:
+            dim = 0
+        if all(row is not None for row in rows):
+            return np.frombuffer(b''.join(rows), dtype='<f4').astype(np.float32).reshape(len(rows), dim)
+        array = np.full((len(rows), dim), np.nan, dtype=np.float32)
+        for i, row in enumerate(rows):
+            if row is not None:
+                array[i] = np.frombuffer(row, dtype='<f4')
+        return array
+
+    @classmethod
+    def set_embeddings(cls, embeddings, array, timestamp=None):
+        """replaces the vals of N embedding messages with the rows of an (N, dim) array
+
+        Args:
+            embeddings (list): FaceEmbedding / BBoxEmbedding messages
+            array (array-like): (N, dim) values
+            timestamp (int, optional): also sets every embedding's timestamp. Defaults to None.
+        """
+        array = np.ascontiguousarray(array, dtype='<f4')
+        if array.ndim != 2 or array.shape[0] != len(embeddings):
+            raise ValueError(f'expected shape ({len(embeddings)}, dim) for {len(embeddings)} embeddings, got {array.shape}')
+        row_len = array.shape[1] * 4
+        prefix = bytes([cls.embedding_vals_key]) + cls.encode_varint(row_len)
+        data = array.tobytes()
+        for i, embedding in enumerate(embeddings):
+            # merging appends to repeated fields, so clear the old vals first
+            embedding.ClearField('vals')
+            embedding.MergeFromString(prefix + data[i * row_len:(i + 1) * row_len])
+            if timestamp:
+                embedding.timestamp = timestamp
+
+    tlbr_fields = ['top', 'left', 'bottom', 'right']
+
+    @classmethod
+    def tlbr_boxes_to_numpy(cls, boxes):
+        """returns N TLBR_Box messages as an (N, 4) float32 [top, left, bottom, right] array"""
+        return cls.float_fields_to_numpy(boxes, cls.tlbr_fields)
+
+    @classmethod
+    def set_tlbr_boxes(cls, boxes, tlbr):
+        """sets N TLBR_Box messages from an (N, 4) [top, left, bottom, right] array"""
+        cls.set_float_fields(boxes, cls.tlbr_fields, tlbr)
+
     """ required class variables in subclasses """
     
     @property
@@ -211,7 +389,58 @@ class SkaiMsg(ABC):
         """ required variable in subclass """
         raise NotImplementedError
 
+    msg_id_struct = struct.Struct('! H')
+    # first byte of versioned records, msg ids always start with 0x00
+    frame_magic_byte = SkaiFrame.magic[0]
+
+
+class UnpackError(ValueError):
+    """msg bytes could not be unpacked, msg_type_id is None if it could not be read"""
+
+    def __init__(self, message, msg_type_id=None):
+        super().__init__(message)
+        self.msg_type_id = msg_type_id
+
+
+class UnknownMsgTypeError(UnpackError):
+    """msg id is not registered"""
+
+
+class MsgDecodeError(UnpackError):
+    """msg bytes are truncated or the protobuf does not parse"""
+
+
+# result of SkaiMsg.try_unpack
+UnpackResult = namedtuple('UnpackResult', ['msg_type', 'msg', 'error'])
 
+
+def register_msg(msg_class):
+    """class decorator adding a SkaiMsg subclass to the msg id dispatch table
+
+    msg_type can be a SkaiMsg.MsgType member or a plain int id for types
+    that are not in the enum. ids must fit in 16 bits and be below 256 so
+    msg bytes keep their leading 0x00 (see SkaiFrame)
+
+    @register_msg
+    class MyMsg(SkaiMsg):
+        msg_type = 42
+        proto_msg_class = MyProtoMsg
+    """
+    msg_type = msg_class.msg_type
+    msg_id = msg_type.value if isinstance(msg_type, Enum) else msg_type
+    if not isinstance(msg_id, int) or not 0 < msg_id < 256:
+        raise ValueError(f'{msg_class.__name__} msg_type {msg_type} must be an int id between 1 and 255')
+    registered = SkaiMsg.registry.get(msg_id)
+    if registered is not None and registered.__qualname__ != msg_class.__qualname__:
+        raise ValueError(f'msg id {msg_id} of {msg_class.__name__} is already registered to {registered.__name__}')
+
+    msg_class.msg_id = msg_id
+    msg_class.msg_id_bytes = SkaiMsg.msg_id_struct.pack(msg_id)
+    SkaiMsg.registry[msg_id] = msg_class
+    return msg_class
+
+
+@register_msg
 class SkaimotMsg(SkaiMsg):
     """SkaiMOT message packing/unpacking/port definitions"""
     msg_type = SkaiMsg.MsgType.SKAIMOT
@@ -237,6 +466,36 @@ class SkaimotMsg(SkaiMsg):
         if timestamp:
             person_or_vehicle.bbox_embedding.timestamp = timestamp
 
+    """ numpy bulk helpers, one array per camera frame
+
+    embeds = SkaimotMsg.face_embeds_to_numpy(camframe.people_in_frame)    # (N, 512)
+    SkaimotMsg.set_bboxes(camframe.people_in_frame, tlbr)                # (N, 4)
+    """
+    @classmethod
+    def bboxes_to_numpy(cls, people_or_vehicles):
+        return cls.tlbr_boxes_to_numpy([obj.box for obj in people_or_vehicles])
+
+    @classmethod
+    def set_bboxes(cls, people_or_vehicles, tlbr):
+        cls.set_tlbr_boxes([obj.box for obj in people_or_vehicles], tlbr)
+
+    @classmethod
+    def face_embeds_to_numpy(cls, people, dim=None):
+        return cls.embeddings_to_numpy([person.face_embedding for person in people], dim)
+
+    @classmethod
+    def set_face_embeds(cls, people, face_embeds, timestamp=None):
+        cls.set_embeddings([person.face_embedding for person in people], face_embeds, timestamp)
+
+    @classmethod
+    def bbox_embeds_to_numpy(cls, people_or_vehicles, dim=None):
+        return cls.embeddings_to_numpy([obj.bbox_embedding for obj in people_or_vehicles], dim)
+
+    @classmethod
+    def set_bbox_embeds(cls, people_or_vehicles, bbox_embeds, timestamp=None):
+        cls.set_embeddings([obj.bbox_embedding for obj in people_or_vehicles], bbox_embeds, timestamp)
+
+@register_msg
 class PoseMsg(SkaiMsg):
     """Pose message packing/unpacking/port definitions"""
     msg_type = SkaiMsg.MsgType.POSE
@@ -296,6 +555,69 @@ class PoseMsg(SkaiMsg):
     def set_xy(keypoint, xy):
         keypoint.x, keypoint.y = xy
 
+    """ numpy bulk helpers, one array per camera frame
+
+    keypoints = PoseMsg.keypoints_to_numpy([p.keypoints for p in camframe.people_in_frame])   # (N, 33, 2)
+
+    take Keypoints messages, so they work on LocalTrackMsg pose_keypoints too
+    """
+    # xy keypoint fields in field number order, same order as set_keypoints()
+    keypoint_fields = [field for field in PoseProtoMsg.CameraFrame.Person.DESCRIPTOR.fields_by_name['keypoints'].message_type.fields
+                       if field.message_type is not None]
+    keypoint_names = [field.name for field in keypoint_fields]
+    keypoints_getter = operator.attrgetter(*keypoint_names)
+    keypoints_wire = None
+
+    @classmethod
+    def keypoints_wire_layout(cls):
+        """returns (template, float columns) of the Keypoints wire bytes set_keypoints_from_numpy() merges
+
+        every xy is [key of its keypoint field][length 10][x float field][y float field],
+        the template has the keys and lengths, float columns are the byte positions of
+        the 33 * 2 floats in keypoint_names order
+        """
+        if cls.keypoints_wire is None:
+            template = bytearray()
+            float_columns = []
+            for field in cls.keypoint_fields:
+                template += cls.encode_varint((field.number << 3) | 2) + b'\x0a'
+                for xy_key in (0x0d, 0x15):
+                    template.append(xy_key)
+                    float_columns += range(len(template), len(template) + 4)
+                    template += bytes(4)
+            cls.keypoints_wire = (np.frombuffer(template, dtype=np.uint8), np.array(float_columns))
+        return cls.keypoints_wire
+
+    @classmethod
+    def keypoints_to_numpy(cls, keypoints_msgs):
+        """returns N Keypoints messages as an (N, 33, 2) float32 array of xy"""
+        getter = cls.keypoints_getter
+        values = [[(xy.x, xy.y) for xy in getter(keypoints)] for keypoints in keypoints_msgs]
+        return np.array(values, dtype=np.float32).reshape(len(keypoints_msgs), len(cls.keypoint_names), 2)
+
+    @classmethod
+    def set_keypoints_from_numpy(cls, keypoints_msgs, keypoints, timestamp=None):
+        """sets N Keypoints messages from an (N, 33, 2) array of xy
+
+        Args:
+            keypoints_msgs (list): Keypoints messages
+            keypoints (array-like): (N, 33, 2) xy, in keypoint_names order
+            timestamp (int, optional): also sets every Keypoints timestamp. Defaults to None.
+        """
+        num_keypoints = len(cls.keypoint_names)
+        keypoints = np.asarray(keypoints)
+        if keypoints.shape != (len(keypoints_msgs), num_keypoints, 2):
+            raise ValueError(f'expected shape {(len(keypoints_msgs), num_keypoints, 2)}, got {keypoints.shape}')
+        n = len(keypoints_msgs)
+        template, float_columns = cls.keypoints_wire_layout()
+        wire = np.tile(template, (n, 1))
+        wire[:, float_columns] = np.ascontiguousarray(keypoints, dtype='<f4').view(np.uint8).reshape(n, -1)
+        for keypoints_msg, msg_wire in zip(keypoints_msgs, wire):
+            keypoints_msg.MergeFromString(msg_wire.tobytes())
+            if timestamp:
+                keypoints_msg.timestamp = timestamp
+
+@register_msg
 class FeetPosMsg(SkaiMsg):
 
     msg_type = SkaiMsg.MsgType.FEETPOS
@@ -310,7 +632,26 @@ class FeetPosMsg(SkaiMsg):
         feetpos.x, feetpos.y, feetpos.z = xyz
         if timestamp:
             feetpos.timestamp = timestamp
-    
+
+    """ numpy bulk helpers, one array per camera frame """
+
+    feet_pos_fields = ['x', 'y', 'z']
+
+    @classmethod
+    def feet_pos_to_numpy(cls, people):
+        """returns the feet positions of N people as an (N, 3) float32 xyz array"""
+        return cls.float_fields_to_numpy([person.feet_position for person in people], cls.feet_pos_fields)
+
+    @classmethod
+    def set_feet_pos_from_numpy(cls, people, xyz, timestamp=None):
+        """sets the feet positions of N people from an (N, 3) xyz array"""
+        feet_positions = [person.feet_position for person in people]
+        cls.set_float_fields(feet_positions, cls.feet_pos_fields, xyz)
+        if timestamp:
+            for feetpos in feet_positions:
+                feetpos.timestamp = timestamp
+
+@register_msg
 class LocalTrackMsg(SkaiMsg):
     msg_type = SkaiMsg.MsgType.LOCALTRACK
     proto_msg_class = LocalTrackProtoMsg
@@ -394,6 +735,7 @@ class LocalTrackMsg(SkaiMsg):
     def copy_action(action, actionperson):
         pass
 
+@register_msg
 class GlobalTrackMsg(SkaiMsg):
     msg_type = SkaiMsg.MsgType.GLOBALTRACK
     proto_msg_class = GlobalTrackProtoMsg
@@ -406,46 +748,54 @@ class GlobalTrackMsg(SkaiMsg):
         global_bbox.bottom = tlbr_box.bottom
         global_bbox.right = tlbr_box.right
 
+@register_msg
 class ActionMsg(SkaiMsg):
     msg_type = SkaiMsg.MsgType.ACTION
     proto_msg_class = ActionProtoMsg
     ports = list(range(6500, 6600))
 
+@register_msg
 class SkaiboxDealershipMsg(SkaiMsg):
     msg_type = SkaiMsg.MsgType.SKAIBOX_DEALERSHIP
     proto_msg_class = SkaiboxDealershipMsgProtoMsg
     ports_command = list(range(7000, 7100))     # ports to send/recieve commands 
     ports_response = list(range(7100, 7200))    # ports to send/recieve responses
 
+@register_msg
 class SkaiboxCameraCalibrationMsg(SkaiMsg):
     msg_type = SkaiMsg.MsgType.SKAIBOX_CAMERACALIBRATION
     proto_msg_class = SkaiboxCameraCalibrationMsgProtoMsg
     ports_command = list(range(7000, 7100))     # ports to send/recieve commands 
     ports_response = list(range(7100, 7200))    # ports to send/recieve responses
 
+@register_msg
 class SkaiboxCameraGroupMsg(SkaiMsg):
     msg_type = SkaiMsg.MsgType.SKAIBOX_CAMERAGROUP
     proto_msg_class = SkaiboxCameraGroupMsgProtoMsg
     ports_command = list(range(7000, 7100))     # ports to send/recieve commands 
     ports_response = list(range(7100, 7200))    # ports to send/recieve responses
 
+@register_msg
 class SkaiboxDatabaseCloudMsg(SkaiMsg):
     msg_type = SkaiMsg.MsgType.SKAIBOX_DATABASECLOUD
     proto_msg_class = SkaiboxDatabaseCloudMsgProtoMsg
     ports_command = list(range(7000, 7100))     # ports to send/recieve commands 
     ports_response = list(range(7100, 7200))    # ports to send/recieve responses
 
+@register_msg
 class TracksInDealershipMsg(SkaiMsg):
     msg_type = SkaiMsg.MsgType.TRACKS_IN_DEALERSHIP
     proto_msg_class = TracksInDealershipProtoMsg
     ports = list(range(7310, 7320)) # only few per dealership needed
     ports_skai = list(range(7340,7350)) # send duplicate message to skai
 
+@register_msg
 class InteractionInDealershipMsg(SkaiMsg):
     msg_type = SkaiMsg.MsgType.INTERACTION_IN_DEALERSHIP
     proto_msg_class = InteractionInDealershipProtoMsg
     ports = list(range(7320, 7330)) # only few per dealership needed
 
+@register_msg
 class VehicleMsg(SkaiMsg):
     msg_type = SkaiMsg.MsgType.VEHICLE
     proto_msg_class = VehicleProtoMsg
@@ -456,16 +806,19 @@ class VehicleMsg(SkaiMsg):
     def set_box_from_list(box, tlbr_list):
         box.top, box.left, box.bottom, box.right = tlbr_list
 
+@register_msg
 class VehicleSpotMonitorMsg(SkaiMsg):
     msg_type = SkaiMsg.MsgType.VEHICLE_SPOT_MONITOR
     proto_msg_class = VehicleSpotMonitorProtoMsg
     ports = list(range(6900,7000))
 
+@register_msg
 class SkaiEventMsg(SkaiMsg):
     msg_type = SkaiMsg.MsgType.SKAI_EVENT
     proto_msg_class = SkaiEventProtoMsg
     ports = list(range(7200,7300))
 
+@register_msg
 class SkaiGooeyMsg(SkaiMsg):
     msg_type = SkaiMsg.MsgType.SKAI_GOOEY
     proto_msg_class = SkaiGooeyProtoMsg
@@ -474,11 +827,13 @@ class SkaiGooeyMsg(SkaiMsg):
     # event from interaction to gui
     interacts2gooey_ports = list(range(7330, 7340))
 
+@register_msg
 class ModuleStatusMsg(SkaiMsg):
     msg_type = SkaiMsg.MsgType.MODULE_STATUS
     proto_msg_class = ModuleStatusProtoMsg
     ports = list(range(7350, 7360))
     
+@register_msg
 class AdatStatusMsg(SkaiMsg):
     msg_type = SkaiMsg.MsgType.ADAT_STATUS
     proto_msg_class = AdatStatusProtoMsg
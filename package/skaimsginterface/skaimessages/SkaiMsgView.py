@@ -0,0 +1,272 @@
+#!/usr/bin/python3
+
+import struct
+
+from google.protobuf.descriptor import FieldDescriptor
+from google.protobuf.internal import api_implementation
+
+from skaimsginterface.skaimessages.SkaiMessages import SkaiMsg, MsgDecodeError, UnknownMsgTypeError
+from skaimsginterface.framing import SkaiFrame, FrameError
+
+
+class SkaiMsgView:
+    """lazy read-only view of packed SkaiMsg bytes
+
+    reads selected scalar fields straight off the protobuf wire bytes without
+    parsing the rest. nested and repeated messages on the way are walked, every
+    other field (embeddings, keypoints, people...) is skipped by its length, so
+    routing and filtering on camera ids or timestamps doesn't pay for a full
+    decode. decode() does the full parse on demand, once.
+
+    fields are named by dotted path, a repeated message along the path gives
+    a list with one value per entry:
+
+        view = SkaiMsgView(msg_bytes)
+        if view.msg_type == SkaiMsg.MsgType.SKAIMOT:
+            camera_ids = view.get('camera_frames.camera_id')    # [id, id, ...]
+        timestamp = view.get('timestamp')                       # LocalTrackMsg top level scalar
+        msg = view.decode()                                     # full protobuf when needed
+
+    like protobuf, missing scalars read as their default value.
+
+    the wire scan is pure python. on the pure python protobuf backend it is
+    ~1000x faster than a full parse of msgs with embeddings, but the C
+    backends (upb / cpp) parse those at close to memcpy speed, faster than
+    any python level scan. so by default get() only scans on the python
+    backend and otherwise reads the fields from a (cached) full decode.
+    same results either way, pass wire_scan to force one.
+    """
+
+    # wire types
+    VARINT = 0
+    FIXED64 = 1
+    LENGTH_DELIMITED = 2
+    FIXED32 = 5
+
+    fixed64_formats = {
+        FieldDescriptor.TYPE_DOUBLE: struct.Struct('<d'),
+        FieldDescriptor.TYPE_FIXED64: struct.Struct('<Q'),
+        FieldDescriptor.TYPE_SFIXED64: struct.Struct('<q'),
+    }
+    fixed32_formats = {
+        FieldDescriptor.TYPE_FLOAT: struct.Struct('<f'),
+        FieldDescriptor.TYPE_FIXED32: struct.Struct('<I'),
+        FieldDescriptor.TYPE_SFIXED32: struct.Struct('<i'),
+    }
+
+    # (proto msg class, path): list of FieldDescriptor, shared by every view
+    path_cache = {}
+
+    # default for wire_scan=None
+    python_backend = api_implementation.Type() == 'python'
+
+    def __init__(self, msg_bytes, wire_scan=None):
+        """
+        Args:
+            msg_bytes (bytes-like): SkaiMsg.pack() output or a record with a versioned frame header
+            wire_scan (bool, optional): read fields by scanning the wire bytes instead of a full decode.
+                None scans only on the pure python protobuf backend. Defaults to None.
+
+        Raises:
+            MsgDecodeError: too short or bad frame header, or a batch record (view each of SkaiFrame.split_msgs())
+            UnknownMsgTypeError: msg id is not registered
+        """
+        if len(msg_bytes) and msg_bytes[0] == SkaiMsg.frame_magic_byte:
+            try:
+                header_len, header = SkaiFrame.parse_header(msg_bytes)
+                if header.flags & SkaiFrame.BATCH:
+                    raise MsgDecodeError(f'batch record of msg type {header.msg_type}, view each msg of '
+                                         f'SkaiFrame.split_msgs() instead', header.msg_type)
+                msg_bytes, self.header = SkaiFrame.split(msg_bytes)
+            except FrameError as e:
+                raise MsgDecodeError(str(e)) from e
+        else:
+            self.header = SkaiFrame.legacy_header
+        if len(msg_bytes) < 2:
+            raise MsgDecodeError(f'{len(msg_bytes)} bytes is too short for a msg id')
+
+        self.msg_bytes = msg_bytes
+        self.msg_id = SkaiMsg.msg_id_struct.unpack_from(msg_bytes)[0]
+        self.msg_class = SkaiMsg.registry.get(self.msg_id)
+        if self.msg_class is None:
+            raise UnknownMsgTypeError(f'msg id {self.msg_id} not found', self.msg_id)
+        # protobuf bytes past the msg id
+        self.buf = memoryview(msg_bytes)[2:]
+        self.msg = None
+        self.wire_scan = self.python_backend if wire_scan is None else wire_scan
+
+    @property
+    def msg_type(self):
+        return self.msg_class.msg_type
+
+    def decode(self):
+        """full protobuf parse, cached"""
+        if self.msg is None:
+            msg = self.msg_class.proto_msg_class()
+            try:
+                msg.ParseFromString(self.buf)
+            except Exception as e:
+                raise MsgDecodeError(f'{self.msg_class.__name__} did not parse: {e}', self.msg_id) from e
+            self.msg = msg
+        return self.msg
+
+    def get(self, path):
+        """reads the scalar (or string / bytes) field at a dotted path without a full decode
+
+        Raises:
+            KeyError: path is not a field of this msg type
+            TypeError: path ends on a message field
+            MsgDecodeError: truncated or corrupt wire bytes
+
+        Returns:
+            value, or a list of values if the path goes through a repeated field
+        """
+        fields = self.resolve(self.msg_class.proto_msg_class, path)
+        if not self.wire_scan:
+            values = self.walk(self.decode(), fields, 0)
+        else:
+            try:
+                values = self.scan(self.buf, 0, len(self.buf), fields, 0)
+            except (IndexError, struct.error) as e:
+                raise MsgDecodeError(f'{self.msg_class.__name__} wire bytes truncated reading {path}', self.msg_id) from e
+
+        if any(self.is_repeated(f) for f in fields):
+            return values
+        if values:
+            return values[-1] # last one wins, same as a protobuf parse
+        return fields[-1].default_value
+
+    @classmethod
+    def resolve(cls, proto_msg_class, path):
+        key = (proto_msg_class, path)
+        fields = cls.path_cache.get(key)
+        if fields is None:
+            fields = []
+            descriptor = proto_msg_class.DESCRIPTOR
+            for name in path.split('.'):
+                if descriptor is None:
+                    raise KeyError(f'{path}: {fields[-1].name} is not a message')
+                field = descriptor.fields_by_name.get(name)
+                if field is None:
+                    raise KeyError(f'{path}: no field {name} in {descriptor.name}')
+                fields.append(field)
+                descriptor = field.message_type
+            if fields[-1].type in (FieldDescriptor.TYPE_MESSAGE, FieldDescriptor.TYPE_GROUP):
+                raise TypeError(f'{path} is a message, only scalar fields can be read lazily')
+            cls.path_cache[key] = fields
+        return fields
+
+    @staticmethod
+    def is_repeated(field):
+        is_repeated = getattr(field, 'is_repeated', None)
+        if is_repeated is None:
+            # protobuf < 5
+            return field.label == FieldDescriptor.LABEL_REPEATED
+        return is_repeated
+
+    @classmethod
+    def walk(cls, msg, fields, depth):
+        """returns the values of fields[depth:] in a decoded msg, same as scan()"""
+        field = fields[depth]
+        value = getattr(msg, field.name)
+        repeated = cls.is_repeated(field)
+        if depth == len(fields) - 1:
+            return list(value) if repeated else [value]
+        values = []
+        for item in (value if repeated else [value]):
+            values += cls.walk(item, fields, depth + 1)
+        return values
+
+    @staticmethod
+    def read_varint(buf, pos):
+        result = 0
+        shift = 0
+        while True:
+            b = buf[pos]
+            pos += 1
+            result |= (b & 0x7f) << shift
+            if b < 0x80:
+                return result, pos
+            shift += 7
+
+    @classmethod
+    def scan(cls, buf, pos, end, fields, depth):
+        """returns the values of fields[depth:] found in buf[pos:end]"""
+        field = fields[depth]
+        number = field.number
+        last = depth == len(fields) - 1
+        # proto3 leaves default scalars off the wire, so each submessage whose
+        # remaining path has no repeated field must still give exactly one value
+        single_tail = not last and not any(cls.is_repeated(f) for f in fields[depth + 1:])
+        values = []
+        read_varint = cls.read_varint
+        while pos < end:
+            # field keys and most lengths fit in one byte
+            key = buf[pos]
+            if key < 0x80:
+                pos += 1
+            else:
+                key, pos = read_varint(buf, pos)
+            wire_type = key & 0x7
+            if wire_type == cls.VARINT:
+                value, pos = read_varint(buf, pos)
+                if key >> 3 == number:
+                    values.append(cls.convert_varint(field, value))
+            elif wire_type == cls.LENGTH_DELIMITED:
+                length = buf[pos]
+                if length < 0x80:
+                    pos += 1
+                else:
+                    length, pos = read_varint(buf, pos)
+                if key >> 3 == number:
+                    if single_tail:
+                        sub_values = cls.scan(buf, pos, pos + length, fields, depth + 1)
+                        values.append(sub_values[-1] if sub_values else fields[-1].default_value)
+                    elif not last:
+                        values += cls.scan(buf, pos, pos + length, fields, depth + 1)
+                    elif field.type == FieldDescriptor.TYPE_STRING:
+                        values.append(str(buf[pos:pos + length], 'utf-8'))
+                    elif field.type == FieldDescriptor.TYPE_BYTES:
+                        values.append(bytes(buf[pos:pos + length]))
+                    else:
+                        values += cls.unpack_packed(field, buf, pos, pos + length)
+                pos += length
+            elif wire_type == cls.FIXED64:
+                if key >> 3 == number:
+                    values.append(cls.fixed64_formats[field.type].unpack_from(buf, pos)[0])
+                pos += 8
+            elif wire_type == cls.FIXED32:
+                if key >> 3 == number:
+                    values.append(cls.fixed32_formats[field.type].unpack_from(buf, pos)[0])
+                pos += 4
+            else:
+                raise MsgDecodeError(f'unsupported wire type {wire_type} in field {key >> 3}')
+        if pos > end:
+            raise MsgDecodeError(f'field overruns its message by {pos - end} bytes')
+        return values
+
+    @staticmethod
+    def convert_varint(field, value):
+        field_type = field.type
+        if field_type in (FieldDescriptor.TYPE_INT64, FieldDescriptor.TYPE_INT32) and value >= 1 << 63:
+            return value - (1 << 64)
+        if field_type in (FieldDescriptor.TYPE_SINT64, FieldDescriptor.TYPE_SINT32):
+            return (value >> 1) ^ -(value & 1)
+        if field_type == FieldDescriptor.TYPE_BOOL:
+            return bool(value)
+        return value
+
+    @classmethod
+    def unpack_packed(cls, field, buf, pos, end):
+        # packed repeated scalars (proto3 default)
+        if field.type in cls.fixed64_formats:
+            fmt = cls.fixed64_formats[field.type]
+            return [v[0] for v in fmt.iter_unpack(buf[pos:end])]
+        if field.type in cls.fixed32_formats:
+            fmt = cls.fixed32_formats[field.type]
+            return [v[0] for v in fmt.iter_unpack(buf[pos:end])]
+        values = []
+        while pos < end:
+            value, pos = cls.read_varint(buf, pos)
+            values.append(cls.convert_varint(field, value))
+        return values
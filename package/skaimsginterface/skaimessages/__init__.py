@@ -1 +1,2 @@
-from .SkaiMessages import *
\ No newline at end of file
+from .SkaiMessages import *
+from .SkaiMsgView import SkaiMsgView
@@ -0,0 +1,265 @@
+#!/usr/bin/python3
+
+import asyncio
+import inspect
+import struct
+import time
+
+from skaimsginterface.skaimessages import *
+from skaimsginterface.replay import FileRecorder
+from skaimsginterface.framing import SkaiFrame, FrameError, StreamStats
+
+# optional faster event loop
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+
+class AsyncMultiportTcpListener:
+
+    length_struct = struct.Struct('!I')
+
+    def __init__(self, portlist, multiport_callback_func, ipv6=False, verbose=False, recordfile=None, max_frame_size=256 * 1024 * 1024,
+                 transport_options=None, record_index=False, record_segment_bytes=None, record_segment_sec=None):
+        """skai multiport TCP listener serving every port from one asyncio event loop
+
+        unlike MultiportTcpListener / MultiportTcpListenerMP nothing is started in the
+        constructor. either await serve_forever() from your own event loop or call
+        run() to block on a new one (uvloop if installed).
+
+        def example_multiport_callback_func(data, server_address):
+            msg_type, msg = SkaiMsg.unpack(data)
+
+        async def example_async_multiport_callback_func(data, server_address):
+            msg_type, msg = SkaiMsg.unpack(data)
+            await do_something(msg)
+
+        Args:
+            portlist (list): ports to listen to
+            multiport_callback_func (function or coroutine function): your function, which should have params (data, server_address).
+                data is a memoryview of the msg bytes (checksum trailer excluded). coroutine functions are awaited,
+                so each connection's msgs are handled in order
+            ipv6 (bool): default val=False, defaults to using ipv4
+            verbose (bool, optional): controls additional print statements. Defaults to False.
+            recordfile (str, optional): skaibin file to record to. Defaults to None.
+            max_frame_size (int, optional): connections announcing a bigger frame are dropped. Defaults to 256 MB.
+            transport_options (TransportOptions, optional): socket options for the listening and accepted
+                sockets. Defaults to None.
+            record_index (bool, optional): write a SkaibinIndex next to recordfile while recording. Defaults to False.
+            record_segment_bytes (int, optional): record into rotating segments of this size, see
+                SkaibinSegments. Defaults to None.
+            record_segment_sec (float, optional): record into rotating segments of this duration. Defaults to None.
+
+        stream_stats holds a StreamStats (drops, reordering, latency) per open
+        connection, keyed by (port, peer address).
+        """
+        # type checking
+        if isinstance(portlist, int):
+            portlist = [portlist]
+        if not isinstance(portlist, list):
+            raise TypeError(
+                'portlist must be a list of integers or a single port integer')
+        for p in portlist:
+            if not isinstance(p, int):
+                raise TypeError(
+                    'portlist must be a list of integers or a single port integer'
+                )
+
+        # initialize file recorder if recordfile specified
+        self.recorder = None
+        if recordfile is not None:
+            print('opening recorder...')
+            self.recorder = FileRecorder(recordfile, index=record_index, max_segment_bytes=record_segment_bytes,
+                                         max_segment_sec=record_segment_sec)
+            self.recorder.open()
+
+        # initialize
+        self.verbose = verbose
+        self.portlist = portlist
+        self.multiport_callback_func = multiport_callback_func
+        self.callback_is_async = inspect.iscoroutinefunction(multiport_callback_func)
+        self.max_frame_size = max_frame_size
+        self.transport_options = transport_options
+        self.ipv6 = ipv6
+        if self.ipv6:
+            self.listen_addr = '::'
+        else:
+            self.listen_addr = '0.0.0.0'
+
+        self.loop = None
+        self.stopped = None
+        self.servers = []
+        self.connections = {} # writer: handler task
+        self.stream_stats = {}
+
+    def __del__(self):
+        if self.recorder is not None:
+            print('closing recorder...')
+            self.recorder.close()
+            self.recorder = None
+
+    async def start(self):
+        """starts listening on every port in portlist (returns once all are bound)"""
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        for port in self.portlist:
+            server_address = (self.listen_addr, port)
+            server = await asyncio.start_server(
+                lambda reader, writer, server_address=server_address: self.handle_connection(reader, writer, server_address),
+                host=self.listen_addr,
+                port=port,
+                reuse_address=True)
+            if self.transport_options is not None:
+                # already listening, buffer sizes still count for the window scale of later connections
+                for sock in server.sockets:
+                    self.transport_options.apply(sock)
+            self.servers.append(server)
+            if self.verbose:
+                print(f'now listening on {server_address}')
+
+    async def serve_forever(self):
+        """starts listening if needed and serves until stop() is called"""
+        if not self.servers:
+            await self.start()
+        try:
+            await self.stopped.wait()
+        finally:
+            await self.close()
+
+    def run(self, use_uvloop=True):
+        """blocks serving on a new event loop, uses uvloop when installed unless use_uvloop=False"""
+        if use_uvloop and uvloop is not None:
+            uvloop.run(self.serve_forever())
+        else:
+            asyncio.run(self.serve_forever())
+
+    def stop(self):
+        """stops serving, safe to call from any thread"""
+        if self.loop is None:
+            return
+        self.loop.call_soon_threadsafe(self.stopped.set)
+
+    async def close(self):
+        # stop accepting, then drop open connections so their handlers return
+        for server in self.servers:
+            server.close()
+        for writer in list(self.connections):
+            writer.close()
+        await asyncio.gather(*self.connections.values(), return_exceptions=True)
+        for server in self.servers:
+            await server.wait_closed()
+        self.servers = []
+
+        # flush and close recorder once nothing else can be recorded
+        if self.recorder is not None:
+            print('closing recorder...')
+            self.recorder.close()
+            self.recorder = None
+
+    @property
+    def num_connections(self):
+        return len(self.connections)
+
+    async def handle_connection(self, reader, writer, server_address):
+        self.connections[writer] = asyncio.current_task()
+        stream_stats = StreamStats()
+        stream_key = (server_address[1], writer.get_extra_info('peername'))
+        self.stream_stats[stream_key] = stream_stats
+        sock = writer.get_extra_info('socket')
+        transport_options = self.transport_options
+        if transport_options is not None:
+            transport_options.apply(sock)
+        try:
+            while True:
+                # assumes first 4 bytes designate length of message
+                # (packed as network endian unsigned int)
+                length_bytes = await reader.readexactly(self.length_struct.size)
+
+                # log timestamp of first packet arrival
+                firstpacket_timestamp = time.time()
+
+                length = self.length_struct.unpack(length_bytes)[0]
+                if length > self.max_frame_size:
+                    print(f'frame length {length} on {server_address} exceeds max_frame_size. dropping connection')
+                    break
+
+                data = await reader.readexactly(length)
+                if transport_options is not None:
+                    transport_options.rearm(sock)
+                await self.multiport_callback(data, server_address, firstpacket_timestamp, stream_stats)
+
+        except asyncio.IncompleteReadError:
+            pass # connection closed, possibly mid frame
+        except ConnectionError as e:
+            if self.verbose:
+                print(f'connection on {server_address} closed: {e}')
+        finally:
+            self.connections.pop(writer, None)
+            self.stream_stats.pop(stream_key, None)
+            writer.close()
+            if self.verbose:
+                print(f'connection {stream_key[1]} on {server_address} closed: {stream_stats}')
+
+    async def multiport_callback(self, data, server_address, firstpacket_timestamp, stream_stats=None):
+        # verify checksum (legacy or versioned frame) without slicing copies
+        try:
+            record, header = SkaiFrame.strip_checksum(data)
+            msgs, header = SkaiFrame.split_msgs(record)
+            checksum_ok = True
+        except FrameError as e:
+            checksum_ok = False
+            error = e
+
+        if checksum_ok:
+            if stream_stats is not None:
+                gap = stream_stats.update(header, firstpacket_timestamp)
+                if gap and self.verbose:
+                    print(f'{gap} msgs missing before sequence {header.sequence} on {server_address}')
+
+            if self.recorder is not None:
+                port = server_address[1]
+                if self.verbose:
+                    print(f'recording msg length {len(record)} on port: {port} firstpacket_ts {firstpacket_timestamp}')
+                self.recorder.record(record, firstpacket_timestamp, port)
+
+            # batch frames carry several msgs, each goes to the callback on its own
+            for msg in msgs:
+                try:
+                    if self.callback_is_async:
+                        await self.multiport_callback_func(msg, server_address)
+                    else:
+                        self.multiport_callback_func(msg, server_address)
+                except Exception as e:
+                    print(f'multiport callback exception: {e}')
+
+        elif self.verbose:
+            print(error)
+
+
+def example_multiport_callback_func(data, server_address):
+    # store it, unpack, etc do as you wish
+    msg_type, msg = SkaiMsg.unpack(data)
+    print(
+        f'got some data length {len(data)} from {server_address} msg type {msg_type}\n'
+    )
+
+
+if __name__ == '__main__':
+    # ports to listen to
+    camgroup_idx = 0
+    ports = [
+        SkaimotMsg.ports[camgroup_idx], PoseMsg.ports[camgroup_idx],
+        FeetPosMsg.ports[camgroup_idx], LocalTrackMsg.ports[camgroup_idx],
+        GlobalTrackMsg.ports[camgroup_idx], ActionMsg.ports[camgroup_idx]
+    ]
+
+    # listen until ctrl+c input
+    listener = AsyncMultiportTcpListener(
+        portlist=ports,
+        multiport_callback_func=example_multiport_callback_func,
+        verbose=True)
+    try:
+        listener.run()
+    except KeyboardInterrupt:
+        print('exiting now...')
@@ -0,0 +1,276 @@
+#!/usr/bin/python3
+
+import asyncio
+import random
+import socket
+import struct
+import time
+
+from skaimsginterface.skaimessages import *
+from skaimsginterface.framing import SkaiFrame
+
+
+class AsyncTcpSender:
+
+    ipv4_localhost = '127.0.0.1'
+    ipv6_localhost = '::1' # expands to 0:0:0:0:0:0:0:1, listen on '::' for receiving
+
+    length_struct = struct.Struct('!I')
+
+    def __init__(self,
+                 host_ip,
+                 port,
+                 retryTimeoutSec=0.5,
+                 maxRetryTimeoutSec=30,
+                 high_watermark=8 * 1024 * 1024,
+                 low_watermark=2 * 1024 * 1024,
+                 max_buffer_size=64 * 1024 * 1024,
+                 ipv6=False, # default to ipv4
+                 checksum_type=None, # legacy md5 frames, see SkaiFrame.pack
+                 compression=None,
+                 compress_min_bytes=1024,
+                 transport_options=None, # TransportOptions, None keeps os defaults
+                 verbose=False) -> None:
+        """skai TCP sender for code that already runs an asyncio event loop
+
+        send() never blocks: it queues the frame and a background task
+        writes everything queued since its last write with one writelines
+        call. await drain() for backpressure, it waits while more than
+        high_watermark bytes are buffered until the buffer falls below
+        low_watermark. reconnects use jittered exponential backoff with
+        asyncio.sleep, so other senders on the same loop keep going.
+        frames in flight when a connection breaks are queued again and
+        resent after reconnecting.
+
+        example:
+            sender = AsyncTcpSender('127.0.0.1', SkaimotMsg.ports[0])
+            await sender.start()
+            sender.send(SkaimotMsg.pack(msg))
+            await sender.drain()
+            ...
+            await sender.close()
+
+        Args:
+            host_ip (str): destination ip
+            port (int): destination port
+            retryTimeoutSec (float, optional): first reconnect delay, doubles per failed attempt. Defaults to 0.5.
+            maxRetryTimeoutSec (float, optional): cap on the reconnect delay. Defaults to 30.
+            high_watermark (int, optional): buffered bytes above which drain() waits. Defaults to 8 MB.
+            low_watermark (int, optional): buffered bytes below which waiting drain() calls return. Defaults to 2 MB.
+            max_buffer_size (int, optional): send() drops msgs that would grow the buffer past this. Defaults to 64 MB.
+            ipv6 (bool, optional): use ipv6. Defaults to False.
+            checksum_type (FrameChecksum.Type, optional): None sends legacy md5 frames. Defaults to None.
+            compression (FrameCompression.Type, optional): compress msgs of at least compress_min_bytes, needs a
+                checksum_type. runs in send(), on the event loop. Defaults to None.
+            compress_min_bytes (int, optional): smaller msgs go out uncompressed. Defaults to 1024.
+            transport_options (TransportOptions, optional): socket options applied before connecting. Defaults to None.
+            verbose (bool, optional): controls additional print statements. Defaults to False.
+        """
+        if low_watermark > high_watermark:
+            raise ValueError('low_watermark must not be above high_watermark')
+        self.destination = (host_ip, port)
+        self.retryTimeoutSec = retryTimeoutSec
+        self.maxRetryTimeoutSec = maxRetryTimeoutSec
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.max_buffer_size = max_buffer_size
+        self.ipv6 = ipv6
+        self.verbose = verbose
+        SkaiFrame.check_compression(compression, checksum_type)
+        self.checksum_type = checksum_type
+        self.compression = compression
+        self.compress_min_bytes = compress_min_bytes
+        self.transport_options = transport_options
+        # sequence number of the next versioned frame, one stream per sender
+        self.sequence = 0
+        if self.ipv6:
+            self.localhost = self.ipv6_localhost
+        else:
+            self.localhost = self.ipv4_localhost
+
+        # queued frames as lists of buffers, plus bytes queued or in flight
+        self.pending = []
+        self.buffered_bytes = 0
+
+        # stats
+        self.sent_msgs = 0
+        self.dropped_msgs = 0
+        self.reconnects = 0
+
+        self.reader = None
+        self.writer = None
+        self.writer_task = None
+        self.closing = False
+
+        # asyncio primitives are created in start() on the running loop
+        self.data_ready = None
+        self.writable = None
+        self.connected = None
+
+    async def start(self):
+        """starts the background writer task, connection happens in the background"""
+        self.data_ready = asyncio.Event()
+        self.writable = asyncio.Event()
+        self.writable.set()
+        self.connected = asyncio.Event()
+        self.writer_task = asyncio.create_task(self.writer_loop())
+
+    def is_connected(self):
+        return self.connected is not None and self.connected.is_set()
+
+    def send(self, msg_bytes, send_failed_checksum=False):
+        """queues msg_bytes for sending without blocking
+
+        Returns:
+            bool: False if the msg was dropped because the buffer is at max_buffer_size
+        """
+        if self.writer_task is None:
+            raise RuntimeError('call await start() before sending')
+
+        # frame msg with checksum (intentionally false if send_failed_checksum), sequence
+        # number and send timestamp. legacy frames (checksum_type None) carry neither
+        frame_body = SkaiFrame.pack(msg_bytes, self.checksum_type, self.sequence,
+                                    corrupt_checksum=send_failed_checksum, compression=self.compression,
+                                    compress_min_bytes=self.compress_min_bytes)
+        self.sequence += 1
+
+        # length prefix and frame body stay separate buffers (no concatenation)
+        frame_len = sum(len(b) for b in frame_body)
+        frame = [self.length_struct.pack(frame_len)] + frame_body
+        frame_size = self.length_struct.size + frame_len
+        if self.buffered_bytes + frame_size > self.max_buffer_size:
+            self.dropped_msgs += 1
+            if self.verbose:
+                print(f'{self.destination} send buffer full, dropping {SkaiMsg.getMessageTypeName(msg_bytes)} message')
+            return False
+
+        self.pending.append(frame)
+        self.buffered_bytes += frame_size
+        if self.buffered_bytes > self.high_watermark:
+            self.writable.clear()
+        self.data_ready.set()
+        return True
+
+    async def drain(self):
+        """waits while the buffer is above the high watermark until it falls below the low watermark"""
+        await self.writable.wait()
+
+    async def send_and_drain(self, msg_bytes, send_failed_checksum=False):
+        sent = self.send(msg_bytes, send_failed_checksum)
+        await self.drain()
+        return sent
+
+    async def connect(self):
+        # keep trying with jittered exponential backoff until connected or closing
+        attempt = 0
+        while not self.closing:
+            try:
+                family = socket.AF_INET6 if self.ipv6 else socket.AF_INET
+                if self.transport_options is None:
+                    self.reader, self.writer = await asyncio.open_connection(*self.destination, family=family)
+                else:
+                    # own socket so the options are set before connecting
+                    sock = socket.socket(family, socket.SOCK_STREAM)
+                    try:
+                        self.transport_options.apply(sock)
+                        sock.setblocking(False)
+                        await asyncio.get_running_loop().sock_connect(sock, self.destination)
+                    except BaseException:
+                        sock.close()
+                        raise
+                    self.reader, self.writer = await asyncio.open_connection(sock=sock)
+                self.connected.set()
+                if self.verbose:
+                    print(f'{self.destination} connected!')
+                return
+            except OSError as e:
+                delay = min(self.maxRetryTimeoutSec, self.retryTimeoutSec * 2 ** attempt)
+                delay *= random.uniform(0.5, 1.5)
+                attempt += 1
+                print(f'{self.destination} connection failed ({e}), trying again in {delay:.2f} seconds')
+                await asyncio.sleep(delay)
+
+    async def writer_loop(self):
+        while not self.closing:
+            if self.writer is None:
+                await self.connect()
+                continue
+
+            await self.data_ready.wait()
+            self.data_ready.clear()
+            if not self.pending:
+                continue
+
+            # coalesce everything queued since the last write
+            batch, self.pending = self.pending, []
+            batch_size = 0
+            buffers = []
+            for frame in batch:
+                buffers.extend(frame)
+                batch_size += sum(len(b) for b in frame)
+            try:
+                # listeners never send, so eof means the peer closed. catching it here
+                # keeps the batch from being written into a dead connection
+                if self.reader.at_eof():
+                    raise ConnectionResetError('peer closed the connection')
+                self.writer.writelines(buffers)
+                await self.writer.drain()
+            except (OSError, ConnectionError) as e:
+                print(f'{self.destination} connection broken ({e})! reconnecting...')
+                self.connected.clear()
+                self.writer.close()
+                self.writer = None
+                self.reconnects += 1
+                # resend the whole batch after reconnecting, ahead of anything queued since
+                self.pending = batch + self.pending
+                self.data_ready.set()
+                continue
+
+            self.sent_msgs += len(batch)
+            self.buffered_bytes -= batch_size
+            if self.buffered_bytes < self.low_watermark:
+                self.writable.set()
+            if self.verbose:
+                print(f'sent {len(batch)} messages ({batch_size} bytes) to {self.destination}')
+
+    async def close(self, flush_timeout_sec=2.0):
+        """waits up to flush_timeout_sec for queued msgs to be sent, then closes the connection"""
+        if self.writer_task is None:
+            return
+        deadline = time.monotonic() + flush_timeout_sec
+        while self.buffered_bytes and self.is_connected() and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        self.closing = True
+        self.writer_task.cancel()
+        try:
+            await self.writer_task
+        except asyncio.CancelledError:
+            pass
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (OSError, ConnectionError):
+                pass
+            self.writer = None
+        self.writer_task = None
+
+
+if __name__ == '__main__':
+
+    from examples.test_skaimot import create_example_skaimotmsg
+
+    async def main():
+        # assume first camera group only for this test
+        cam_group_idx = 0
+        sender = AsyncTcpSender(AsyncTcpSender.ipv4_localhost, SkaimotMsg.ports[cam_group_idx], verbose=True)
+        await sender.start()
+
+        msg_bytes = SkaimotMsg.pack(create_example_skaimotmsg())
+        for i in range(10):
+            sender.send(msg_bytes)
+            await sender.drain()
+            await asyncio.sleep(0.1)
+        await sender.close()
+
+    asyncio.run(main())
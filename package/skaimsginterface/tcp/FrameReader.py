@@ -0,0 +1,155 @@
+#!/usr/bin/python3
+
+import time
+import struct
+
+
+class FrameReader:
+    """reads length prefixed frames off a stream socket
+
+    each frame is a 4 byte network endian unsigned int length followed by
+    that many bytes. small frames are carved out of a reusable receive arena
+    so a burst of them costs one recv; once a frame's length is known its
+    payload is preallocated at exactly that size and the rest of it is filled
+    in place with recv_into, so short reads never truncate a frame and
+    nothing is concatenated. partial header / payload state is kept between
+    calls, which lets read_available() be driven by a selector or a socket
+    with a timeout.
+
+    example:
+        reader = FrameReader(sock)
+        while True:
+            frame = reader.read_frame()
+            if frame is None:
+                break # connection closed
+            payload, firstpacket_timestamp = frame
+    """
+
+    length_struct = struct.Struct('!I')
+
+    def __init__(self, sock, max_frame_size=256 * 1024 * 1024, arena_size=64 * 1024):
+        """
+        Args:
+            sock (socket.socket): connected stream socket to read from
+            max_frame_size (int, optional): announced lengths above this raise ValueError. Defaults to 256 MB.
+            arena_size (int, optional): size of the reusable receive buffer used between payloads. Defaults to 64 KB.
+        """
+        self.sock = sock
+        self.max_frame_size = max_frame_size
+
+        # receive arena state, bytes [arena_start:arena_end] are buffered but unparsed
+        self.arena = bytearray(max(arena_size, self.length_struct.size))
+        self.arena_view = memoryview(self.arena)
+        self.arena_start = 0
+        self.arena_end = 0
+
+        # payload state (None while between frames)
+        self.payload = None
+        self.payload_view = None
+        self.payload_pos = 0
+
+        self.firstpacket_timestamp = None
+        self.closed = False
+
+    def read_available(self):
+        """parses a buffered frame or does at most one recv_into
+
+        Returns:
+            (bytearray, float) tuple of (payload, firstpacket_timestamp) when a frame completes,
+            otherwise None. check self.closed to tell a closed connection apart from a partial read
+        """
+        if self.closed:
+            return None
+
+        if self.payload is None:
+            # frames left over from the last recv need no syscall
+            frame = self._parse_arena()
+            if frame is not None or self.payload is not None:
+                return frame
+
+            # read more header bytes into the arena
+            if self.arena_start == self.arena_end:
+                self.arena_start = self.arena_end = 0
+            nbytes = self.sock.recv_into(self.arena_view[self.arena_end:])
+            if nbytes == 0:
+                self._mark_closed()
+                return None
+            if self.firstpacket_timestamp is None:
+                # log timestamp of first packet arrival
+                self.firstpacket_timestamp = time.time()
+            self.arena_end += nbytes
+            return self._parse_arena()
+
+        # fill the rest of the payload in place
+        nbytes = self.sock.recv_into(self.payload_view[self.payload_pos:])
+        if nbytes == 0:
+            self._mark_closed()
+            return None
+        self.payload_pos += nbytes
+        if self.payload_pos < len(self.payload):
+            return None
+        return self._complete_payload()
+
+    def read_frame(self):
+        """blocks until a full frame is read
+
+        Returns:
+            (bytearray, float) tuple of (payload, firstpacket_timestamp), or None if the connection closed
+        """
+        while not self.closed:
+            frame = self.read_available()
+            if frame is not None:
+                return frame
+        return None
+
+    def _parse_arena(self):
+        available = self.arena_end - self.arena_start
+        headerlen = self.length_struct.size
+        if available < headerlen:
+            # keep the partial header at the front of the arena
+            if self.arena_start:
+                self.arena[:available] = self.arena_view[self.arena_start:self.arena_end]
+                self.arena_start, self.arena_end = 0, available
+            return None
+
+        length = self.length_struct.unpack_from(self.arena, self.arena_start)[0]
+        if length > self.max_frame_size:
+            self.arena_start = self.arena_end = 0
+            self.firstpacket_timestamp = None
+            raise ValueError(f'announced frame length {length} exceeds max_frame_size {self.max_frame_size}')
+
+        begin = self.arena_start + headerlen
+        if available - headerlen >= length:
+            # whole frame is buffered, carve it out of the arena
+            payload = bytearray(self.arena_view[begin:begin + length])
+            timestamp = self.firstpacket_timestamp
+            self.arena_start = begin + length
+            if self.arena_start == self.arena_end:
+                self.arena_start = self.arena_end = 0
+                self.firstpacket_timestamp = None
+            return payload, timestamp
+
+        # preallocate the payload at the announced length, recv_into fills the rest
+        self.payload = bytearray(length)
+        self.payload_view = memoryview(self.payload)
+        self.payload_pos = self.arena_end - begin
+        self.payload[:self.payload_pos] = self.arena_view[begin:self.arena_end]
+        self.arena_start = self.arena_end = 0
+        return None
+
+    def _complete_payload(self):
+        # hand off the payload buffer itself (no copy) and start a fresh one next frame
+        payload, timestamp = self.payload, self.firstpacket_timestamp
+        self.payload_view.release()
+        self.payload = None
+        self.payload_view = None
+        self.payload_pos = 0
+        self.firstpacket_timestamp = None
+        return payload, timestamp
+
+    def _mark_closed(self):
+        # connection dropped, discard any partial frame
+        self.closed = True
+        self.payload = None
+        self.payload_view = None
+        self.arena_start = self.arena_end = 0
@@ -1,8 +1,6 @@
 #!/usr/bin/python3
 
-import hashlib
 import time
-import math
 
 import threading
 import socketserver
@@ -11,19 +9,33 @@ import struct
 
 from skaimsginterface.skaimessages import *
 from skaimsginterface.replay import FileRecorder
+from skaimsginterface.tcp.FrameReader import FrameReader
+from skaimsginterface.framing import SkaiFrame, FrameError, StreamStats
 
 import code
 
 class MultiportTcpListener:
 
-    def __init__(self, portlist, multiport_callback_func, ipv6=False, verbose=False, recordfile=None):
+    def __init__(self, portlist, multiport_callback_func, ipv6=False, verbose=False, recordfile=None, transport_options=None,
+                 record_index=False, record_segment_bytes=None, record_segment_sec=None):
         """skai multiport TCP listener
 
         Args:
             portlist (list): ports to listen to 
-            multiport_callback_func (_type_):  your function, which should have params (data, server_address)
+            multiport_callback_func (_type_):  your function, which should have params (data, server_address).
+                data is bytes for legacy frames and a memoryview of the frame for versioned ones (SkaiMsg.unpack
+                and SkaiMsgView take either), call bytes(data) where bytes are needed
             ipv6 (bool): default val=False, defaults to using ipv4
             verbose (bool, optional): _description_. Defaults to False.
+            transport_options (TransportOptions, optional): socket options for the listening and accepted
+                sockets. Defaults to None.
+            record_index (bool, optional): write a SkaibinIndex next to recordfile while recording. Defaults to False.
+            record_segment_bytes (int, optional): record into rotating segments of this size, see
+                SkaibinSegments. Defaults to None.
+            record_segment_sec (float, optional): record into rotating segments of this duration. Defaults to None.
+
+        stream_stats holds a StreamStats (drops, reordering, latency) per open
+        connection, keyed by (port, client address).
         """
         # type checking
         if isinstance(portlist, int):
@@ -41,13 +53,16 @@ class MultiportTcpListener:
         self.recorder = None
         if recordfile is not None:
             print('opening recorder...')
-            self.recorder = FileRecorder(recordfile)
+            self.recorder = FileRecorder(recordfile, index=record_index, max_segment_bytes=record_segment_bytes,
+                                         max_segment_sec=record_segment_sec)
             self.recorder.open()
 
         # initialize
         self.verbose = verbose
         self.portlist = portlist
         self.multiport_callback_func = multiport_callback_func
+        self.stream_stats = {}
+        self.transport_options = transport_options
         self.ipv6 = ipv6
         if self.ipv6:
             self.listen_addr = '::'
@@ -78,21 +93,36 @@ class MultiportTcpListener:
             t.daemon = True  # non blocking
             t.start()
 
-    def multiport_callback(self, data, server_address, firstpacket_timestamp):
-        msg, checksum = data[:-16], data[-16:]
-        msg_checksum = hashlib.md5(msg).digest()
+    def multiport_callback(self, data, server_address, firstpacket_timestamp, stream_stats=None):
+        # verify the checksum (legacy or versioned frame), then trim the
+        # trailer in place so the record is the same buffer
+        try:
+            header = SkaiFrame.strip_checksum_inplace(data)
+            msgs, header = SkaiFrame.split_msgs(data)
+            checksum_ok = True
+        except FrameError as e:
+            checksum_ok = False
+            error = e
+
+        if checksum_ok:
+            if stream_stats is not None:
+                gap = stream_stats.update(header, firstpacket_timestamp)
+                if gap and self.verbose:
+                    print(f'{gap} msgs missing before sequence {header.sequence} on {server_address}')
 
-        if checksum == msg_checksum:
             if self.recorder is not None:    
                 port = server_address[1]
                 if self.verbose:
-                    print(f'recording msg length {len(msg)} on port: {port} firstpacket_ts {firstpacket_timestamp}')
-                self.recorder.record(msg, firstpacket_timestamp, port)
+                    print(f'recording msg length {len(data)} on port: {port} firstpacket_ts {firstpacket_timestamp}')
+                self.recorder.record(data, firstpacket_timestamp, port)
 
-            self.multiport_callback_func(msg, server_address)
+            # batch frames carry several msgs, each goes to the callback on its own.
+            # legacy frames are the reader's bytearray, callbacks have always been given bytes for them
+            for msg in msgs:
+                self.multiport_callback_func(bytes(msg) if isinstance(msg, bytearray) else msg, server_address)
 
         elif self.verbose:
-            print('checksum failed')
+            print(error)
 
 
     class SinglePortListener(socketserver.ThreadingTCPServer):
@@ -101,41 +131,32 @@ class MultiportTcpListener:
 
             def handle(self):
                 # note: socket will close at end of handle method
-                while True:
-
-                    # assumes first 4 bytes designate length of message
-                    # (packed as network endian unsigned int)
-                    bytes_in = self.request.recv(4)
-                    if not bytes_in:
-                        continue  # continue if no new message
-
-                    # otherwise log timestamp of first packet arrival
-                    firstpacket_timestamp = time.time()
-
-                    # and parse the length
-                    length = struct.unpack('!I', bytes_in)[0]
-
-                    # receive in chunks
-                    chunksize = 4096
-                    data = bytes()
-                    for chunk in range(math.ceil(length / chunksize)):
-                        data += self.request.recv(chunksize)
-
-                    # variables = globals().copy()
-                    # variables.update(locals())
-                    # shell = code.InteractiveConsole(variables)
-                    # shell.interact()
-
-                    # socket = self.request.getsockname()
-                    # print(
-                    #     f'client {self.client_address}\n\twrote {data}\n\tto {self.server.server_address}'
-                    # )
-
-                    # send back message in uppercase as confirmation (comment out if not needed)
-                    # socket.sendto(data.upper(), self.client_address)
-
-                    # call server callback function with data
-                    self.server.single_port_callback(data, firstpacket_timestamp)
+                reader = FrameReader(self.request)
+                stream_stats = StreamStats()
+                stream_key = (self.server.server_address[1], self.client_address)
+                multiport_listener = self.server.multiport_listener
+                multiport_listener.stream_stats[stream_key] = stream_stats
+                transport_options = multiport_listener.transport_options
+                try:
+                    while True:
+
+                        # assumes first 4 bytes designate length of message
+                        # (packed as network endian unsigned int)
+                        frame = reader.read_frame()
+                        if frame is None:
+                            break  # connection closed
+
+                        # payload buffer is handed off as is (no copy)
+                        data, firstpacket_timestamp = frame
+                        if transport_options is not None:
+                            transport_options.rearm(self.request)
+
+                        # call server callback function with data
+                        self.server.single_port_callback(data, firstpacket_timestamp, stream_stats)
+                finally:
+                    multiport_listener.stream_stats.pop(stream_key, None)
+                    if multiport_listener.verbose:
+                        print(f'connection {self.client_address} on {self.server.server_address} closed: {stream_stats}')
 
         def __init__(self, server_address, multiport_listener):
             # store reference to parent class
@@ -156,11 +177,23 @@ class MultiportTcpListener:
             print(f'now listening on {self.server_address}')
             self.serve_forever()
 
-        def single_port_callback(self, data, firstpacket_timestamp):
+        def server_bind(self):
+            # before bind / listen, so buffer sizes count for the window scale of accepted connections
+            if self.multiport_listener.transport_options is not None:
+                self.multiport_listener.transport_options.apply(self.socket)
+            socketserver.ThreadingTCPServer.server_bind(self)
+
+        def get_request(self):
+            request, client_address = socketserver.ThreadingTCPServer.get_request(self)
+            if self.multiport_listener.transport_options is not None:
+                self.multiport_listener.transport_options.apply(request)
+            return request, client_address
+
+        def single_port_callback(self, data, firstpacket_timestamp, stream_stats=None):
             # do something single port wise if you want here...
             # otherwise pass data to higher server
             self.multiport_listener.multiport_callback(data,
-                                                       self.server_address, firstpacket_timestamp)
+                                                       self.server_address, firstpacket_timestamp, stream_stats)
 
 
 def example_multiport_callback_func(data, server_address):
@@ -1,8 +1,8 @@
 #!/usr/bin/python3
 
-import hashlib
+import queue
+import collections
 import time
-import math
 
 import threading
 import socketserver
@@ -11,6 +11,9 @@ import struct
 
 from skaimsginterface.skaimessages import *
 from skaimsginterface.replay import FileRecorder
+from skaimsginterface.tcp.FrameReader import FrameReader
+from skaimsginterface.framing import SkaiFrame, FrameError, StreamStats
+from skaimsginterface.ipc import ShmRingBuffer
 
 import multiprocessing as mp
 
@@ -28,14 +31,47 @@ logger.addHandler(log_fh)
 
 class MultiportTcpListenerMP:
 
-    def __init__(self, portlist, multiport_callback_func, print_q=None, ipv6=False, verbose=False, recordfile=None):
+    # multiport process tuning
+    queue_timeout_sec = 0.1     # max blocking wait on msg_q before rechecking the stop event
+    max_batch = 256             # max queued msgs drained per wakeup
+    stop_join_sec = 1.0         # max wait in stop() for the processes to exit before the rings are removed
+
+    # per worker counters, see worker_stats()
+    worker_stat_fields = ('connections', 'msgs', 'bytes', 'checksum_errors', 'gaps')
+
+    def __init__(self, portlist, multiport_callback_func, print_q=None, ipv6=False, verbose=False, recordfile=None,
+                 use_shared_memory=False, shm_ring_size=16 * 1024 * 1024, workers_per_port=1, ordered=True,
+                 transport_options=None, record_index=False, record_segment_bytes=None, record_segment_sec=None):
         """skai multiport TCP listener using multiprocessing
 
         Args:
             portlist (list): ports to listen to 
-            multiport_callback_func (_type_):  your function, which should have params (data, server_address)
+            multiport_callback_func (_type_):  your function, which should have params (data, server_address).
+                data is bytes for legacy frames and a memoryview of the frame for versioned ones, or for every
+                frame with use_shared_memory (SkaiMsg.unpack and SkaiMsgView take either), call bytes(data) where
+                bytes are needed
             ipv6 (bool): default val=False, defaults to using ipv4
             verbose (bool, optional): _description_. Defaults to False.
+            use_shared_memory (bool, optional): hand msgs from the port processes to the callback process through
+                a shared memory ring per port instead of pickling them through a queue. the callback then gets a
+                memoryview into shared memory that is only valid until it returns (copy it with bytes() to keep it).
+                msgs bigger than half a ring still go through the queue, an empty record in the ring keeps their
+                place among the other msgs. Defaults to False.
+            shm_ring_size (int, optional): bytes of shared memory per port when use_shared_memory is set. Defaults to 16 MB.
+            workers_per_port (int or dict, optional): listener processes per port, or {port: processes} for just
+                the hot ports. more than one binds with SO_REUSEPORT and the kernel spreads the connections over
+                them, each connection stays on one worker. Defaults to 1.
+            ordered (bool, optional): True hands every msg to the one callback process, msgs of a connection reach
+                the callback in order. False calls the callback in the
+                worker processes themselves, concurrently across workers and connections and with no state shared
+                between workers, which saves the handoff and spreads callback work over the workers. Defaults to True.
+            transport_options (TransportOptions, optional): socket options for the listening and accepted
+                sockets. Defaults to None.
+            record_index (bool, optional): have the record process write a SkaibinIndex next to recordfile.
+                Defaults to False.
+            record_segment_bytes (int, optional): record into rotating segments of this size, see
+                SkaibinSegments. Defaults to None.
+            record_segment_sec (float, optional): record into rotating segments of this duration. Defaults to None.
         """
         # type checking
         if isinstance(portlist, int):
@@ -54,16 +90,34 @@ class MultiportTcpListenerMP:
         self.print_q = print_q 
         self.stop_event = mp.Event()
 
+        # (port, worker idx) of every listener process
+        if isinstance(workers_per_port, int):
+            workers_per_port = {port: workers_per_port for port in portlist}
+        self.workers_per_port = {port: workers_per_port.get(port, 1) for port in portlist}
+        self.workers = [(port, worker_idx) for port in portlist for worker_idx in range(self.workers_per_port[port])]
+        self.ordered = ordered
+        self.transport_options = transport_options
+        # a row of worker_stat_fields counters per worker, each worker only writes its own row
+        self.worker_stats_array = mp.Array('q', len(self.workers) * len(self.worker_stat_fields), lock=False)
+
+        # shared memory rings (one per worker) and the event that wakes the callback process
+        self.rings = {}
+        self.data_event = None
+        if use_shared_memory and ordered:
+            self.data_event = mp.Event()
+            self.rings = {worker: ShmRingBuffer(create=True, size=shm_ring_size) for worker in self.workers}
+
         # initialize file recorder queue & file recorder if recordfile specified
         self.record_q = None
         if recordfile is not None:
             self.record = True
             
-            self.record_q = mp.SimpleQueue()
+            self.record_q = mp.Queue()
             self.record_proc = mp.Process(
                 name='record_process',
                 target=FileRecorder.mp_record_process,
-                args=(self.stop_event, self.print_q, self.record_q, recordfile, False)
+                args=(self.stop_event, self.print_q, self.record_q, recordfile, False, False, record_index,
+                      record_segment_bytes, record_segment_sec)
             )
             self.record_proc.daemon = True
             self.record_proc.start()
@@ -83,32 +137,143 @@ class MultiportTcpListenerMP:
 
 
     @staticmethod
-    def multiport_process(stop_event, print_q, msg_q, user_multiport_callback, record_q):
+    def deliver(record, firstpacket_timestamp, server_address, user_multiport_callback, record_q):
+        # record (msg bytes, with the frame header for versioned frames)
+        if record_q is not None:
+            # msg_bytes, epoch_timestamp, port
+            port = server_address[1]
+            record_bytes = bytes(record) if isinstance(record, memoryview) else record
+            record_q.put( (record_bytes, firstpacket_timestamp, port) )
+
+        # forward msg_bytes to user callback, each msg of a batch frame on its own
+        msgs, header = SkaiFrame.split_msgs(record)
+        for msg_bytes in msgs:
+            if isinstance(msg_bytes, bytearray):
+                # legacy frames are the reader's bytearray, callbacks have always been given bytes for them
+                msg_bytes = bytes(msg_bytes)
+            printmsg = f'got data length {len(msg_bytes)} from {server_address}. calling user callback...'
+            logger.info(printmsg)
+            user_multiport_callback(msg_bytes, server_address)
+
+    @staticmethod
+    def multiport_process(stop_event, print_q, msg_q, user_multiport_callback, record_q, rings=None, data_event=None):
+        if rings:
+            MultiportTcpListenerMP.multiport_shm_process(stop_event, print_q, msg_q, user_multiport_callback, record_q, rings, data_event)
+            return
+
+        while not stop_event.is_set():
+            try:
+                # block until a msg arrives, then drain everything else already queued
+                try:
+                    batch = [msg_q.get(timeout=MultiportTcpListenerMP.queue_timeout_sec)]
+                except queue.Empty:
+                    continue
+                while len(batch) < MultiportTcpListenerMP.max_batch:
+                    try:
+                        batch.append(msg_q.get_nowait())
+                    except queue.Empty:
+                        break
+
+                for item in batch:
+                    if item is None:
+                        # stop sentinel, pass it on to the recorder too
+                        if record_q is not None:
+                            record_q.put(None)
+                        return
+                    MultiportTcpListenerMP.deliver(*item, user_multiport_callback, record_q)
+            except Exception as e:
+                printmsg = f'mp_listener exception: {e}'
+                logger.exception(printmsg)
+
+    @staticmethod
+    def multiport_shm_process(stop_event, print_q, msg_q, user_multiport_callback, record_q, rings, data_event):
+        # rings is a list of (server_address, ShmRingBuffer), port processes set data_event after each write
+        # msgs too big for a ring come through msg_q, taken off it ahead of their ring's marker: {ring name: deque}
+        oversized = {}
         while not stop_event.is_set():
             try:
-                if not msg_q.empty():
-                    # grab msg off queue
-                    msg_bytes, firstpacket_timestamp, server_address = msg_q.get_nowait()
-                    
-                    # record 
-                    if record_q is not None:
-                        # msg_bytes, epoch_timestamp, port
-                        port = server_address[1]
-                        record_q.put( (msg_bytes, firstpacket_timestamp, port) )
-                    
-                    # forward msg_bytes to user callback
-                    printmsg = f'got data length {len(msg_bytes)} from {server_address}. calling user callback...'
-                    logger.info(printmsg)
-                    user_multiport_callback(msg_bytes, server_address)
+                # clear before draining so a write that lands mid drain wakes us again
+                data_event.wait(MultiportTcpListenerMP.queue_timeout_sec)
+                data_event.clear()
+
+                more = False
+                for server_address, ring in rings:
+                    for i in range(MultiportTcpListenerMP.max_batch):
+                        record = ring.read()
+                        if record is None:
+                            break
+                        view, firstpacket_timestamp = record
+                        try:
+                            if len(view):
+                                MultiportTcpListenerMP.deliver(view, firstpacket_timestamp, server_address, user_multiport_callback, record_q)
+                            else:
+                                # marker of a msg that went through the queue, deliver it in its place
+                                item = MultiportTcpListenerMP.next_oversized(stop_event, msg_q, ring.name, oversized)
+                                if item is None:
+                                    if record_q is not None:
+                                        record_q.put(None)
+                                    return
+                                MultiportTcpListenerMP.deliver(*item, user_multiport_callback, record_q)
+                        finally:
+                            view.release()
+                            ring.release()
+                    else:
+                        more = True
+                if more:
+                    # a ring still has msgs, come back around without waiting
+                    data_event.set()
+
+                # the stop sentinel comes through the queue, oversized msgs on it wait for their marker
+                while True:
+                    try:
+                        item = msg_q.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        if record_q is not None:
+                            record_q.put(None)
+                        return
+                    oversized.setdefault(item[3], collections.deque()).append(item[:3])
             except Exception as e:
                 printmsg = f'mp_listener exception: {e}'
                 logger.exception(printmsg)
 
+    @staticmethod
+    def next_oversized(stop_event, msg_q, ring_name, oversized):
+        """returns the (msg_bytes, firstpacket_timestamp, server_address) a ring's marker stands for, None on stop
+
+        the port process queues the msg before it writes the marker, so it is on msg_q or already in oversized
+        """
+        pending = oversized.get(ring_name)
+        if pending:
+            return pending.popleft()
+        while not stop_event.is_set():
+            try:
+                item = msg_q.get(timeout=MultiportTcpListenerMP.queue_timeout_sec)
+            except queue.Empty:
+                continue
+            if item is None:
+                return None
+            if item[3] == ring_name:
+                return item[:3]
+            oversized.setdefault(item[3], collections.deque()).append(item[:3])
+        return None
 
     @staticmethod
-    def single_port_process(stop_event, print_q, msg_q, addr_port:tuple, ListenerClass):
+    def queue_oversized(msg_q, msg_ring, msg_bytes, firstpacket_timestamp, server_address):
+        """puts a msg too big for msg_ring on msg_q and returns the empty marker record to write in its place"""
+        msg_q.put_nowait( (bytes(msg_bytes), firstpacket_timestamp, server_address, msg_ring.name) )
+        return b''
+
+    @staticmethod
+    def single_port_process(stop_event, print_q, msg_q, addr_port:tuple, ListenerClass, msg_ring=None, data_event=None,
+                            ipv6=False, reuse_port=False, stats_array=None, worker_num=0, user_multiport_callback=None,
+                            record_q=None, transport_options=None):
         # instantiate listener
-        spl = ListenerClass(addr_port, print_q, msg_q)
+        spl = ListenerClass(addr_port, print_q, msg_q, ipv6=ipv6, msg_ring=msg_ring, data_event=data_event,
+                            stop_event=stop_event, reuse_port=reuse_port, stats_array=stats_array, worker_num=worker_num,
+                            user_multiport_callback=user_multiport_callback, record_q=record_q,
+                            transport_options=transport_options)
 
         # now listen for messages on port until stop event
         printmsg = f'now listening on {addr_port}...'
@@ -125,34 +290,77 @@ class MultiportTcpListenerMP:
                 print_q.put(printmsg)
         finally:
             # close server after stop event
+            logger.info(f'worker {worker_num} on {addr_port}: {spl.stats_str()}')
             spl.server_close()
 
     def start_listeners(self):
-                
-        # start multiport process
-        self.multiport_proc = mp.Process(
-            name='mp_msg_receiver',
-            target=self.multiport_process,
-            args=(self.stop_event, self.print_q, self.msg_q, self.user_multiport_callback, self.record_q, )
-        )
-        self.multiport_proc.daemon = True
-        self.multiport_proc.start()
+        self.start_multiport_process()
 
-        # start single port processes
+        # unordered workers call the callback (and record) themselves
+        user_multiport_callback = None if self.ordered else self.user_multiport_callback
+        record_q = None if self.ordered else self.record_q
+
+        # start single port processes, one per worker
         self.processes = []
-        for port in self.portlist:
+        for worker_num, (port, worker_idx) in enumerate(self.workers):
             listen_addr_port = (self.listen_addr, port)
             proc = mp.Process(
-                name=f'listener_port_{port}',
+                name=f'listener_port_{port}_{worker_idx}',
                 target=self.single_port_process,
-                args=(self.stop_event, self.print_q, self.msg_q, listen_addr_port, self.SinglePortListener)
+                args=(self.stop_event, self.print_q, self.msg_q, listen_addr_port, self.SinglePortListener,
+                      self.rings.get((port, worker_idx)), self.data_event, self.ipv6, self.workers_per_port[port] > 1,
+                      self.worker_stats_array, worker_num, user_multiport_callback, record_q, self.transport_options)
             )
             proc.daemon = True
             proc.start()
             self.processes.append(proc)
 
+    def start_multiport_process(self):
+        # start multiport process
+        self.multiport_proc = mp.Process(
+            name='mp_msg_receiver',
+            target=self.multiport_process,
+            args=(self.stop_event, self.print_q, self.msg_q, self.user_multiport_callback, self.record_q,
+                  [((self.listen_addr, port), ring) for (port, worker_idx), ring in self.rings.items()], self.data_event)
+        )
+        self.multiport_proc.daemon = True
+        self.multiport_proc.start()
+
+    def worker_stats(self):
+        """returns a dict of worker_stat_fields counters per (port, worker idx), live while the workers run"""
+        num_fields = len(self.worker_stat_fields)
+        return {
+            worker: dict(zip(self.worker_stat_fields, self.worker_stats_array[i * num_fields:(i + 1) * num_fields]))
+            for i, worker in enumerate(self.workers)
+        }
+
     def stop(self):
         self.stop_event.set()
+        # wake the multiport process if it is blocked waiting on the queue
+        self.msg_q.put_nowait(None)
+        if self.data_event is not None:
+            self.data_event.set()
+        # shared memory outlives processes, remove the rings once they are done with them. a worker
+        # still serving a connection after stop_join_sec keeps its mapping, only the name goes
+        if self.rings:
+            deadline = time.monotonic() + self.stop_join_sec
+            for proc in self.processes + [self.multiport_proc]:
+                proc.join(max(0.0, deadline - time.monotonic()))
+            self.close()
+
+    def close(self):
+        """removes the shared memory rings, stop() calls it after the processes exit"""
+        for ring in self.rings.values():
+            try:
+                ring.close()
+                ring.unlink()
+            except Exception:
+                pass
+        self.rings = {}
+
+    def __del__(self):
+        # fallback for a listener that was never stopped
+        self.close()
 
     class SinglePortListener(socketserver.ThreadingTCPServer):
 
@@ -161,59 +369,73 @@ class MultiportTcpListenerMP:
             def handle(self):
                 try:
                     # note: socket will close at end of handle method
+                    reader = FrameReader(self.request)
+                    stream_stats = StreamStats()
+                    self.server.count('connections')
+                    transport_options = self.server.transport_options
                     while True:
 
                         # assumes first 4 bytes designate length of message
                         # (packed as network endian unsigned int)
-                        bytes_in = self.request.recv(4)
-                        if not bytes_in:
-                            continue  # continue if no new message
-
-                        # otherwise log timestamp of first packet arrival
-                        firstpacket_timestamp = time.time()
-
-                        # and parse the length
-                        length = struct.unpack('!I', bytes_in)[0]
-
-                        # receive in chunks
-                        chunksize = 4096
-                        data = bytes()
-                        for chunk in range(math.ceil(length / chunksize)):
-                            data += self.request.recv(chunksize)
-
-                        # variables = globals().copy()
-                        # variables.update(locals())
-                        # shell = code.InteractiveConsole(variables)
-                        # shell.interact()
-
-                        # socket = self.request.getsockname()
-                        # print(
-                        #     f'client {self.client_address}\n\twrote {data}\n\tto {self.server.server_address}'
-                        # )
-
-                        # verify checksum
-                        msg_bytes, checksum_bytes = data[:-16], data[-16:]
-                        computed_checksum = hashlib.md5(msg_bytes).digest()
-
-                        # pass onwards if verified, otherwise add an error msg to print_q
-                        if checksum_bytes == computed_checksum:
-                            # pass to msg queue
-                            self.server.msg_q.put_nowait( (msg_bytes, firstpacket_timestamp, self.server.server_address) )
-                        else:
-                            printmsg = f'checksum failed on {self.server.server_address}'
+                        frame = reader.read_frame()
+                        if frame is None:
+                            break  # connection closed
+                        data, firstpacket_timestamp = frame
+                        if transport_options is not None:
+                            transport_options.rearm(self.request)
+
+                        # verify checksum (legacy or versioned frame) and trim the
+                        # trailer in place, then pass the record on to the callback process
+                        try:
+                            header = SkaiFrame.strip_checksum_inplace(data)
+                            gap = stream_stats.update(header, firstpacket_timestamp)
+                            self.server.count_msg(len(data), gap)
+                            if gap:
+                                printmsg = f'{gap} msgs missing before sequence {header.sequence} from {self.client_address} on {self.server.server_address}'
+                                logger.warning(printmsg)
+                                if self.server.print_q is not None:
+                                    self.server.print_q.put(printmsg)
+                            self.server.forward_msg(data, firstpacket_timestamp)
+                        except FrameError as e:
+                            self.server.count('checksum_errors')
+                            # add an error msg to print_q
+                            printmsg = f'{e} on {self.server.server_address}'
                             logger.error(printmsg)
                             if self.server.print_q is not None:
                                 self.server.print_q.put(printmsg)
+                    logger.info(f'connection {self.client_address} on {self.server.server_address} closed: {stream_stats}')
                 except Exception as e:
                     printmsg = f'Handling Exception: {e}'
                     logger.exception(printmsg)
                     if self.server.print_q is not None:
                         self.server.print_q.put(printmsg)
 
-        def __init__(self, server_address, print_q, msg_q, ipv6=False):
+        def __init__(self, server_address, print_q, msg_q, ipv6=False, msg_ring=None, data_event=None, stop_event=None,
+                     reuse_port=False, stats_array=None, worker_num=0, user_multiport_callback=None, record_q=None,
+                     transport_options=None):
             # store reference to mp vars
             self.print_q = print_q
             self.msg_q = msg_q
+            self.msg_ring = msg_ring
+            self.data_event = data_event
+            self.stop_event = stop_event
+            self.reuse_port = reuse_port
+            self.transport_options = transport_options
+            self.user_multiport_callback = user_multiport_callback
+            self.record_q = record_q
+            # handle_request() returns this often, so the worker sees the stop event without a new connection
+            self.timeout = MultiportTcpListenerMP.queue_timeout_sec
+            # handler threads of this process share the ring's single producer side
+            self.ring_lock = threading.Lock()
+
+            # this worker's row of the shared stats array
+            fields = MultiportTcpListenerMP.worker_stat_fields
+            if stats_array is None:
+                stats_array = [0] * len(fields)
+                worker_num = 0
+            self.stats_array = stats_array
+            self.stats_idx = {field: worker_num * len(fields) + i for i, field in enumerate(fields)}
+            self.stats_lock = threading.Lock()
 
             # turn on allow reuse ports
             socketserver.ThreadingTCPServer.allow_reuse_address = True
@@ -226,6 +448,58 @@ class MultiportTcpListenerMP:
             socketserver.ThreadingTCPServer.__init__(self, server_address,
                                                      self.RequestHandler)
 
+        def server_bind(self):
+            # every worker of a port binds with SO_REUSEPORT, the kernel then balances connections across them
+            if self.reuse_port:
+                self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            # before bind / listen, so buffer sizes count for the window scale of accepted connections
+            if self.transport_options is not None:
+                self.transport_options.apply(self.socket)
+            socketserver.ThreadingTCPServer.server_bind(self)
+
+        def get_request(self):
+            request, client_address = socketserver.ThreadingTCPServer.get_request(self)
+            if self.transport_options is not None:
+                self.transport_options.apply(request)
+            return request, client_address
+
+        def count(self, field, n=1):
+            with self.stats_lock:
+                self.stats_array[self.stats_idx[field]] += n
+
+        def count_msg(self, num_bytes, gap=0):
+            stats_idx = self.stats_idx
+            with self.stats_lock:
+                self.stats_array[stats_idx['msgs']] += 1
+                self.stats_array[stats_idx['bytes']] += num_bytes
+                self.stats_array[stats_idx['gaps']] += gap
+
+        def stats_str(self):
+            return ' '.join(f'{field} {self.stats_array[idx]}' for field, idx in self.stats_idx.items())
+
+        def forward_msg(self, msg_bytes, firstpacket_timestamp):
+            if self.user_multiport_callback is not None:
+                # unordered, call the callback right here in the worker
+                try:
+                    MultiportTcpListenerMP.deliver(msg_bytes, firstpacket_timestamp, self.server_address,
+                                                   self.user_multiport_callback, self.record_q)
+                except Exception as e:
+                    logger.exception(f'callback exception on {self.server_address}: {e}')
+                return
+
+            # shared memory ring when enabled, msgs that do not fit it are pickled through the queue with a
+            # marker in the ring, queued and marked under the lock so the marker order matches the queue's
+            if self.msg_ring is not None:
+                with self.ring_lock:
+                    if len(msg_bytes) > self.msg_ring.max_payload_size:
+                        msg_bytes = MultiportTcpListenerMP.queue_oversized(self.msg_q, self.msg_ring, msg_bytes,
+                                                                           firstpacket_timestamp, self.server_address)
+                    written = self.msg_ring.write(msg_bytes, firstpacket_timestamp, self.stop_event)
+                if written:
+                    self.data_event.set()
+            else:
+                self.msg_q.put_nowait( (msg_bytes, firstpacket_timestamp, self.server_address) )
+
       
 
 
@@ -1,17 +1,19 @@
 #!/usr/bin/python3
 
-import hashlib
 import socket
 import struct
 import time
 
 from skaimsginterface.skaimessages import *
+from skaimsginterface.framing import SkaiFrame
 
 
 class TcpSender:
 
     ipv4_localhost = '127.0.0.1'
     ipv6_localhost = '::1' # expands to 0:0:0:0:0:0:0:1, listen on '::' for receiving
+    # frames at least this big are gathered by sendmsg, smaller ones are cheaper to join and sendall
+    gather_min_bytes = 64 * 1024
     
     def __init__(self,
                  host_ip,
@@ -19,25 +21,45 @@ class TcpSender:
                  retryLimit=None,
                  retryTimeoutSec=2,
                  ipv6=False, # default to ipv4
+                 checksum_type=None, # legacy md5 frames, see SkaiFrame.pack
+                 compression=None, # FrameCompression.Type of msgs of at least compress_min_bytes, see SkaiFrame.pack
+                 compress_min_bytes=1024,
+                 transport_options=None, # TransportOptions, None keeps os defaults
                  verbose=False) -> None:
         self.ipv6 = ipv6
         self.verbose = verbose
+        SkaiFrame.check_compression(compression, checksum_type)
+        self.checksum_type = checksum_type
+        self.compression = compression
+        self.compress_min_bytes = compress_min_bytes
+        self.transport_options = transport_options
+        # sequence number of the next versioned frame, one stream per sender
+        self.sequence = 0
         self.retryLimit = retryLimit
         self.retryTimeoutSec = retryTimeoutSec
         
         # create tcp socket allowing reuse ports
         self.destination = (host_ip, port)
         if self.ipv6:
-            self.sock = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
             self.localhost = self.ipv6_localhost
         else:
-            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.localhost = self.ipv4_localhost
-        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock = self.create_socket()
 
         # try to connect with limits
         self.connect_to_destination()
 
+    def create_socket(self):
+        if self.ipv6:
+            sock = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
+        else:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # before connecting, so buffer sizes count for the window scale
+        if self.transport_options is not None:
+            self.transport_options.apply(sock)
+        return sock
+
     def try_to_connect(self):
         success = False
         try:
@@ -70,28 +92,39 @@ class TcpSender:
         if not self.connected:
             print('failed to connect!')
 
-    def send(self, msg_bytes, send_failed_checksum=False):
-        # calc checksum 
-        clean_checksum = hashlib.md5(msg_bytes).digest()
-        # if you want to send a intentionally false checksum then mutate the bytes
-        if send_failed_checksum:
-            # add 1 to each bytes
-            checksum = b''
-            for b in clean_checksum:
-                checksum += bytes([ min(255, max(b+1, 0)) ])
-        else:
-            checksum = clean_checksum
-        # and append
-        msg_bytes_with_checksum = msg_bytes + checksum
+    @staticmethod
+    def sendmsg_all(sock, buffers):
+        """sendall() for a list of buffers, gathered by sendmsg instead of concatenated first"""
+        buffers = list(buffers)
+        while buffers:
+            sent = sock.sendmsg(buffers)
+            # drop fully sent buffers, a partial send leaves the rest of the first one
+            while buffers and sent >= len(buffers[0]):
+                sent -= len(buffers[0])
+                del buffers[0]
+            if sent:
+                buffers[0] = memoryview(buffers[0])[sent:]
 
-        msg_bytes_with_len = struct.pack('!I', len(msg_bytes_with_checksum)) + msg_bytes_with_checksum
+    def send(self, msg_bytes, send_failed_checksum=False):
+        # frame msg with checksum (intentionally false if send_failed_checksum), sequence
+        # number and send timestamp. legacy frames (checksum_type None) carry neither
+        frame_body = SkaiFrame.pack(msg_bytes, self.checksum_type, self.sequence,
+                                    corrupt_checksum=send_failed_checksum, compression=self.compression,
+                                    compress_min_bytes=self.compress_min_bytes)
+        self.sequence += 1
+        # prepend length, the buffers go out as they are without joining them (msg_bytes
+        # can also be SkaiMsg.pack_parts() output, then the msg bytes are never copied)
+        frame_len = sum(len(b) for b in frame_body)
+        frame = [struct.pack('!I', frame_len)] + frame_body
+        if frame_len < self.gather_min_bytes:
+            frame = [b''.join(frame)]
         while True:
             try:
-                self.sock.sendall(msg_bytes_with_len)
+                self.sendmsg_all(self.sock, frame)
                 if self.verbose:
                     print(
                         # length added in front as an unsigned int
-                        f'sent { SkaiMsg.getMessageTypeName(msg_bytes)} message with length {len(msg_bytes)}'
+                        f'sent { SkaiMsg.getMessageTypeName(msg_bytes)} message with length {SkaiFrame.msg_len(msg_bytes)}'
                     )
                     # print(f'\tfull message: {msg_bytes_with_len}')
                 break
@@ -101,7 +134,7 @@ class TcpSender:
 
                 # close, recreate, and try to reconnect
                 self.sock.close()
-                self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                self.sock = self.create_socket()
                 self.connect_to_destination()
 
             except Exception as e:
@@ -1,11 +1,15 @@
 #!/usr/bin/python3
 
-import hashlib
+import os
+import queue
+import select
 import socket
 import struct
 import time
+from collections import deque
 
 from skaimsginterface.skaimessages import *
+from skaimsginterface.framing import SkaiFrame
 import multiprocessing as mp
 import threading
 
@@ -22,6 +26,18 @@ class TcpSenderMP:
 
     ipv4_localhost = '127.0.0.1'
     ipv6_localhost = '::1' # expands to 0:0:0:0:0:0:0:1, listen on '::' for receiving
+
+    # sender process tuning
+    queue_timeout_sec = 0.1     # max blocking wait on send_q before rechecking the stop event
+    send_timeout_sec = 5.0      # max wait for a full socket buffer to drain before reconnecting
+    max_batch = 64              # max queued frames drained into one sendmsg call
+    stop_drain_sec = 1.0        # max wait in stop() for the sender process to send what was queued
+    max_iov = min(os.sysconf('SC_IOV_MAX'), 1024) if hasattr(os, 'sysconf') else 1024
+
+    # bounded send queue, see __init__
+    queue_policies = ('drop_oldest', 'drop_newest', 'block', 'coalesce')
+    max_in_flight_msgs = 256                # frames handed to the sender process but not yet taken off send_q
+    max_in_flight_bytes = 8 * 1024 * 1024
     
     def __init__(self,
                  host_ip,
@@ -32,9 +48,89 @@ class TcpSenderMP:
                  retryTimeoutSec=2,
                  block_during_first_connection=True,
                  ipv6=False, # default to ipv4
+                 checksum_type=None, # legacy md5 frames, see SkaiFrame.pack
+                 compression=None,
+                 compress_min_bytes=1024,
+                 transport_options=None, # TransportOptions, None keeps os defaults
+                 max_queue_msgs=None,
+                 max_queue_bytes=None,
+                 queue_policy='drop_oldest',
+                 conflate=False,
+                 batch_max_msgs=None,
+                 batch_max_bytes=64 * 1024,
+                 batch_max_delay_s=0.002,
                  verbose=False) -> None:
+        """skai TCP sender using a separate sender process
+
+        send() frames a msg and queues it for the sender process. without a
+        capacity the queue is unbounded, so while the listener is down it grows
+        until the sender reconnects. with max_queue_msgs and / or max_queue_bytes
+        at most that much is queued, counting frames already handed to the sender
+        process, and queue_policy decides what happens to msgs beyond it:
+            drop_oldest  the oldest queued msgs are dropped to make room
+            drop_newest  send() drops the new msg and returns False
+            block        send() waits until the sender process frees space
+            coalesce     a new msg replaces a queued msg of the same type (latest
+                         wins, keeping the queued msg's place), otherwise drop_oldest
+        queued frames get their sequence number when they are handed to the sender
+        process, so they go out in sequence order whatever was replaced, and the
+        numbers of dropped and replaced msgs are skipped, so listeners count them as
+        missing (not reordered). queue_depth() and queue_stats() report the queue.
+
+        conflate is for state-like streams (TracksInDealershipMsg, SkaiGooeyMsg,
+        AdatStatusMsg, ...) where only the newest msg matters: every msg waits
+        in the queue keyed by its msg type plus send()'s conflate_key (e.g. a
+        camera_id), a newer msg with the same key replaces it, and only one frame
+        at a time is handed to the sender process, the next as soon as it takes
+        that one off. after a reconnect the listener gets at most the couple of
+        frames the sender process already held, then the latest msg of every
+        key, instead of a replay of the whole outage.
+        replaced msgs are counted as coalesced in queue_stats().
+
+        batch_max_msgs is for small high-rate msgs (FeetPosMsg, ActionMsg,
+        ModuleStatusMsg, ...): send() collects msgs and sends up to batch_max_msgs
+        of them, or batch_max_bytes worth, as one batch frame with one header,
+        checksum and sequence number (see SkaiFrame.pack_batch). a msg waits at
+        most batch_max_delay_s for its batch to fill, flush() sends the batch
+        right away. listeners unbatch to the same per msg callback. batching
+        needs a checksum_type, the queue capacity and counters count a batch as
+        one msg, and collected msg bytes must not change until they are sent.
+
+        compression is for big msgs (LocalTrackMsg, GlobalTrackMsg, SkaimotMsg
+        embeddings): msgs of at least compress_min_bytes (whole batches when
+        batching) go out compressed if that makes them smaller. it needs a
+        checksum_type and runs in send(), the queue limits count compressed bytes.
+
+        Args:
+            host_ip (str): destination ip
+            port (int): destination port
+            max_queue_msgs (int, optional): queue capacity in msgs. Defaults to None.
+            max_queue_bytes (int, optional): queue capacity in frame bytes. Defaults to None.
+            queue_policy (str, optional): one of queue_policies. Defaults to 'drop_oldest'.
+            conflate (bool, optional): keep only the latest pending msg per key, see above. Defaults to False.
+            batch_max_msgs (int, optional): msgs per batch frame, None or 1 sends every msg on its own. Defaults to None.
+            batch_max_bytes (int, optional): msg bytes that fill a batch early. Defaults to 64 KB.
+            batch_max_delay_s (float, optional): max time a msg waits for its batch to fill. Defaults to 0.002.
+            compression (FrameCompression.Type, optional): codec, see above and SkaiFrame.pack. Defaults to None.
+            compress_min_bytes (int, optional): smaller msgs go out uncompressed. Defaults to 1024.
+        """
+        if queue_policy not in self.queue_policies:
+            raise ValueError(f'unknown queue_policy {queue_policy}, expected one of {self.queue_policies}')
+        self.batching = batch_max_msgs is not None and batch_max_msgs > 1
+        if self.batching and checksum_type is None:
+            raise ValueError('batching needs a checksum_type, legacy frames can not carry batches')
+        if self.batching and (conflate or queue_policy == 'coalesce'):
+            # replacing a queued batch would drop every msg in it
+            raise ValueError('conflate and the coalesce queue_policy replace single msgs, they can not be batched')
+        SkaiFrame.check_compression(compression, checksum_type)
         self.ipv6 = ipv6
         self.verbose = verbose
+        self.checksum_type = checksum_type
+        self.compression = compression
+        self.compress_min_bytes = compress_min_bytes
+        self.transport_options = transport_options
+        # sequence number of the next versioned frame, one stream per sender
+        self.sequence = 0
         self.retryLimit = retryLimit
         self.reconnectRetryLimit = reconnectRetryLimit
         self.retryTimeoutSec = retryTimeoutSec
@@ -48,6 +144,45 @@ class TcpSenderMP:
         self.print_q = print_q
         self.send_q = mp.Queue()
 
+        # msgs / bytes put on send_q that the sender process has not taken off yet,
+        # room_event is set by the sender process when it takes some off
+        self.in_flight = mp.Array('q', 2)
+        self.room_event = mp.Event()
+
+        # bounded queue: frames wait here until the sender process has room, which is where
+        # the queue policy can still drop or coalesce them
+        self.max_queue_msgs = max_queue_msgs
+        self.max_queue_bytes = max_queue_bytes
+        self.queue_policy = queue_policy
+        self.conflate = conflate
+        self.bounded = max_queue_msgs is not None or max_queue_bytes is not None or conflate
+        self.backlog = deque()                  # [frame, key, replaced msgs] entries, key is (msg type, conflate_key)
+        self.backlog_bytes = 0
+        self.handoff_sequence = 0               # sequence number of the next frame handed to the sender process
+        self.skipped_sequences = 0              # msgs dropped since then, their numbers are skipped
+        self.backlog_keys = {}                  # key: backlog entry, coalesce and conflate only
+        self.backlog_cond = threading.Condition()
+        self.stopping = False                   # stop() hands everything over, the limits no longer apply
+        self.dropped_oldest = 0
+        self.dropped_newest = 0
+        self.coalesced = 0
+        self.blocked = 0
+        self.blocked_sec = 0.0
+        self.in_flight_msgs_limit = min(self.max_in_flight_msgs, max_queue_msgs or self.max_in_flight_msgs)
+        if conflate:
+            # frames handed over can not be replaced any more
+            self.in_flight_msgs_limit = 1
+        self.in_flight_bytes_limit = min(self.max_in_flight_bytes, max_queue_bytes or self.max_in_flight_bytes)
+
+        # msgs collected for the next batch frame, batch_cond also guards the sequence number while batching
+        self.batch_max_msgs = batch_max_msgs
+        self.batch_max_bytes = batch_max_bytes
+        self.batch_max_delay_s = batch_max_delay_s
+        self.batch_msgs = []
+        self.batch_bytes = 0
+        self.batch_deadline = None
+        self.batch_cond = threading.Condition()
+
         # socket creation info
         self.destination = (host_ip, port)
         if self.ipv6:
@@ -56,7 +191,11 @@ class TcpSenderMP:
             self.localhost = self.ipv4_localhost
 
         # actually create socket
-        self.sock = self.create_socket(ipv6=self.ipv6)
+        self.sock = self.create_socket(ipv6=self.ipv6, transport_options=self.transport_options)
+
+        # start sender process, it waits for the first connection. fork before the connect
+        # thread exists, a child forked while that thread logs inherits a held log stream lock
+        self.start_sender_process()
 
         # try to connect with limits
         self.connect_to_destination(
@@ -71,15 +210,42 @@ class TcpSenderMP:
             self.block_during_first_connection,
             self.verbose)
 
-        # start sender process
-        self.start_sender_process()
+        # moves the backlog on to the sender process as it frees space
+        if self.bounded:
+            self.feeder_thread = threading.Thread(target=self.feed_backlog, daemon=True)
+            self.feeder_thread.start()
+
+        # sends batches that did not fill up within batch_max_delay_s
+        if self.batching:
+            self.batch_thread = threading.Thread(target=self.flush_batches, daemon=True)
+            self.batch_thread.start()
 
     def stop(self):
         if self.print_q is not None:
             printmsg = 'setting sender stop event!'
             logger.info(printmsg)
             self.print_q.put(printmsg)
+        # msgs send() took still go out: the partial batch and the whole queue go to the sender
+        # process, then the stop sentinel, it sends what it took before stopping
+        with self.backlog_cond:
+            self.stopping = True
+            self.backlog_cond.notify_all()
+        if self.batching:
+            self.flush()
+        with self.backlog_cond:
+            while self.backlog:
+                frame, key, replaced = self.pop_backlog()
+                self.hand_off(frame, replaced)
+            self.send_q.put_nowait(None)
+        if self.connected_event.is_set():
+            self.sender_proc.join(self.stop_drain_sec)
         self.stop_event.set()
+        # wake send() / the feeder if they wait for room, and the batch flusher
+        self.room_event.set()
+        with self.backlog_cond:
+            self.backlog_cond.notify_all()
+        with self.batch_cond:
+            self.batch_cond.notify_all()
 
     '''
     return whether the sender is connected
@@ -117,25 +283,31 @@ class TcpSenderMP:
                 self.pause_event,
                 self.print_q,
                 self.send_q,
+                self.in_flight,
+                self.room_event,
                 self.sock,
                 self.destination,
                 self.reconnectRetryLimit,
                 self.retryTimeoutSec,
                 self.verbose,
-                self.ipv6
+                self.ipv6,
+                self.transport_options
             )
         )
         self.sender_proc.daemon = True
         self.sender_proc.start()
 
     @staticmethod
-    def create_socket(ipv6=False):
+    def create_socket(ipv6=False, transport_options=None):
         
         if ipv6:
             sock = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
         else:
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # before connecting, so buffer sizes count for the window scale
+        if transport_options is not None:
+            transport_options.apply(sock)
         send_timeout_sec = 0.0
         sock.settimeout(send_timeout_sec)
         return sock
@@ -242,6 +414,31 @@ class TcpSenderMP:
             # return results of attempt to connect
             return connected
 
+    @staticmethod
+    def send_frames(sock, frames, send_timeout_sec):
+        """sends a batch of length prefixed frames with as few sendmsg calls as possible
+
+        frames that were fully sent are removed from the front of the list, so after an
+        exception it holds exactly the frames that still need to be (re)sent
+        """
+        offset = 0 # bytes of frames[0] already sent
+        while frames:
+            buffers = [memoryview(frames[0])[offset:]]
+            buffers.extend(frames[1:TcpSenderMP.max_iov])
+            try:
+                sent = sock.sendmsg(buffers) + offset
+            except BlockingIOError:
+                # socket buffer is full, wait until writable instead of spinning
+                _, writable, _ = select.select([], [sock], [], send_timeout_sec)
+                if not writable:
+                    raise TimeoutError(f'socket not writable after {send_timeout_sec} seconds')
+                continue
+            # drop fully sent frames, remember how far into the next one we got
+            while frames and sent >= len(frames[0]):
+                sent -= len(frames[0])
+                del frames[0]
+            offset = sent
+
     @staticmethod
     def sender_process(stop_event,
                        first_connection_event,
@@ -249,116 +446,309 @@ class TcpSenderMP:
                        pause_event,
                        print_q,
                        send_q,
+                       in_flight,
+                       room_event,
                        sock,
                        destination,
                        retryLimit,
                        retryTimeoutSec,
                        verbose,
-                       ipv6=False):
-        # check if first connection is made
-        while not first_connection_event.is_set():
-            time.sleep(0.01)
-
-
-        # send_timeout_sec = 0.8
+                       ipv6=False,
+                       transport_options=None):
+        # wait for first connection to be made
+        while not first_connection_event.wait(TcpSenderMP.queue_timeout_sec):
+            if stop_event.is_set():
+                return
+
+        batch = []
         while not stop_event.is_set():
-            
-            # check if anything to send
-            if not send_q.empty():
-                
-                # try sending until sent (handle disconnects too)
-                sent = False
-                while (not sent) and (not stop_event.is_set()):
-                    # attempt to send on socket
-                    try:
-                        # get msg bytes with checksum appended and length prepended
-                        if connected_event.is_set():
-                            msg_bytes_with_checksum_and_length = send_q.get_nowait()
-                        else:
-                            printmsg = 'connected event not set!'
-                            logger.info(printmsg)
-                            if print_q is not None:
-                                print_q.put(printmsg)
-                            raise BrokenPipeError
-                        
-                        logger.info(f'sending {len(msg_bytes_with_checksum_and_length)} bytes...')
-                        sock.sendall(msg_bytes_with_checksum_and_length)
-                        if verbose:
-                            printmsg = f'sent message to {destination}'
-                            logger.info(printmsg)
-                            if print_q is not None:
-                                print_q.put(printmsg)
-                        sent = True
-
-                    # except BrokenPipeError:
-                    except Exception as e:
-                        printmsg = f'TcpSenderMP Exception: {e}'
-                        logger.exception(printmsg)
+
+            # block until something to send, then drain everything else already queued
+            if not batch:
+                try:
+                    frame = send_q.get(timeout=TcpSenderMP.queue_timeout_sec)
+                except queue.Empty:
+                    continue
+                if frame is None:
+                    break # stop sentinel
+                batch.append(frame)
+                num_taken = 1
+            else:
+                num_taken = 0
+            stopping = False
+            while len(batch) < TcpSenderMP.max_batch:
+                try:
+                    frame = send_q.get_nowait()
+                except queue.Empty:
+                    break
+                if frame is None:
+                    stopping = True
+                    break
+                batch.append(frame)
+                num_taken += 1
+
+            # frames taken off the queue free space for the parent's bounded queue
+            if num_taken:
+                with in_flight.get_lock():
+                    in_flight[0] -= num_taken
+                    in_flight[1] -= sum(len(frame) for frame in batch[-num_taken:])
+                room_event.set()
+
+            # try sending until sent (handle disconnects too)
+            while batch and (not stop_event.is_set()):
+                # attempt to send on socket
+                try:
+                    if not connected_event.is_set():
+                        printmsg = 'connected event not set!'
+                        logger.info(printmsg)
                         if print_q is not None:
                             print_q.put(printmsg)
+                        raise BrokenPipeError
 
-                        connected_event.clear()
-                        printmsg = f'{destination} connection broken! reconnecting...'
-                        logger.error(printmsg)
+                    logger.info(f'sending {len(batch)} frames...')
+                    num_frames = len(batch)
+                    TcpSenderMP.send_frames(sock, batch, TcpSenderMP.send_timeout_sec)
+                    if verbose:
+                        printmsg = f'sent {num_frames} messages to {destination}'
+                        logger.info(printmsg)
                         if print_q is not None:
                             print_q.put(printmsg)
 
-                        # close, recreate, and try to reconnect
-                        sock.close()
-                        sock = TcpSenderMP.create_socket(ipv6=ipv6)
-                        connected = TcpSenderMP.connect_to_destination(
-                            stop_event,
-                            first_connection_event,
-                            connected_event,
-                            print_q,
-                            sock,
-                            destination,
-                            retryLimit,
-                            retryTimeoutSec,
-                            True,
-                            verbose)
-                        
-                        # pause the thread and resume when pause_event is unset
-                        if not connected:
-                            printmsg = f'pausing sender process due to {retryLimit} unsuccessful reconnect attempts'
-                            logger.info(printmsg)
-                            if print_q is not None:
-                                print_q.put(printmsg)
-                            pause_event.set()
-                            time.sleep(0.5)
-                            while pause_event.is_set():
-                                time.sleep(0.1)
-
-                    # except Exception as e:
-                    #     if print_q is not None:
-                    #         print_q.put(f'TcpSenderMP Exception: {e}')
-
-                    if not sent:
-                        printmsg = 'msg not sent. retrying...'
+                # except BrokenPipeError:
+                except Exception as e:
+                    printmsg = f'TcpSenderMP Exception: {e}'
+                    logger.exception(printmsg)
+                    if print_q is not None:
+                        print_q.put(printmsg)
+
+                    connected_event.clear()
+                    printmsg = f'{destination} connection broken! reconnecting...'
+                    logger.error(printmsg)
+                    if print_q is not None:
+                        print_q.put(printmsg)
+
+                    # close, recreate, and try to reconnect
+                    sock.close()
+                    sock = TcpSenderMP.create_socket(ipv6=ipv6, transport_options=transport_options)
+                    connected = TcpSenderMP.connect_to_destination(
+                        stop_event,
+                        first_connection_event,
+                        connected_event,
+                        print_q,
+                        sock,
+                        destination,
+                        retryLimit,
+                        retryTimeoutSec,
+                        True,
+                        verbose)
+
+                    # pause the thread and resume when pause_event is unset
+                    if not connected:
+                        printmsg = f'pausing sender process due to {retryLimit} unsuccessful reconnect attempts'
                         logger.info(printmsg)
                         if print_q is not None:
                             print_q.put(printmsg)
-           
-                # delay between repeated sends
-                time.sleep(0.005)
-
-    def send(self, msg_bytes, send_failed_checksum=False):
-        # calc checksum 
-        clean_checksum = hashlib.md5(msg_bytes).digest()
-        # if you want to send a intentionally false checksum then mutate the bytes
-        if send_failed_checksum:
-            # add 1 to each bytes
-            checksum = b''
-            for b in clean_checksum:
-                checksum += bytes([ min(255, max(b+1, 0)) ])
+                        pause_event.set()
+                        time.sleep(0.5)
+                        while pause_event.is_set():
+                            time.sleep(0.1)
+
+                if batch:
+                    printmsg = 'msg not sent. retrying...'
+                    logger.info(printmsg)
+                    if print_q is not None:
+                        print_q.put(printmsg)
+
+            if stopping:
+                break
+
+    def send(self, msg_bytes, send_failed_checksum=False, conflate_key=None):
+        # frame msg with checksum (intentionally false if send_failed_checksum), sequence
+        # number and send timestamp. legacy frames (checksum_type None) carry neither.
+        # conflate_key (e.g. a camera_id) splits a msg type into separately conflated streams
+        if self.batching:
+            return self.add_to_batch(msg_bytes, send_failed_checksum)
+        frame_body = SkaiFrame.pack(msg_bytes, self.checksum_type, self.sequence,
+                                    corrupt_checksum=send_failed_checksum, compression=self.compression,
+                                    compress_min_bytes=self.compress_min_bytes)
+        self.sequence += 1
+        return self.send_frame_body(frame_body, msg_bytes, conflate_key)
+
+    def add_to_batch(self, msg_bytes, send_failed_checksum=False):
+        with self.batch_cond:
+            if send_failed_checksum:
+                # a failed checksum would fail the whole batch, send it on its own after the batch so far
+                sent = self.flush_batch()
+                frame_body = SkaiFrame.pack(msg_bytes, self.checksum_type, self.sequence, corrupt_checksum=True,
+                                            compression=self.compression, compress_min_bytes=self.compress_min_bytes)
+                self.sequence += 1
+                return self.send_frame_body(frame_body, msg_bytes) and sent
+            if not self.batch_msgs:
+                self.batch_deadline = time.monotonic() + self.batch_max_delay_s
+                self.batch_cond.notify_all()
+            self.batch_msgs.append(msg_bytes)
+            self.batch_bytes += SkaiFrame.msg_len(msg_bytes)
+            if len(self.batch_msgs) >= self.batch_max_msgs or self.batch_bytes >= self.batch_max_bytes:
+                return self.flush_batch()
+            return True
+
+    def flush(self):
+        """sends the msgs collected for the next batch frame right away, returns False if the queue dropped it"""
+        with self.batch_cond:
+            return self.flush_batch()
+
+    def flush_batch(self):
+        # batch_cond held. a single msg goes out as a normal frame
+        msgs = self.batch_msgs
+        if not msgs:
+            return True
+        self.batch_msgs = []
+        self.batch_bytes = 0
+        self.batch_deadline = None
+        if len(msgs) == 1:
+            frame_body = SkaiFrame.pack(msgs[0], self.checksum_type, self.sequence, compression=self.compression,
+                                        compress_min_bytes=self.compress_min_bytes)
         else:
-            checksum = clean_checksum
-        # and append
-        msg_bytes_with_checksum = msg_bytes + checksum
-        # calc length and prepend
-        msg_bytes_with_checksum_and_length = struct.pack('!I', len(msg_bytes_with_checksum)) + msg_bytes_with_checksum
+            frame_body = SkaiFrame.pack_batch(msgs, self.checksum_type, self.sequence, compression=self.compression,
+                                              compress_min_bytes=self.compress_min_bytes)
+        self.sequence += 1
+        return self.send_frame_body(frame_body, msgs[0])
+
+    def flush_batches(self):
+        with self.batch_cond:
+            while not self.stop_event.is_set():
+                if self.batch_deadline is None:
+                    self.batch_cond.wait(self.queue_timeout_sec)
+                    continue
+                remaining = self.batch_deadline - time.monotonic()
+                if remaining > 0:
+                    self.batch_cond.wait(remaining)
+                else:
+                    self.flush_batch()
+
+    def send_frame_body(self, frame_body, msg_bytes, conflate_key=None):
+        # calc length, prepend and join into one buffer. the only copy of the msg bytes (SkaiMsg.pack_parts()
+        # output works too), the frame has to be one buffer to be pickled over to the sender process anyway
+        frame_len = sum(len(b) for b in frame_body)
         # add to send queue to be sent
-        self.send_q.put_nowait(msg_bytes_with_checksum_and_length)
+        if not self.bounded:
+            self.put_frame(b''.join([struct.pack('!I', frame_len)] + frame_body))
+            return True
+        # writable, hand_off() sets the sequence number
+        frame = bytearray().join([struct.pack('!I', frame_len)] + frame_body)
+        return self.queue_frame(frame, msg_bytes, conflate_key)
+
+    def put_frame(self, frame):
+        with self.in_flight.get_lock():
+            self.in_flight[0] += 1
+            self.in_flight[1] += len(frame)
+        self.send_q.put_nowait(frame)
+
+    def has_room_in_flight(self):
+        msgs, nbytes = self.in_flight[:]
+        return msgs == 0 or (msgs < self.in_flight_msgs_limit and nbytes < self.in_flight_bytes_limit)
+
+    def is_full(self, frame_len):
+        if self.stopping:
+            return False
+        msgs, nbytes = self.in_flight[:]
+        msgs += len(self.backlog)
+        nbytes += self.backlog_bytes
+        # an empty queue always takes one msg, even one bigger than max_queue_bytes
+        return msgs > 0 and ((self.max_queue_msgs is not None and msgs + 1 > self.max_queue_msgs) or
+                             (self.max_queue_bytes is not None and nbytes + frame_len > self.max_queue_bytes))
+
+    def hand_off(self, frame, replaced=0):
+        # backlog_cond held. numbers the frame in hand off order, skipping one per msg dropped or replaced before it
+        if self.checksum_type is not None:
+            self.handoff_sequence += self.skipped_sequences + replaced
+            SkaiFrame.set_sequence(frame, self.handoff_sequence, offset=4)
+            self.handoff_sequence += 1
+            self.skipped_sequences = 0
+        self.put_frame(frame)
+
+    def pop_backlog(self):
+        entry = self.backlog.popleft()
+        self.backlog_bytes -= len(entry[0])
+        if self.backlog_keys.get(entry[1]) is entry:
+            del self.backlog_keys[entry[1]]
+        return entry
+
+    def queue_frame(self, frame, msg_bytes, conflate_key=None):
+        msg_type = SkaiFrame.msg_type_of(msg_bytes)
+        key = (msg_type, conflate_key)
+        replace_by_key = self.conflate or self.queue_policy == 'coalesce'
+        with self.backlog_cond:
+            # nothing waiting and room in flight: straight to the sender process
+            if not self.backlog and self.has_room_in_flight() and not self.is_full(len(frame)):
+                self.hand_off(frame)
+                return True
+
+            if replace_by_key:
+                entry = self.backlog_keys.get(key)
+                if entry is not None:
+                    self.backlog_bytes += len(frame) - len(entry[0])
+                    entry[0] = frame
+                    entry[2] += 1
+                    self.coalesced += 1
+                    return True
+
+            if self.queue_policy == 'block' and self.is_full(len(frame)):
+                self.blocked += 1
+                start = time.perf_counter()
+                while self.is_full(len(frame)) and not self.stop_event.is_set():
+                    # the feeder notifies when the sender process takes frames
+                    self.backlog_cond.wait(self.queue_timeout_sec)
+                self.blocked_sec += time.perf_counter() - start
+
+            while self.is_full(len(frame)):
+                if self.queue_policy in ('drop_newest', 'block') or not self.backlog:
+                    # only frames in flight left, those can not be taken back
+                    self.dropped_newest += 1
+                    self.skipped_sequences += 1
+                    return False
+                entry = self.pop_backlog()
+                self.skipped_sequences += 1 + entry[2]
+                self.dropped_oldest += 1
+
+            entry = [frame, key, 0]
+            self.backlog.append(entry)
+            self.backlog_bytes += len(frame)
+            if replace_by_key:
+                self.backlog_keys[key] = entry
+            if self.has_room_in_flight():
+                self.room_event.set()
+        return True
+
+    def feed_backlog(self):
+        while not self.stop_event.is_set():
+            # woken by the sender process taking frames, or by send() queueing while there is room.
+            # cleared before checking, so a frame taken meanwhile sets it again
+            self.room_event.wait(self.queue_timeout_sec)
+            self.room_event.clear()
+            with self.backlog_cond:
+                while self.backlog and self.has_room_in_flight():
+                    frame, key, replaced = self.pop_backlog()
+                    self.hand_off(frame, replaced)
+                self.backlog_cond.notify_all()
+
+    def queue_depth(self):
+        """returns (msgs, bytes) queued and not yet taken by the sender process"""
+        with self.backlog_cond:
+            msgs, nbytes = self.in_flight[:]
+            return msgs + len(self.backlog), nbytes + self.backlog_bytes
+
+    def queue_stats(self):
+        msgs, nbytes = self.queue_depth()
+        return {
+            'queued_msgs': msgs,
+            'queued_bytes': nbytes,
+            'dropped_oldest': self.dropped_oldest,
+            'dropped_newest': self.dropped_newest,
+            'coalesced': self.coalesced,
+            'blocked': self.blocked,
+            'blocked_sec': self.blocked_sec,
+        }
         
 if __name__ == '__main__':
 
@@ -2,3 +2,6 @@ from .TcpSender import TcpSender
 from .TcpSenderMP import TcpSenderMP
 from .MultiportTcpListener import MultiportTcpListener
 from .MultiportTcpListenerMP import MultiportTcpListenerMP
+from .FrameReader import FrameReader
+from .AsyncMultiportTcpListener import AsyncMultiportTcpListener
+from .AsyncTcpSender import AsyncTcpSender
@@ -0,0 +1,102 @@
+#!/usr/bin/python3
+
+import socket
+
+
+class TransportOptions:
+    """socket options applied the same way by every sender and listener
+
+    every option defaults to None, which leaves the os default alone, so
+    TransportOptions() behaves like passing nothing. tcp only options are
+    skipped on udp sockets and on platforms without them.
+
+        options = TransportOptions.profile('low_latency')
+        sender = TcpSender('127.0.0.1', port, transport_options=options)
+        listener = MultiportTcpListener(ports, callback, transport_options=options)
+
+    profiles:
+        default      os defaults
+        low_latency  TCP_NODELAY so small msgs are not held back by Nagle,
+                     TCP_QUICKACK re-armed after every received frame,
+                     keepalive and a 5 s TCP_USER_TIMEOUT so dead peers are noticed quickly
+        throughput   4 MB send / receive buffers for multi MB frames, TCP_NODELAY
+                     (frames are written whole, so Nagle only delays their tails), keepalive
+    """
+
+    profiles = {
+        'default': {},
+        'low_latency': dict(nodelay=True, quickack=True, keepalive=True, keepalive_idle_s=5, keepalive_interval_s=1,
+                            keepalive_count=3, user_timeout_ms=5000),
+        'throughput': dict(nodelay=True, sndbuf=4 * 1024 * 1024, rcvbuf=4 * 1024 * 1024, keepalive=True),
+    }
+
+    def __init__(self, nodelay=None, sndbuf=None, rcvbuf=None, keepalive=None, keepalive_idle_s=None,
+                 keepalive_interval_s=None, keepalive_count=None, user_timeout_ms=None, quickack=None):
+        """
+        Args:
+            nodelay (bool, optional): TCP_NODELAY, disables Nagle. Defaults to None.
+            sndbuf (int, optional): SO_SNDBUF bytes (linux doubles it and caps it at wmem_max). Defaults to None.
+            rcvbuf (int, optional): SO_RCVBUF bytes (linux doubles it and caps it at rmem_max). Defaults to None.
+            keepalive (bool, optional): SO_KEEPALIVE. Defaults to None.
+            keepalive_idle_s (int, optional): TCP_KEEPIDLE, idle seconds before the first probe. Defaults to None.
+            keepalive_interval_s (int, optional): TCP_KEEPINTVL, seconds between probes. Defaults to None.
+            keepalive_count (int, optional): TCP_KEEPCNT, unanswered probes before the connection drops. Defaults to None.
+            user_timeout_ms (int, optional): TCP_USER_TIMEOUT, ms sent data may stay unacked before the
+                connection drops. Defaults to None.
+            quickack (bool, optional): TCP_QUICKACK, ack right away instead of delaying. linux clears it
+                again on its own, so listeners re-arm it after every frame. Defaults to None.
+        """
+        self.nodelay = nodelay
+        self.sndbuf = sndbuf
+        self.rcvbuf = rcvbuf
+        self.keepalive = keepalive
+        self.keepalive_idle_s = keepalive_idle_s
+        self.keepalive_interval_s = keepalive_interval_s
+        self.keepalive_count = keepalive_count
+        self.user_timeout_ms = user_timeout_ms
+        self.quickack = quickack
+
+    @classmethod
+    def profile(cls, name, **overrides):
+        """returns the options of a named profile, see profiles, with any option overridden by keyword"""
+        if name not in cls.profiles:
+            raise ValueError(f'unknown transport profile {name}, expected one of {list(cls.profiles)}')
+        return cls(**{**cls.profiles[name], **overrides})
+
+    def socket_options(self, tcp=True):
+        """returns the (level, option, value) list to set, options the platform lacks are left out"""
+        options = []
+
+        def add(level, name, value):
+            if value is not None and hasattr(socket, name):
+                options.append((level, getattr(socket, name), int(value)))
+
+        add(socket.SOL_SOCKET, 'SO_SNDBUF', self.sndbuf)
+        add(socket.SOL_SOCKET, 'SO_RCVBUF', self.rcvbuf)
+        if tcp:
+            add(socket.SOL_SOCKET, 'SO_KEEPALIVE', self.keepalive)
+            add(socket.IPPROTO_TCP, 'TCP_NODELAY', self.nodelay)
+            add(socket.IPPROTO_TCP, 'TCP_KEEPIDLE', self.keepalive_idle_s)
+            add(socket.IPPROTO_TCP, 'TCP_KEEPINTVL', self.keepalive_interval_s)
+            add(socket.IPPROTO_TCP, 'TCP_KEEPCNT', self.keepalive_count)
+            add(socket.IPPROTO_TCP, 'TCP_USER_TIMEOUT', self.user_timeout_ms)
+            add(socket.IPPROTO_TCP, 'TCP_QUICKACK', self.quickack)
+        return options
+
+    def apply(self, sock):
+        """sets the options on sock, a tcp or udp socket. call it before connect() / listen() so the
+        buffer sizes also count for the tcp window scale, listeners call it again on every accepted socket"""
+        for level, option, value in self.socket_options(tcp=sock.type == socket.SOCK_STREAM):
+            sock.setsockopt(level, option, value)
+
+    def rearm(self, sock):
+        """re-arms TCP_QUICKACK after a read, a no-op unless quickack is set"""
+        if self.quickack and hasattr(socket, 'TCP_QUICKACK'):
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+            except OSError:
+                pass
+
+    def __repr__(self):
+        set_options = ', '.join(f'{key}={value}' for key, value in vars(self).items() if value is not None)
+        return f'TransportOptions({set_options})'
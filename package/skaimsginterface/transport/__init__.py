@@ -0,0 +1 @@
+from .TransportOptions import TransportOptions
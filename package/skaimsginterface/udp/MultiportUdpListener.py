@@ -1,16 +1,21 @@
 #!/usr/bin/python3
 
-import hashlib
 import time
 import threading
 import socketserver
 import struct
 from skaimsginterface.skaimessages import *
 from skaimsginterface.replay import FileRecorder
+from skaimsginterface.framing import SkaiFrame, FrameError, StreamStats
+from skaimsginterface.udp.UdpChunk import UdpChunk
+from skaimsginterface.udp.UdpReassembler import UdpReassembler
+from skaimsginterface.udp.UdpBatchSocket import UdpBatchSocket
 
 class MultiportUdpListener:
 
-    def __init__(self, portlist, multiport_callback_func, verbose=False, recordfile=None):
+    def __init__(self, portlist, multiport_callback_func, verbose=False, recordfile=None,
+                 reassembly_timeout_s=1.0, nack=False, batch_size=None, transport_options=None,
+                 record_index=False, record_segment_bytes=None, record_segment_sec=None):
         """skai multiport udp listener
 
         def example_multiport_callback_func(data, server_address):
@@ -22,16 +27,41 @@ class MultiportUdpListener:
             portlist (list): ports to listen to 
             multiport_callback_func (types.FunctionType): your function, which should have params (data, server_address)
             verbose (bool, optional): controls additional print statements. Defaults to False.
+            reassembly_timeout_s (float, optional): drop partial chunked msgs after this long without
+                a new chunk. Defaults to 1.0.
+            nack (bool, optional): NACK missing chunks of chunked msgs back to their sender. Defaults to False.
+            batch_size (int, optional): receive up to this many datagrams per recvmmsg syscall into a reused
+                arena (see UdpBatchSocket) instead of one socketserver handler call per datagram. Defaults to None.
+            transport_options (TransportOptions, optional): socket options, udp sockets only take the
+                buffer sizes (rcvbuf is the one that matters for bursts of chunks). Defaults to None.
+            record_index (bool, optional): write a SkaibinIndex next to recordfile while recording. Defaults to False.
+            record_segment_bytes (int, optional): record into rotating segments of this size, see
+                SkaibinSegments. Defaults to None.
+            record_segment_sec (float, optional): record into rotating segments of this duration. Defaults to None.
+
+        chunked senders (UdpSender(..., chunked=True)) are reassembled per sender
+        by reassemblers[port], whose sources hold loss / reorder counters and a
+        StreamStats each (until the sender has been idle for
+        UdpReassembler.source_idle_timeouts reassembly timeouts). legacy senders have no sender id, so stream_stats holds
+        a StreamStats per port for them and each port is assumed to have one
+        legacy sender.
         """
         self.verbose = verbose
         self.portlist = portlist
         self.multiport_callback_func = multiport_callback_func
+        self.stream_stats = {port: StreamStats() for port in portlist}
+        self.reassembly_timeout_s = reassembly_timeout_s
+        self.nack = nack
+        self.batch_size = batch_size
+        self.transport_options = transport_options
+        self.reassemblers = {}
 
         # initialize file recorder if recordfile specified
         self.recorder = None
         if recordfile is not None:
             print('opening recorder...')
-            self.recorder = FileRecorder(recordfile)
+            self.recorder = FileRecorder(recordfile, index=record_index, max_segment_bytes=record_segment_bytes,
+                                         max_segment_sec=record_segment_sec)
             self.recorder.open()
 
         self.start_listeners()
@@ -59,36 +89,52 @@ class MultiportUdpListener:
             t.daemon = True  # non blocking
             t.start()
 
-    def multiport_callback(self, data, server_address, firstpacket_timestamp):
-        msg, checksum = data[:-16], data[-16:]
-        msg_checksum = hashlib.md5(msg).digest()
+    def multiport_callback(self, data, server_address, firstpacket_timestamp, stream_stats=None):
+        # verify checksum (legacy or versioned frame)
+        try:
+            record, header = SkaiFrame.strip_checksum(data)
+            msgs, header = SkaiFrame.split_msgs(record)
+            checksum_ok = True
+        except FrameError as e:
+            checksum_ok = False
+            error = e
+
+        if checksum_ok:
+            port = server_address[1]
+            if stream_stats is None:
+                stream_stats = self.stream_stats[port]
+            gap = stream_stats.update(header, firstpacket_timestamp)
+            if gap and self.verbose:
+                print(f'{gap} msgs missing before sequence {header.sequence} on {server_address}')
 
-        if checksum == msg_checksum:
             if self.recorder is not None:    
-                port = server_address[1]
                 if self.verbose:
-                    print(f'recording msg length {len(msg)} on port: {port} firstpacket_ts {firstpacket_timestamp}')
-                self.recorder.record(msg, firstpacket_timestamp, port)
+                    print(f'recording msg length {len(record)} on port: {port} firstpacket_ts {firstpacket_timestamp}')
+                self.recorder.record(record, firstpacket_timestamp, port)
 
-            self.multiport_callback_func(msg, server_address)
+            # batch frames carry several msgs, each goes to the callback on its own
+            for msg in msgs:
+                self.multiport_callback_func(msg, server_address)
 
         elif self.verbose:
-            print('checksum failed')
+            print(error)
 
-    class MySinglePortListener(socketserver.ThreadingUDPServer):
+    class MySinglePortListener(socketserver.UDPServer):
+        # datagrams are handled one at a time, in arrival order. a thread per
+        # datagram (ThreadingUDPServer) raced on the reassembly state
 
         class MyUDPHandler(socketserver.BaseRequestHandler):
                  
             def handle(self):
-                data = self.request[0]
+                data, sock = self.request
                 # call server callback function with data
-                self.server.single_port_callback(data)
+                self.server.single_port_callback(data, sock, self.client_address)
 
         def __init__(self, server_address, multiport_listener):
             
             # state var init
             self.new_msg_flag = True
-            self.databuff = bytes()
+            self.databuff = bytearray()
             self.packet_idx = 0
             self.total_num_packets = 0
 
@@ -96,17 +142,60 @@ class MultiportUdpListener:
             self.multiport_listener = multiport_listener
 
             # turn on allow reuse ports
-            socketserver.ThreadingUDPServer.allow_reuse_address = True
+            socketserver.UDPServer.allow_reuse_address = True
 
             # instantiate server
-            socketserver.ThreadingUDPServer.__init__(self, server_address,
-                                                     self.MyUDPHandler)
+            socketserver.UDPServer.__init__(self, server_address,
+                                            self.MyUDPHandler)
 
-            # now serve forever
-            print(f'now listening on {self.server_address}')
-            self.serve_forever()
+            # chunked msgs, keyed per sender
+            nack_func = self.send_nack if multiport_listener.nack else None
+            self.reassembler = UdpReassembler(multiport_listener.reassembly_timeout_s, nack_func, verbose=multiport_listener.verbose)
+            multiport_listener.reassemblers[server_address[1]] = self.reassembler
 
-        def single_port_callback(self, data):
+            # now serve forever, waking up often enough to time out and NACK stalled msgs
+            print(f'now listening on {self.server_address}')
+            poll_interval = self.reassembler.nack_interval_s if multiport_listener.nack else 0.5
+            if multiport_listener.batch_size:
+                self.serve_batched(multiport_listener.batch_size, poll_interval)
+            else:
+                self.serve_forever(poll_interval=poll_interval)
+
+        def server_bind(self):
+            if self.multiport_listener.transport_options is not None:
+                self.multiport_listener.transport_options.apply(self.socket)
+            socketserver.UDPServer.server_bind(self)
+
+        def serve_batched(self, batch_size, poll_interval):
+            # same handling as serve_forever, batch_size datagrams per syscall
+            batch = UdpBatchSocket(self.socket, batch_size, self.max_packet_size)
+            while True:
+                for data, client_address in batch.recv_many(timeout=poll_interval):
+                    self.single_port_callback(data, self.socket, client_address)
+                self.service_actions()
+
+        def service_actions(self):
+            self.reassembler.service()
+
+        def send_nack(self, datagram, address):
+            try:
+                self.socket.sendto(datagram, address)
+            except OSError as e:
+                print(f'could not send NACK to {address}: {e}')
+
+        def single_port_callback(self, data, sock=None, client_address=None):
+
+            if UdpChunk.is_chunk(data):
+                firstpacket_timestamp = time.time()
+                try:
+                    completed = self.reassembler.add(data, client_address, firstpacket_timestamp)
+                except FrameError as e:
+                    if self.multiport_listener.verbose:
+                        print(f'bad udp chunk from {client_address}: {e}')
+                    return
+                for frame_bytes, first_ts, source in completed:
+                    self.multiport_listener.multiport_callback(frame_bytes, self.server_address, first_ts, source.stream_stats)
+                return
 
             if self.new_msg_flag:
                 try:
@@ -114,7 +203,7 @@ class MultiportUdpListener:
                     # prep for reading chunks
                     self.new_msg_flag = False
                     self.firstpacket_timestamp = time.time()
-                    self.databuff = bytes()
+                    self.databuff = bytearray()
                     self.packet_idx = 0
                     self.total_num_packets = packet_count
                 except Exception as e:
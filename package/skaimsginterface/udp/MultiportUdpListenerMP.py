@@ -0,0 +1,292 @@
+#!/usr/bin/python3
+
+import time
+import socket
+import struct
+
+from skaimsginterface.skaimessages import *
+from skaimsginterface.framing import SkaiFrame, FrameError, StreamStats
+from skaimsginterface.tcp.MultiportTcpListenerMP import MultiportTcpListenerMP, logger
+from skaimsginterface.udp.UdpChunk import UdpChunk
+from skaimsginterface.udp.UdpReassembler import UdpReassembler
+from skaimsginterface.udp.UdpBatchSocket import UdpBatchSocket
+
+import multiprocessing as mp
+
+
+class MultiportUdpListenerMP(MultiportTcpListenerMP):
+
+    # seconds stop() waits for each process to exit
+    join_timeout_sec = 2.0
+
+    def __init__(self, portlist, multiport_callback_func, print_q=None, ipv6=False, verbose=False, recordfile=None,
+                 use_shared_memory=True, shm_ring_size=16 * 1024 * 1024, reassembly_timeout_s=1.0, nack=False,
+                 batch_size=32, transport_options=None, record_index=False, record_segment_bytes=None,
+                 record_segment_sec=None):
+        """skai multiport udp listener using multiprocessing
+
+        one process per port receives datagrams, reassembles msgs (chunked or legacy
+        senders, see MultiportUdpListener) and verifies checksums, one more process
+        calls your callback and optionally records, same as MultiportTcpListenerMP.
+
+        Args:
+            portlist (list): ports to listen to
+            multiport_callback_func (types.FunctionType): your function, which should have params (data, server_address)
+            print_q (mp.SimpleQueue, optional): queue the processes put status msgs on. Defaults to None.
+            ipv6 (bool, optional): listen on ipv6 instead of ipv4. Defaults to False.
+            verbose (bool, optional): log dropped chunks and timed out msgs. Defaults to False.
+            recordfile (str, optional): skaibin file to record to. Defaults to None.
+            use_shared_memory (bool, optional): hand msgs to the callback process through a shared memory ring
+                per port, the callback gets a memoryview that is only valid until it returns (copy it with bytes()
+                to keep it). msgs bigger than half a ring go through a queue in their place. False pickles them
+                all through a queue. Defaults to True.
+            shm_ring_size (int, optional): bytes of shared memory per port. Defaults to 16 MB.
+            reassembly_timeout_s (float, optional): drop partial chunked msgs after this long without
+                a new chunk. Defaults to 1.0.
+            nack (bool, optional): NACK missing chunks of chunked msgs back to their sender. Defaults to False.
+            batch_size (int, optional): datagrams received per recvmmsg syscall, see UdpBatchSocket. Defaults to 32.
+            transport_options (TransportOptions, optional): socket options, udp sockets only take the
+                buffer sizes. Defaults to None.
+            record_index (bool, optional): write a SkaibinIndex next to recordfile while recording. Defaults to False.
+            record_segment_bytes (int, optional): record into rotating segments of this size, see
+                SkaibinSegments. Defaults to None.
+            record_segment_sec (float, optional): record into rotating segments of this duration. Defaults to None.
+        """
+        self.reassembly_timeout_s = reassembly_timeout_s
+        self.nack = nack
+        self.batch_size = batch_size or 1
+        MultiportTcpListenerMP.__init__(self, portlist, multiport_callback_func, print_q=print_q, ipv6=ipv6,
+                                        verbose=verbose, recordfile=recordfile, use_shared_memory=use_shared_memory,
+                                        shm_ring_size=shm_ring_size, transport_options=transport_options,
+                                        record_index=record_index, record_segment_bytes=record_segment_bytes,
+                                        record_segment_sec=record_segment_sec)
+
+    @staticmethod
+    def single_port_process(stop_event, print_q, msg_q, addr_port:tuple, ListenerClass, msg_ring=None, data_event=None,
+                            ipv6=False, reassembly_timeout_s=1.0, nack=False, batch_size=32, verbose=False,
+                            stats_array=None, worker_num=0, transport_options=None):
+        # instantiate listener
+        spl = ListenerClass(addr_port, print_q, msg_q, ipv6=ipv6, msg_ring=msg_ring, data_event=data_event,
+                            stop_event=stop_event, reassembly_timeout_s=reassembly_timeout_s, nack=nack,
+                            batch_size=batch_size, verbose=verbose, stats_array=stats_array, worker_num=worker_num,
+                            transport_options=transport_options)
+
+        # now listen for datagrams on port until stop event
+        printmsg = f'now listening on {addr_port}...'
+        logger.info(printmsg)
+        if print_q is not None:
+            print_q.put(printmsg)
+        try:
+            while not stop_event.is_set():
+                spl.handle_batch()
+        except Exception as e:
+            printmsg = f'something went wrong in single port datagram handling: {e}'
+            logger.exception(printmsg)
+            if print_q is not None:
+                print_q.put(printmsg)
+        finally:
+            # close socket after stop event
+            spl.server_close()
+
+    def start_listeners(self):
+        self.start_multiport_process()
+
+        # start single port processes, one worker per port. udp has no connections, the
+        # connections counter of worker_stats() holds the number of chunked senders instead
+        self.processes = []
+        for worker_num, port in enumerate(self.portlist):
+            listen_addr_port = (self.listen_addr, port)
+            proc = mp.Process(
+                name=f'udp_listener_port_{port}',
+                target=self.single_port_process,
+                args=(self.stop_event, self.print_q, self.msg_q, listen_addr_port, self.SinglePortListener,
+                      self.rings.get((port, 0)), self.data_event, self.ipv6, self.reassembly_timeout_s, self.nack,
+                      self.batch_size, self.verbose, self.worker_stats_array, worker_num, self.transport_options)
+            )
+            proc.daemon = True
+            proc.start()
+            self.processes.append(proc)
+
+    def stop(self):
+        MultiportTcpListenerMP.stop(self)
+        # port processes notice the stop event within a poll interval, wait so the ports are free again
+        # and for the recorder to write out what is queued
+        procs = self.processes + [self.multiport_proc]
+        if self.record_q is not None:
+            procs.append(self.record_proc)
+        for proc in procs:
+            proc.join(self.join_timeout_sec)
+
+    class SinglePortListener:
+
+        # max wait for datagrams before rechecking the stop event / servicing the reassembler
+        poll_interval_sec = 0.1
+
+        def __init__(self, server_address, print_q, msg_q, ipv6=False, msg_ring=None, data_event=None, stop_event=None,
+                     reassembly_timeout_s=1.0, nack=False, batch_size=32, verbose=False, stats_array=None, worker_num=0,
+                     transport_options=None):
+            # store reference to mp vars
+            self.server_address = server_address
+            self.print_q = print_q
+            self.msg_q = msg_q
+            self.msg_ring = msg_ring
+            self.data_event = data_event
+            self.stop_event = stop_event
+            self.verbose = verbose
+
+            # this port's row of the shared stats array, see MultiportTcpListenerMP.worker_stats()
+            fields = MultiportTcpListenerMP.worker_stat_fields
+            if stats_array is None:
+                stats_array = [0] * len(fields)
+                worker_num = 0
+            self.stats_array = stats_array
+            self.stats_idx = {field: worker_num * len(fields) + i for i, field in enumerate(fields)}
+
+            # legacy sender state
+            self.new_msg_flag = True
+            self.databuff = bytearray()
+            self.packet_idx = 0
+            self.total_num_packets = 0
+            self.firstpacket_timestamp = 0
+            self.stream_stats = StreamStats()
+
+            self.socket = socket.socket(socket.AF_INET6 if ipv6 else socket.AF_INET, socket.SOCK_DGRAM)
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if transport_options is not None:
+                transport_options.apply(self.socket)
+            self.socket.bind(server_address)
+            self.batch = UdpBatchSocket(self.socket, batch_size)
+
+            # chunked msgs, keyed per sender
+            nack_func = self.send_nack if nack else None
+            self.reassembler = UdpReassembler(reassembly_timeout_s, nack_func, verbose=verbose)
+            if nack:
+                # wake up often enough to NACK stalled msgs
+                self.poll_interval_sec = self.reassembler.nack_interval_s
+
+        def server_close(self):
+            for (address, source_id), source in self.reassembler.sources.items():
+                logger.info(f'udp source {source_id:08x} {address} on {self.server_address}: {source}')
+            if self.stream_stats.received:
+                logger.info(f'legacy udp senders on {self.server_address}: {self.stream_stats}')
+            self.socket.close()
+
+        def handle_batch(self):
+            for data, client_address in self.batch.recv_many(timeout=self.poll_interval_sec):
+                self.handle_datagram(data, client_address)
+            self.reassembler.service()
+            # live senders, service() drops idle ones
+            self.stats_array[self.stats_idx['connections']] = len(self.reassembler.sources)
+
+        def send_nack(self, datagram, address):
+            try:
+                self.socket.sendto(datagram, address)
+            except OSError as e:
+                logger.warning(f'could not send NACK to {address}: {e}')
+
+        def handle_datagram(self, data, client_address):
+            # data is a view into the receive arena, only valid until the next batch
+
+            if UdpChunk.is_chunk(data):
+                try:
+                    completed = self.reassembler.add(data, client_address)
+                except FrameError as e:
+                    if self.verbose:
+                        logger.warning(f'bad udp chunk from {client_address} on {self.server_address}: {e}')
+                    return
+                for frame_bytes, firstpacket_timestamp, source in completed:
+                    self.handle_frame(frame_bytes, firstpacket_timestamp, source.stream_stats, client_address)
+                return
+
+            if self.new_msg_flag:
+                try:
+                    packet_count = struct.unpack('!I', data)[0]
+                except struct.error as e:
+                    logger.error(f'msg len parse exception from {client_address} on {self.server_address}: {e}')
+                    return
+                # prep for reading chunks
+                self.new_msg_flag = False
+                self.firstpacket_timestamp = time.time()
+                self.databuff = bytearray()
+                self.packet_idx = 0
+                self.total_num_packets = packet_count
+            else:
+                # read chunks to assemble message
+                self.databuff += data
+                self.packet_idx += 1
+                if self.packet_idx >= self.total_num_packets:
+                    self.new_msg_flag = True
+                    self.handle_frame(self.databuff, self.firstpacket_timestamp, self.stream_stats, client_address)
+
+        def handle_frame(self, frame_bytes, firstpacket_timestamp, stream_stats, client_address):
+            # verify checksum (legacy or versioned frame), then pass the record on to the callback process
+            try:
+                record, header = SkaiFrame.strip_checksum(frame_bytes)
+            except FrameError as e:
+                self.stats_array[self.stats_idx['checksum_errors']] += 1
+                printmsg = f'{e} from {client_address} on {self.server_address}'
+                logger.error(printmsg)
+                if self.print_q is not None:
+                    self.print_q.put(printmsg)
+                return
+            gap = stream_stats.update(header, firstpacket_timestamp)
+            stats_idx = self.stats_idx
+            self.stats_array[stats_idx['msgs']] += 1
+            self.stats_array[stats_idx['bytes']] += len(record)
+            self.stats_array[stats_idx['gaps']] += gap
+            if gap:
+                printmsg = f'{gap} msgs missing before sequence {header.sequence} from {client_address} on {self.server_address}'
+                logger.warning(printmsg)
+                if self.print_q is not None:
+                    self.print_q.put(printmsg)
+            self.forward_msg(record, firstpacket_timestamp)
+
+        def forward_msg(self, msg_bytes, firstpacket_timestamp):
+            # shared memory ring when enabled, msgs that do not fit it are pickled through the queue with a
+            # marker in the ring. one thread per port process, so no lock around the ring's producer side
+            if self.msg_ring is not None:
+                if len(msg_bytes) > self.msg_ring.max_payload_size:
+                    msg_bytes = MultiportTcpListenerMP.queue_oversized(self.msg_q, self.msg_ring, msg_bytes,
+                                                                       firstpacket_timestamp, self.server_address)
+                if self.msg_ring.write(msg_bytes, firstpacket_timestamp, self.stop_event):
+                    self.data_event.set()
+            else:
+                self.msg_q.put_nowait( (bytes(msg_bytes), firstpacket_timestamp, self.server_address) )
+
+
+def example_multiport_callback_func(msg_bytes, server_address):
+    # store it, unpack, etc do as you wish
+    msg_type, msg = SkaiMsg.unpack(msg_bytes)
+    printmsg = f'got some data length {len(msg_bytes)} from {server_address} msg type {msg_type}\n'
+    logger.info(printmsg)
+    print(printmsg)
+
+
+if __name__ == '__main__':
+
+    # ports to listen to
+    camgroup_idx = 0
+    ports = [
+        SkaimotMsg.ports[camgroup_idx], PoseMsg.ports[camgroup_idx],
+        FeetPosMsg.ports[camgroup_idx], LocalTrackMsg.ports[camgroup_idx],
+        GlobalTrackMsg.ports[camgroup_idx], ActionMsg.ports[camgroup_idx]
+    ]
+
+    # make mp print q
+    print_q = mp.SimpleQueue()
+
+    # start listening
+    mpl = MultiportUdpListenerMP(
+        portlist=ports,
+        multiport_callback_func=example_multiport_callback_func,
+        print_q=print_q)
+
+    # stay active until ctrl+c input
+    try:
+        while True:
+            if not print_q.empty():
+                print(print_q.get())
+            time.sleep(0.001)
+    except KeyboardInterrupt:
+        print('exiting now...')
+        mpl.stop()
@@ -0,0 +1,297 @@
+#!/usr/bin/python3
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import socket
+import struct
+import sys
+
+
+class iovec(ctypes.Structure):
+    _fields_ = [('iov_base', ctypes.c_void_p), ('iov_len', ctypes.c_size_t)]
+
+
+class send_iovec(ctypes.Structure):
+    # same layout as iovec, a bytes object assigned to iov_base is pointed to without a copy
+    _fields_ = [('iov_base', ctypes.c_char_p), ('iov_len', ctypes.c_size_t)]
+
+
+class msghdr(ctypes.Structure):
+    _fields_ = [('msg_name', ctypes.c_void_p), ('msg_namelen', ctypes.c_uint32),
+                ('msg_iov', ctypes.POINTER(iovec)), ('msg_iovlen', ctypes.c_size_t),
+                ('msg_control', ctypes.c_void_p), ('msg_controllen', ctypes.c_size_t),
+                ('msg_flags', ctypes.c_int)]
+
+
+class mmsghdr(ctypes.Structure):
+    _fields_ = [('msg_hdr', msghdr), ('msg_len', ctypes.c_uint)]
+
+
+def load_mmsg():
+    # linux / glibc only, None everywhere else
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+        sendmmsg, recvmmsg = libc.sendmmsg, libc.recvmmsg
+    except (OSError, AttributeError):
+        return None, None
+    sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(mmsghdr), ctypes.c_uint, ctypes.c_int]
+    sendmmsg.restype = ctypes.c_int
+    recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(mmsghdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+    recvmmsg.restype = ctypes.c_int
+    return sendmmsg, recvmmsg
+
+
+class UdpBatchSocket:
+    """many datagrams per syscall on a udp socket
+
+    sending, best first:
+        udp gso (linux >= 4.18): runs of equal sized datagrams (e.g. the 4 KB chunks
+            of a msg, the last may be shorter) go out as one sendmsg of scatter
+            buffers with a UDP_SEGMENT cmsg, the kernel cuts them into datagrams
+        sendmmsg (linux, through ctypes): any datagrams, batch_size per syscall
+        a sendto loop
+    receiving uses recvmmsg (or a recvfrom_into loop) into one receive arena
+    reused for every batch, so a burst of chunks costs one syscall and no per
+    datagram allocation.
+
+    receivers see the same datagrams whichever way they were sent.
+
+        batch = UdpBatchSocket(sock)
+        batch.sendto_many(datagrams, ('127.0.0.1', 6000))
+        for datagram, address in batch.recv_many(timeout=0.5):
+            ...     # datagram is a memoryview into the arena, valid until the next recv_many
+    """
+
+    sendmmsg, recvmmsg = load_mmsg()
+    available = sendmmsg is not None
+
+    UDP_SEGMENT = getattr(socket, 'UDP_SEGMENT', 103)
+    gso_available = sys.platform.startswith('linux')
+    gso_max_segments = 64
+    gso_max_bytes = 65000
+
+    MSG_DONTWAIT = getattr(socket, 'MSG_DONTWAIT', 0x40)
+    MSG_TRUNC = getattr(socket, 'MSG_TRUNC', 0x20)
+    sockaddr_size = 128     # sizeof(struct sockaddr_storage)
+    sockaddr_in = struct.Struct('=H2s4s8x')
+    # u32 offsets into mmsghdr
+    mmsghdr_u32 = ctypes.sizeof(mmsghdr) // 4
+    msg_len_u32 = mmsghdr.msg_len.offset // 4
+    namelen_u32 = (mmsghdr.msg_hdr.offset + msghdr.msg_namelen.offset) // 4
+
+    def __init__(self, sock, batch_size=32, max_datagram_size=65536, use_mmsg=True, use_gso=True):
+        """
+        Args:
+            sock (socket.socket): AF_INET udp socket, blocking mode is left as is
+            batch_size (int, optional): datagrams per syscall. Defaults to 32.
+            max_datagram_size (int, optional): arena slot size, longer datagrams are dropped. Defaults to 65536.
+            use_mmsg (bool, optional): False forces the per datagram fallback. Defaults to True.
+            use_gso (bool, optional): False never sends with udp gso. Defaults to True.
+        """
+        self.sock = sock
+        self.fd = sock.fileno()
+        self.batch_size = batch_size
+        self.max_datagram_size = max_datagram_size
+        self.use_mmsg = use_mmsg and self.available
+        self.use_gso = use_gso and self.gso_available
+
+        # receive arena, allocated by the first recv_many so senders don't pay for it
+        self.arena = None
+        self.truncated = 0
+
+        if self.use_mmsg:
+            self.send_iovecs = (send_iovec * batch_size)()
+            self.send_msgs = (mmsghdr * batch_size)()
+            for i in range(batch_size):
+                self.send_msgs[i].msg_hdr.msg_iov = ctypes.cast(ctypes.pointer(self.send_iovecs[i]), ctypes.POINTER(iovec))
+                self.send_msgs[i].msg_hdr.msg_iovlen = 1
+            self.send_names = {}    # address: (sockaddr buffer, length)
+            self.send_address = None
+
+    def setup_recv(self):
+        # one arena slot per datagram
+        self.arena = bytearray(self.batch_size * self.max_datagram_size)
+        self.arena_view = memoryview(self.arena)
+        self.slots = [self.arena_view[i * self.max_datagram_size:(i + 1) * self.max_datagram_size] for i in range(self.batch_size)]
+        if self.use_mmsg:
+            arena_addr = ctypes.addressof(ctypes.c_char.from_buffer(self.arena))
+            self.recv_iovecs = (iovec * self.batch_size)()
+            self.recv_names = ctypes.create_string_buffer(self.batch_size * self.sockaddr_size)
+            self.recv_msgs = (mmsghdr * self.batch_size)()
+            self.recv_names_view = memoryview(self.recv_names).cast('B')
+            self.recv_names_u64 = self.recv_names_view.cast('Q')
+            self.addresses = {}     # first 16 sockaddr bytes as 2 u64: (host, port)
+            names_addr = ctypes.addressof(self.recv_names)
+            for i in range(self.batch_size):
+                self.recv_iovecs[i].iov_base = arena_addr + i * self.max_datagram_size
+                self.recv_iovecs[i].iov_len = self.max_datagram_size
+                hdr = self.recv_msgs[i].msg_hdr
+                hdr.msg_name = names_addr + i * self.sockaddr_size
+                hdr.msg_namelen = self.sockaddr_size
+                hdr.msg_iov = ctypes.pointer(self.recv_iovecs[i])
+                hdr.msg_iovlen = 1
+            self.recv_msgs_u32 = memoryview(self.recv_msgs).cast('B').cast('I')
+
+    def sockaddr(self, address):
+        name = self.send_names.get(address)
+        if name is None:
+            host, port = address
+            packed = self.sockaddr_in.pack(socket.AF_INET, struct.pack('!H', port), socket.inet_aton(socket.gethostbyname(host)))
+            buf = ctypes.create_string_buffer(packed, len(packed))
+            name = self.send_names[address] = (buf, len(packed))
+        return name
+
+    def sendto_many(self, datagrams, address):
+        """sends datagrams to address, batch_size per syscall
+
+        Returns:
+            int: number of datagrams sent
+        """
+        sent = 0
+        if self.use_gso:
+            try:
+                sent = self.sendto_gso(datagrams, address)
+            except OSError as e:
+                if e.errno not in (errno.EIO, errno.EINVAL, errno.ENOPROTOOPT, errno.EOPNOTSUPP):
+                    raise
+                # kernel or egress device without udp gso, the failed run was not sent
+                print(f'udp gso not supported ({e}), sending with {"sendmmsg" if self.use_mmsg else "sendto"}')
+                self.use_gso = False
+                sent = e.sent
+            if sent == len(datagrams):
+                return sent
+            datagrams = datagrams[sent:]
+        return sent + self.sendto_mmsg(datagrams, address)
+
+    def sendto_gso(self, datagrams, address):
+        sent = 0
+        while sent < len(datagrams):
+            # a run of segment sized datagrams, ended early by a shorter one
+            segment_size = len(datagrams[sent])
+            end = sent + 1
+            total = segment_size
+            while (end < len(datagrams) and end - sent < self.gso_max_segments
+                    and len(datagrams[end - 1]) == segment_size
+                    and len(datagrams[end]) <= segment_size
+                    and total + len(datagrams[end]) <= self.gso_max_bytes):
+                total += len(datagrams[end])
+                end += 1
+            try:
+                if end - sent == 1:
+                    self.sock.sendto(datagrams[sent], address)
+                else:
+                    self.sock.sendmsg(datagrams[sent:end], [(socket.SOL_UDP, self.UDP_SEGMENT, struct.pack('=H', segment_size))], 0, address)
+            except OSError as e:
+                e.sent = sent
+                raise
+            sent = end
+        return sent
+
+    def sendto_mmsg(self, datagrams, address):
+        if not self.use_mmsg:
+            for datagram in datagrams:
+                self.sock.sendto(datagram, address)
+            return len(datagrams)
+
+        if address != self.send_address:
+            name, namelen = self.sockaddr(address)
+            name_addr = ctypes.addressof(name)
+            for msg in self.send_msgs:
+                msg.msg_hdr.msg_name = name_addr
+                msg.msg_hdr.msg_namelen = namelen
+            self.send_address = address
+
+        iovecs = self.send_iovecs
+        sent = 0
+        while sent < len(datagrams):
+            batch = datagrams[sent:sent + self.batch_size]
+            for i, datagram in enumerate(batch):
+                if not isinstance(datagram, bytes):
+                    datagram = bytes(datagram)
+                # the iovec keeps the bytes referenced until it is overwritten
+                vec = iovecs[i]
+                vec.iov_base = datagram
+                vec.iov_len = len(datagram)
+            count = self.sendmmsg(self.fd, self.send_msgs, len(batch), 0)
+            if count < 0:
+                err = ctypes.get_errno()
+                if err == errno.EINTR:
+                    continue
+                if err in (errno.EAGAIN, errno.ENOBUFS):
+                    select.select([], [self.sock], [])
+                    continue
+                raise OSError(err, os.strerror(err))
+            sent += count
+        return sent
+
+    def parse_sockaddr(self, i):
+        # senders repeat, so addresses are cached by their first 16 sockaddr bytes (all of a sockaddr_in)
+        q = (i * self.sockaddr_size) // 8
+        key = (self.recv_names_u64[q], self.recv_names_u64[q + 1])
+        address = self.addresses.get(key)
+        if address is None:
+            offset = i * self.sockaddr_size
+            raw = bytes(self.recv_names_view[offset:offset + self.sockaddr_size])
+            family = struct.unpack_from('=H', raw)[0]
+            if family == socket.AF_INET:
+                _, port, addr = self.sockaddr_in.unpack_from(raw)
+                address = socket.inet_ntoa(addr), struct.unpack('!H', port)[0]
+                if len(self.addresses) < 4096:
+                    self.addresses[key] = address
+            elif family == socket.AF_INET6:
+                address = socket.inet_ntop(socket.AF_INET6, raw[8:24]), struct.unpack_from('!H', raw, 2)[0]
+        return address
+
+    def recv_many(self, timeout=None):
+        """receives up to batch_size datagrams that are waiting
+
+        Args:
+            timeout (float, optional): wait this long for the first datagram, None waits forever. Defaults to None.
+
+        Returns:
+            list of (memoryview, address), views into the arena valid until the next recv_many call
+        """
+        if self.arena is None:
+            self.setup_recv()
+        ready, _, _ = select.select([self.sock], [], [], timeout)
+        if not ready:
+            return []
+
+        if not self.use_mmsg:
+            received = []
+            for slot in self.slots:
+                try:
+                    length, address = self.sock.recvfrom_into(slot, 0, self.MSG_DONTWAIT)
+                except BlockingIOError:
+                    break
+                except OSError:
+                    # icmp errors of earlier sends
+                    continue
+                received.append((slot[:length], address))
+            return received
+
+        # MSG_TRUNC makes msg_len the full datagram length, so truncation shows as msg_len > slot size
+        count = self.recvmmsg(self.fd, self.recv_msgs, self.batch_size, self.MSG_DONTWAIT | self.MSG_TRUNC, None)
+        if count < 0:
+            err = ctypes.get_errno()
+            if err in (errno.EAGAIN, errno.EINTR, errno.ECONNREFUSED):
+                return []
+            raise OSError(err, os.strerror(err))
+
+        # mmsghdr fields are read through a u32 view, ctypes attribute access costs more than the syscall saves
+        received = []
+        fields = self.recv_msgs_u32
+        stride = self.mmsghdr_u32
+        slots = self.slots
+        for i in range(count):
+            length = fields[i * stride + self.msg_len_u32]
+            # the kernel shrank namelen to the sockaddr it wrote, give the full buffer back
+            fields[i * stride + self.namelen_u32] = self.sockaddr_size
+            if length > self.max_datagram_size:
+                self.truncated += 1
+                continue
+            received.append((slots[i][:length], self.parse_sockaddr(i)))
+        return received
@@ -0,0 +1,105 @@
+#!/usr/bin/python3
+
+import struct
+from collections import namedtuple
+
+from skaimsginterface.framing import FrameError
+
+
+# parsed chunk header, see UdpChunk
+ChunkHeader = namedtuple('ChunkHeader', ['flags', 'source_id', 'msg_id', 'chunk_idx', 'chunk_count'])
+
+
+class UdpChunk:
+    """datagram layout of chunked udp messages
+
+    every datagram carries its own header, so chunks can be lost, duplicated
+    or reordered and several senders can share a port:
+
+        [2s magic 'SU'][u8 version][u8 flags][u32 source id][u32 msg id]
+        [u16 chunk idx][u16 chunk count][payload]
+
+    the payloads of chunks 0..count-1 of one (source id, msg id) concatenate to
+    the frame body (see SkaiFrame). source ids are random per sender, msg ids
+    count up per sender.
+
+    listeners send NACK datagrams back to the sender's address, same header with
+    the NACK flag and chunk idx / count 0, the payload is the u16 idxs of the
+    missing chunks, none meaning the whole msg is missing.
+
+    legacy udp senders send a 4 byte chunk count first, then headerless chunks.
+    neither can start with the magic in practice, listeners handle both.
+    """
+
+    magic = b'SU'
+    version = 1
+    header_struct = struct.Struct('!2sBBIIHH')
+    idx_struct = struct.Struct('!H')
+
+    # flag bits
+    NACK = 0x01
+    RETRANSMIT = 0x02
+    flags_offset = 3
+
+    max_chunk_count = 0xffff
+    # missing idxs per nack datagram
+    max_nack_idxs = 512
+
+    @classmethod
+    def is_chunk(cls, datagram):
+        return len(datagram) >= cls.header_struct.size and datagram[:2] == cls.magic
+
+    @classmethod
+    def pack_header(cls, flags, source_id, msg_id, chunk_idx, chunk_count):
+        return cls.header_struct.pack(cls.magic, cls.version, flags, source_id, msg_id & 0xffffffff, chunk_idx, chunk_count)
+
+    @classmethod
+    def split(cls, frame_bytes, source_id, msg_id, payload_size=4096):
+        """returns the datagrams of one frame body
+
+        Args:
+            frame_bytes (bytes-like): frame body, see SkaiFrame.pack_bytes
+            source_id (int): u32 sender id
+            msg_id (int): u32 per sender msg counter
+            payload_size (int, optional): frame bytes per datagram. Defaults to 4096.
+
+        Raises:
+            ValueError: frame needs more than 65535 chunks
+        """
+        chunk_count = max(1, -(-len(frame_bytes) // payload_size))
+        if chunk_count > cls.max_chunk_count:
+            raise ValueError(f'{len(frame_bytes)} byte frame needs {chunk_count} chunks of {payload_size}, max is {cls.max_chunk_count}')
+        view = memoryview(frame_bytes)
+        return [cls.pack_header(0, source_id, msg_id, idx, chunk_count) + view[idx * payload_size:(idx + 1) * payload_size]
+                for idx in range(chunk_count)]
+
+    @classmethod
+    def parse(cls, datagram):
+        """returns (ChunkHeader, memoryview of the payload)
+
+        Raises:
+            FrameError: not a chunk or a version this reader doesn't know
+        """
+        if not cls.is_chunk(datagram):
+            raise FrameError(f'{len(datagram)} byte datagram is not a udp chunk')
+        _, version, flags, source_id, msg_id, chunk_idx, chunk_count = cls.header_struct.unpack_from(datagram)
+        if version != cls.version:
+            raise FrameError(f'unknown udp chunk version {version}')
+        if not flags & cls.NACK and (chunk_count == 0 or chunk_idx >= chunk_count):
+            raise FrameError(f'bad udp chunk idx {chunk_idx} of {chunk_count}')
+        header = ChunkHeader(flags, source_id, msg_id, chunk_idx, chunk_count)
+        return header, memoryview(datagram)[cls.header_struct.size:]
+
+    @classmethod
+    def pack_nacks(cls, source_id, msg_id, missing_idxs):
+        """returns the NACK datagrams asking for missing_idxs of a msg, an empty list asks for all of it"""
+        missing_idxs = list(missing_idxs)
+        header = cls.pack_header(cls.NACK, source_id, msg_id, 0, 0)
+        if not missing_idxs:
+            return [header]
+        return [header + b''.join(cls.idx_struct.pack(idx) for idx in missing_idxs[i:i + cls.max_nack_idxs])
+                for i in range(0, len(missing_idxs), cls.max_nack_idxs)]
+
+    @classmethod
+    def parse_nack_idxs(cls, payload):
+        return [idx for idx, in cls.idx_struct.iter_unpack(payload[:len(payload) - len(payload) % 2])]
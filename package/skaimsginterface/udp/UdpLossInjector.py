@@ -0,0 +1,114 @@
+#!/usr/bin/python3
+
+import random
+import selectors
+import socket
+import threading
+
+
+class UdpLossInjector:
+    """lossy udp proxy for testing, no netem / root needed
+
+    forwards datagrams sent to listen_port on to target, dropping, duplicating
+    and reordering them at the given rates. replies from target (e.g. NACKs)
+    go back to the sender that caused them, with the same loss applied, through
+    one upstream socket per sender so the target still sees separate senders.
+
+        injector = UdpLossInjector(7000, ('127.0.0.1', 6000), drop=0.05, reorder=0.05)
+        injector.start()
+        sender = UdpSender('127.0.0.1', 7000, chunked=True)
+    """
+
+    def __init__(self, listen_port, target, drop=0.0, duplicate=0.0, reorder=0.0, seed=None, listen_ip='127.0.0.1'):
+        """
+        Args:
+            listen_port (int): port senders send to
+            target (tuple): (host, port) datagrams are forwarded to
+            drop (float, optional): probability of dropping a datagram. Defaults to 0.0.
+            duplicate (float, optional): probability of sending a datagram twice. Defaults to 0.0.
+            reorder (float, optional): probability of holding a datagram back until after the next one. Defaults to 0.0.
+            seed (int, optional): random seed for repeatable runs. Defaults to None.
+            listen_ip (str, optional): Defaults to '127.0.0.1'.
+        """
+        self.target = target
+        self.drop = drop
+        self.duplicate = duplicate
+        self.reorder = reorder
+        self.random = random.Random(seed)
+
+        self.forwarded = 0
+        self.dropped = 0
+        self.duplicated = 0
+        self.reordered = 0
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((listen_ip, listen_port))
+        self.upstream = {}          # sender address: socket to target
+        self.held = {}              # socket: (datagram, address) held back for reordering
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.sock, selectors.EVENT_READ, None)
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+        self.selector.close()
+        for sock in [self.sock, *self.upstream.values()]:
+            sock.close()
+
+    def run(self):
+        while self.running:
+            events = self.selector.select(timeout=0.05)
+            if not events:
+                # nothing else coming to reorder with, let held datagrams go
+                for sock, held in list(self.held.items()):
+                    del self.held[sock]
+                    self.sendto(sock, *held)
+            for key, _ in events:
+                try:
+                    datagram, address = key.fileobj.recvfrom(65536)
+                except OSError:
+                    continue
+                if key.data is None:
+                    # sender -> target
+                    upstream = self.upstream.get(address)
+                    if upstream is None:
+                        upstream = self.upstream[address] = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                        self.selector.register(upstream, selectors.EVENT_READ, address)
+                    self.forward(upstream, datagram, self.target)
+                else:
+                    # target -> sender
+                    self.forward(self.sock, datagram, key.data)
+
+    def forward(self, sock, datagram, address):
+        if self.random.random() < self.drop:
+            self.dropped += 1
+            return
+        if sock not in self.held and self.random.random() < self.reorder:
+            self.held[sock] = (datagram, address)
+            self.reordered += 1
+            return
+        self.sendto(sock, datagram, address)
+        if self.random.random() < self.duplicate:
+            self.sendto(sock, datagram, address)
+            self.duplicated += 1
+        held = self.held.pop(sock, None)
+        if held is not None:
+            self.sendto(sock, *held)
+
+    def sendto(self, sock, datagram, address):
+        try:
+            sock.sendto(datagram, address)
+            self.forwarded += 1
+        except OSError:
+            self.dropped += 1
+
+    def __str__(self):
+        return f'forwarded {self.forwarded} dropped {self.dropped} duplicated {self.duplicated} reordered {self.reordered}'
@@ -0,0 +1,229 @@
+#!/usr/bin/python3
+
+import time
+
+from skaimsginterface.udp.UdpChunk import UdpChunk
+from skaimsginterface.framing import FrameError, StreamStats
+
+
+class UdpReassembler:
+    """reassembles chunked udp messages (see UdpChunk), keyed per sender
+
+    every (address, source id) gets its own UdpReassembler.Source holding its
+    partial msgs and counters, so senders sharing a port don't interfere and a
+    lost chunk only loses its own msg. partial msgs are dropped after
+    timeout_s without a new chunk, and a Source without partial msgs after
+    source_idle_timeouts * timeout_s without a chunk, so restarted senders
+    (new source id) don't pile up.
+
+    with nack_func set, msgs that stall (no chunk for nack_interval_s) or are
+    skipped over entirely are NACKed back to their sender, up to max_nacks
+    times each. senders only resend what they still buffer, see UdpSender.
+
+    msg ids wrap at 2^32 (see UdpSender), each is unwrapped to the id nearest the
+    highest seen so far (serial number arithmetic), so ordering, skipped ranges
+    and counters carry on across the wrap.
+
+    not thread safe, feed it from one thread per port.
+    """
+
+    class Partial:
+        def __init__(self, chunk_count, now):
+            self.chunks = [None] * chunk_count if chunk_count else None
+            self.received = 0
+            self.first_ts = now
+            self.last_ts = now
+            self.nacks = 0
+            self.last_nack_ts = None
+
+        def missing_idxs(self):
+            if self.chunks is None:
+                return []
+            return [idx for idx, chunk in enumerate(self.chunks) if chunk is None]
+
+    class Source:
+        """partial msgs and loss / reorder counters of one sender"""
+
+        def __init__(self, source_id, now):
+            self.source_id = source_id
+            self.last_ts = now              # last chunk received
+            self.partial = {}               # unwrapped msg id: Partial
+            self.completed = set()          # recently completed msg ids, to drop late duplicates
+            self.first_msg_id = None
+            self.highest_msg_id = None
+            self.last_completed_msg_id = None
+            # frame header sequence / latency stats of the reassembled msgs
+            self.stream_stats = StreamStats()
+
+            self.chunks_received = 0
+            self.chunks_duplicate = 0
+            self.chunks_reordered = 0       # chunks arriving behind a later chunk of the same sender
+            self.chunks_retransmitted = 0
+            self.msgs_completed = 0
+            self.msgs_reordered = 0         # msgs completing after a later msg of the same sender
+            self.msgs_timed_out = 0
+            self.nacks_sent = 0
+            self.last_chunk_key = None
+
+        @property
+        def msgs_lost(self):
+            """msgs seen or skipped over that did not complete and are no longer pending"""
+            if self.first_msg_id is None:
+                return 0
+            expected = self.highest_msg_id - self.first_msg_id + 1
+            return expected - self.msgs_completed - len(self.partial)
+
+        def __str__(self):
+            return (f'msgs completed {self.msgs_completed} lost {self.msgs_lost} reordered {self.msgs_reordered}'
+                    f' pending {len(self.partial)} | chunks received {self.chunks_received} reordered {self.chunks_reordered}'
+                    f' duplicate {self.chunks_duplicate} retransmitted {self.chunks_retransmitted} | nacks sent {self.nacks_sent}')
+
+    # completed msg ids remembered per source for duplicate detection
+    completed_window = 1024
+    # sources without partial msgs are dropped after this many timeout_s without a chunk
+    source_idle_timeouts = 10
+    msg_id_modulus = 1 << 32
+
+    @classmethod
+    def unwrap_msg_id(cls, msg_id, reference):
+        # the id congruent to msg_id mod 2^32 within half the range of reference
+        half = cls.msg_id_modulus >> 1
+        return reference + ((msg_id - reference + half) % cls.msg_id_modulus) - half
+
+    def __init__(self, timeout_s=1.0, nack_func=None, nack_interval_s=0.02, max_nacks=3, max_partial=256, verbose=False):
+        """
+        Args:
+            timeout_s (float, optional): drop partial msgs after this long without a new chunk. Defaults to 1.0.
+            nack_func (types.FunctionType, optional): called with (datagram, address) to send a NACK,
+                None disables NACKs. Defaults to None.
+            nack_interval_s (float, optional): stall time before (re)sending a NACK. Defaults to 0.02.
+            max_nacks (int, optional): NACKs per msg before waiting out the timeout. Defaults to 3.
+            max_partial (int, optional): partial msgs kept per sender, the oldest are dropped beyond it. Defaults to 256.
+            verbose (bool, optional): print dropped msgs. Defaults to False.
+        """
+        self.timeout_s = timeout_s
+        self.nack_func = nack_func
+        self.nack_interval_s = nack_interval_s
+        self.max_nacks = max_nacks
+        self.max_partial = max_partial
+        self.verbose = verbose
+        self.sources = {}                   # (address, source id): Source
+        self.last_service_ts = 0
+
+    def add(self, datagram, address, now=None):
+        """adds one datagram
+
+        Args:
+            datagram (bytes-like): UdpChunk datagram
+            address (tuple): sender (host, port)
+            now (float, optional): receive time, epoch seconds. Defaults to time.time().
+
+        Raises:
+            FrameError: not a valid chunk
+
+        Returns:
+            list of (frame bytes, first chunk timestamp, Source) for every msg this datagram completed
+        """
+        if now is None:
+            now = time.time()
+        header, payload = UdpChunk.parse(datagram)
+        if header.flags & UdpChunk.NACK:
+            raise FrameError(f'unexpected NACK from {address}')
+
+        key = (address, header.source_id)
+        source = self.sources.get(key)
+        if source is None:
+            source = self.sources[key] = self.Source(header.source_id, now)
+        source.last_ts = now
+        msg_id = header.msg_id
+        if source.highest_msg_id is not None:
+            msg_id = self.unwrap_msg_id(msg_id, source.highest_msg_id)
+        source.chunks_received += 1
+        if header.flags & UdpChunk.RETRANSMIT:
+            source.chunks_retransmitted += 1
+
+        chunk_key = (msg_id, header.chunk_idx)
+        if source.last_chunk_key is not None and chunk_key < source.last_chunk_key:
+            source.chunks_reordered += 1
+        else:
+            source.last_chunk_key = chunk_key
+
+        if msg_id in source.completed or (source.first_msg_id is not None and (
+                msg_id < source.first_msg_id or msg_id < source.highest_msg_id - self.completed_window)):
+            source.chunks_duplicate += 1
+            return []
+
+        if source.first_msg_id is None:
+            source.first_msg_id = source.highest_msg_id = msg_id
+        elif msg_id > source.highest_msg_id:
+            # msgs skipped over entirely are pending too, so they can be NACKed and time out
+            for skipped_id in range(max(source.highest_msg_id + 1, msg_id - self.max_partial), msg_id):
+                source.partial[skipped_id] = self.Partial(0, now)
+            source.highest_msg_id = msg_id
+
+        partial = source.partial.get(msg_id)
+        if partial is None or partial.chunks is None:
+            partial = source.partial[msg_id] = self.Partial(header.chunk_count, now)
+        elif len(partial.chunks) != header.chunk_count:
+            raise FrameError(f'chunk count {header.chunk_count} of msg {msg_id} from {address} changed from {len(partial.chunks)}')
+        partial.last_ts = now
+
+        if partial.chunks[header.chunk_idx] is not None:
+            source.chunks_duplicate += 1
+            return []
+        partial.chunks[header.chunk_idx] = bytes(payload)
+        partial.received += 1
+
+        completed = []
+        if partial.received == len(partial.chunks):
+            del source.partial[msg_id]
+            source.msgs_completed += 1
+            if source.last_completed_msg_id is not None and msg_id < source.last_completed_msg_id:
+                source.msgs_reordered += 1
+            else:
+                source.last_completed_msg_id = msg_id
+            source.completed.add(msg_id)
+            if len(source.completed) > 2 * self.completed_window:
+                floor = source.highest_msg_id - self.completed_window
+                source.completed = {done for done in source.completed if done > floor}
+            completed.append((b''.join(partial.chunks), partial.first_ts, source))
+
+        while len(source.partial) > self.max_partial:
+            oldest_id = min(source.partial)
+            del source.partial[oldest_id]
+            source.msgs_timed_out += 1
+            if self.verbose:
+                print(f'dropping msg {oldest_id % self.msg_id_modulus} from {address}, more than {self.max_partial} partial msgs')
+
+        self.service(now)
+        return completed
+
+    def service(self, now=None):
+        """times out stale partial msgs and idle sources and sends due NACKs, call it periodically when idle"""
+        if now is None:
+            now = time.time()
+        if now - self.last_service_ts < min(self.nack_interval_s, self.timeout_s) / 2:
+            return
+        self.last_service_ts = now
+
+        for (address, source_id), source in list(self.sources.items()):
+            if not source.partial and now - source.last_ts > self.source_idle_timeouts * self.timeout_s:
+                del self.sources[(address, source_id)]
+                if self.verbose:
+                    print(f'udp source {source_id:08x} {address} idle, dropping it: {source}')
+                continue
+            for msg_id in list(source.partial):
+                partial = source.partial[msg_id]
+                if now - partial.last_ts > self.timeout_s:
+                    del source.partial[msg_id]
+                    source.msgs_timed_out += 1
+                    if self.verbose:
+                        print(f'msg {msg_id % self.msg_id_modulus} from {address} timed out, missing {len(partial.missing_idxs()) or "all"} chunks')
+                elif (self.nack_func is not None and partial.nacks < self.max_nacks
+                        and now - partial.last_ts >= self.nack_interval_s
+                        and (partial.last_nack_ts is None or now - partial.last_nack_ts >= self.nack_interval_s)):
+                    for nack in UdpChunk.pack_nacks(source_id, msg_id % self.msg_id_modulus, partial.missing_idxs()):
+                        self.nack_func(nack, address)
+                    partial.nacks += 1
+                    partial.last_nack_ts = now
+                    source.nacks_sent += 1
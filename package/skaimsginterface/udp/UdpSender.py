@@ -1,20 +1,66 @@
 #!/usr/bin/python3
 
-import hashlib
 import socket
 import struct
 import math
 import time
+import random
+import select
+from collections import OrderedDict
 
 from skaimsginterface.skaimessages import *
+from skaimsginterface.framing import SkaiFrame, FrameError
+from skaimsginterface.udp.UdpChunk import UdpChunk
+from skaimsginterface.udp.UdpBatchSocket import UdpBatchSocket
 
 class UdpSender:
 
     def __init__(self,
                  host_ip,
                  port,
+                 checksum_type=None, # legacy md5 frames, see SkaiFrame.pack
+                 compression=None,
+                 compress_min_bytes=1024,
+                 chunked=False,
+                 retransmit_msgs=0,
+                 packet_size=4096,
+                 transport_options=None,
                  verbose=False) -> None:
+        """skai udp sender
+
+        Args:
+            host_ip (str): listener ip
+            port (int): listener port
+            checksum_type (FrameChecksum.Type, optional): see SkaiFrame.pack. Defaults to None.
+            compression (FrameCompression.Type, optional): compress msgs of at least compress_min_bytes,
+                needs a checksum_type, see SkaiFrame.pack. Defaults to None.
+            compress_min_bytes (int, optional): smaller msgs go out uncompressed. Defaults to 1024.
+            chunked (bool, optional): send UdpChunk datagrams with a per datagram header instead of the
+                legacy count packet + bare chunks, needs a listener that understands them. Defaults to False.
+            retransmit_msgs (int, optional): chunked only, keep the datagrams of this many recent msgs to
+                resend on NACKs from the listener, 0 ignores NACKs. Defaults to 0.
+            packet_size (int, optional): frame bytes per datagram. Defaults to 4096.
+            transport_options (TransportOptions, optional): socket options, udp sockets only take the
+                buffer sizes. Defaults to None.
+            verbose (bool, optional): controls additional print statements. Defaults to False.
+        """
         self.verbose = verbose
+        SkaiFrame.check_compression(compression, checksum_type)
+        self.checksum_type = checksum_type
+        self.compression = compression
+        self.compress_min_bytes = compress_min_bytes
+        # sequence number of the next versioned frame, one stream per sender
+        self.sequence = 0
+
+        self.chunked = chunked
+        self.packet_size = packet_size
+        # random per sender so listeners can tell senders sharing an address apart
+        self.source_id = random.getrandbits(32)
+        self.msg_id = 0
+        self.retransmit_msgs = retransmit_msgs
+        self.sent_datagrams = OrderedDict()     # msg id: datagrams, the last retransmit_msgs msgs
+        self.chunks_resent = 0
+        self.nacks_received = 0
 
         # 1 us delay between packets to ensure same order on local host network
         self.inter_packet_delay_s = 0.000001
@@ -23,39 +69,108 @@ class UdpSender:
         self.destination = (host_ip, port)
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if transport_options is not None:
+            transport_options.apply(self.sock)
+        # chunked msgs go out sendmmsg batches at a time where available
+        self.batch = UdpBatchSocket(self.sock, batch_size=64)
 
     def send(self, msg_bytes, send_failed_checksum=False):
 
-        # calc checksum 
-        clean_checksum = hashlib.md5(msg_bytes).digest()
-        # if you want to send a intentionally false checksum then mutate the bytes
-        if send_failed_checksum:
-            # add 1 to each bytes
-            checksum = b''
-            for b in clean_checksum:
-                checksum += bytes([b+1])
-        else:
-            checksum = clean_checksum
-        # and append to end 
-        msg_bytes += checksum
+        # frame msg with checksum (intentionally false if send_failed_checksum), sequence
+        # number and send timestamp. legacy frames (checksum_type None) carry neither
+        frame_bytes = SkaiFrame.pack_bytes(msg_bytes, self.checksum_type, self.sequence,
+                                           corrupt_checksum=send_failed_checksum, compression=self.compression,
+                                           compress_min_bytes=self.compress_min_bytes)
+        self.sequence += 1
+
+        if self.chunked:
+            self.send_chunked(frame_bytes)
+            if self.verbose:
+                print(f'sent { SkaiMsg.getMessageTypeName(msg_bytes)} message with length {len(frame_bytes)} as msg {self.msg_id - 1}')
+            return
 
         # send msg length & chunksize first
-        packet_size = 4096
-        packet_count = math.ceil(len(msg_bytes)/ packet_size)
+        packet_size = self.packet_size
+        packet_count = math.ceil(len(frame_bytes)/ packet_size)
         msglen_bytes = struct.pack('!I', packet_count)
         self.sock.sendto(msglen_bytes, self.destination)
         time.sleep(self.inter_packet_delay_s)
         idx = 0
+        # slices of a memoryview, not copies of the frame
+        frame_view = memoryview(frame_bytes)
         for chunkcount in range(packet_count):
-            self.sock.sendto(msg_bytes[idx:idx+packet_size], self.destination)
+            self.sock.sendto(frame_view[idx:idx+packet_size], self.destination)
             time.sleep(self.inter_packet_delay_s)
             idx += packet_size
         if self.verbose:
             print(
                 # length added in front as an unsigned int
-                f'sent { SkaiMsg.getMessageTypeName(msg_bytes)} message with length {len(msg_bytes)}'
+                f'sent { SkaiMsg.getMessageTypeName(msg_bytes)} message with length {len(frame_bytes)}'
             )
-        
+
+    def send_chunked(self, frame_bytes):
+        # every datagram carries its own header, so no pacing is needed for the
+        # listener to keep chunks apart
+        self.handle_nacks()
+        datagrams = UdpChunk.split(frame_bytes, self.source_id, self.msg_id, self.packet_size)
+        self.batch.sendto_many(datagrams, self.destination)
+        if self.retransmit_msgs:
+            self.sent_datagrams[self.msg_id] = datagrams
+            while len(self.sent_datagrams) > self.retransmit_msgs:
+                self.sent_datagrams.popitem(last=False)
+        self.msg_id = (self.msg_id + 1) & 0xffffffff
+
+    def handle_nacks(self, timeout_s=0):
+        """resends the chunks listeners NACKed, if still buffered
+
+        send() polls for NACKs before every msg, call this while idle (e.g. after the
+        last msg) to keep serving them.
+
+        Args:
+            timeout_s (float, optional): keep waiting for NACKs this long. Defaults to 0.
+
+        Returns:
+            int: number of chunks resent
+        """
+        if not self.retransmit_msgs:
+            return 0
+        resent = 0
+        deadline = time.monotonic() + timeout_s
+        while True:
+            try:
+                datagram, address = self.sock.recvfrom(65536, socket.MSG_DONTWAIT)
+            except BlockingIOError:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                select.select([self.sock], [], [], remaining)
+                continue
+            except OSError:
+                # e.g. connection refused from an icmp port unreachable
+                continue
+            try:
+                header, payload = UdpChunk.parse(datagram)
+            except FrameError:
+                continue
+            if not header.flags & UdpChunk.NACK or header.source_id != self.source_id:
+                continue
+            self.nacks_received += 1
+            datagrams = self.sent_datagrams.get(header.msg_id)
+            if datagrams is None:
+                if self.verbose:
+                    print(f'msg {header.msg_id} NACKed but no longer buffered')
+                continue
+            idxs = UdpChunk.parse_nack_idxs(payload) or range(len(datagrams))
+            resend = []
+            for idx in idxs:
+                if idx < len(datagrams):
+                    datagram = bytearray(datagrams[idx])
+                    datagram[UdpChunk.flags_offset] |= UdpChunk.RETRANSMIT
+                    resend.append(bytes(datagram))
+            resent += self.batch.sendto_many(resend, self.destination)
+        self.chunks_resent += resent
+        return resent
+
 
 def create_example_skaimotmsg(num_people=2, num_cams=5):    
     trackid = 69
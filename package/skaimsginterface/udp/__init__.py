@@ -1,2 +1,7 @@
 from .UdpSender import UdpSender
 from .MultiportUdpListener import MultiportUdpListener
+from .UdpChunk import UdpChunk, ChunkHeader
+from .UdpReassembler import UdpReassembler
+from .UdpLossInjector import UdpLossInjector
+from .UdpBatchSocket import UdpBatchSocket
+from .MultiportUdpListenerMP import MultiportUdpListenerMP